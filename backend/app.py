@@ -68,8 +68,9 @@ def create_app(config_name='Config'):
 def register_blueprints(app):
     """注册蓝图"""
     # 主要路由
-    from controllers.main_controller import main_bp
+    from controllers.main_controller import main_bp, metrics_bp
     app.register_blueprint(main_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp)
     logger.info("Registered main blueprint")
 
     # 设备管理API
@@ -30,6 +30,98 @@ class Config:
     MQTT_USERNAME = os.getenv('MQTT_USERNAME', '')
     MQTT_PASSWORD = os.getenv('MQTT_PASSWORD', '')
     MQTT_KEEPALIVE = int(os.getenv('MQTT_KEEPALIVE', '60'))
+    MQTT_PROTOCOL = os.getenv('MQTT_PROTOCOL', '3.1.1')  # 3.1.1 或 5
+    MQTT_CLIENT_ID = os.getenv('MQTT_CLIENT_ID', '')
+    
+    # 集群摄取：多个后端实例通过共享订阅 $share/<group>/sensors/+/... 分摊消息
+    MQTT_CLUSTER_ENABLED = os.getenv('MQTT_CLUSTER_ENABLED', 'False').lower() == 'true'
+    MQTT_SHARE_GROUP = os.getenv('MQTT_SHARE_GROUP', 'agrinex-ingest')
+    
+    # MQTT消息分发配置（工作线程池与背压策略: block / drop_oldest / spill）
+    MQTT_DISPATCH_ENABLED = os.getenv('MQTT_DISPATCH_ENABLED', 'True').lower() == 'true'
+    MQTT_WORKER_COUNT = int(os.getenv('MQTT_WORKER_COUNT', '4'))
+    MQTT_QUEUE_MAXSIZE = int(os.getenv('MQTT_QUEUE_MAXSIZE', '10000'))
+    MQTT_BACKPRESSURE_POLICY = os.getenv('MQTT_BACKPRESSURE_POLICY', 'block')
+    MQTT_DISPATCH_BLOCK_TIMEOUT = float(os.getenv('MQTT_DISPATCH_BLOCK_TIMEOUT', '5'))
+    MQTT_SPILL_DIR = os.getenv('MQTT_SPILL_DIR', './storage/mqtt_spill')
+    
+    # 读数批量写入配置
+    INGEST_BATCH_ENABLED = os.getenv('INGEST_BATCH_ENABLED', 'True').lower() == 'true'
+    INGEST_BATCH_MAX_ROWS = int(os.getenv('INGEST_BATCH_MAX_ROWS', '500'))
+    INGEST_BATCH_MAX_LINGER_MS = int(os.getenv('INGEST_BATCH_MAX_LINGER_MS', '200'))
+    
+    # 设备/传感器解析缓存配置
+    SENSOR_CACHE_MAX_ENTRIES = int(os.getenv('SENSOR_CACHE_MAX_ENTRIES', '10000'))
+    SENSOR_CACHE_TTL_SECONDS = int(os.getenv('SENSOR_CACHE_TTL_SECONDS', '300'))
+    
+    # 传感器最新读数缓存（redis: 多进程共享，不可用时退回进程内存储；memory: 仅进程内）
+    LATEST_CACHE_ENABLED = os.getenv('LATEST_CACHE_ENABLED', 'True').lower() == 'true'
+    LATEST_CACHE_BACKEND = os.getenv('LATEST_CACHE_BACKEND', 'redis')
+    LATEST_CACHE_KEY_PREFIX = os.getenv('LATEST_CACHE_KEY_PREFIX', 'agrinex:latest')
+    
+    # 仪表盘统计（状态计数缓存秒数；数据点总数由写入器累加，按间隔重新精确计数校正）
+    DASHBOARD_STATS_TTL_SECONDS = float(os.getenv('DASHBOARD_STATS_TTL_SECONDS', '10'))
+    DASHBOARD_DATA_POINTS_RESYNC_SECONDS = float(os.getenv('DASHBOARD_DATA_POINTS_RESYNC_SECONDS', '3600'))
+    
+    # 按设备模板校验读数范围（超出范围的读数标记质量码）
+    INGEST_TEMPLATE_VALIDATION_ENABLED = os.getenv('INGEST_TEMPLATE_VALIDATION_ENABLED', 'True').lower() == 'true'
+    
+    # 消息去重窗口（丢弃QoS1重投的重复消息）
+    INGEST_DEDUP_ENABLED = os.getenv('INGEST_DEDUP_ENABLED', 'True').lower() == 'true'
+    INGEST_DEDUP_MAX_ENTRIES = int(os.getenv('INGEST_DEDUP_MAX_ENTRIES', '100000'))
+    INGEST_DEDUP_WINDOW_SECONDS = int(os.getenv('INGEST_DEDUP_WINDOW_SECONDS', '900'))
+    
+    # 入库死信队列（无法入库的消息按分段文件持久化，可批量回放）
+    DEAD_LETTER_ENABLED = os.getenv('DEAD_LETTER_ENABLED', 'True').lower() == 'true'
+    DEAD_LETTER_DIR = os.getenv('DEAD_LETTER_DIR', './storage/dead_letters')
+    DEAD_LETTER_SEGMENT_MAX_BYTES = int(os.getenv('DEAD_LETTER_SEGMENT_MAX_BYTES', str(16 * 1024 * 1024)))
+    DEAD_LETTER_MAX_TOTAL_BYTES = int(os.getenv('DEAD_LETTER_MAX_TOTAL_BYTES', str(1024 * 1024 * 1024)))
+    
+    # 读数汇总表（1m/1h/1d，统计接口优先使用汇总表）
+    READING_ROLLUP_ENABLED = os.getenv('READING_ROLLUP_ENABLED', 'True').lower() == 'true'
+    
+    # 读数表按月分区维护与保留（MySQL，回填汇总并归档后按整个分区删除过期读数；默认0表示不删除）
+    READING_PARTITIONS_ENABLED = os.getenv('READING_PARTITIONS_ENABLED', 'True').lower() == 'true'
+    READING_PARTITION_MONTHS_AHEAD = int(os.getenv('READING_PARTITION_MONTHS_AHEAD', '3'))
+    READING_PARTITION_CHECK_HOURS = float(os.getenv('READING_PARTITION_CHECK_HOURS', '24'))
+    READING_RETENTION_MONTHS = int(os.getenv('READING_RETENTION_MONTHS', '0'))
+    
+    # 保留与降采样策略（JSON: {"default": {...}, "<传感器类型>": {...}}，天数为null表示永久保留；默认关闭，未配置策略时全部永久保留）
+    RETENTION_ENABLED = os.getenv('RETENTION_ENABLED', 'False').lower() == 'true'
+    RETENTION_POLICIES = os.getenv('RETENTION_POLICIES', '{}')
+    RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '5000'))
+    RETENTION_BATCH_PAUSE_MS = int(os.getenv('RETENTION_BATCH_PAUSE_MS', '50'))
+    RETENTION_CHECK_HOURS = float(os.getenv('RETENTION_CHECK_HOURS', '24'))
+    
+    # 冷数据归档配置（已结束日期的数值读数按 传感器/天 导出为 Parquet，历史查询合并归档与数据库）
+    ARCHIVE_ENABLED = os.getenv('ARCHIVE_ENABLED', 'False').lower() == 'true'
+    ARCHIVE_BUCKET = os.getenv('ARCHIVE_BUCKET', 'agrinex-archive')
+    ARCHIVE_DELAY_DAYS = int(os.getenv('ARCHIVE_DELAY_DAYS', '1'))
+    ARCHIVE_CHECK_HOURS = float(os.getenv('ARCHIVE_CHECK_HOURS', '24'))
+    
+    # 入库写前日志（数值读数先追加到本地日志并组提交fsync，再由后台线程批量写入数据库）
+    INGEST_JOURNAL_ENABLED = os.getenv('INGEST_JOURNAL_ENABLED', 'False').lower() == 'true'
+    INGEST_JOURNAL_DIR = os.getenv('INGEST_JOURNAL_DIR', './storage/ingest_journal')
+    INGEST_JOURNAL_SEGMENT_MAX_BYTES = int(os.getenv('INGEST_JOURNAL_SEGMENT_MAX_BYTES', str(64 * 1024 * 1024)))
+    INGEST_JOURNAL_FSYNC_INTERVAL_MS = int(os.getenv('INGEST_JOURNAL_FSYNC_INTERVAL_MS', '0'))
+    INGEST_JOURNAL_APPLY_MAX_ROWS = int(os.getenv('INGEST_JOURNAL_APPLY_MAX_ROWS', '1000'))
+    
+    # SQL查询监控（按请求统计查询数/耗时，同一语句形状重复超过阈值时记录 N+1 警告；响应头默认只在调试模式返回）
+    SQL_MONITOR_ENABLED = os.getenv('SQL_MONITOR_ENABLED', 'True').lower() == 'true'
+    SQL_MONITOR_HEADERS = os.getenv('SQL_MONITOR_HEADERS', os.getenv('FLASK_DEBUG', 'False')).lower() == 'true'
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv('SQL_N_PLUS_ONE_THRESHOLD', '10'))
+    
+    # Prometheus 指标（/metrics 端点：请求耗时、入库队列、告警/通知/预测耗时、连接池和缓存命中）
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+    
+    # 入库链路追踪（MQTT消息 → 解码 → 入库 → 告警检查 → 通知；按采样率以 OTLP/JSON 导出到本地文件或收集器，
+    # 总耗时超过 TRACING_SLOW_MS 的消息在日志中输出完整span树）
+    TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'False').lower() == 'true'
+    TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', '0.01'))
+    TRACING_SLOW_MS = float(os.getenv('TRACING_SLOW_MS', '2000'))
+    TRACING_EXPORT_PATH = os.getenv('TRACING_EXPORT_PATH', './storage/traces/spans.jsonl')
+    TRACING_EXPORT_MAX_BYTES = int(os.getenv('TRACING_EXPORT_MAX_BYTES', str(64 * 1024 * 1024)))
+    TRACING_OTLP_ENDPOINT = os.getenv('TRACING_OTLP_ENDPOINT', '')  # 例如 http://localhost:4318/v1/traces
     
     # OpenAI 配置
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
@@ -46,6 +138,12 @@ class Config:
     MINIO_SECURE = os.getenv('MINIO_SECURE', 'False').lower() == 'true'
     LOCAL_STORAGE_PATH = os.getenv('LOCAL_STORAGE_PATH', './storage')
     
+    # 分块媒体上传配置（图像/视频按块写入临时文件，提交后转存到存储服务）
+    MEDIA_UPLOAD_DIR = os.getenv('MEDIA_UPLOAD_DIR', './storage/media_uploads')
+    MEDIA_UPLOAD_MAX_BYTES = int(os.getenv('MEDIA_UPLOAD_MAX_BYTES', str(512 * 1024 * 1024)))
+    MEDIA_UPLOAD_MAX_CHUNK_BYTES = int(os.getenv('MEDIA_UPLOAD_MAX_CHUNK_BYTES', str(1024 * 1024)))
+    MEDIA_UPLOAD_TTL_HOURS = int(os.getenv('MEDIA_UPLOAD_TTL_HOURS', '24'))
+    
     # 应用配置
     ITEMS_PER_PAGE = 100
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB 最大文件上传
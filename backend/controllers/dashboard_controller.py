@@ -1,12 +1,8 @@
 from flask import Blueprint, jsonify, current_app
 from datetime import datetime
 from flask_jwt_extended import jwt_required
-from sqlalchemy import func
 
-from models.device import Device
-from models.sensor import Sensor
-from models.alarm import Alarm
-from models.reading import Reading
+from services.dashboard_counters import dashboard_counters
 from extensions import db
 
 # Blueprint for dashboard related endpoints
@@ -20,46 +16,9 @@ dashboard_bp = Blueprint('dashboard', __name__)
 def get_stats():
     """Return aggregated statistics for the dashboard"""
     try:
-        devices_total = db.session.query(func.count(Device.id)).filter(Device.status != 'deleted').scalar()
-        devices_online = db.session.query(func.count(Device.id)).filter(Device.status == 'active').scalar()
-        devices_offline = db.session.query(func.count(Device.id)).filter(Device.status == 'offline').scalar()
-        devices_error = db.session.query(func.count(Device.id)).filter(Device.status == 'error').scalar()
-
-        sensors_total = db.session.query(func.count(Sensor.id)).filter(Sensor.status != 'deleted').scalar()
-        sensors_active = db.session.query(func.count(Sensor.id)).filter(Sensor.status == 'active').scalar()
-        sensors_inactive = db.session.query(func.count(Sensor.id)).filter(Sensor.status == 'inactive').scalar()
-        sensors_error = db.session.query(func.count(Sensor.id)).filter(Sensor.status == 'error').scalar()
-
-        alarms_total = db.session.query(func.count(Alarm.id)).scalar()
-        alarms_active = db.session.query(func.count(Alarm.id)).filter(Alarm.status == 'active').scalar()
-        alarms_resolved = db.session.query(func.count(Alarm.id)).filter(Alarm.status == 'resolved').scalar()
-        alarms_critical = db.session.query(func.count(Alarm.id)).filter(Alarm.severity == 'high').scalar()
-
-        data_points = db.session.query(func.count(Reading.id)).scalar()
-
-        stats = {
-            'devices': {
-                'total': devices_total,
-                'online': devices_online,
-                'offline': devices_offline,
-                'error': devices_error,
-            },
-            'sensors': {
-                'total': sensors_total,
-                'active': sensors_active,
-                'inactive': sensors_inactive,
-                'error': sensors_error,
-            },
-            'alarms': {
-                'total': alarms_total,
-                'active': alarms_active,
-                'resolved': alarms_resolved,
-                'critical': alarms_critical,
-            },
-            'data_points': data_points,
-            'last_updated': datetime.utcnow().isoformat(),
-        }
-
+        # Status counts come from TTL-cached GROUP BY queries; the data point
+        # total is maintained incrementally by the reading batch writer
+        stats = dashboard_counters.get_counts()
         return jsonify({'success': True, 'data': stats})
     except Exception as e:
         current_app.logger.error('Failed to gather dashboard stats: %s', e)
@@ -93,5 +52,11 @@ def get_system_health():
     except Exception as e:
         status['mqtt_status'] = f'error: {e}'
 
+    # mean API latency since startup, from the request duration histogram
+    from services.metrics import HTTP_REQUEST_SECONDS
+    count, total = HTTP_REQUEST_SECONDS.totals()
+    if count:
+        status['api_response_time'] = round(total / count * 1000, 2)
+
     status['last_updated'] = datetime.utcnow().isoformat()
     return jsonify({'success': True, 'data': status})
\ No newline at end of file
@@ -4,10 +4,14 @@
 移除所有Mock数据，只支持真实的数据库操作
 """
 from flask import Blueprint, request, jsonify
+from sqlalchemy.orm import selectinload
 from datetime import datetime
 import logging
 import asyncio
 from services.device_validation_service import device_validation_service
+from services.resolution_cache import resolution_cache
+from services.reading_service import ReadingService
+from utils.pagination import clamp_limit, keyset_page
 
 # 导入数据库模型
 from models.device import Device
@@ -29,8 +33,8 @@ logger = logging.getLogger(__name__)
 def get_devices():
     """获取所有设备（排除已删除的设备）"""
     try:
-        # 只查询状态不为 'deleted' 的设备 - 获取所有设备然后过滤
-        all_devices = Device.query.all()
+        # 只查询状态不为 'deleted' 的设备，传感器一次批量加载（to_dict 统计活跃传感器数）
+        all_devices = Device.query.options(selectinload(Device.sensors)).all()
         devices = [device for device in all_devices if device.status != 'deleted']
         device_list = [device.to_dict() for device in devices]  # 使用模型的to_dict方法
         
@@ -138,6 +142,7 @@ def create_device():
                 created_sensors.append(sensor)
         
         db.session.commit()
+        resolution_cache.invalidate_client(device.client_id)
         logger.info("Created device: %s with %d sensors", device.name, len(created_sensors))
         
         # 返回设备信息和创建的传感器列表
@@ -187,8 +192,12 @@ def update_device(device_id: int):
                 }), 400
         
         # 更新设备
+        old_client_id = device.client_id
         device.update(**data)
         db.session.commit()
+        resolution_cache.invalidate_device(device_id)
+        resolution_cache.invalidate_client(old_client_id)
+        resolution_cache.invalidate_client(device.client_id)
         logger.info("Updated device: %s", device.name)
         
         return jsonify({
@@ -218,6 +227,7 @@ def delete_device(device_id: int):
         # 软删除：标记为删除状态
         device.delete()
         db.session.commit()
+        resolution_cache.invalidate_device(device_id)
         logger.info("Deleted device: %s", device.name)
         
         return jsonify({
@@ -274,7 +284,7 @@ def get_latest_reading(device_id: int, sensor_id: int):
             }), 404
         
         # 获取最新读数
-        reading = Reading.query.filter_by(sensor_id=sensor_id).order_by(Reading.timestamp.desc()).first()
+        reading = ReadingService.get_latest_readings([sensor]).get(sensor_id)
         if not reading:
             return jsonify({
                 'success': False,
@@ -282,12 +292,11 @@ def get_latest_reading(device_id: int, sensor_id: int):
             }), 404
         
         reading_data = {
-            'id': reading.id,
-            'sensor_id': reading.sensor_id,
-            'timestamp': reading.timestamp.isoformat(),
-            'numeric_value': reading.numeric_value,
-            'text_value': reading.text_value,
-            'file_path': reading.file_path
+            'id': reading['id'],
+            'sensor_id': reading['sensor_id'],
+            'timestamp': reading['timestamp'],
+            'numeric_value': reading.get('value'),
+            'file_path': reading.get('file_path')
         }
         
         return jsonify({
@@ -303,7 +312,7 @@ def get_latest_reading(device_id: int, sensor_id: int):
 
 @device_bp.route('/<int:device_id>/sensors/<int:sensor_id>/readings', methods=['GET'])
 def get_sensor_readings(device_id: int, sensor_id: int):
-    """获取传感器读数列表"""
+    """获取传感器读数列表（页码分页，或 ?after= 游标分页，total=exact|rollup 时返回总数）"""
     try:
         # 验证传感器属于指定设备
         sensor = Sensor.query.filter_by(id=sensor_id, device_id=device_id).first()
@@ -313,29 +322,51 @@ def get_sensor_readings(device_id: int, sensor_id: int):
                 'error': 'Sensor not found'
             }), 404
         
-        # 获取查询参数
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 100, type=int)
-        
         # 查询读数
-        query = Reading.query.filter_by(sensor_id=sensor_id).order_by(Reading.timestamp.desc())
-        total = query.count()
-        readings = query.offset((page - 1) * limit).limit(limit).all()
+        model = sensor.reading_model
+        query = model.query.filter_by(sensor_id=sensor_id)
         
-        reading_list = []
-        for reading in readings:
-            reading_list.append({
+        def serialize(readings):
+            return [{
                 'id': reading.id,
                 'sensor_id': reading.sensor_id,
                 'timestamp': reading.timestamp.isoformat(),
                 'numeric_value': reading.numeric_value,
-                'text_value': reading.text_value,
                 'file_path': reading.file_path
+            } for reading in readings]
+        
+        # 游标分页：?after=<游标>&limit=，首页传空的 after，不执行 COUNT(*) 和 OFFSET
+        if 'after' in request.args:
+            limit = clamp_limit(request.args.get('limit', type=int))
+            try:
+                readings, next_cursor = keyset_page(query, model, limit, request.args.get('after'))
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            
+            total_source = request.args.get('total')
+            total = None
+            if total_source in ('exact', 'rollup'):
+                total = ReadingService.count_sensor_readings(sensor, source=total_source)
+            
+            return jsonify({
+                'success': True,
+                'data': serialize(readings),
+                'total': total,
+                'limit': limit,
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None
             })
         
+        # 页码分页（兼容旧客户端）
+        page = request.args.get('page', 1, type=int)
+        limit = request.args.get('limit', 100, type=int)
+        
+        total = query.count()
+        readings = query.order_by(model.timestamp.desc(), model.id.desc()).offset((page - 1) * limit).limit(limit).all()
+        
         return jsonify({
             'success': True,
-            'data': reading_list,
+            'data': serialize(readings),
             'total': total,
             'page': page,
             'limit': limit,
@@ -425,6 +456,7 @@ def add_sensor_to_device(device_id: int):
         )
         
         db.session.commit()
+        resolution_cache.invalidate_device(device_id)
         logger.info("Added sensor %s to device %s", sensor.name, device.name)
         
         return jsonify({
@@ -652,16 +684,13 @@ def get_device_mqtt_status(device_id: str):
                 'message': '设备不存在'
             }), 404
         
-        # 获取设备最新的数据读取时间
-        from models.sensor import Sensor
-        from models.reading import Reading
-        
-        latest_reading = db.session.query(Reading).join(Sensor).filter(
-            Sensor.device_id == device.id
-        ).order_by(Reading.timestamp.desc()).first()
+        # 获取设备最新的数据读取时间（设备各传感器最新读数中最新的一条）
+        sensors = Sensor.query.filter_by(device_id=device.id).all()
+        latest = ReadingService.get_latest_readings(sensors).values()
+        last_seen = max((datetime.fromisoformat(reading['timestamp']) for reading in latest), default=None)
         
-        if latest_reading:
-            time_diff = datetime.utcnow() - latest_reading.timestamp
+        if last_seen:
+            time_diff = datetime.utcnow() - last_seen
             is_online = time_diff.total_seconds() < 300  # 5分钟内有数据认为在线
             
             return jsonify({
@@ -669,7 +698,7 @@ def get_device_mqtt_status(device_id: str):
                 'data': {
                     'device_id': device_id,
                     'is_online': is_online,
-                    'last_seen': latest_reading.timestamp.isoformat(),
+                    'last_seen': last_seen.isoformat(),
                     'seconds_since_last_data': int(time_diff.total_seconds())
                 }
             })
@@ -4,6 +4,7 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from models.device_template import DeviceTemplate
+from services.template_decoder import template_decoders
 from extensions import db
 import logging
 
@@ -116,6 +117,7 @@ def create_device_template():
         )
         
         db.session.commit()
+        template_decoders.rebuild(template.device_type)
         logger.info("Created device template: %s", template.name)
         
         return jsonify({
@@ -164,6 +166,8 @@ def update_device_template(device_type: str):
         template.updated_at = datetime.utcnow()
         
         db.session.commit()
+        # 重新编译摄取使用的模板解码器（字段映射和校验范围）
+        template_decoders.rebuild(device_type)
         logger.info("Updated device template: %s", template.name)
         
         return jsonify({
@@ -208,6 +212,7 @@ def delete_device_template(device_type: str):
         template.updated_at = datetime.utcnow()
         
         db.session.commit()
+        template_decoders.rebuild(device_type)
         logger.info("Deactivated device template: %s", template.name)
         
         return jsonify({
@@ -223,10 +223,13 @@ def get_prediction_history():
             error_out=False
         )
         
+        # 当前页的传感器信息一次查询
+        sensor_ids = {pred.sensor_id for pred in pagination.items}
+        sensors = {sensor.id: sensor for sensor in Sensor.query.filter(Sensor.id.in_(sensor_ids))}
+        
         predictions = []
         for pred in pagination.items:
-            # 查询对应的传感器信息
-            sensor = Sensor.query.get(pred.sensor_id)
+            sensor = sensors.get(pred.sensor_id)
             if sensor:
                 # 根据传感器类型生成中文描述
                 sensor_type_desc = _get_sensor_type_description(sensor.type)
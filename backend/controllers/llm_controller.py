@@ -11,9 +11,13 @@ import json
 
 from models.sensor import Sensor
 from models.reading import Reading
+from models.numeric_reading import NumericReading
 from models.device import Device
 from models.alarm import Alarm
 from services.llm_service import LLMService
+from services.rollup_service import rollup_service
+from services.archive_service import reading_archive
+from services.reading_service import ReadingService
 from extensions import db
 
 logger = logging.getLogger(__name__)
@@ -197,10 +201,10 @@ def sensor_analysis():
             
         # 获取最近数据
         start_time = datetime.now() - timedelta(minutes=minutes)
-        readings = Reading.query.filter(
-            Reading.sensor_id == sensor_id,
-            Reading.timestamp >= start_time
-        ).order_by(Reading.timestamp.desc()).limit(100).all()
+        readings = NumericReading.query.filter(
+            NumericReading.sensor_id == sensor_id,
+            NumericReading.timestamp >= start_time
+        ).order_by(NumericReading.timestamp.desc()).limit(100).all()
         
         if not readings:
             return jsonify({
@@ -302,7 +306,7 @@ def generate_report():
                 'error': 'Sensor IDs are required'
             }), 400
             
-        sensor_ids = data['sensor_ids']
+        sensor_ids = [int(sensor_id) for sensor_id in data['sensor_ids']]
         start_date = data.get('start_date')
         end_date = data.get('end_date')
         report_type = data.get('report_type', 'daily')
@@ -318,23 +322,23 @@ def generate_report():
         else:
             end_date = datetime.now()
             
-        # 获取传感器数据
-        sensors_data = []
-        for sensor_id in sensor_ids:
-            sensor = Sensor.query.get(sensor_id)
-            if not sensor:
-                continue
-                
-            readings = Reading.query.filter(
-                Reading.sensor_id == sensor_id,
-                Reading.timestamp >= start_date,
-                Reading.timestamp <= end_date
-            ).order_by(Reading.timestamp.desc()).all()
-            
-            sensors_data.append({
-                'sensor': sensor,
-                'readings': readings
-            })
+        # 获取传感器统计（由汇总表计算，不再加载原始读数）
+        sensors = Sensor.query.filter(Sensor.id.in_(sensor_ids)).all()
+        sensors.sort(key=lambda sensor: sensor_ids.index(sensor.id))
+        summaries = rollup_service.summarize([sensor.id for sensor in sensors], start_date, end_date)
+        
+        # 偏离均值超过2倍标准差的读数计数（归档区间在 Parquet 文件上过滤，其余为一次分组计数）
+        bounds = {
+            sensor_id: (summary['avg'] - 2 * summary['stddev'], summary['avg'] + 2 * summary['stddev'])
+            for sensor_id, summary in summaries.items() if summary['stddev']
+        }
+        outliers = reading_archive.count_outside_many(bounds, start_date, end_date)
+        
+        sensors_data = [{
+            'sensor': sensor,
+            'summary': summaries[sensor.id],
+            'outliers': outliers.get(sensor.id, 0)
+        } for sensor in sensors]
             
         # 生成报告
         report = llm_service.generate_report(
@@ -383,18 +387,19 @@ def system_diagnosis():
         
         # 获取最近24小时的数据点数
         yesterday = datetime.now() - timedelta(days=1)
-        recent_readings = Reading.query.filter(
-            Reading.timestamp >= yesterday
-        ).count()
+        recent_readings = sum(
+            model.query.filter(model.timestamp >= yesterday).count()
+            for model in (NumericReading, Reading)
+        )
         
         # 获取异常传感器
         problem_sensors = []
         sensors = Sensor.query.filter_by(status='active').all()
+        latest = ReadingService.get_latest_readings(sensors)
         for sensor in sensors:
-            latest_reading = Reading.query.filter_by(sensor_id=sensor.id)\
-                .order_by(Reading.timestamp.desc()).first()
+            latest_reading = latest.get(sensor.id)
             if not latest_reading or \
-               (datetime.now() - latest_reading.timestamp).total_seconds() > 3600:
+               (datetime.now() - datetime.fromisoformat(latest_reading['timestamp'])).total_seconds() > 3600:
                 problem_sensors.append(sensor)
         
         # 生成系统诊断
@@ -477,8 +482,8 @@ def _get_sensor_context(sensor_id: int) -> str:
         device = Device.query.get(sensor.device_id)
         
         # 获取最近几个读数
-        recent_readings = Reading.query.filter_by(sensor_id=sensor_id)\
-            .order_by(Reading.timestamp.desc()).limit(5).all()
+        recent_readings = NumericReading.query.filter_by(sensor_id=sensor_id)\
+            .order_by(NumericReading.timestamp.desc()).limit(5).all()
         
         # 获取活跃告警
         active_alarms = Alarm.query.filter_by(
@@ -508,28 +513,30 @@ def _get_sensor_context(sensor_id: int) -> str:
 def _get_recent_sensor_context() -> str:
     """获取最近的传感器上下文信息"""
     try:
-        # 获取最近活跃的传感器（有数据的）
+        # 获取最近活跃的传感器（最新数值读数在30分钟内的）
         recent_time = datetime.now() - timedelta(minutes=30)
-        recent_sensors = db.session.query(Sensor).join(Reading).filter(
-            Reading.timestamp >= recent_time
-        ).distinct().limit(5).all()
-        
-        if not recent_sensors:
+        sensors = {sensor.id: sensor for sensor in Sensor.query.all() if not sensor.is_multimedia_sensor}
+        recent_readings = sorted(
+            (reading for reading in ReadingService.get_latest_readings(list(sensors.values())).values()
+             if datetime.fromisoformat(reading['timestamp']) >= recent_time),
+            key=lambda reading: reading['timestamp'], reverse=True
+        )[:5]
+        
+        if not recent_readings:
             return "暂无最近传感器数据"
         
+        device_ids = {sensors[reading['sensor_id']].device_id for reading in recent_readings}
+        devices = {device.id: device for device in Device.query.filter(Device.id.in_(device_ids))}
+        
         context_parts = []
-        for sensor in recent_sensors:
-            # 获取该传感器最新读数
-            latest_reading = Reading.query.filter_by(sensor_id=sensor.id)\
-                .order_by(Reading.timestamp.desc()).first()
+        for latest_reading in recent_readings:
+            sensor = sensors[latest_reading['sensor_id']]
+            device = devices.get(sensor.device_id)
+            device_info = f" ({device.location})" if device else ""
             
-            if latest_reading:
-                device = Device.query.get(sensor.device_id)
-                device_info = f" ({device.location})" if device else ""
-                
-                context_parts.append(
-                    f"{sensor.name}{device_info}: {latest_reading.numeric_value}{sensor.unit}"
-                )
+            context_parts.append(
+                f"{sensor.name}{device_info}: {latest_reading['value']}{sensor.unit}"
+            )
         
         return "最近传感器数据: " + ", ".join(context_parts)
         
@@ -1,9 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
+from flask_jwt_extended import jwt_required
 from datetime import datetime
 import os
 
 main_bp = Blueprint('main', __name__)
 
+# Prometheus 抓取端点不带 /api 前缀，注册在应用根路径
+metrics_bp = Blueprint('metrics', __name__)
+
 @main_bp.route('/')
 def index():
     """主页"""
@@ -23,6 +27,7 @@ def index():
             'auth': '/api/auth',
             'mcp': '/api/mcp',
             'health': '/api/health',
+            'metrics': '/metrics',
             'docs': '/api/docs'
         }
     })
@@ -119,6 +124,14 @@ def health_check():
             'error': str(e)
         }), 503
 
+@metrics_bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus 指标抓取端点"""
+    from services.metrics import metrics
+    if not metrics.enabled:
+        return jsonify({'error': 'metrics disabled'}), 404
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @main_bp.route('/api/status')
 def system_status():
     """系统状态"""
@@ -172,3 +185,10 @@ def system_status():
         status['components']['mqtt'] = f'error: {str(e)}'
     
     return jsonify(status)
+
+@main_bp.route('/status/queries')
+@jwt_required()
+def query_stats():
+    """按端点累计的SQL查询统计（查询数、数据库耗时、N+1 警告次数）"""
+    from services.query_monitor import query_monitor
+    return jsonify({'success': True, 'data': query_monitor.get_stats()})
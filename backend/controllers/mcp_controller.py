@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify
 from models.device import Device
 from models.sensor import Sensor
-from models.reading import Reading
+from models.numeric_reading import NumericReading
 from extensions import db
+from services.resolution_cache import resolution_cache
 
 mcp_bp = Blueprint('mcp', __name__, url_prefix='/api/v1/mcp')
 
@@ -40,6 +41,7 @@ def add_sensor(device_id):
     )
     db.session.add(new_sensor)
     db.session.commit()
+    resolution_cache.invalidate_device(device_id)
     return jsonify({"message": "Sensor added successfully"}), 201
 
 # 获取设备下所有传感器
@@ -59,12 +61,10 @@ def get_sensors(device_id):
 def add_reading(sensor_id):
     data = request.get_json()
     
-    # 使用Reading模型的create_numeric方法
-    new_reading = Reading.create_numeric(
+    # 数值读数写入 numeric_readings 窄表
+    new_reading = NumericReading.create_numeric(
         sensor_id=sensor_id,
-        value=data['value'],
-        unit=data.get('unit'),
-        metadata=data.get('metadata')
+        value=data['value']
     )
     db.session.add(new_reading)
     db.session.commit()
@@ -73,5 +73,6 @@ def add_reading(sensor_id):
 # 获取传感器所有读数
 @mcp_bp.route('/sensors/<int:sensor_id>/readings', methods=['GET'])
 def get_readings(sensor_id):
-    readings = Reading.query.filter_by(sensor_id=sensor_id).all()
+    sensor = Sensor.query.get_or_404(sensor_id)
+    readings = sensor.reading_model.query.filter_by(sensor_id=sensor_id).all()
     return jsonify([reading.to_dict() for reading in readings])
@@ -1,8 +1,9 @@
 # backend/controllers/mqtt_controller.py
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 
 from services.mqtt_service import mqtt_service
+from services.dead_letter_store import dead_letter_store, REASONS
 
 mqtt_bp = Blueprint('mqtt', __name__)
 
@@ -136,3 +137,98 @@ def publish_message():
             'success': False,
             'message': '发布MQTT消息失败'
         }), 500
+
+
+def _require_admin():
+    """死信管理接口仅限管理员"""
+    if get_jwt().get('role') != 'admin':
+        return jsonify({
+            'success': False,
+            'message': '需要管理员权限'
+        }), 403
+    return None
+
+
+@mqtt_bp.route('/dead-letters', methods=['GET'])
+@jwt_required()
+def get_dead_letter_stats():
+    """获取死信队列统计（按原因码计数）"""
+    denied = _require_admin()
+    if denied:
+        return denied
+    try:
+        return jsonify({
+            'success': True,
+            'data': dead_letter_store.get_stats()
+        })
+    except Exception as e:
+        current_app.logger.error("获取死信统计失败: %s", e)
+        return jsonify({
+            'success': False,
+            'message': '获取死信统计失败'
+        }), 500
+
+
+@mqtt_bp.route('/dead-letters/records', methods=['GET'])
+@jwt_required()
+def list_dead_letters():
+    """查看死信记录"""
+    denied = _require_admin()
+    if denied:
+        return denied
+    try:
+        reason = request.args.get('reason')
+        if reason and reason not in REASONS:
+            return jsonify({
+                'success': False,
+                'message': f'无效的原因码，可选: {", ".join(REASONS)}'
+            }), 400
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        
+        records = dead_letter_store.list_records(reason=reason, limit=limit)
+        return jsonify({
+            'success': True,
+            'data': records,
+            'count': len(records)
+        })
+    except Exception as e:
+        current_app.logger.error("获取死信记录失败: %s", e)
+        return jsonify({
+            'success': False,
+            'message': '获取死信记录失败'
+        }), 500
+
+
+@mqtt_bp.route('/dead-letters/replay', methods=['POST'])
+@jwt_required()
+def replay_dead_letters():
+    """通过批量写入路径回放死信（可按原因码过滤）"""
+    denied = _require_admin()
+    if denied:
+        return denied
+    try:
+        data = request.get_json(silent=True) or {}
+        reason = data.get('reason')
+        if reason and reason not in REASONS:
+            return jsonify({
+                'success': False,
+                'message': f'无效的原因码，可选: {", ".join(REASONS)}'
+            }), 400
+        
+        result = mqtt_service.replay_dead_letters(reason=reason)
+        return jsonify({
+            'success': True,
+            'message': f"回放完成: {result['replayed']} 条重新入库, {result['failed']} 条仍失败",
+            'data': result
+        })
+    except RuntimeError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 409
+    except Exception as e:
+        current_app.logger.error("死信回放失败: %s", e)
+        return jsonify({
+            'success': False,
+            'message': '死信回放失败'
+        }), 500
@@ -1,11 +1,22 @@
-from flask import Blueprint, request, jsonify
+from datetime import datetime
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.sensor import Sensor
-from models.reading import Reading
+from models.numeric_reading import NumericReading
 from models.device import Device
 from models.device_template import DeviceTemplate
 from services.sensor_service import SensorService
+from services.reading_service import ReadingService, EXPORT_FORMATS, BULK_BUCKETS
+from services.resolution_cache import resolution_cache
+from services.rollup_service import rollup_service
 from extensions import db
+from utils.pagination import clamp_limit, keyset_page
+from utils.downsample import METHODS as DOWNSAMPLE_METHODS
+
+# 图表降采样的最大目标点数
+MAX_CHART_POINTS = 5000
+# 批量序列查询一次最多的传感器数
+MAX_BULK_SENSORS = 200
 
 sensor_bp = Blueprint('sensor', __name__, url_prefix='/api/sensors')
 
@@ -38,30 +49,75 @@ def get_sensor(sensor_id):
 @sensor_bp.route('/<int:sensor_id>/readings', methods=['GET'])
 @jwt_required()
 def get_sensor_readings(sensor_id):
-    """获取传感器读数"""
+    """获取传感器读数
+
+    两种分页方式：
+    - 页码分页 ?page=&per_page=（兼容旧客户端，需要 COUNT(*) 和 OFFSET）
+    - 游标分页 ?after=<游标>&limit=，首页传空的 after；沿 (sensor_id, timestamp)
+      索引从上一页末尾继续，响应中的 next_cursor 作为下一页的 after。默认不返回
+      总数，total=exact 执行 COUNT(*)，total=rollup 从汇总表计数
+    图表模式 ?points=<目标点数>&method=lttb|minmax：返回降采样后的列式序列
+    （毫秒时间戳和数值两个数组），只支持数值传感器
+    """
     sensor = Sensor.query.get_or_404(sensor_id)
     
-    # 分页参数
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 100, type=int)
-    
     # 时间范围
     start_time = request.args.get('start_time')
     end_time = request.args.get('end_time')
+    start_dt = end_dt = None
     
-    query = Reading.query.filter_by(sensor_id=sensor_id)
+    # 数值读数在 numeric_readings 窄表，图片/视频读数在 readings 表
+    model = sensor.reading_model
+    query = model.query.filter_by(sensor_id=sensor_id)
     
     if start_time:
-        from datetime import datetime
         start_dt = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-        query = query.filter(Reading.timestamp >= start_dt)
+        query = query.filter(model.timestamp >= start_dt)
     
     if end_time:
-        from datetime import datetime
         end_dt = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
-        query = query.filter(Reading.timestamp <= end_dt)
+        query = query.filter(model.timestamp <= end_dt)
+    
+    if 'points' in request.args:
+        points = request.args.get('points', type=int)
+        method = request.args.get('method', 'lttb')
+        if sensor.is_multimedia_sensor:
+            return jsonify({'success': False, 'error': '降采样只支持数值传感器'}), 400
+        if not points or points < 3 or points > MAX_CHART_POINTS:
+            return jsonify({'success': False, 'error': f'points 需在 3 到 {MAX_CHART_POINTS} 之间'}), 400
+        if method not in DOWNSAMPLE_METHODS:
+            return jsonify({'success': False, 'error': f'不支持的降采样方法: {method}'}), 400
+        series = ReadingService.get_downsampled_series(sensor_id, points, method, start_dt, end_dt)
+        return jsonify({'success': True, 'data': series})
+    
+    if 'after' in request.args:
+        limit = clamp_limit(request.args.get('limit', type=int))
+        try:
+            readings, next_cursor = keyset_page(query, model, limit, request.args.get('after'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        total_source = request.args.get('total')
+        total = None
+        if total_source in ('exact', 'rollup'):
+            total = ReadingService.count_sensor_readings(sensor, start_dt, end_dt, source=total_source)
+        
+        return jsonify({
+            'success': True,
+            'data': [reading.to_dict() for reading in readings],
+            'pagination': {
+                'limit': limit,
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None,
+                'total': total
+            }
+        })
     
-    readings = query.order_by(Reading.timestamp.desc()).paginate(
+    # 分页参数
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 100, type=int)
+    
+    readings = query.order_by(model.timestamp.desc(), model.id.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
@@ -89,11 +145,9 @@ def create_reading(sensor_id):
         data_type = data.get('data_type', 'numeric')
         
         if data_type == 'numeric':
-            reading = Reading.create_numeric(
+            reading = NumericReading.create_numeric(
                 sensor_id=sensor_id,
-                value=data['value'],
-                unit=data.get('unit'),
-                metadata=data.get('metadata')
+                value=data['value']
             )
         else:
             # 文件型数据处理在单独的文件上传接口中
@@ -104,7 +158,7 @@ def create_reading(sensor_id):
         
         db.session.add(reading)
         db.session.commit()
-        
+
         return jsonify({
             'success': True,
             'data': reading.to_dict()
@@ -117,15 +171,32 @@ def create_reading(sensor_id):
             'error': str(e)
         }), 500
 
+@sensor_bp.route('/readings/latest', methods=['GET'])
+@jwt_required()
+def get_latest_readings():
+    """批量获取最新读数：device_id 指定设备的所有传感器，省略时为全部传感器
+
+    响应 data 为 {传感器ID: 读数}，没有读数的传感器不出现在结果中。
+    """
+    device_id = request.args.get('device_id', type=int)
+    query = Sensor.query
+    if device_id is not None:
+        Device.query.get_or_404(device_id)
+        query = query.filter_by(device_id=device_id)
+    
+    latest = ReadingService.get_latest_readings(query.all())
+    return jsonify({
+        'success': True,
+        'data': {str(sensor_id): reading for sensor_id, reading in latest.items()}
+    })
+
 @sensor_bp.route('/<int:sensor_id>/readings/latest', methods=['GET'])
 @jwt_required()
 def get_latest_reading(sensor_id):
     """获取传感器最新读数"""
     sensor = Sensor.query.get_or_404(sensor_id)
     
-    reading = Reading.query.filter_by(sensor_id=sensor_id)\
-                    .order_by(Reading.timestamp.desc())\
-                    .first()
+    reading = ReadingService.get_latest_readings([sensor]).get(sensor_id)
     
     if not reading:
         return jsonify({
@@ -135,7 +206,107 @@ def get_latest_reading(sensor_id):
     
     return jsonify({
         'success': True,
-        'data': reading.to_dict()
+        'data': reading
+    })
+
+@sensor_bp.route('/readings/export', methods=['GET'])
+@jwt_required()
+def export_readings():
+    """流式导出读数
+
+    参数：sensor_id（可重复）或 device_id、start_time、end_time、
+    format=csv|ndjson（默认csv）、gzip=1（边生成边压缩，下载 .gz 文件）。
+    响应分块传输，服务端内存占用与导出范围无关。
+    """
+    sensor_ids = request.args.getlist('sensor_id', type=int)
+    device_id = request.args.get('device_id', type=int)
+    fmt = request.args.get('format', 'csv')
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f'不支持的导出格式: {fmt}'}), 400
+    if sensor_ids:
+        sensors = Sensor.query.filter(Sensor.id.in_(sensor_ids)).all()
+        missing = set(sensor_ids) - {sensor.id for sensor in sensors}
+        if missing:
+            return jsonify({'success': False, 'error': f'传感器不存在: {sorted(missing)}'}), 404
+        sensors.sort(key=lambda sensor: sensor_ids.index(sensor.id))
+    elif device_id:
+        sensors = Sensor.query.filter_by(device_id=device_id).order_by(Sensor.id).all()
+    else:
+        return jsonify({'success': False, 'error': '需要 sensor_id 或 device_id 参数'}), 400
+    
+    try:
+        start_time = request.args.get('start_time')
+        end_time = request.args.get('end_time')
+        start_dt = datetime.fromisoformat(start_time.replace('Z', '+00:00')) if start_time else None
+        end_dt = datetime.fromisoformat(end_time.replace('Z', '+00:00')) if end_time else None
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'时间格式错误: {e}'}), 400
+    
+    filename = f"readings_{datetime.utcnow():%Y%m%d%H%M%S}.{fmt}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    body = ReadingService.stream_export(sensors, start_dt, end_dt, fmt=fmt, compress=compress)
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'Cache-Control': 'no-cache',
+            # 禁止反向代理缓冲整个响应
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@sensor_bp.route('/readings/bulk', methods=['GET'])
+@jwt_required()
+def get_bulk_readings():
+    """批量获取多个数值传感器的读数序列（列式响应）
+
+    参数：sensor_ids=1,2,3 或可重复的 sensor_id、start_time、end_time、
+    bucket=1m|1h|1d（可选，按桶返回均值及 min/max/n）。
+    响应 data 为 {传感器ID: {ts: [毫秒时间戳], v: [数值]}}，所有传感器共用一次查询。
+    """
+    sensor_ids = request.args.getlist('sensor_id', type=int)
+    try:
+        sensor_ids += [int(part) for part in request.args.get('sensor_ids', '').split(',') if part.strip()]
+    except ValueError:
+        return jsonify({'success': False, 'error': 'sensor_ids 需为逗号分隔的整数'}), 400
+    sensor_ids = list(dict.fromkeys(sensor_ids))
+    bucket = request.args.get('bucket')
+    
+    if not sensor_ids:
+        return jsonify({'success': False, 'error': '需要 sensor_ids 或 sensor_id 参数'}), 400
+    if len(sensor_ids) > MAX_BULK_SENSORS:
+        return jsonify({'success': False, 'error': f'一次最多查询 {MAX_BULK_SENSORS} 个传感器'}), 400
+    if bucket is not None and bucket not in BULK_BUCKETS:
+        return jsonify({'success': False, 'error': f'不支持的分桶粒度: {bucket}'}), 400
+    
+    sensors = Sensor.query.filter(Sensor.id.in_(sensor_ids)).all()
+    missing = set(sensor_ids) - {sensor.id for sensor in sensors}
+    if missing:
+        return jsonify({'success': False, 'error': f'传感器不存在: {sorted(missing)}'}), 404
+    media = sorted(sensor.id for sensor in sensors if sensor.is_multimedia_sensor)
+    if media:
+        return jsonify({'success': False, 'error': f'批量查询只支持数值传感器: {media}'}), 400
+    
+    try:
+        start_time = request.args.get('start_time')
+        end_time = request.args.get('end_time')
+        start_dt = datetime.fromisoformat(start_time.replace('Z', '+00:00')) if start_time else None
+        end_dt = datetime.fromisoformat(end_time.replace('Z', '+00:00')) if end_time else None
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'时间格式错误: {e}'}), 400
+    
+    series = ReadingService.get_bulk_series(sensor_ids, start_dt, end_dt, bucket)
+    return jsonify({
+        'success': True,
+        'data': {str(sensor_id): columns for sensor_id, columns in series.items()},
+        'bucket': bucket
     })
 
 @sensor_bp.route('/<int:sensor_id>/statistics', methods=['GET'])
@@ -144,20 +315,8 @@ def get_sensor_statistics(sensor_id):
     """获取传感器统计信息"""
     sensor = Sensor.query.get_or_404(sensor_id)
     
-    # 获取统计信息
-    from sqlalchemy import func
-    
-    stats = db.session.query(
-        func.count(Reading.id).label('total_readings'),
-        func.avg(Reading.numeric_value).label('avg_value'),
-        func.min(Reading.numeric_value).label('min_value'),
-        func.max(Reading.numeric_value).label('max_value'),
-        func.min(Reading.timestamp).label('first_reading'),
-        func.max(Reading.timestamp).label('last_reading')
-    ).filter(
-        Reading.sensor_id == sensor_id,
-        Reading.data_type == 'numeric'
-    ).first()
+    # 由汇总表计算全部数值读数的统计信息
+    stats = rollup_service.summarize([sensor_id])[sensor_id]
     
     return jsonify({
         'success': True,
@@ -166,12 +325,12 @@ def get_sensor_statistics(sensor_id):
             'sensor_name': sensor.name,
             'sensor_type': sensor.type,
             'unit': sensor.unit,
-            'total_readings': stats.total_readings or 0,
-            'average_value': float(stats.avg_value) if stats.avg_value else None,
-            'min_value': float(stats.min_value) if stats.min_value else None,
-            'max_value': float(stats.max_value) if stats.max_value else None,
-            'first_reading': stats.first_reading.isoformat() if stats.first_reading else None,
-            'last_reading': stats.last_reading.isoformat() if stats.last_reading else None
+            'total_readings': stats['count'],
+            'average_value': stats['avg'],
+            'min_value': stats['min'],
+            'max_value': stats['max'],
+            'first_reading': stats['first_ts'].isoformat() if stats['first_ts'] else None,
+            'last_reading': stats['last_ts'].isoformat() if stats['last_ts'] else None
         }
     })
 
@@ -254,6 +413,7 @@ def create_sensor():
         )
         
         db.session.commit()
+        resolution_cache.invalidate_device(device.id)
         
         return jsonify({
             'success': True,
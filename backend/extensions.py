@@ -16,10 +16,86 @@ def init_extensions(app):
     db.init_app(app)
     jwt.init_app(app)
     
+    # 初始化SQL查询监控（按请求统计查询数，检测 N+1）
+    from services.query_monitor import query_monitor
+    query_monitor.init_app(app)
+    
+    # 初始化 Prometheus 指标（请求耗时钩子、连接池事件和抓取时的采集器）
+    from services.metrics import metrics
+    metrics.init_app(app)
+    
+    # 初始化入库链路追踪（MQTT消息 → 入库 → 告警 → 通知）
+    from services.tracing import tracer
+    tracer.init_app(app)
+    if app.config.get('TRACING_ENABLED', False):
+        tracer.start()
+    
+    # 初始化设备/传感器解析缓存
+    from services.resolution_cache import resolution_cache
+    resolution_cache.init_app(app)
+    
+    # 初始化设备模板解码器
+    from services.template_decoder import template_decoders
+    template_decoders.init_app(app)
+    
+    # 初始化消息去重窗口
+    from services.dedup_filter import dedup_filter
+    dedup_filter.init_app(app)
+    
+    # 初始化入库死信队列
+    from services.dead_letter_store import dead_letter_store
+    dead_letter_store.init_app(app)
+    
+    # 初始化读数批量写入器
+    from services.reading_writer import reading_writer
+    reading_writer.init_app(app)
+    if app.config.get('INGEST_BATCH_ENABLED', True):
+        reading_writer.start()
+    
+    # 初始化读数汇总服务（在批量写入器的事务中增量更新汇总表）
+    from services.rollup_service import rollup_service
+    rollup_service.init_app(app, reading_writer)
+    
+    # 初始化传感器最新读数缓存（批量写入器刷新后及ORM会话提交后更新）
+    from services.latest_cache import latest_cache
+    latest_cache.init_app(app, reading_writer)
+    
+    # 初始化仪表盘计数器（数据点总数随批量写入累加）
+    from services.dashboard_counters import dashboard_counters
+    dashboard_counters.init_app(app, reading_writer)
+    
+    # 初始化读数表分区维护（创建未来月分区、按保留期删除过期分区）
+    from services.partition_manager import partition_manager
+    partition_manager.init_app(app)
+    if app.config.get('READING_PARTITIONS_ENABLED', False):
+        partition_manager.start()
+    
+    # 初始化冷数据归档（已结束日期的数值读数导出为 Parquet，保留策略删除前先归档）
+    from services.archive_service import reading_archive
+    reading_archive.init_app(app)
+    if app.config.get('ARCHIVE_ENABLED', False):
+        reading_archive.start()
+    
+    # 初始化保留与降采样策略任务
+    from services.retention_service import retention_engine
+    retention_engine.init_app(app)
+    if app.config.get('RETENTION_ENABLED', False):
+        retention_engine.start()
+    
+    # 初始化分块媒体上传服务
+    from services.media_upload_service import media_upload_service
+    media_upload_service.init_app(app)
+    
     # 初始化MQTT服务
     from services.mqtt_service import mqtt_service
     mqtt_service.init_app(app)
     
+    # 初始化入库写前日志（启动时恢复上次未应用的记录，原始消息由MQTT服务解析为读数行）
+    from services.ingest_journal import ingest_journal
+    ingest_journal.init_app(app)
+    if app.config.get('INGEST_JOURNAL_ENABLED', False):
+        ingest_journal.start(reading_writer, mqtt_service.build_journal_rows)
+    
     # 启动MQTT连接（在应用上下文中）
     import threading
     import time
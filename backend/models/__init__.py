@@ -2,6 +2,9 @@ from .user import User
 from .device import Device
 from .sensor import Sensor
 from .reading import Reading
+from .numeric_reading import NumericReading
+from .reading_rollup import ReadingRollup1m, ReadingRollup1h, ReadingRollup1d
+from .reading_archive import ReadingArchive
 from .prediction import Prediction
 from .alarm import Alarm
 from .alarm_rule import AlarmRule
@@ -10,6 +13,7 @@ from .token_blacklist import TokenBlacklist
 from .ai_suggestion import AISuggestion
 
 __all__ = [
-    'User', 'Device', 'Sensor', 'Reading', 'Prediction', 
-    'Alarm', 'AlarmRule', 'AlarmState', 'TokenBlacklist', 'AISuggestion'
+    'User', 'Device', 'Sensor', 'Reading', 'NumericReading', 'Prediction', 
+    'Alarm', 'AlarmRule', 'AlarmState', 'TokenBlacklist', 'AISuggestion',
+    'ReadingRollup1m', 'ReadingRollup1h', 'ReadingRollup1d', 'ReadingArchive'
 ]
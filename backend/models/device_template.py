@@ -96,8 +96,7 @@ class DeviceTemplate(db.Model):
     
     def validate_sensor_type(self, sensor_type: str) -> bool:
         """验证传感器类型是否属于该设备模板"""
-        sensor_types = [config['type'] for config in self.get_sensor_configs()]
-        return sensor_type in sensor_types
+        return any(config['type'] == sensor_type for config in self.get_sensor_configs())
     
     def get_required_sensors(self) -> List[Dict[str, Any]]:
         """获取必需的传感器配置"""
@@ -0,0 +1,90 @@
+from datetime import datetime
+from sqlalchemy.orm import synonym
+from extensions import db
+
+# 质量码：窄表以 smallint 存储，对外仍使用字符串（与 template_decoder 的质量码一致）
+QUALITY_CODES = {'good': 0, 'out_of_range': 1}
+QUALITY_LABELS = {code: label for label, code in QUALITY_CODES.items()}
+
+
+def quality_code(label) -> int:
+    return QUALITY_CODES.get(label or 'good', QUALITY_CODES['good'])
+
+
+class NumericReading(db.Model):
+    """数值读数窄表 - 每行只有 (id, sensor_id, timestamp, value, quality)
+
+    数值读数占读数总量的绝大部分，从多类型的 readings 宽表中分离出来：
+    不再携带文件/对象存储的空列、单位字符串和重复的JSON元信息，单位取自
+    传感器行，行宽缩小到原来的几分之一。图片/视频读数仍存放在 readings 表。
+
+    提供与 Reading 相同的读取接口（numeric_value、data_type、unit、quality、
+    to_dict），按传感器查询读数的调用方可以直接替换模型。
+    """
+    __tablename__ = 'numeric_readings'
+    __table_args__ = (
+        db.Index('idx_numeric_sensor_timestamp', 'sensor_id', 'timestamp'),
+        {'extend_existing': True},
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id'), nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    value = db.Column(db.Float, nullable=False)
+    quality_code = db.Column('quality', db.SmallInteger, nullable=False, default=0)
+
+    # 兼容 Reading 的字段名，可用于查询条件
+    numeric_value = synonym('value')
+
+    data_type = 'numeric'
+    meta_info = None
+    created_at = None
+    file_path = file_size = file_format = None
+    storage_backend = bucket_name = object_key = object_url = object_etag = None
+
+    @property
+    def quality(self):
+        return QUALITY_LABELS.get(self.quality_code, 'good')
+
+    @quality.setter
+    def quality(self, label):
+        self.quality_code = quality_code(label)
+
+    @property
+    def unit(self):
+        return self.sensor.unit if self.sensor else None
+
+    def to_dict(self):
+        """与 Reading.to_dict 的数值型读数结构一致"""
+        return {
+            'id': self.id,
+            'sensor_id': self.sensor_id,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'data_type': 'numeric',
+            'created_at': None,
+            'value': self.value,
+            'unit': self.unit,
+            'quality': self.quality
+        }
+
+    @classmethod
+    def create_numeric(cls, sensor_id, value, timestamp=None, quality='good'):
+        """创建数值型读数（窄表不存单位和元信息，单位以传感器行为准）"""
+        return cls(
+            sensor_id=sensor_id,
+            value=value,
+            quality_code=quality_code(quality),
+            timestamp=timestamp or datetime.utcnow()
+        )
+
+    def is_numeric(self):
+        return True
+
+    def is_file(self):
+        return False
+
+    def get_metadata(self):
+        return {}
+
+    def __repr__(self):
+        return f'<NumericReading {self.id}: {self.value} for sensor {self.sensor_id}>'
@@ -16,6 +16,7 @@ class Reading(db.Model):
     # 数值型数据（温度、湿度、光照）
     numeric_value = db.Column(db.Float, nullable=True)
     unit = db.Column(db.String(10), nullable=True)  # 单位，如 °C, %, lux
+    quality = db.Column(db.String(16), nullable=False, default='good')  # 质量码: good / out_of_range
     
     # 文件型数据（图片、视频）
     file_path = db.Column(db.String(512), nullable=True)  # 本地文件存储路径（备份）
@@ -47,7 +48,8 @@ class Reading(db.Model):
         if self.data_type == 'numeric':
             result.update({
                 'value': self.numeric_value,
-                'unit': self.unit
+                'unit': self.unit,
+                'quality': self.quality
             })
         elif self.data_type in ['image', 'video']:
             result.update({
@@ -0,0 +1,36 @@
+from datetime import datetime
+from extensions import db
+
+
+class ReadingArchive(db.Model):
+    """读数归档索引 - 每个 (传感器, 日期) 的数值读数导出为一个 Parquet 文件
+
+    归档按传感器从旧到新连续进行，每个传感器最大的 day 即归档水位：
+    水位（含）之前的读数从 Parquet 文件读取，之后的读数查询数据库。
+    """
+    __tablename__ = 'reading_archives'
+
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    bucket_name = db.Column(db.String(100), nullable=False)
+    object_key = db.Column(db.String(500), nullable=False)
+    storage_backend = db.Column(db.String(20), nullable=False, default='local')  # 'local', 'dual'
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    min_ts = db.Column(db.DateTime, nullable=True)
+    max_ts = db.Column(db.DateTime, nullable=True)
+    file_size = db.Column(db.BigInteger, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'sensor_id': self.sensor_id,
+            'day': self.day.isoformat() if self.day else None,
+            'bucket_name': self.bucket_name,
+            'object_key': self.object_key,
+            'storage_backend': self.storage_backend,
+            'row_count': self.row_count,
+            'min_ts': self.min_ts.isoformat() if self.min_ts else None,
+            'max_ts': self.max_ts.isoformat() if self.max_ts else None,
+            'file_size': self.file_size,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
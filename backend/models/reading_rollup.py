@@ -0,0 +1,64 @@
+from datetime import timedelta
+from sqlalchemy.orm import declared_attr
+from extensions import db
+
+
+class ReadingRollupMixin:
+    """读数汇总表公共字段 - 每个 (传感器, 时间桶) 一行
+
+    保存可合并的聚合量：count/sum/min/max/sum_sq 可以直接相加或取极值，
+    first/last 按时间戳比较合并，因此粗粒度统计可以由任意多个桶合并得到，
+    平均值和标准差在查询时由 sum、sum_sq 计算。
+    """
+
+    @declared_attr
+    def sensor_id(cls):
+        return db.Column(db.Integer, db.ForeignKey('sensors.id', ondelete='CASCADE'), primary_key=True)
+
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    sum = db.Column(db.Double, nullable=False, default=0.0)
+    min = db.Column(db.Double, nullable=True)
+    max = db.Column(db.Double, nullable=True)
+    sum_sq = db.Column(db.Double, nullable=False, default=0.0)
+    first_ts = db.Column(db.DateTime, nullable=True)
+    first_value = db.Column(db.Double, nullable=True)
+    last_ts = db.Column(db.DateTime, nullable=True)
+    last_value = db.Column(db.Double, nullable=True)
+
+    def to_dict(self):
+        return {
+            'sensor_id': self.sensor_id,
+            'bucket_start': self.bucket_start.isoformat() if self.bucket_start else None,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'sum_sq': self.sum_sq,
+            'first_ts': self.first_ts.isoformat() if self.first_ts else None,
+            'first_value': self.first_value,
+            'last_ts': self.last_ts.isoformat() if self.last_ts else None,
+            'last_value': self.last_value
+        }
+
+
+class ReadingRollup1m(ReadingRollupMixin, db.Model):
+    __tablename__ = 'readings_rollup_1m'
+
+
+class ReadingRollup1h(ReadingRollupMixin, db.Model):
+    __tablename__ = 'readings_rollup_1h'
+
+
+class ReadingRollup1d(ReadingRollupMixin, db.Model):
+    __tablename__ = 'readings_rollup_1d'
+
+
+# 汇总粒度，从粗到细
+ROLLUP_RESOLUTIONS = (
+    ('1d', timedelta(days=1), ReadingRollup1d),
+    ('1h', timedelta(hours=1), ReadingRollup1h),
+    ('1m', timedelta(minutes=1), ReadingRollup1m),
+)
+
+ROLLUP_MODELS = {name: model for name, _, model in ROLLUP_RESOLUTIONS}
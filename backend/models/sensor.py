@@ -1,3 +1,4 @@
+from sqlalchemy import event
 from extensions import db
 from datetime import datetime
 
@@ -16,6 +17,9 @@ class Sensor(db.Model):
     
     # 关系
     readings = db.relationship('Reading', backref='sensor', lazy=True, cascade='all, delete-orphan')
+    # 读数不经ORM逐行加载删除，由 before_delete 事件一条 DELETE 删除
+    numeric_readings = db.relationship('NumericReading', backref='sensor', lazy='dynamic',
+                                       cascade='all, delete-orphan', passive_deletes=True)
     
     def to_dict(self):
         return {
@@ -52,11 +56,19 @@ class Sensor(db.Model):
     def is_active(self):
         return self.status == 'active'
     
+    @property
+    def reading_model(self):
+        """该传感器读数所在的模型：多媒体传感器为 Reading，其余为 NumericReading"""
+        if self.is_multimedia_sensor:
+            from models.reading import Reading
+            return Reading
+        from models.numeric_reading import NumericReading
+        return NumericReading
+    
     @property
     def latest_reading(self):
-        if self.readings:
-            return sorted(self.readings, key=lambda r: r.timestamp, reverse=True)[0]
-        return None
+        model = self.reading_model
+        return model.query.filter_by(sensor_id=self.id).order_by(model.timestamp.desc()).first()
     
     @property
     def is_multimedia_sensor(self):
@@ -81,12 +93,17 @@ class Sensor(db.Model):
     def get_readings_by_type(self, data_type=None, limit=None):
         """根据数据类型获取读数"""
         from models.reading import Reading
-        query = Reading.query.filter_by(sensor_id=self.id)
-        
-        if data_type:
-            query = query.filter_by(data_type=data_type)
+        from models.numeric_reading import NumericReading
+        if data_type == 'numeric' or (data_type is None and not self.is_multimedia_sensor):
+            model = NumericReading
+            query = NumericReading.query.filter_by(sensor_id=self.id)
+        else:
+            model = Reading
+            query = Reading.query.filter_by(sensor_id=self.id)
+            if data_type:
+                query = query.filter_by(data_type=data_type)
             
-        query = query.order_by(Reading.timestamp.desc())
+        query = query.order_by(model.timestamp.desc())
         
         if limit:
             query = query.limit(limit)
@@ -97,3 +114,11 @@ class Sensor(db.Model):
         """获取指定类型的最新读数"""
         readings = self.get_readings_by_type(data_type=data_type, limit=1)
         return readings[0] if readings else None
+
+
+@event.listens_for(Sensor, 'before_delete')
+def _delete_numeric_readings(mapper, connection, target):
+    """numeric_readings 分区表没有外键，删除传感器时按 sensor_id 批量删除其读数"""
+    from models.numeric_reading import NumericReading
+    table = NumericReading.__table__
+    connection.execute(table.delete().where(table.c.sensor_id == target.id))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+保留与降采样策略命令
+
+默认为演练模式：按生效策略对传感器分组，报告每组将删除的原始读数和汇总行数
+以及估算回收的空间；加 --execute 时执行（先补齐汇总，再分批删除）。策略来自
+RETENTION_POLICIES 和设备模板 sensor_configs 中的 retention。
+
+示例：
+  python scripts/apply_retention.py
+  python scripts/apply_retention.py --json
+  python scripts/apply_retention.py --execute --batch-size 2000
+"""
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+# 添加backend根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from flask import Flask
+
+from config import Config
+from extensions import db
+
+
+def create_cli_app(database_url=None) -> Flask:
+    """只初始化数据库的最小应用（不启动MQTT和后台线程）"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(app)
+    return app
+
+
+def format_days(days):
+    return '永久' if days is None else f"{days}天"
+
+
+def format_bytes(size):
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+def print_report(report, executed):
+    total = 0
+    for entry in report:
+        policy = entry['policy']
+        print(f"策略 [{', '.join(entry['sources'])}] - {entry['sensors']} 个传感器")
+        print(f"  原始 {format_days(policy['raw_days'])} / 1m {format_days(policy['rollup_1m_days'])} / "
+              f"1h {format_days(policy['rollup_1h_days'])} / 1d {format_days(policy['rollup_1d_days'])}")
+        if entry['raw_cutoff']:
+            line = f"  原始读数 (< {entry['raw_cutoff'].date()}): {entry['raw']['rows']} 行"
+            if not executed:
+                line += f", 约 {format_bytes(entry['raw']['bytes'])}"
+            print(line)
+        for name, result in entry['rollups'].items():
+            line = f"  {name} 汇总 (< {entry['rollup_cutoffs'][name].date()}): {result['rows']} 行"
+            if not executed:
+                line += f", 约 {format_bytes(result['bytes'])}"
+            print(line)
+        if executed and entry['days_backfilled']:
+            print(f"  删除前回填汇总: {entry['days_backfilled']} 天")
+        total += entry['bytes']
+    if not executed:
+        print(f"合计可回收约 {format_bytes(total)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AgriNex 保留与降采样策略")
+    parser.add_argument('--execute', action='store_true', help='执行删除（默认只演练）')
+    parser.add_argument('--batch-size', type=int, help='每批删除的行数（默认取配置）')
+    parser.add_argument('--json', action='store_true', help='以JSON输出报告')
+    parser.add_argument('--database-url', help='覆盖 DATABASE_URL')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    app = create_cli_app(args.database_url)
+    with app.app_context():
+        from services.retention_service import retention_engine
+        retention_engine.init_app(app)
+        if args.batch_size:
+            retention_engine.batch_size = args.batch_size
+
+        report = retention_engine.run() if args.execute else retention_engine.plan()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+    else:
+        print_report(report, args.execute)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
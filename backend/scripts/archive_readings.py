@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+读数冷数据归档命令
+
+把已结束日期的数值读数按 传感器/天 导出为 Parquet 文件（本地存储目录，MinIO
+可用时同时上传到归档桶），并记录到 reading_archives 表。每个传感器从最后归档
+日期的下一天继续，重复执行不会重复导出。需要安装 pyarrow。
+
+示例：
+  python scripts/archive_readings.py status
+  python scripts/archive_readings.py run                      # 归档到 ARCHIVE_DELAY_DAYS 天前
+  python scripts/archive_readings.py run --before 2026-01-01 --sensor 3 --sensor 4
+"""
+
+import argparse
+import logging
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# 添加backend根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from flask import Flask
+from sqlalchemy import func
+
+from config import Config
+from extensions import db
+
+
+def create_cli_app(database_url=None) -> Flask:
+    """只初始化数据库的最小应用（不启动MQTT和后台线程）"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(app)
+    return app
+
+
+def print_status():
+    from models.reading_archive import ReadingArchive
+    rows = db.session.query(
+        ReadingArchive.sensor_id,
+        func.min(ReadingArchive.day),
+        func.max(ReadingArchive.day),
+        func.count(),
+        func.sum(ReadingArchive.row_count),
+        func.sum(ReadingArchive.file_size),
+    ).group_by(ReadingArchive.sensor_id).order_by(ReadingArchive.sensor_id).all()
+    if not rows:
+        print("尚无归档文件")
+        return
+    print(f"{'传感器':<8} {'起始日期':<12} {'归档至':<12} {'文件数':>8} {'读数':>12} {'大小(MB)':>10}")
+    for sensor_id, first_day, last_day, files, readings, size in rows:
+        print(f"{sensor_id:<8} {first_day.isoformat():<12} {last_day.isoformat():<12} "
+              f"{files:>8} {int(readings or 0):>12} {int(size or 0) / 1024 / 1024:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AgriNex 读数冷数据归档")
+    parser.add_argument('--database-url', help='覆盖 DATABASE_URL')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('status', help='列出每个传感器的归档范围')
+
+    run = subparsers.add_parser('run', help='归档已结束的日期')
+    run.add_argument('--before', help='只归档该日期之前的数据 (YYYY-MM-DD，默认当前时间减 ARCHIVE_DELAY_DAYS 天)')
+    run.add_argument('--sensor', type=int, action='append', help='只归档指定传感器（可重复）')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    app = create_cli_app(args.database_url)
+    with app.app_context():
+        from services.archive_service import reading_archive, PYARROW_AVAILABLE
+        reading_archive.init_app(app)
+
+        if args.command == 'status':
+            print_status()
+
+        elif args.command == 'run':
+            if not PYARROW_AVAILABLE:
+                print("未安装 pyarrow，无法归档")
+                return 1
+            before = datetime.fromisoformat(args.before) if args.before else None
+            result = reading_archive.archive(before=before, sensor_ids=args.sensor)
+            print(f"归档 {result['days']} 天, 写入 {result['files']} 个文件, {result['rows']} 条读数")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+读数汇总表回填任务
+
+按天从 readings 原始读数重新计算 1m/1h/1d 汇总（逐天删除旧汇总、写入并提交），
+用于首次启用汇总表、修复增量更新失败的时间段，以及补齐关闭汇总期间入库的
+读数。回填与批量写入器并发执行是安全的：同一天的汇总在一个事务内重建。
+
+示例：
+  python scripts/backfill_rollups.py                      # 全部历史数据
+  python scripts/backfill_rollups.py --days 2             # 最近两天（适合定时任务）
+  python scripts/backfill_rollups.py --start 2025-06-01 --end 2025-06-30 --sensor 12 --sensor 13
+"""
+
+import argparse
+import logging
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加backend根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from flask import Flask
+
+from config import Config
+from extensions import db
+
+
+def create_backfill_app(database_url=None) -> Flask:
+    """只初始化数据库的最小应用（不启动MQTT和批量写入器）"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(app)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AgriNex 读数汇总表回填")
+    parser.add_argument('--start', type=datetime.fromisoformat, help='起始时间（UTC，ISO格式）')
+    parser.add_argument('--end', type=datetime.fromisoformat, help='结束时间（UTC，ISO格式）')
+    parser.add_argument('--days', type=int, help='只回填最近N天（忽略 --start）')
+    parser.add_argument('--sensor', type=int, action='append', dest='sensor_ids', help='只回填指定传感器，可重复')
+    parser.add_argument('--database-url', help='覆盖 DATABASE_URL')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    start = args.start
+    if args.days:
+        start = datetime.utcnow() - timedelta(days=args.days)
+
+    app = create_backfill_app(args.database_url)
+    with app.app_context():
+        from services.rollup_service import rollup_service
+        result = rollup_service.backfill(start=start, end=args.end, sensor_ids=args.sensor_ids)
+
+    print(f"回填完成: {result['days']} 天, {result['readings']} 条读数, {result['buckets']} 个汇总桶")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+端到端入库基准测试（MQTT回调 → 数据库提交）
+
+不连接真实Broker：直接以 paho 消息对象调用 MQTTService._on_message，负载格式与
+sensor-client 的 DynamicDeviceManager._generate_sensor_data 一致，走完整的
+分发队列 → 解码 → 去重 → 批量写入器 → 刷新后告警检查路径。
+
+对每个设备规模输出：
+  - 持续吞吐（消息/秒，从第一条发送到最后一条提交）
+  - 接收到提交的延迟 p50 / p99（毫秒）
+  - 告警检查开销（每条读数耗时及占总时长比例）
+
+示例：
+  python scripts/benchmark_ingestion.py --devices 10 1000 10000 --messages 20000
+  python scripts/benchmark_ingestion.py --database-url mysql+pymysql://u:p@localhost/agrinex_bench
+  python scripts/benchmark_ingestion.py --no-batch          # 对比逐条提交路径
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加backend根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from flask import Flask
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.compiler import compiles
+
+from config import Config
+from extensions import db
+
+# 与 DynamicDeviceManager 的气象站设备一致的传感器及取值范围
+SENSOR_PROFILES = {
+    'temperature': ('°C', 15.0, 35.0),
+    'humidity': ('%', 30.0, 80.0),
+    'light_intensity': ('lux', 0.0, 100000.0),
+}
+
+CLIENT_PREFIX = 'bench_'
+
+
+@compiles(BigInteger, 'sqlite')
+def _sqlite_bigint(type_, compiler, **kw):
+    """SQLite 只有 INTEGER PRIMARY KEY 才自增，基准库中 BIGINT 主键按 INTEGER 建表"""
+    return 'INTEGER'
+
+
+def create_bench_app(database_url: str, args) -> Flask:
+    """创建只包含入库链路的应用，不启动MQTT连接线程和后台告警监控"""
+    app = Flask('agrinex-benchmark')
+    app.config.from_object(Config)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=database_url,
+        INGEST_BATCH_ENABLED=not args.no_batch,
+        INGEST_BATCH_MAX_ROWS=args.batch_rows,
+        INGEST_BATCH_MAX_LINGER_MS=args.linger_ms,
+        MQTT_WORKER_COUNT=args.workers,
+        DEAD_LETTER_ENABLED=False,
+    )
+    if database_url.startswith('sqlite'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30, 'check_same_thread': False}}
+
+    db.init_app(app)
+
+    import models  # noqa: F401  注册所有模型
+    import models.device_template  # noqa: F401
+    from services.resolution_cache import resolution_cache
+    from services.dedup_filter import dedup_filter
+    from services.dead_letter_store import dead_letter_store
+    from services.reading_writer import reading_writer
+    from services.alarm_monitor import alarm_monitor
+
+    resolution_cache.init_app(app)
+    dedup_filter.init_app(app)
+    dead_letter_store.init_app(app)
+    reading_writer.init_app(app)
+    alarm_monitor.app = app
+
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed_devices(app, device_count: int, rules_per_sensor: int):
+    """批量创建基准设备、传感器和（不会触发的）告警规则，返回 {(client_id, sensor_type): sensor_id}"""
+    from models.device import Device
+    from models.sensor import Sensor
+    from models.alarm_rule import AlarmRule
+
+    sensor_ids = {}
+    with app.app_context():
+        devices = [
+            Device(name=f"{CLIENT_PREFIX}{i}", client_id=f"{CLIENT_PREFIX}{i}", type='weather_station')
+            for i in range(device_count)
+        ]
+        db.session.add_all(devices)
+        db.session.flush()
+
+        sensors = []
+        for device in devices:
+            for sensor_type, (unit, _, _) in SENSOR_PROFILES.items():
+                sensor = Sensor(device_id=device.id, type=sensor_type, unit=unit)
+                sensor.client_id = device.client_id
+                sensors.append(sensor)
+        db.session.add_all(sensors)
+        db.session.flush()
+
+        rules = []
+        for sensor in sensors:
+            sensor_ids[(sensor.client_id, sensor.type)] = sensor.id
+            for n in range(rules_per_sensor):
+                rules.append(AlarmRule(
+                    name=f"bench_rule_{sensor.id}_{n}", sensor_id=sensor.id,
+                    rule_type='threshold', condition='>', threshold_value=1e12,
+                    created_by='benchmark'
+                ))
+        db.session.add_all(rules)
+        db.session.commit()
+    return sensor_ids
+
+
+def cleanup_devices(app):
+    """删除基准数据，便于在共享数据库上重复运行"""
+    from models.device import Device
+    from models.sensor import Sensor
+    from models.reading import Reading
+    from models.numeric_reading import NumericReading
+    from models.alarm_rule import AlarmRule
+
+    with app.app_context():
+        device_ids = db.session.query(Device.id).filter(Device.client_id.like(f"{CLIENT_PREFIX}%"))
+        sensor_ids = db.session.query(Sensor.id).filter(Sensor.device_id.in_(device_ids))
+        NumericReading.query.filter(NumericReading.sensor_id.in_(sensor_ids)).delete(synchronize_session=False)
+        Reading.query.filter(Reading.sensor_id.in_(sensor_ids)).delete(synchronize_session=False)
+        AlarmRule.query.filter(AlarmRule.sensor_id.in_(sensor_ids)).delete(synchronize_session=False)
+        Sensor.query.filter(Sensor.id.in_(sensor_ids)).delete(synchronize_session=False)
+        Device.query.filter(Device.id.in_(device_ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def generate_message(client_id: str, sensor_type: str, timestamp: datetime, seq: int) -> SimpleNamespace:
+    """生成与 DynamicDeviceManager._generate_sensor_data 相同格式的 paho 消息"""
+    unit, low, high = SENSOR_PROFILES[sensor_type]
+    payload = {
+        'device_id': client_id,
+        'sensor_type': sensor_type,
+        'value': round(random.uniform(low, high), 2),
+        'unit': unit,
+        'timestamp': timestamp.isoformat(),
+        'location': 'benchmark',
+        'device_type': 'weather_station',
+        'msg_id': f"bench-{seq}",
+    }
+    return SimpleNamespace(
+        topic=f"sensors/{client_id}/numeric",
+        payload=json.dumps(payload).encode('utf-8'),
+        properties=None
+    )
+
+
+def percentile(values, pct: float) -> float:
+    """最近秩百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class LatencyRecorder:
+    """按 (sensor_id, timestamp) 关联发送时间和提交时间"""
+
+    def __init__(self):
+        self.sent = {}
+        self.latencies = []
+        self.last_commit = None
+        self.settled = 0
+        self.last_settled = None
+        self._lock = threading.Lock()
+
+    def mark_sent(self, key):
+        self.sent[key] = time.perf_counter()
+
+    def mark_committed(self, keys):
+        now = time.perf_counter()
+        with self._lock:
+            for key in keys:
+                sent_at = self.sent.pop(key, None)
+                if sent_at is not None:
+                    self.latencies.append(now - sent_at)
+            self.last_commit = now
+
+    def mark_settled(self, count: int):
+        """刷新后的告警检查完成"""
+        with self._lock:
+            self.settled += count
+            self.last_settled = time.perf_counter()
+
+    @property
+    def committed(self) -> int:
+        return len(self.latencies)
+
+
+def run_scenario(app, service, device_count: int, message_count: int, args):
+    """运行单个设备规模的基准测试"""
+    from services.reading_writer import reading_writer
+    from services.resolution_cache import resolution_cache
+    from services.dedup_filter import dedup_filter
+
+    cleanup_devices(app)
+    resolution_cache.clear()
+    dedup_filter.clear()
+    reading_writer.stats.update(rows_written=0, rows_failed=0, rows_skipped=0, flushes=0)
+
+    sensor_ids = seed_devices(app, device_count, args.alarm_rules)
+    sensor_types = list(SENSOR_PROFILES)
+    recorder = LatencyRecorder()
+    alarm_time = [0.0, 0]
+
+    # 批量路径在刷新提交后回调；逐条路径在 ingest_mqtt_message 返回（已提交）后记录
+    service._bench_recorder = recorder
+    ingest_original = service.ingestion_service.ingest_mqtt_message
+    check_original = service._check_alarms
+
+    def ingest_timed(topic, payload):
+        reading = ingest_original(topic, payload)
+        if reading is not None:
+            recorder.mark_committed([(reading.sensor_id, reading.timestamp)])
+        return reading
+
+    def check_timed(*a, **kw):
+        started = time.perf_counter()
+        try:
+            return check_original(*a, **kw)
+        finally:
+            alarm_time[0] += time.perf_counter() - started
+            alarm_time[1] += 1
+
+    service.ingestion_service.ingest_mqtt_message = ingest_timed
+    service._check_alarms = check_timed
+    if args.skip_alarms:
+        service._check_alarms = lambda *a, **kw: None
+
+    dropped_before = service.dispatcher.get_stats().get('dropped', 0)
+    base_ts = datetime.utcnow().replace(microsecond=0)
+    interval = 1.0 / args.rate if args.rate else 0.0
+    service.dispatcher.start()
+    started = time.perf_counter()
+    try:
+        for seq in range(message_count):
+            client_id = f"{CLIENT_PREFIX}{seq % device_count}"
+            sensor_type = sensor_types[(seq // device_count) % len(sensor_types)]
+            timestamp = base_ts + timedelta(microseconds=seq)
+            msg = generate_message(client_id, sensor_type, timestamp, seq)
+            recorder.mark_sent((sensor_ids[(client_id, sensor_type)], timestamp))
+            service._on_message(None, None, msg)
+            if interval:
+                delay = started + (seq + 1) * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+        deadline = time.perf_counter() + args.drain_timeout
+        while recorder.committed < message_count and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        # 告警检查在提交之后执行，等待其完成后再统计开销
+        while not args.no_batch and recorder.settled < recorder.committed and time.perf_counter() < deadline:
+            time.sleep(0.01)
+    finally:
+        service.dispatcher.stop()
+        reading_writer.flush()
+        service.ingestion_service.ingest_mqtt_message = ingest_original
+        service._check_alarms = check_original
+
+    finished = recorder.last_commit or time.perf_counter()
+    elapsed = max(finished - started, 1e-9)
+    # 告警占比以包含告警检查在内的总时长为分母
+    total_elapsed = max((recorder.last_settled or finished) - started, elapsed)
+    latencies_ms = [value * 1000 for value in recorder.latencies]
+    alarm_seconds, alarm_checks = alarm_time
+    return {
+        'devices': device_count,
+        'messages': message_count,
+        'committed': recorder.committed,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_msg_s': round(recorder.committed / elapsed, 1),
+        'latency_p50_ms': round(percentile(latencies_ms, 50), 2),
+        'latency_p99_ms': round(percentile(latencies_ms, 99), 2),
+        'latency_max_ms': round(max(latencies_ms), 2) if latencies_ms else 0.0,
+        'alarm_checks': alarm_checks,
+        'alarm_us_per_reading': round(alarm_seconds / alarm_checks * 1e6, 1) if alarm_checks else 0.0,
+        'alarm_share_pct': round(alarm_seconds / total_elapsed * 100, 1),
+        'writer_flushes': reading_writer.stats['flushes'],
+        'dispatcher_dropped': service.dispatcher.get_stats().get('dropped', 0) - dropped_before,
+    }
+
+
+def print_report(results, args):
+    """打印结果表"""
+    mode = 'per-message commit' if args.no_batch else f"batched ({args.batch_rows} rows / {args.linger_ms}ms)"
+    print("=" * 100)
+    print(f"AgriNex ingestion benchmark - {mode}, {args.workers} workers, "
+          f"{args.alarm_rules} alarm rule(s)/sensor{' (alarms skipped)' if args.skip_alarms else ''}")
+    print("=" * 100)
+    header = f"{'devices':>8} {'messages':>9} {'committed':>9} {'msg/s':>10} {'p50 ms':>9} " \
+             f"{'p99 ms':>9} {'alarm us':>9} {'alarm %':>8} {'flushes':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['devices']:>8} {r['messages']:>9} {r['committed']:>9} {r['throughput_msg_s']:>10.1f} "
+              f"{r['latency_p50_ms']:>9.2f} {r['latency_p99_ms']:>9.2f} {r['alarm_us_per_reading']:>9.1f} "
+              f"{r['alarm_share_pct']:>8.1f} {r['writer_flushes']:>8}")
+    print("=" * 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AgriNex 端到端入库基准测试")
+    parser.add_argument('--devices', type=int, nargs='+', default=[10, 1000, 10000],
+                        help='设备规模（每个设备3个传感器）')
+    parser.add_argument('--messages', type=int, default=10000, help='每个规模发送的消息数')
+    parser.add_argument('--rate', type=float, default=0.0, help='发送速率（消息/秒），0 表示不限速')
+    parser.add_argument('--database-url', help='数据库URL，默认使用临时SQLite文件')
+    parser.add_argument('--workers', type=int, default=4, help='分发工作线程数')
+    parser.add_argument('--batch-rows', type=int, default=500, help='批量写入最大行数')
+    parser.add_argument('--linger-ms', type=int, default=200, help='批量写入最长等待时间')
+    parser.add_argument('--no-batch', action='store_true', help='关闭批量写入，逐条提交')
+    parser.add_argument('--alarm-rules', type=int, default=1, help='每个传感器的告警规则数')
+    parser.add_argument('--skip-alarms', action='store_true', help='跳过告警检查（对比开销）')
+    parser.add_argument('--drain-timeout', type=float, default=120.0, help='等待全部提交的最长秒数')
+    parser.add_argument('--json', dest='json_path', help='将结果写入JSON文件')
+    parser.add_argument('--min-throughput', type=float, default=0.0,
+                        help='任一规模吞吐低于该值时以退出码1结束（用于回归检查）')
+    parser.add_argument('--log-level', default='WARNING', help='日志级别')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    temp_db = None
+    database_url = args.database_url
+    if not database_url:
+        fd, temp_db = tempfile.mkstemp(prefix='agrinex-bench-', suffix='.db')
+        os.close(fd)
+        database_url = f"sqlite:///{temp_db}"
+
+    app = create_bench_app(database_url, args)
+
+    from services.mqtt_service import MQTTService
+    from services.reading_writer import reading_writer
+
+    # 提交时间监听器需先于 MQTTService 的告警监听器注册，避免把告警耗时计入提交延迟
+    service = MQTTService()
+    reading_writer.add_flush_listener(
+        lambda rows: service._bench_recorder.mark_committed(
+            [(row['sensor_id'], row['timestamp']) for row in rows]
+        )
+    )
+    service.init_app(app)
+    reading_writer.add_flush_listener(lambda rows: service._bench_recorder.mark_settled(len(rows)))
+    if not args.no_batch:
+        reading_writer.start()
+
+    results = []
+    try:
+        for device_count in args.devices:
+            results.append(run_scenario(app, service, device_count, args.messages, args))
+    finally:
+        reading_writer.stop()
+        cleanup_devices(app)
+        if temp_db:
+            os.remove(temp_db)
+
+    print_report(results, args)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2, default=str)
+
+    if args.min_throughput and any(r['throughput_msg_s'] < args.min_throughput for r in results):
+        print(f"吞吐低于阈值 {args.min_throughput} 消息/秒")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+读数表分区管理命令（MySQL）
+
+numeric_readings 表按月 RANGE COLUMNS(timestamp) 分区：p_history 存放最早的数据，
+pYYYYMM 存放对应月份，p_future 兜底存放尚未创建分区的未来数据。后端运行时
+由分区管理线程自动维护（READING_PARTITIONS_ENABLED），本命令用于查看状态、
+手动维护以及把已有的未分区表转换为分区表。
+
+示例：
+  python scripts/manage_partitions.py status
+  python scripts/manage_partitions.py ensure --months-ahead 6
+  python scripts/manage_partitions.py drop --retain-months 3 --dry-run
+  python scripts/manage_partitions.py migrate             # 只打印转换语句
+  python scripts/manage_partitions.py migrate --execute   # 执行转换（会重建整张表）
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# 添加backend根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from flask import Flask
+from sqlalchemy import text
+
+from config import Config
+from extensions import db
+
+
+def create_cli_app(database_url=None) -> Flask:
+    """只初始化数据库的最小应用（不启动MQTT和后台线程）"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(app)
+    return app
+
+
+def print_status(manager):
+    partitions = manager.list_partitions()
+    if not partitions:
+        print("numeric_readings 表未分区")
+        return
+    print(f"{'分区':<12} {'上界':<20} {'估算行数':>12} {'大小(MB)':>10}")
+    for p in partitions:
+        bound = p['upper_bound'].strftime('%Y-%m-%d') if p['upper_bound'] else 'MAXVALUE'
+        print(f"{p['name']:<12} {bound:<20} {p['rows']:>12} {p['bytes'] / 1024 / 1024:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AgriNex 读数表分区管理")
+    parser.add_argument('--database-url', help='覆盖 DATABASE_URL')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('status', help='列出分区')
+
+    ensure = subparsers.add_parser('ensure', help='创建未来的月分区')
+    ensure.add_argument('--months-ahead', type=int, help='提前创建的月数（默认取配置）')
+
+    drop = subparsers.add_parser('drop', help='删除过期分区')
+    drop.add_argument('--retain-months', type=int, help='保留当前月之前的月数（默认取配置）')
+    drop.add_argument('--dry-run', action='store_true', help='只列出将被删除的分区')
+
+    migrate = subparsers.add_parser('migrate', help='把未分区的 numeric_readings 表转换为按月分区')
+    migrate.add_argument('--execute', action='store_true', help='执行转换（默认只打印语句）')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    app = create_cli_app(args.database_url)
+    with app.app_context():
+        from services.partition_manager import partition_manager
+        partition_manager.init_app(app)
+
+        if db.session.get_bind().dialect.name != 'mysql':
+            print("分区管理只支持MySQL")
+            return 1
+
+        if args.command == 'status':
+            print_status(partition_manager)
+
+        elif args.command == 'ensure':
+            created = partition_manager.ensure_future(months_ahead=args.months_ahead)
+            print(f"新建分区: {', '.join(created) if created else '无'}")
+
+        elif args.command == 'drop':
+            from services.rollup_service import rollup_service
+            from services.archive_service import reading_archive
+            rollup_service.init_app(app)
+            reading_archive.init_app(app)
+            retain = args.retain_months if args.retain_months is not None else partition_manager.retention_months
+            if retain <= 0:
+                print("未设置保留期（--retain-months 或 READING_RETENTION_MONTHS），不删除分区")
+                return 1
+            expired = partition_manager.drop_expired(retention_months=retain, dry_run=args.dry_run)
+            action = '将删除' if args.dry_run else '已删除'
+            print(f"{action} {len(expired)} 个分区，约 {sum(p['rows'] for p in expired)} 条读数")
+            for p in expired:
+                print(f"  {p['name']}")
+
+        elif args.command == 'migrate':
+            if partition_manager.is_partitioned():
+                print("numeric_readings 表已分区")
+                return 0
+            statements = partition_manager.migrate_statements()
+            for statement in statements:
+                print(statement + ";\n")
+            if args.execute:
+                for statement in statements:
+                    db.session.execute(text(statement))
+                db.session.commit()
+                print_status(partition_manager)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+数值读数迁移命令：readings -> numeric_readings
+
+先执行 db/numeric_readings.sql 建表。默认为演练模式，只统计待迁移的读数；
+加 --execute 时：
+  1. 单位为空的传感器从其数值读数的 unit 补齐 sensors.unit；
+  2. 按ID分批把数值读数复制到 numeric_readings（保留原ID，已存在的ID跳过，
+     质量码转为 smallint），并在同一事务中从 readings 删除这一批。
+中断后重新执行会从剩余的读数继续。
+
+示例：
+  python scripts/migrate_numeric_readings.py
+  python scripts/migrate_numeric_readings.py --execute --batch-size 5000
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# 添加backend根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from flask import Flask
+from sqlalchemy import func
+
+from config import Config
+from extensions import db
+
+
+def create_cli_app(database_url=None) -> Flask:
+    """只初始化数据库的最小应用（不启动MQTT和后台线程）"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(app)
+    return app
+
+
+def numeric_filter():
+    from models.reading import Reading
+    return Reading.data_type == 'numeric', Reading.numeric_value.isnot(None)
+
+
+def fill_sensor_units() -> int:
+    """单位为空的传感器取其数值读数中出现的单位"""
+    from models.reading import Reading
+    from models.sensor import Sensor
+    units = db.session.query(Reading.sensor_id, func.max(Reading.unit)).join(
+        Sensor, Sensor.id == Reading.sensor_id
+    ).filter(*numeric_filter(), Reading.unit.isnot(None), Sensor.unit.is_(None)).group_by(Reading.sensor_id).all()
+    for sensor_id, unit in units:
+        Sensor.query.filter_by(id=sensor_id).update({'unit': unit}, synchronize_session=False)
+    db.session.commit()
+    return len(units)
+
+
+def copy_batches(batch_size: int) -> int:
+    from models.reading import Reading
+    from models.numeric_reading import NumericReading, quality_code
+
+    copied = 0
+    insert = NumericReading.__table__.insert().prefix_with('IGNORE', dialect='mysql')
+    while True:
+        rows = db.session.query(
+            Reading.id, Reading.sensor_id, Reading.timestamp, Reading.numeric_value, Reading.quality
+        ).filter(*numeric_filter()).order_by(Reading.id).limit(batch_size).all()
+        if not rows:
+            break
+        db.session.execute(insert, [
+            {'id': row.id, 'sensor_id': row.sensor_id, 'timestamp': row.timestamp,
+             'value': row.numeric_value, 'quality': quality_code(row.quality)}
+            for row in rows
+        ])
+        Reading.query.filter(Reading.id.in_([row.id for row in rows])).delete(synchronize_session=False)
+        db.session.commit()
+        copied += len(rows)
+        print(f"已迁移 {copied} 条 (ID <= {rows[-1].id})")
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AgriNex 数值读数迁移到 numeric_readings")
+    parser.add_argument('--execute', action='store_true', help='执行迁移（默认只统计）')
+    parser.add_argument('--batch-size', type=int, default=10000, help='每批迁移的读数数量')
+    parser.add_argument('--database-url', help='覆盖 DATABASE_URL')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    app = create_cli_app(args.database_url)
+    with app.app_context():
+        from models.reading import Reading
+        pending = db.session.query(func.count(Reading.id)).filter(*numeric_filter()).scalar() or 0
+        print(f"readings 中待迁移的数值读数: {pending} 条")
+        if not args.execute or not pending:
+            return 0
+
+        print(f"补齐单位的传感器: {fill_sensor_units()} 个")
+        copied = copy_batches(args.batch_size)
+        print(f"迁移完成: {copied} 条数值读数")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+入库死信队列管理命令
+
+通过后端管理接口查看死信统计并批量回放。回放在后端进程内执行（经批量写入
+器重新入库），因此可以在服务运行期间安全使用，不会与正在写入的死信分段冲突。
+
+示例：
+  python scripts/replay_dead_letters.py --stats
+  python scripts/replay_dead_letters.py --reason unknown_device
+  python scripts/replay_dead_letters.py --url http://backend:5000 --username admin --password ***
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import requests
+
+
+def login(base_url: str, username: str, password: str) -> str:
+    """登录获取访问令牌"""
+    response = requests.post(
+        f"{base_url}/api/auth/login",
+        json={'username': username, 'password': password},
+        timeout=10
+    )
+    response.raise_for_status()
+    return response.json()['access_token']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AgriNex 入库死信队列回放")
+    parser.add_argument('--url', default=os.getenv('AGRINEX_API_URL', 'http://localhost:5000'),
+                        help='后端地址')
+    parser.add_argument('--username', default=os.getenv('AGRINEX_ADMIN_USER', 'admin'), help='管理员用户名')
+    parser.add_argument('--password', default=os.getenv('AGRINEX_ADMIN_PASSWORD'), help='管理员密码')
+    parser.add_argument('--reason', help='只回放指定原因码的死信')
+    parser.add_argument('--stats', action='store_true', help='只查看统计，不回放')
+    parser.add_argument('--timeout', type=float, default=600.0, help='回放请求超时秒数')
+    args = parser.parse_args()
+
+    if not args.password:
+        parser.error('需要 --password 或环境变量 AGRINEX_ADMIN_PASSWORD')
+
+    base_url = args.url.rstrip('/')
+    headers = {'Authorization': f"Bearer {login(base_url, args.username, args.password)}"}
+
+    response = requests.get(f"{base_url}/api/mqtt/dead-letters", headers=headers, timeout=10)
+    response.raise_for_status()
+    stats = response.json()['data']
+    print(f"待回放死信: {stats['pending']} 条, {stats['segments']} 个分段, {stats['bytes']} 字节")
+    for reason, count in sorted(stats['by_reason'].items()):
+        print(f"  {reason:<16} {count}")
+
+    if args.stats or not stats['pending']:
+        return 0
+
+    body = {'reason': args.reason} if args.reason else {}
+    response = requests.post(f"{base_url}/api/mqtt/dead-letters/replay",
+                             headers=headers, json=body, timeout=args.timeout)
+    result = response.json()
+    if not response.ok:
+        print(f"回放失败: {result.get('message')}")
+        return 1
+
+    print(result['message'])
+    print(json.dumps(result['data'], ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,9 +3,11 @@ import asyncio
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
-from models.reading import Reading
+from models.numeric_reading import NumericReading
 from models.sensor import Sensor
 from services.alarm_service import AlarmService
+from services.metrics import ALARM_EVALUATION_SECONDS, ALARMS_TRIGGERED
+from services.tracing import tracer
 from extensions import db
 from flask import Flask
 
@@ -66,11 +68,10 @@ class AlarmMonitor:
                 last_check = self.last_check_time.get(sensor_id, datetime.utcnow() - timedelta(minutes=5))
                 
                 # 获取自上次检查以来的新读数
-                new_readings = Reading.query.filter(
-                    Reading.sensor_id == sensor_id,
-                    Reading.timestamp > last_check,
-                    Reading.data_type == 'numeric'
-                ).order_by(Reading.timestamp.asc()).all()
+                new_readings = NumericReading.query.filter(
+                    NumericReading.sensor_id == sensor_id,
+                    NumericReading.timestamp > last_check
+                ).order_by(NumericReading.timestamp.asc()).all()
                 
                 if not new_readings:
                     return
@@ -104,7 +105,8 @@ class AlarmMonitor:
                 logger.error("Flask app not initialized for alarm monitor")
                 return []
                 
-            with self.app.app_context():
+            with self.app.app_context(), ALARM_EVALUATION_SECONDS.time(), \
+                    tracer.span('alarm.evaluate', sensor_id=sensor_id) as span:
                 triggered_alarms = AlarmService.check_and_trigger_alarms(
                     sensor_id=sensor_id,
                     value=value,
@@ -112,6 +114,8 @@ class AlarmMonitor:
                 )
                 
                 if triggered_alarms:
+                    ALARMS_TRIGGERED.inc(len(triggered_alarms))
+                    span.set_attribute('triggered', len(triggered_alarms))
                     logger.info(f"Immediately triggered {len(triggered_alarms)} alarms for sensor {sensor_id}")
                     
                 return triggered_alarms
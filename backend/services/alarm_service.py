@@ -4,6 +4,8 @@ from models.alarm_rule import AlarmRule
 from models.alarm_state import AlarmState
 from models.reading import Reading
 from extensions import db
+from services.metrics import NOTIFICATION_SECONDS, NOTIFICATIONS_FAILED
+from services.tracing import tracer
 from datetime import datetime, timedelta
 import asyncio
 import logging
@@ -176,15 +178,21 @@ class AlarmService:
         # 邮件通知
         if rule.email_enabled:
             try:
-                AlarmService._send_email_notification(rule, alarm, value)
+                with NOTIFICATION_SECONDS.time(channel='email'), \
+                        tracer.span('notification.email', alarm_id=alarm.id):
+                    AlarmService._send_email_notification(rule, alarm, value)
             except Exception as e:
+                NOTIFICATIONS_FAILED.inc(channel='email')
                 logger.error(f"Failed to send email notification: {e}")
         
         # Webhook通知
         if rule.webhook_enabled and rule.webhook_url:
             try:
-                AlarmService._send_webhook_notification(rule, alarm, value)
+                with NOTIFICATION_SECONDS.time(channel='webhook'), \
+                        tracer.span('notification.webhook', alarm_id=alarm.id):
+                    AlarmService._send_webhook_notification(rule, alarm, value)
             except Exception as e:
+                NOTIFICATIONS_FAILED.inc(channel='webhook')
                 logger.error(f"Failed to send webhook notification: {e}")
 
     @staticmethod
@@ -218,6 +226,8 @@ class AlarmService:
             response.raise_for_status()
             logger.info(f"Webhook notification sent successfully for alarm: {alarm.id}")
         except requests.RequestException as e:
+            NOTIFICATIONS_FAILED.inc(channel='webhook')
+            tracer.set_error(e)
             logger.error(f"Failed to send webhook notification: {e}")
 
     @staticmethod
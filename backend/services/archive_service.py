@@ -0,0 +1,490 @@
+# backend/services/archive_service.py
+import logging
+import os
+import threading
+from datetime import datetime, date, timedelta, timezone
+from typing import Dict, Any, Optional, List, Iterable, Iterator, Tuple
+
+import pandas as pd
+from sqlalchemy import func, or_, and_
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.numeric_reading import NumericReading, QUALITY_LABELS
+from models.reading_archive import ReadingArchive
+from models.sensor import Sensor
+from services.storage_service import storage_service
+from extensions import db
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    pa = ds = pq = None
+    logging.warning("pyarrow not available, reading archive disabled")
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['sensor_id', 'timestamp', 'value', 'quality']
+_ROW_GROUP_SIZE = 10000
+_SENSOR_CHUNK = 100
+_STREAM_BATCH = 10000
+
+
+def _day(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, ts.day)
+
+
+def _day_end(day: date) -> datetime:
+    """归档日期的下一天零点，即该传感器数据库读数的起点"""
+    return datetime(day.year, day.month, day.day) + timedelta(days=1)
+
+
+def _naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    if ts is not None and ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _empty_frame() -> pd.DataFrame:
+    return pd.DataFrame(columns=COLUMNS)
+
+
+def _db_frame(query) -> pd.DataFrame:
+    """数据库读数转为与归档文件相同的列，质量码还原为字符串"""
+    df = pd.DataFrame(query.all(), columns=COLUMNS)
+    df['quality'] = df['quality'].map(QUALITY_LABELS).fillna('good')
+    return df
+
+
+class ReadingArchiveService:
+    """读数冷数据归档 - 已结束日期的数值读数按 传感器/天 导出为 Parquet 列式文件
+
+    文件写入存储服务的本地目录（archive/readings/sensor_id=<id>/date=<YYYY-MM-DD>.parquet），
+    MinIO 可用时同时上传到归档桶；reading_archives 表记录每个文件的行数和时间范围。
+    每个传感器按日期从旧到新连续归档，最大的归档日期即水位：
+
+      - read_numeric()/latest()/count_outside()/iter_numeric() 对水位之前的数据读取 Parquet 文件，
+        按传感器和日期从索引表选出文件，时间和数值条件下推到行组统计；
+      - 水位之后的数据查询数据库，两部分合并后返回，调用方无需关心数据在哪一层。
+
+    只归档数值读数。归档时已结束超过 delay_days 天的日期才视为封闭区间，之后
+    写入这些日期的迟到读数不会再被读取。原始读数的删除仍由分区/保留策略负责，
+    保留策略在删除前会先归档对应区间（ARCHIVE_ENABLED 时）。
+    """
+
+    def __init__(self, bucket_name: str = 'agrinex-archive', delay_days: int = 1, check_interval_hours: float = 24):
+        self.app = None
+        self.enabled = False
+        self.bucket_name = bucket_name
+        self.delay_days = delay_days
+        self.check_interval_hours = check_interval_hours
+        self.running = False
+
+        self._run_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.stats = {
+            'runs': 0,
+            'files_written': 0,
+            'rows_archived': 0,
+            'files_read': 0,
+            'files_downloaded': 0,
+            'missing_files': 0,
+            'errors': 0,
+            'last_run': None,
+            'last_error': None,
+        }
+
+    def init_app(self, app):
+        """读取归档配置"""
+        self.app = app
+        self.enabled = app.config.get('ARCHIVE_ENABLED', self.enabled)
+        self.bucket_name = app.config.get('ARCHIVE_BUCKET', self.bucket_name)
+        self.delay_days = app.config.get('ARCHIVE_DELAY_DAYS', self.delay_days)
+        self.check_interval_hours = app.config.get('ARCHIVE_CHECK_HOURS', self.check_interval_hours)
+        if self.enabled and not PYARROW_AVAILABLE:
+            logger.warning("ARCHIVE_ENABLED 已开启但未安装 pyarrow，读数归档不可用")
+            self.enabled = False
+
+    def start(self):
+        """启动后台归档线程"""
+        if self.running or not self.enabled:
+            return
+        self.running = True
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='reading-archiver', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台线程（正在进行的归档在当前文件后退出）"""
+        self.running = False
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        # 启动后等待一段时间再执行，避开启动时的数据库初始化和积压消息写入
+        self._stop_event.wait(60)
+        while self.running:
+            errors = self.stats['errors']
+            with self.app.app_context():
+                try:
+                    self.archive()
+                except RuntimeError as e:
+                    logger.info("跳过本次归档: %s", e)
+                except (SQLAlchemyError, OSError) as e:
+                    db.session.rollback()
+                    self.stats['errors'] += 1
+                    self.stats['last_error'] = str(e)
+                    logger.error("读数归档失败: %s", e)
+            # 失败时（例如数据库或存储尚未就绪）5分钟后重试
+            interval = self.check_interval_hours * 3600
+            if self.stats['errors'] != errors:
+                interval = min(interval, 300)
+            self._stop_event.wait(interval)
+
+    # ---- 归档 ----
+
+    def object_key(self, sensor_id: int, day: date) -> str:
+        return f"archive/readings/sensor_id={sensor_id}/date={day:%Y-%m-%d}.parquet"
+
+    def watermarks(self, sensor_ids: Optional[Iterable[int]] = None) -> Dict[int, date]:
+        """每个传感器已归档的最后日期"""
+        query = db.session.query(ReadingArchive.sensor_id, func.max(ReadingArchive.day))
+        if sensor_ids is not None:
+            query = query.filter(ReadingArchive.sensor_id.in_(list(sensor_ids)))
+        return dict(query.group_by(ReadingArchive.sensor_id).all())
+
+    def archive(self, before: Optional[datetime] = None, sensor_ids: Optional[List[int]] = None) -> Dict[str, int]:
+        """把 before（默认当前时间减 delay_days 天）所在日期之前、尚未归档的日期导出为 Parquet"""
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("未安装 pyarrow")
+        if not self._run_lock.acquire(blocking=False):
+            raise RuntimeError("读数归档正在执行")
+        try:
+            limit = _day(before or datetime.utcnow() - timedelta(days=self.delay_days))
+            if sensor_ids is None:
+                sensor_ids = [sensor_id for (sensor_id,) in db.session.query(Sensor.id).order_by(Sensor.id)]
+            self.stats['runs'] += 1
+            self.stats['last_run'] = datetime.utcnow().isoformat()
+
+            result = {'files': 0, 'rows': 0, 'days': 0}
+            for i in range(0, len(sensor_ids), _SENSOR_CHUNK):
+                chunk = sensor_ids[i:i + _SENSOR_CHUNK]
+                self._archive_chunk(chunk, limit, result)
+            if result['files']:
+                logger.info("读数归档完成: %d 个文件, %d 条读数 (早于 %s)", result['files'], result['rows'], limit.date())
+            return result
+        finally:
+            self._run_lock.release()
+
+    def _archive_chunk(self, sensor_ids: List[int], limit: datetime, result: Dict[str, int]):
+        watermarks = self.watermarks(sensor_ids)
+        filters = (NumericReading.sensor_id.in_(sensor_ids),)
+
+        # 从最小水位的下一天开始；从未归档的传感器从其最早的读数开始
+        starts = [_day_end(day) for day in watermarks.values()]
+        unarchived = [sensor_id for sensor_id in sensor_ids if sensor_id not in watermarks]
+        if unarchived:
+            first = db.session.query(func.min(NumericReading.timestamp)).filter(
+                NumericReading.sensor_id.in_(unarchived), NumericReading.timestamp < limit
+            ).scalar()
+            if first is not None:
+                starts.append(_day(first))
+        if not starts:
+            return
+        cursor = min(starts)
+
+        while cursor < limit:
+            if not self._should_continue():
+                return
+            first = db.session.query(func.min(NumericReading.timestamp)).filter(
+                *filters, NumericReading.timestamp >= cursor, NumericReading.timestamp < limit
+            ).scalar()
+            if first is None:
+                return
+
+            day = _day(first)
+            next_day = day + timedelta(days=1)
+            rows = db.session.query(
+                NumericReading.sensor_id, NumericReading.timestamp, NumericReading.value, NumericReading.quality_code
+            ).filter(*filters, NumericReading.timestamp >= day, NumericReading.timestamp < next_day).order_by(
+                NumericReading.sensor_id, NumericReading.timestamp
+            ).yield_per(_STREAM_BATCH)
+
+            # 按传感器流式分组，内存中只保留一个传感器一天的读数
+            current, buffer = None, []
+            for row in rows:
+                if row[0] != current:
+                    self._flush(current, day.date(), buffer, watermarks, result)
+                    current, buffer = row[0], []
+                buffer.append((row[0], row[1], row[2], QUALITY_LABELS.get(row[3], 'good')))
+            self._flush(current, day.date(), buffer, watermarks, result)
+            db.session.commit()
+            result['days'] += 1
+            cursor = next_day
+
+    def _flush(self, sensor_id, day: date, rows, watermarks: Dict[int, date], result: Dict[str, int]):
+        if sensor_id is None or not rows:
+            return
+        if sensor_id in watermarks and watermarks[sensor_id] >= day:
+            return
+        entry = self._write_file(sensor_id, day, rows)
+        db.session.merge(entry)
+        result['files'] += 1
+        result['rows'] += len(rows)
+
+    def _write_file(self, sensor_id: int, day: date, rows) -> ReadingArchive:
+        table = pa.table({
+            'sensor_id': pa.array([row[0] for row in rows], pa.int32()),
+            'timestamp': pa.array([row[1] for row in rows], pa.timestamp('us')),
+            'value': pa.array([row[2] for row in rows], pa.float64()),
+            'quality': pa.array([row[3] for row in rows], pa.string()),
+        })
+        object_key = self.object_key(sensor_id, day)
+        local_path = os.path.join(storage_service.local_storage_path, object_key)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        temp_path = local_path + '.tmp'
+        pq.write_table(table, temp_path, compression='zstd', row_group_size=_ROW_GROUP_SIZE)
+        os.replace(temp_path, local_path)
+
+        storage_backend = 'local'
+        if storage_service.minio_client and storage_service.ensure_bucket_exists(self.bucket_name):
+            try:
+                storage_service.minio_client.fput_object(
+                    self.bucket_name, object_key, local_path, content_type='application/vnd.apache.parquet'
+                )
+                storage_backend = 'dual'
+            except Exception as e:
+                logger.error("归档文件上传MinIO失败 %s: %s", object_key, e)
+
+        self.stats['files_written'] += 1
+        self.stats['rows_archived'] += len(rows)
+        return ReadingArchive(
+            sensor_id=sensor_id,
+            day=day,
+            bucket_name=self.bucket_name,
+            object_key=object_key,
+            storage_backend=storage_backend,
+            row_count=len(rows),
+            min_ts=rows[0][1],
+            max_ts=rows[-1][1],
+            file_size=os.path.getsize(local_path),
+        )
+
+    def _should_continue(self) -> bool:
+        # 后台线程停止时在当前日期后退出；命令行或保留策略直接调用时不受影响
+        return self.running or self._thread is None
+
+    # ---- 读取 ----
+
+    def read_numeric(self, sensor_ids: List[int], start: Optional[datetime] = None,
+                     end: Optional[datetime] = None) -> pd.DataFrame:
+        """读取 [start, end] 内的数值读数（归档文件 ∪ 数据库），按 sensor_id、timestamp 排序"""
+        if not sensor_ids:
+            return _empty_frame()
+        start, end = _naive_utc(start), _naive_utc(end)
+        watermarks = self.watermarks(sensor_ids) if PYARROW_AVAILABLE else {}
+
+        frames = []
+        if watermarks:
+            entries = self._entries(list(watermarks), start, end).order_by(
+                ReadingArchive.sensor_id, ReadingArchive.day
+            ).all()
+            frames.append(self._read_files(entries, start, end))
+
+        query = db.session.query(
+            NumericReading.sensor_id, NumericReading.timestamp, NumericReading.value, NumericReading.quality_code
+        ).filter(self._db_scope(sensor_ids, watermarks))
+        query = self._time_filter(query, start, end).order_by(NumericReading.sensor_id, NumericReading.timestamp)
+        frames.append(_db_frame(query))
+
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return _empty_frame()
+        df = pd.concat(frames, ignore_index=True)
+        return df.sort_values(['sensor_id', 'timestamp'], kind='stable', ignore_index=True)
+
+    def latest(self, sensor_id: int, limit: int = 200) -> pd.DataFrame:
+        """传感器最近 limit 条数值读数（按时间升序），数据库中不足时从最新的归档文件补齐"""
+        watermarks = self.watermarks([sensor_id]) if PYARROW_AVAILABLE else {}
+        query = db.session.query(
+            NumericReading.sensor_id, NumericReading.timestamp, NumericReading.value, NumericReading.quality_code
+        ).filter(self._db_scope([sensor_id], watermarks)).order_by(NumericReading.timestamp.desc()).limit(limit)
+        recent = _db_frame(query)
+
+        frames = [recent] if not recent.empty else []
+        needed = limit - len(recent)
+        if needed > 0 and watermarks:
+            entries = ReadingArchive.query.filter(ReadingArchive.sensor_id == sensor_id).order_by(
+                ReadingArchive.day.desc()
+            )
+            for entry in entries:
+                older = self._read_files([entry], None, None)
+                if older.empty:
+                    continue
+                frames.append(older.tail(needed))
+                needed -= min(needed, len(older))
+                if needed == 0:
+                    break
+
+        if not frames:
+            return _empty_frame()
+        df = pd.concat(frames, ignore_index=True)
+        return df.sort_values('timestamp', kind='stable', ignore_index=True)
+
+    def count_outside(self, sensor_id: int, start: Optional[datetime], end: Optional[datetime],
+                      low: float, high: float) -> int:
+        """统计 [start, end] 内数值小于 low 或大于 high 的读数数量"""
+        return self.count_outside_many({sensor_id: (low, high)}, start, end)[sensor_id]
+
+    def count_outside_many(self, bounds: Dict[int, Tuple[float, float]], start: Optional[datetime],
+                           end: Optional[datetime]) -> Dict[int, int]:
+        """按传感器各自的 (low, high) 统计区间外的读数数量，归档索引和数据库部分各为一次查询"""
+        start, end = _naive_utc(start), _naive_utc(end)
+        sensor_ids = list(bounds)
+        counts = {sensor_id: 0 for sensor_id in sensor_ids}
+        if not sensor_ids:
+            return counts
+        watermarks = self.watermarks(sensor_ids) if PYARROW_AVAILABLE else {}
+        entries_by_sensor: Dict[int, List[ReadingArchive]] = {}
+        if watermarks:
+            for entry in self._entries(list(watermarks), start, end).all():
+                entries_by_sensor.setdefault(entry.sensor_id, []).append(entry)
+        value = ds.field('value') if watermarks else None
+        for sensor_id, entries in entries_by_sensor.items():
+            low, high = bounds[sensor_id]
+            dataset = self._dataset(entries)
+            if dataset is not None:
+                condition = self._time_expression(start, end, (value < low) | (value > high))
+                counts[sensor_id] += dataset.count_rows(filter=condition)
+
+        outside = or_(*[
+            and_(NumericReading.sensor_id == sensor_id, or_(NumericReading.value < low, NumericReading.value > high))
+            for sensor_id, (low, high) in bounds.items()
+        ])
+        query = db.session.query(NumericReading.sensor_id, func.count(NumericReading.id)).filter(
+            self._db_scope(sensor_ids, watermarks), outside
+        )
+        for sensor_id, count in self._time_filter(query, start, end).group_by(NumericReading.sensor_id):
+            counts[sensor_id] += count
+        return counts
+
+    def iter_numeric(self, sensor_id: int, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None) -> Iterator[Tuple[datetime, float, str]]:
+        """按时间顺序逐条产出 [start, end] 内的 (时间戳, 数值, 质量码)
+
+        归档部分每次只读入一个文件（一个传感器一天），数据库部分以 yield_per 流式读取，
+        内存占用与区间长度无关。
+        """
+        start, end = _naive_utc(start), _naive_utc(end)
+        watermarks = self.watermarks([sensor_id]) if PYARROW_AVAILABLE else {}
+        if watermarks:
+            for entry in self._entries([sensor_id], start, end).order_by(ReadingArchive.day).all():
+                df = self._read_files([entry], start, end)
+                if df.empty:
+                    continue
+                yield from zip(df['timestamp'].dt.to_pydatetime(), df['value'].tolist(), df['quality'].tolist())
+
+        query = db.session.query(
+            NumericReading.timestamp, NumericReading.value, NumericReading.quality_code
+        ).filter(self._db_scope([sensor_id], watermarks))
+        query = self._time_filter(query, start, end).order_by(NumericReading.timestamp).yield_per(_STREAM_BATCH)
+        for timestamp, value, code in query:
+            yield timestamp, value, QUALITY_LABELS.get(code, 'good')
+
+    def _entries(self, sensor_ids: List[int], start: Optional[datetime], end: Optional[datetime]):
+        query = ReadingArchive.query.filter(ReadingArchive.sensor_id.in_(sensor_ids))
+        if start is not None:
+            query = query.filter(ReadingArchive.day >= start.date())
+        if end is not None:
+            query = query.filter(ReadingArchive.day <= end.date())
+        return query
+
+    @staticmethod
+    def _db_scope(sensor_ids: List[int], watermarks: Dict[int, date]):
+        """数据库部分：未归档的传感器全部读数，已归档的传感器只取水位之后的读数"""
+        unarchived = [sensor_id for sensor_id in sensor_ids if sensor_id not in watermarks]
+        conditions = [and_(NumericReading.sensor_id == sensor_id, NumericReading.timestamp >= _day_end(day))
+                      for sensor_id, day in watermarks.items()]
+        if unarchived:
+            conditions.append(NumericReading.sensor_id.in_(unarchived))
+        return or_(*conditions)
+
+    @staticmethod
+    def _time_filter(query, start: Optional[datetime], end: Optional[datetime]):
+        if start is not None:
+            query = query.filter(NumericReading.timestamp >= start)
+        if end is not None:
+            query = query.filter(NumericReading.timestamp <= end)
+        return query
+
+    @staticmethod
+    def _time_expression(start: Optional[datetime], end: Optional[datetime], condition=None):
+        if start is not None:
+            expression = ds.field('timestamp') >= pa.scalar(start, pa.timestamp('us'))
+            condition = expression if condition is None else condition & expression
+        if end is not None:
+            expression = ds.field('timestamp') <= pa.scalar(end, pa.timestamp('us'))
+            condition = expression if condition is None else condition & expression
+        return condition
+
+    def _read_files(self, entries: List[ReadingArchive], start: Optional[datetime],
+                    end: Optional[datetime]) -> pd.DataFrame:
+        dataset = self._dataset(entries)
+        if dataset is None:
+            return _empty_frame()
+        table = dataset.to_table(columns=COLUMNS, filter=self._time_expression(start, end))
+        return table.to_pandas()
+
+    def _dataset(self, entries: List[ReadingArchive]):
+        paths = [path for path in (self._local_file(entry) for entry in entries) if path]
+        if not paths:
+            return None
+        self.stats['files_read'] += len(paths)
+        return ds.dataset(paths, format='parquet')
+
+    def _local_file(self, entry: ReadingArchive) -> Optional[str]:
+        """归档文件的本地路径，本地不存在时从MinIO下载到本地目录"""
+        local_path = os.path.join(storage_service.local_storage_path, entry.object_key)
+        if os.path.exists(local_path):
+            return local_path
+
+        data = storage_service.download_file(entry.bucket_name, entry.object_key)
+        if data is None:
+            self.stats['missing_files'] += 1
+            logger.error("归档文件不存在: %s/%s", entry.bucket_name, entry.object_key)
+            return None
+        try:
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            temp_path = local_path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(data.read())
+            os.replace(temp_path, local_path)
+        finally:
+            data.close()
+            if hasattr(data, 'release_conn'):
+                data.release_conn()
+        self.stats['files_downloaded'] += 1
+        return local_path
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取归档统计信息"""
+        return {
+            'enabled': self.enabled,
+            'running': self.running,
+            'available': PYARROW_AVAILABLE,
+            'bucket_name': self.bucket_name,
+            'delay_days': self.delay_days,
+            **self.stats
+        }
+
+
+# 全局读数归档实例
+reading_archive = ReadingArchiveService()
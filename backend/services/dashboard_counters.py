@@ -0,0 +1,175 @@
+# backend/services/dashboard_counters.py
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from sqlalchemy import func
+
+from models.device import Device
+from models.sensor import Sensor
+from models.alarm import Alarm
+from models.reading import Reading
+from models.numeric_reading import NumericReading
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+def _status_summary(counts: Dict[Optional[str], int], **fields: str) -> Dict[str, int]:
+    """{状态: 数量} 转换为仪表盘结构：total 不含已删除（及状态为空）的行，其余字段取对应状态"""
+    summary = {'total': sum(count for status, count in counts.items() if status not in (None, 'deleted'))}
+    summary.update({field: counts.get(status, 0) for field, status in fields.items()})
+    return summary
+
+
+class DashboardCounters:
+    """仪表盘计数器 - 设备/传感器/告警状态计数和数据点总数
+
+    状态计数每张表一次 GROUP BY 查询，结果缓存 ttl_seconds 秒，多个浏览器
+    同时刷新时只有缓存过期后的第一个请求查询数据库。
+
+    数据点总数不再每次 COUNT 整张读数表：启动后第一次请求精确计数一次作为基数，
+    之后由批量写入器的刷新监听器累加写入的行数。HTTP接口写入的读数、保留策略和
+    归档删除的行不经过写入器，每隔 resync_seconds 秒在后台线程重新计数校正。
+    """
+
+    def __init__(self, ttl_seconds: float = 10, resync_seconds: float = 3600):
+        self.app = None
+        self.ttl_seconds = ttl_seconds
+        self.resync_seconds = resync_seconds
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._status: Optional[Dict[str, Any]] = None
+        self._status_expires_at = 0.0
+        self._data_points_base: Optional[int] = None
+        self._data_points_delta = 0
+        self._resync_at = 0.0
+        self._resyncing = False
+
+        # 统计信息
+        self.stats = {
+            'status_hits': 0,
+            'status_refreshes': 0,
+            'rows_added': 0,
+            'data_points_resyncs': 0,
+            'last_resync_ms': 0.0,
+        }
+
+    def init_app(self, app, writer=None):
+        """读取配置并注册到批量写入器的刷新监听器"""
+        self.app = app
+        self.ttl_seconds = app.config.get('DASHBOARD_STATS_TTL_SECONDS', self.ttl_seconds)
+        self.resync_seconds = app.config.get('DASHBOARD_DATA_POINTS_RESYNC_SECONDS', self.resync_seconds)
+        if writer is not None:
+            writer.add_flush_listener(self.on_rows_written)
+
+    def on_rows_written(self, rows):
+        """批量写入器刷新监听器：累加新写入的读数行数"""
+        with self._lock:
+            self._data_points_delta += len(rows)
+        self.stats['rows_added'] += len(rows)
+
+    def get_counts(self) -> Dict[str, Any]:
+        """获取仪表盘统计：devices/sensors/alarms 状态计数、data_points 和 last_updated"""
+        counts = dict(self._status_counts())
+        counts['data_points'] = self._data_points()
+        return counts
+
+    def invalidate(self):
+        """使状态计数缓存失效（下次请求重新查询）"""
+        with self._lock:
+            self._status_expires_at = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取计数器统计信息"""
+        return {
+            **self.stats,
+            'ttl_seconds': self.ttl_seconds,
+            'resync_seconds': self.resync_seconds,
+            'data_points_base': self._data_points_base,
+            'data_points_delta': self._data_points_delta
+        }
+
+    def _status_counts(self) -> Dict[str, Any]:
+        if self._status is not None and time.monotonic() < self._status_expires_at:
+            self.stats['status_hits'] += 1
+            return self._status
+
+        # 同时过期的请求只有一个查询数据库，其余等待后直接使用新结果
+        with self._refresh_lock:
+            if self._status is not None and time.monotonic() < self._status_expires_at:
+                self.stats['status_hits'] += 1
+                return self._status
+
+            devices = dict(db.session.query(Device.status, func.count(Device.id)).group_by(Device.status).all())
+            sensors = dict(db.session.query(Sensor.status, func.count(Sensor.id)).group_by(Sensor.status).all())
+            alarms = db.session.query(
+                Alarm.status, Alarm.severity, func.count(Alarm.id)
+            ).group_by(Alarm.status, Alarm.severity).all()
+
+            status = {
+                'devices': _status_summary(devices, online='active', offline='offline', error='error'),
+                'sensors': _status_summary(sensors, active='active', inactive='inactive', error='error'),
+                'alarms': {
+                    'total': sum(count for _, _, count in alarms),
+                    'active': sum(count for status, _, count in alarms if status == 'active'),
+                    'resolved': sum(count for status, _, count in alarms if status == 'resolved'),
+                    'critical': sum(count for _, severity, count in alarms if severity == 'high'),
+                },
+                'last_updated': datetime.utcnow().isoformat(),
+            }
+            with self._lock:
+                self._status = status
+                self._status_expires_at = time.monotonic() + self.ttl_seconds
+            self.stats['status_refreshes'] += 1
+            return status
+
+    def _data_points(self) -> int:
+        if self._data_points_base is None:
+            # 第一次请求同步计数（之后只在后台校正）
+            with self._refresh_lock:
+                if self._data_points_base is None:
+                    self.resync_data_points()
+        elif time.monotonic() >= self._resync_at and self.app is not None:
+            with self._lock:
+                start = not self._resyncing
+                self._resyncing = True
+            if start:
+                threading.Thread(target=self._resync_in_background, daemon=True).start()
+
+        with self._lock:
+            return self._data_points_base + self._data_points_delta
+
+    def resync_data_points(self):
+        """精确计数两张读数表，作为新的基数（计数期间写入器累加的行数计入新基数之后）"""
+        started = time.monotonic()
+        with self._lock:
+            delta_before = self._data_points_delta
+
+        total = sum(db.session.query(func.count(model.id)).scalar() for model in (NumericReading, Reading))
+
+        with self._lock:
+            self._data_points_base = total
+            self._data_points_delta -= delta_before
+            self._resync_at = time.monotonic() + self.resync_seconds
+        self.stats['data_points_resyncs'] += 1
+        self.stats['last_resync_ms'] = round((time.monotonic() - started) * 1000, 2)
+
+    def _resync_in_background(self):
+        try:
+            with self.app.app_context():
+                self.resync_data_points()
+        except Exception as e:
+            logger.error("校正数据点总数失败: %s", e)
+            with self._lock:
+                self._resync_at = time.monotonic() + self.resync_seconds
+        finally:
+            with self._lock:
+                self._resyncing = False
+
+
+# 全局仪表盘计数器实例
+dashboard_counters = DashboardCounters()
@@ -0,0 +1,271 @@
+# backend/services/dead_letter_store.py
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, Optional, List, Callable
+
+logger = logging.getLogger(__name__)
+
+# 死信原因码
+REASON_DECODE_ERROR = 'decode_error'        # 负载无法解码
+REASON_INVALID_PAYLOAD = 'invalid_payload'  # 主题/字段缺失或取值无效
+REASON_UNKNOWN_DEVICE = 'unknown_device'    # client_id 没有对应的启用设备
+REASON_UNKNOWN_SENSOR = 'unknown_sensor'    # 设备下没有对应类型的传感器
+REASON_DB_ERROR = 'db_error'                # 写入数据库失败
+REASON_INGEST_FAILED = 'ingest_failed'      # 逐条写入路径失败（原因已记录在日志中）
+
+REASONS = (
+    REASON_DECODE_ERROR,
+    REASON_INVALID_PAYLOAD,
+    REASON_UNKNOWN_DEVICE,
+    REASON_UNKNOWN_SENSOR,
+    REASON_DB_ERROR,
+    REASON_INGEST_FAILED,
+)
+
+SEGMENT_SUFFIX = '.dlq'
+
+
+class DeadLetterStore:
+    """入库死信队列 - 持久化无法入库的MQTT消息，原因排除后可批量回放
+
+    每条死信是一行JSON（主题、原因码、错误信息、解码后的负载或原始字节的
+    base64），只追加写入当前分段文件；分段超过大小上限后轮转，总大小超过
+    上限时删除最旧的分段。回放时先封存当前分段，逐个读取已封存的分段交给
+    处理函数，处理完的分段删除；回放期间新产生的死信写入新分段，不会被
+    本次回放重复读取。
+    """
+
+    def __init__(self, directory: str = './storage/dead_letters',
+                 segment_max_bytes: int = 16 * 1024 * 1024,
+                 max_total_bytes: int = 1024 * 1024 * 1024):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.max_total_bytes = max_total_bytes
+        self.enabled = True
+
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._file = None
+        self._seq = 0
+        self._segments: Dict[str, Dict[str, Any]] = {}  # path -> {'size': int, 'reasons': Counter}
+
+        # 统计信息
+        self.stats = {
+            'written': 0,
+            'write_errors': 0,
+            'replayed': 0,
+            'replay_failed': 0,
+            'segments_dropped': 0,
+            'records_dropped': 0,
+        }
+
+    def init_app(self, app):
+        """从应用配置读取死信参数，并加载磁盘上已有的分段"""
+        self.enabled = app.config.get('DEAD_LETTER_ENABLED', self.enabled)
+        self.directory = app.config.get('DEAD_LETTER_DIR', self.directory)
+        self.segment_max_bytes = app.config.get('DEAD_LETTER_SEGMENT_MAX_BYTES', self.segment_max_bytes)
+        self.max_total_bytes = app.config.get('DEAD_LETTER_MAX_TOTAL_BYTES', self.max_total_bytes)
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load_segments()
+
+    def add(self, topic: str, reason: str, payload: Optional[Dict[str, Any]] = None,
+            raw: Optional[bytes] = None, error: Optional[str] = None) -> bool:
+        """追加一条死信；payload 为解码后的负载，无法解码时传入原始字节 raw"""
+        if not self.enabled:
+            return False
+
+        record = {
+            'ts': time.time(),
+            'reason': reason,
+            'topic': topic,
+            'error': error,
+        }
+        if payload is not None:
+            record['payload'] = payload
+        elif raw is not None:
+            record['payload_b64'] = base64.b64encode(raw).decode('ascii')
+        if self._append(record):
+            logger.warning("消息进入死信队列 [%s] %s: %s", reason, topic, error)
+            return True
+        return False
+
+    def list_records(self, reason: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """按写入顺序读取最多 limit 条死信（用于排查）"""
+        records = []
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            paths = sorted(self._segments)
+        for path in paths:
+            for record in self._read_segment(path):
+                if reason and record.get('reason') != reason:
+                    continue
+                records.append(record)
+                if len(records) >= limit:
+                    return records
+        return records
+
+    def replay(self, handler: Callable[[Dict[str, Any]], None],
+               reason: Optional[str] = None) -> Dict[str, Any]:
+        """回放已封存的死信
+
+        handler 抛出异常的记录重新写入死信队列（异常带 reason 属性时更新原因码）；
+        指定 reason 时其他原因的记录原样保留（写入新分段）。
+        """
+        if not self._replay_lock.acquire(blocking=False):
+            raise RuntimeError("死信回放正在进行中")
+
+        result = {'replayed': 0, 'failed': 0, 'kept': 0, 'segments': 0}
+        try:
+            with self._lock:
+                # 封存当前分段，回放期间的新死信写入新分段
+                self._close_active()
+                paths = sorted(self._segments)
+
+            for path in paths:
+                for record in self._read_segment(path):
+                    if reason and record.get('reason') != reason:
+                        self._append(record)
+                        result['kept'] += 1
+                        continue
+                    try:
+                        handler(record)
+                        result['replayed'] += 1
+                    except Exception as e:
+                        record['reason'] = getattr(e, 'reason', record['reason'])
+                        record['error'] = str(e)
+                        self._append(record)
+                        result['failed'] += 1
+
+                with self._lock:
+                    self._segments.pop(path, None)
+                os.remove(path)
+                result['segments'] += 1
+
+            self.stats['replayed'] += result['replayed']
+            self.stats['replay_failed'] += result['failed']
+            logger.info("死信回放完成: %s", result)
+            return result
+        finally:
+            self._replay_lock.release()
+
+    def counts_by_reason(self) -> Dict[str, int]:
+        """当前保存的死信按原因码计数"""
+        with self._lock:
+            total = Counter()
+            for segment in self._segments.values():
+                total.update(segment['reasons'])
+        return dict(total)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取死信队列统计信息"""
+        counts = self.counts_by_reason()
+        with self._lock:
+            total_bytes = sum(segment['size'] for segment in self._segments.values())
+            segment_count = len(self._segments)
+        return {
+            'enabled': self.enabled,
+            'directory': self.directory,
+            'pending': sum(counts.values()),
+            'by_reason': counts,
+            'segments': segment_count,
+            'bytes': total_bytes,
+            'replaying': self._replay_lock.locked(),
+            **self.stats
+        }
+
+    @staticmethod
+    def decode_raw(record: Dict[str, Any]) -> Optional[bytes]:
+        """取回无法解码时保存的原始负载字节"""
+        encoded = record.get('payload_b64')
+        return base64.b64decode(encoded) if encoded else None
+
+    def _append(self, record: Dict[str, Any]) -> bool:
+        """把一条记录写入当前分段，必要时轮转"""
+        line = (json.dumps(record, ensure_ascii=False, default=str) + '\n').encode('utf-8')
+        try:
+            with self._lock:
+                if self._file is None or self._segments[self._file.name]['size'] >= self.segment_max_bytes:
+                    self._rotate()
+                self._file.write(line)
+                self._file.flush()
+                segment = self._segments[self._file.name]
+                segment['size'] += len(line)
+                segment['reasons'][record['reason']] += 1
+                self.stats['written'] += 1
+                self._enforce_total_size()
+            return True
+        except OSError as e:
+            self.stats['write_errors'] += 1
+            logger.error("写入死信队列失败，消息丢失 [%s] %s: %s", record['reason'], record['topic'], e)
+            return False
+
+    def _load_segments(self):
+        """启动时加载上次运行遗留的分段并统计原因码"""
+        with self._lock:
+            self._segments = {}
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith(SEGMENT_SUFFIX):
+                    continue
+                path = os.path.join(self.directory, name)
+                reasons = Counter(record.get('reason') for record in self._read_segment(path))
+                self._segments[path] = {'size': os.path.getsize(path), 'reasons': reasons}
+            if self._segments:
+                logger.info("发现 %d 个死信分段，共 %d 条待回放",
+                            len(self._segments),
+                            sum(sum(s['reasons'].values()) for s in self._segments.values()))
+
+    def _read_segment(self, path: str):
+        """逐行读取分段，跳过写入中断导致的不完整行"""
+        try:
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        logger.warning("死信分段中存在损坏的记录，已跳过: %s", path)
+        except FileNotFoundError:
+            return
+
+    def _rotate(self):
+        """关闭当前分段并打开新分段（调用方需持有锁）"""
+        self._close_active()
+        self._seq += 1
+        path = os.path.join(self.directory, f"{int(time.time() * 1000):015d}-{self._seq:06d}{SEGMENT_SUFFIX}")
+        self._file = open(path, 'ab')
+        self._segments[path] = {'size': 0, 'reasons': Counter()}
+
+    def _close_active(self):
+        """封存当前分段（调用方需持有锁）"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _enforce_total_size(self):
+        """总大小超过上限时删除最旧的已封存分段（调用方需持有锁）"""
+        total = sum(segment['size'] for segment in self._segments.values())
+        active = self._file.name if self._file is not None else None
+        for path in sorted(self._segments):
+            if total <= self.max_total_bytes:
+                break
+            if path == active or self._replay_lock.locked():
+                break
+            segment = self._segments.pop(path)
+            total -= segment['size']
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.stats['segments_dropped'] += 1
+            self.stats['records_dropped'] += sum(segment['reasons'].values())
+            logger.error("死信队列超过容量上限，删除最旧分段: %s", path)
+
+
+# 全局死信队列实例
+dead_letter_store = DeadLetterStore()
@@ -0,0 +1,114 @@
+# backend/services/dedup_filter.py
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# 客户端可携带的消息ID字段（按优先级）
+MESSAGE_ID_FIELDS = ('msg_id', 'message_id', 'uuid', 'seq')
+
+
+class MessageDedupFilter:
+    """消息去重窗口 - 丢弃QoS1重连重投的重复消息
+
+    每条消息生成一个消息键：优先使用客户端提供的消息ID/序号，否则使用
+    client_id + 数据类型 + 传感器类型 + 设备时间戳 的哈希。没有消息ID也没有
+    设备时间戳的消息无法区分重投与新读数，不做去重。
+
+    已见过的键按首次出现顺序保存在有界有序字典中（按条目数和时间窗口淘汰），
+    检查和记录在同一把锁内完成，复杂度 O(1)，不访问数据库。
+    """
+
+    def __init__(self, max_entries: int = 100000, window_seconds: int = 900):
+        self.max_entries = max_entries
+        self.window_seconds = window_seconds
+        self.enabled = True
+        self._seen: 'OrderedDict[bytes, float]' = OrderedDict()  # key digest -> first_seen
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.checked = 0
+        self.duplicates = 0
+
+    def init_app(self, app):
+        """从应用配置读取去重参数"""
+        self.enabled = app.config.get('INGEST_DEDUP_ENABLED', self.enabled)
+        self.max_entries = app.config.get('INGEST_DEDUP_MAX_ENTRIES', self.max_entries)
+        self.window_seconds = app.config.get('INGEST_DEDUP_WINDOW_SECONDS', self.window_seconds)
+
+    @staticmethod
+    def message_key(topic: str, payload: Dict[str, Any]) -> Optional[str]:
+        """生成消息键，无法可靠识别的消息返回None"""
+        parts = topic.split('/')
+        if len(parts) < 3:
+            return None
+        client_id, data_type = parts[1], parts[2]
+
+        for field in MESSAGE_ID_FIELDS:
+            message_id = payload.get(field)
+            if message_id is not None and message_id != '':
+                return f"{client_id}|{data_type}|id:{message_id}"
+
+        timestamp = payload.get('timestamp')
+        if timestamp:
+            sensor_type = payload.get('sensor_type') or '*'
+            return f"{client_id}|{data_type}|{sensor_type}|ts:{timestamp}"
+        return None
+
+    def is_duplicate(self, topic: str, payload: Dict[str, Any]) -> bool:
+        """检查并记录消息，窗口内已出现过的消息返回True"""
+        if not self.enabled:
+            return False
+        key = self.message_key(topic, payload)
+        if key is None:
+            return False
+
+        # 固定16字节摘要，控制内存占用
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        now = time.monotonic()
+        with self._lock:
+            self.checked += 1
+            first_seen = self._seen.get(digest)
+            if first_seen is not None and now - first_seen < self.window_seconds:
+                self.duplicates += 1
+                return True
+
+            self._seen[digest] = now
+            self._seen.move_to_end(digest)
+            self._evict(now)
+        return False
+
+    def clear(self):
+        """清空去重窗口"""
+        with self._lock:
+            self._seen.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取去重统计信息"""
+        return {
+            'enabled': self.enabled,
+            'entries': len(self._seen),
+            'max_entries': self.max_entries,
+            'window_seconds': self.window_seconds,
+            'checked': self.checked,
+            'duplicates': self.duplicates
+        }
+
+    def _evict(self, now: float):
+        """淘汰超出条目上限或时间窗口的最旧条目（调用方需持有锁）"""
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+        cutoff = now - self.window_seconds
+        while self._seen:
+            oldest_key, first_seen = next(iter(self._seen.items()))
+            if first_seen >= cutoff:
+                break
+            del self._seen[oldest_key]
+
+
+# 全局去重过滤器实例
+dedup_filter = MessageDedupFilter()
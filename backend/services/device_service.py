@@ -1,11 +1,14 @@
 # backend/services/device_service.py
 from typing import List, Optional, Dict, Any
+from datetime import datetime, timedelta
 from models.device import Device
 from models.sensor import Sensor
 from models.reading import Reading
 from extensions import db
 from services.sensor_service import SensorService
 from services.reading_service import ReadingService
+from services.resolution_cache import resolution_cache
+from services.rollup_service import rollup_service
 import logging
 
 class DeviceService:
@@ -54,6 +57,7 @@ class DeviceService:
             )
             db.session.add(device)
             db.session.commit()
+            resolution_cache.invalidate_client(device.client_id)
             logging.info(f"Created device {device.id}: {name}")
             return device
         except Exception as e:
@@ -69,11 +73,15 @@ class DeviceService:
             if not device:
                 return None
             
+            old_client_id = device.client_id
             for key, value in kwargs.items():
                 if hasattr(device, key):
                     setattr(device, key, value)
             
             db.session.commit()
+            resolution_cache.invalidate_device(device_id)
+            resolution_cache.invalidate_client(old_client_id)
+            resolution_cache.invalidate_client(device.client_id)
             logging.info(f"Updated device {device_id}")
             return device
         except Exception as e:
@@ -91,6 +99,7 @@ class DeviceService:
             
             device.status = 'deleted'
             db.session.commit()
+            resolution_cache.invalidate_device(device_id)
             logging.info(f"Deleted device {device_id}")
             return True
         except Exception as e:
@@ -136,7 +145,7 @@ class DeviceService:
             overview = {
                 'device': device.to_dict(),
                 'sensors': [sensor.to_dict() for sensor in sensors],
-                'latest_readings': [reading.to_dict() for reading in latest_readings],
+                'latest_readings': latest_readings,
                 'statistics': {
                     'total_sensors': len(sensors),
                     'active_sensors': len([s for s in sensors if s.status == 'active']),
@@ -171,11 +180,29 @@ class DeviceService:
                 days=days
             )
             
-            # 获取传感器信息
+            # 获取传感器信息：数值传感器一次性由汇总表计算统计周期内的统计值
             sensors = SensorService.get_sensors_by_device(device_id)
+            end_time = datetime.utcnow()
+            summaries = rollup_service.summarize(
+                [sensor.id for sensor in sensors if not sensor.is_multimedia_sensor],
+                end_time - timedelta(days=days), end_time
+            )
             sensor_info = {}
             for sensor in sensors:
-                sensor_stats = SensorService.get_sensor_statistics(sensor.id)
+                summary = summaries.get(sensor.id)
+                if summary is None:
+                    sensor_stats = SensorService.get_sensor_statistics(sensor.id)
+                else:
+                    sensor_stats = {
+                        'sensor_id': sensor.id,
+                        'sensor_name': sensor.name,
+                        'sensor_type': sensor.type,
+                        'total_readings': summary['count'],
+                        'min_value': summary['min'],
+                        'max_value': summary['max'],
+                        'avg_value': summary['avg'],
+                        'latest_value': summary['last_value']
+                    }
                 sensor_info[sensor.id] = {
                     'sensor': sensor.to_dict(),
                     'statistics': sensor_stats
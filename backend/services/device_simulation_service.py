@@ -11,6 +11,7 @@ from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 
 from services.mqtt_service import mqtt_service
+from services.resolution_cache import resolution_cache
 from models.device import Device
 from models.sensor import Sensor
 from extensions import db
@@ -225,6 +226,7 @@ class DeviceSimulationService:
                 # 删除设备
                 db.session.delete(device)
                 db.session.commit()
+                resolution_cache.invalidate_device(device.id)
                 logger.info(f"设备数据库记录清理成功: {device_id}")
         except Exception as e:
             db.session.rollback()
@@ -243,6 +245,7 @@ class DeviceSimulationService:
                     sensor.is_active = False
                 
                 db.session.commit()
+                resolution_cache.invalidate_device(device.id)
                 logger.info(f"设备已停用: {device_id}")
         except Exception as e:
             db.session.rollback()
@@ -1,6 +1,8 @@
 # backend/services/forecast_service.py
 from models.reading import Reading
 from models.prediction import Prediction
+from services.archive_service import reading_archive
+from services.metrics import FORECAST_SECONDS
 from extensions import db
 from prophet import Prophet
 import pandas as pd
@@ -66,7 +68,10 @@ class ForecastService:
 
     @staticmethod
     def get_history(sensor_id, field='numeric_value', limit=200):
-        """获取传感器历史数据"""
+        """获取传感器历史数据（数值读数合并归档文件和数据库中的最近读数）"""
+        if field == 'numeric_value':
+            df = reading_archive.latest(sensor_id, limit)
+            return pd.DataFrame({'ds': df['timestamp'], 'y': df['value']})
         query = Reading.query.filter_by(sensor_id=sensor_id).order_by(Reading.timestamp.desc()).limit(limit)
         df = pd.DataFrame([
             {'ds': r.timestamp, 'y': getattr(r, field)}
@@ -90,6 +95,10 @@ class ForecastService:
         # 聚合所有传感器的数据
         all_data = []
         for sensor in sensors:
+            if field == 'numeric_value':
+                df = reading_archive.latest(sensor.id, limit)
+                all_data.extend({'ds': ts, 'y': value} for ts, value in zip(df['timestamp'], df['value']))
+                continue
             query = Reading.query.filter_by(sensor_id=sensor.id).order_by(Reading.timestamp.desc()).limit(limit)
             for r in query:
                 if getattr(r, field) is not None:
@@ -112,10 +121,11 @@ class ForecastService:
         if df.empty or len(df) < 10:
             return None, "历史数据不足，无法预测"
         df = df.sort_values('ds')
-        model = Prophet()
-        model.fit(df)
-        future = model.make_future_dataframe(periods=periods, freq=freq)
-        forecast = model.predict(future)
+        with FORECAST_SECONDS.time(scope='sensor'):
+            model = Prophet()
+            model.fit(df)
+            future = model.make_future_dataframe(periods=periods, freq=freq)
+            forecast = model.predict(future)
         # 只返回未来的预测
         forecast = forecast.tail(periods)
         result = [
@@ -196,10 +206,11 @@ class ForecastService:
         if df.empty or len(df) < 10:
             return None, "设备历史数据不足，无法预测"
         df = df.sort_values('ds')
-        model = Prophet()
-        model.fit(df)
-        future = model.make_future_dataframe(periods=periods, freq=freq)
-        forecast = model.predict(future)
+        with FORECAST_SECONDS.time(scope='device'):
+            model = Prophet()
+            model.fit(df)
+            future = model.make_future_dataframe(periods=periods, freq=freq)
+            forecast = model.predict(future)
         # 只返回未来的预测
         forecast = forecast.tail(periods)
         result = [
@@ -0,0 +1,420 @@
+# backend/services/ingest_journal.py
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Any, Optional, List, Tuple
+
+from sqlalchemy.exc import OperationalError, InterfaceError
+
+from services.dead_letter_store import dead_letter_store, REASON_DB_ERROR, REASON_INGEST_FAILED
+
+logger = logging.getLogger(__name__)
+
+# 记录帧头: 正文长度(uint32) + 正文CRC32(uint32)
+_FRAME_HEADER = struct.Struct('<II')
+# 记录正文: 主题长度(uint16) + 主题(UTF-8，含内容类型后缀) + 原始负载字节
+_TOPIC_HEADER = struct.Struct('<H')
+
+SEGMENT_SUFFIX = '.wal'
+CHECKPOINT_FILE = 'checkpoint.json'
+
+# 数据库连接类错误：保留日志并退避重试；其他错误视为数据问题，写入死信队列
+_RETRYABLE_ERRORS = (OperationalError, InterfaceError)
+
+
+class IngestJournal:
+    """入库写前日志 - 原始消息先追加到本地日志分段，再由后台应用线程解析并批量写入数据库
+
+    append() 只把主题和原始负载字节写入当前分段（不解码、不访问数据库），等待
+    同步线程的 fsync 覆盖该记录才返回，调用方在返回后才能确认消息；同步线程一次
+    fsync 覆盖期间所有线程追加的记录（组提交），fsync_interval_ms 大于0时先等待该
+    间隔收集更多记录。应用线程从检查点开始顺序读取已落盘的记录，由 resolver 把
+    原始消息解析为读数行（设备/传感器查询在这里进行），按批交给
+    ReadingBatchWriter.write_rows 写入数据库，成功后推进检查点并删除已完全应用的
+    分段。数据库不可用时应用线程退避重试，记录保留在磁盘上，不占用内存。
+
+    启动时先从检查点恢复：上次运行未应用的分段由同一个应用线程补写，写入
+    总是使用新分段。检查点在数据库提交之后写入，崩溃时最后一批可能被重复
+    写入（至少一次），启用 readings 唯一索引时重复行会被跳过。
+    """
+
+    def __init__(self, directory: str = './storage/ingest_journal',
+                 segment_max_bytes: int = 64 * 1024 * 1024,
+                 fsync_interval_ms: int = 0,
+                 apply_max_rows: int = 1000):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_interval_ms = fsync_interval_ms
+        self.apply_max_rows = apply_max_rows
+        self.running = False
+        self.writer = None
+        self.resolver = None
+
+        self._lock = threading.Condition()
+        self._apply_cond = threading.Condition()
+        self._file = None
+        self._file_size = 0
+        self._seq = 0
+        self._segments: List[str] = []           # 按顺序排列的分段路径（包括当前分段）
+        self._unsynced = 0                        # 已写入但未fsync的记录数
+        self._synced: Tuple[Optional[str], int] = (None, 0)  # 已落盘的位置
+        self._apply_pos: Tuple[Optional[str], int] = (None, 0)  # 检查点位置
+        self._sync_thread: Optional[threading.Thread] = None
+        self._apply_thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.stats = {
+            'appended': 0,
+            'fsyncs': 0,
+            'last_fsync_ms': 0.0,
+            'last_group_size': 0,
+            'applied_records': 0,
+            'applied_rows': 0,
+            'apply_batches': 0,
+            'apply_retries': 0,
+            'dead_lettered': 0,
+            'recovered_segments': 0,
+        }
+
+    def init_app(self, app):
+        """从应用配置读取日志参数"""
+        self.directory = app.config.get('INGEST_JOURNAL_DIR', self.directory)
+        self.segment_max_bytes = app.config.get('INGEST_JOURNAL_SEGMENT_MAX_BYTES', self.segment_max_bytes)
+        self.fsync_interval_ms = app.config.get('INGEST_JOURNAL_FSYNC_INTERVAL_MS', self.fsync_interval_ms)
+        self.apply_max_rows = app.config.get('INGEST_JOURNAL_APPLY_MAX_ROWS', self.apply_max_rows)
+
+    def start(self, writer, resolver: Callable[[str, bytes], List[Dict[str, Any]]]):
+        """恢复未应用的分段并启动同步线程和应用线程
+
+        resolver(topic, payload_bytes) 在应用线程中把原始消息解析为读数行；数据库连接类
+        错误向上抛出时整批退避重试，其他异常时该条消息写入死信队列。
+        """
+        if self.running:
+            return
+        self.writer = writer
+        self.resolver = resolver
+        os.makedirs(self.directory, exist_ok=True)
+        self._recover()
+
+        with self._lock:
+            self._open_segment()
+            self.running = True
+
+        self._sync_thread = threading.Thread(target=self._sync_loop, name='ingest-journal-sync', daemon=True)
+        self._apply_thread = threading.Thread(target=self._apply_loop, name='ingest-journal-apply', daemon=True)
+        self._sync_thread.start()
+        self._apply_thread.start()
+        logger.info("入库写前日志已启动: dir=%s, fsync_interval_ms=%s",
+                    self.directory, self.fsync_interval_ms)
+
+    def stop(self, timeout: float = 10.0):
+        """停止日志：最后一次fsync后等待应用线程处理完已落盘的记录"""
+        with self._lock:
+            if not self.running:
+                return
+            self.running = False
+            self._lock.notify_all()
+        if self._sync_thread:
+            self._sync_thread.join(timeout)
+            self._sync_thread = None
+
+        with self._apply_cond:
+            self._apply_cond.notify_all()
+        if self._apply_thread:
+            self._apply_thread.join(timeout)
+            self._apply_thread = None
+
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        logger.info("入库写前日志已停止")
+
+    def append(self, topic: str, payload_bytes: bytes):
+        """追加一条原始消息，fsync覆盖该记录后返回，不解码也不等待数据库
+
+        同步线程停止、记录无法确认落盘时抛出 RuntimeError。
+        """
+        topic_bytes = topic.encode('utf-8')
+        body = _TOPIC_HEADER.pack(len(topic_bytes)) + topic_bytes + payload_bytes
+        frame = _FRAME_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+        with self._lock:
+            if not self.running:
+                raise RuntimeError("写前日志未运行")
+            self._file.write(frame)
+            self._file_size += len(frame)
+            position = (self._file.name, self._file_size)
+            self._unsynced += 1
+            self.stats['appended'] += 1
+            if self._unsynced == 1:
+                self._lock.notify_all()
+
+            while not self._covers(position):
+                if not self._lock.wait(1.0) and not self._covers(position) \
+                        and not (self._sync_thread and self._sync_thread.is_alive()):
+                    raise RuntimeError("写前日志同步线程已停止，记录未确认落盘")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取写前日志统计信息"""
+        with self._lock:
+            segments = list(self._segments)
+            apply_path, apply_offset = self._apply_pos
+            unsynced = self._unsynced
+
+        backlog_bytes = 0
+        for path in segments:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            if apply_path is None or path > apply_path:
+                backlog_bytes += size
+            elif path == apply_path:
+                backlog_bytes += max(0, size - apply_offset)
+
+        return {
+            'running': self.running,
+            'directory': self.directory,
+            'segments': len(segments),
+            'unsynced_records': unsynced,
+            'backlog_bytes': backlog_bytes,
+            **self.stats
+        }
+
+    # ---- 同步线程 ----
+
+    def _sync_loop(self):
+        """组提交：等待一个间隔收集记录后统一fsync"""
+        interval = self.fsync_interval_ms / 1000.0
+        while True:
+            with self._lock:
+                while self.running and not self._unsynced:
+                    self._lock.wait()
+                stopping = not self.running
+                if stopping and not self._unsynced:
+                    break
+
+            if not stopping and interval:
+                time.sleep(interval)
+
+            started = time.monotonic()
+            with self._lock:
+                group = self._unsynced
+                self._unsynced = 0
+                self._file.flush()
+                fd = self._file.fileno()
+                position = (self._file.name, self._file_size)
+            os.fsync(fd)
+
+            with self._lock:
+                self._synced = position
+                self.stats['fsyncs'] += 1
+                self.stats['last_group_size'] = group
+                self.stats['last_fsync_ms'] = round((time.monotonic() - started) * 1000, 3)
+                if self._file_size >= self.segment_max_bytes:
+                    self._rotate()
+                self._lock.notify_all()
+
+            with self._apply_cond:
+                self._apply_cond.notify_all()
+
+            if stopping:
+                break
+
+    def _covers(self, position: Tuple[str, int]) -> bool:
+        """已落盘的位置是否覆盖 position（之后的分段说明该分段已在轮转时fsync；调用方需持有锁）"""
+        synced_path, synced_offset = self._synced
+        path, offset = position
+        return synced_path > path or (synced_path == path and synced_offset >= offset)
+
+    def _open_segment(self):
+        """打开新分段（调用方需持有锁）"""
+        self._seq += 1
+        path = os.path.join(self.directory, f"{int(time.time() * 1000):015d}-{self._seq:06d}{SEGMENT_SUFFIX}")
+        self._file = open(path, 'ab')
+        self._file_size = 0
+        self._segments.append(path)
+        self._synced = (path, 0)
+
+    def _rotate(self):
+        """封存当前分段并打开新分段（调用方需持有锁）"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._unsynced = 0
+        self._open_segment()
+
+    # ---- 应用线程 ----
+
+    def _apply_loop(self):
+        """顺序读取已落盘的记录并批量写入数据库"""
+        while True:
+            records, position = self._read_batch()
+            if not records:
+                if position != self._apply_pos:
+                    self._checkpoint(position)
+                if not self.running:
+                    break
+                with self._apply_cond:
+                    self._apply_cond.wait(1.0)
+                continue
+
+            if not self._apply_batch(records):
+                break
+            self._checkpoint(position)
+
+    def _read_batch(self) -> Tuple[List[Dict[str, Any]], Tuple[Optional[str], int]]:
+        """从检查点读取最多 apply_max_rows 条已落盘的记录（每条消息至少一行），返回 (记录, 新位置)"""
+        with self._lock:
+            segments = list(self._segments)
+            synced_path, synced_offset = self._synced
+        path, offset = self._apply_pos
+        if path is None and segments:
+            path, offset = segments[0], 0
+
+        records = []
+        while path is not None:
+            limit = synced_offset if path == synced_path else None
+            for record, end in self._read_frames(path, offset, limit):
+                records.append(record)
+                offset = end
+                if len(records) >= self.apply_max_rows:
+                    return records, (path, offset)
+
+            # 当前分段已读完；最新落盘的分段还会继续增长，停在这里
+            if path == synced_path:
+                break
+            later = [p for p in segments if p > path]
+            if not later:
+                break
+            path, offset = later[0], 0
+        return records, (path, offset)
+
+    def _apply_batch(self, records: List[Dict[str, Any]]) -> bool:
+        """解析并写入一批记录；数据库不可用时退避重试，返回False表示停止过程中放弃"""
+        rows: List[Dict[str, Any]] = []
+        delay = 0.5
+        while True:
+            try:
+                rows = self._resolve(records)
+                if rows:
+                    self.writer.write_rows(rows)
+                break
+            except _RETRYABLE_ERRORS as e:
+                if not self.running:
+                    logger.warning("停止时数据库不可用，%d 条记录保留在写前日志中", len(records))
+                    return False
+                self.stats['apply_retries'] += 1
+                logger.error("写前日志应用失败，%.1f秒后重试: %s", delay, e)
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+            except Exception as e:
+                for record in records:
+                    dead_letter_store.add(record['topic'], REASON_DB_ERROR,
+                                          raw=record['payload'], error=str(e))
+                self.stats['dead_lettered'] += len(records)
+                break
+
+        self.stats['applied_records'] += len(records)
+        self.stats['applied_rows'] += len(rows)
+        self.stats['apply_batches'] += 1
+        return True
+
+    def _resolve(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """把记录解析为读数行；每条记录只解析一次，重试时不重复解析已成功的记录"""
+        for record in records:
+            if 'rows' in record:
+                continue
+            try:
+                record['rows'] = self.resolver(record['topic'], record['payload'])
+            except _RETRYABLE_ERRORS:
+                raise
+            except Exception as e:
+                dead_letter_store.add(record['topic'], REASON_INGEST_FAILED, raw=record['payload'], error=str(e))
+                self.stats['dead_lettered'] += 1
+                record['rows'] = []
+        return [row for record in records for row in record['rows']]
+
+    def _read_frames(self, path: str, offset: int, limit: Optional[int] = None):
+        """从 offset 开始读取分段中的记录帧，遇到不完整或损坏的帧时停止"""
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                while limit is None or offset < limit:
+                    header = f.read(_FRAME_HEADER.size)
+                    if len(header) < _FRAME_HEADER.size:
+                        return
+                    length, crc = _FRAME_HEADER.unpack(header)
+                    body = f.read(length)
+                    if len(body) < length or zlib.crc32(body) != crc:
+                        logger.warning("写前日志分段末尾存在不完整的记录，已跳过: %s@%d", path, offset)
+                        return
+                    offset += _FRAME_HEADER.size + length
+                    (topic_length,) = _TOPIC_HEADER.unpack_from(body)
+                    topic_end = _TOPIC_HEADER.size + topic_length
+                    yield {'topic': body[_TOPIC_HEADER.size:topic_end].decode('utf-8'),
+                           'payload': body[topic_end:]}, offset
+        except FileNotFoundError:
+            return
+
+    def _checkpoint(self, position: Tuple[Optional[str], int]):
+        """原子写入检查点，并删除已完全应用的旧分段"""
+        path, offset = position
+        self._apply_pos = position
+        if path is None:
+            return
+
+        checkpoint = os.path.join(self.directory, CHECKPOINT_FILE)
+        tmp = checkpoint + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'segment': os.path.basename(path), 'offset': offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, checkpoint)
+
+        with self._lock:
+            applied = [p for p in self._segments if p < path]
+            self._segments = [p for p in self._segments if p >= path]
+        for old in applied:
+            try:
+                os.remove(old)
+            except OSError as e:
+                logger.warning("删除已应用的写前日志分段失败 %s: %s", old, e)
+
+    # ---- 崩溃恢复 ----
+
+    def _recover(self):
+        """加载检查点和上次运行遗留的分段"""
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        self._segments = [os.path.join(self.directory, name) for name in names]
+
+        checkpoint = os.path.join(self.directory, CHECKPOINT_FILE)
+        position = (None, 0)
+        if os.path.exists(checkpoint):
+            try:
+                with open(checkpoint, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                position = (os.path.join(self.directory, data['segment']), int(data['offset']))
+            except (ValueError, KeyError, OSError) as e:
+                logger.error("写前日志检查点损坏，从最早的分段开始恢复: %s", e)
+
+        # 检查点所在分段已被删除时，从其后的第一个分段开始
+        path, offset = position
+        if path is not None and path not in self._segments:
+            later = [p for p in self._segments if p > path]
+            position = (later[0], 0) if later else (None, 0)
+        self._apply_pos = position
+
+        pending = [p for p in self._segments if position[0] is None or p >= position[0]]
+        self.stats['recovered_segments'] = len(pending)
+        if pending:
+            logger.warning("写前日志恢复: %d 个分段待应用（检查点 %s）", len(pending), position)
+
+
+# 全局写前日志实例
+ingest_journal = IngestJournal()
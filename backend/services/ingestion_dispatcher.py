@@ -0,0 +1,368 @@
+# backend/services/ingestion_dispatcher.py
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Any, List, Optional, Callable
+
+from extensions import db
+from services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 背压策略
+POLICY_BLOCK = 'block'
+POLICY_DROP_OLDEST = 'drop_oldest'
+POLICY_SPILL = 'spill'
+BACKPRESSURE_POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_SPILL)
+
+# 溢出文件记录头: 接收时间戳(double) + 主题长度 + 负载长度
+_SPILL_HEADER = struct.Struct('>dII')
+
+
+class IngestionDispatcher:
+    """MQTT消息分发器 - 将paho网络线程与摄取处理解耦
+
+    paho回调只调用 dispatch() 把 (topic, payload bytes, receive_ts) 放入
+    有界队列，由工作线程池完成解码、入库和告警检查。消息按 client_id
+    分片到各工作线程的队列，保证同一设备的消息按顺序处理。调用 dispatch()
+    时的追踪span随消息入队，工作线程在该span的上下文中调用处理函数。
+
+    队列满时的背压策略：
+    - block: 阻塞网络线程直到有空位（超时后丢弃并计数）
+    - drop_oldest: 丢弃该分片中最旧的消息
+    - spill: 写入本地溢出文件，队列恢复后按顺序回放
+    """
+
+    def __init__(self, handler: Callable[[str, bytes, float], None]):
+        self.handler = handler
+        self.app = None
+        self.worker_count = 4
+        self.queue_maxsize = 10000
+        self.policy = POLICY_BLOCK
+        self.block_timeout = 5.0
+        self.spill_dir = './storage/mqtt_spill'
+        self.running = False
+
+        self._queues: List[queue.Queue] = []
+        self._workers: List[threading.Thread] = []
+        self._spill_lock = threading.Lock()
+        self._spill_file = None
+        self._spill_seq = 0
+        self._spill_backlog: List[str] = []
+        self._spill_thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'enqueued': 0,
+            'processed': 0,
+            'failed': 0,
+            'dropped': 0,
+            'spilled': 0,
+            'replayed': 0,
+            'max_depth': 0,
+            'last_wait_ms': 0.0,
+        }
+
+    def init_app(self, app):
+        """从应用配置读取线程池与背压参数"""
+        self.app = app
+        self.worker_count = max(1, app.config.get('MQTT_WORKER_COUNT', self.worker_count))
+        self.queue_maxsize = max(1, app.config.get('MQTT_QUEUE_MAXSIZE', self.queue_maxsize))
+        self.block_timeout = app.config.get('MQTT_DISPATCH_BLOCK_TIMEOUT', self.block_timeout)
+        self.spill_dir = app.config.get('MQTT_SPILL_DIR', self.spill_dir)
+
+        policy = app.config.get('MQTT_BACKPRESSURE_POLICY', self.policy)
+        if policy not in BACKPRESSURE_POLICIES:
+            logger.warning("未知的背压策略 %s，使用 %s", policy, POLICY_BLOCK)
+            policy = POLICY_BLOCK
+        self.policy = policy
+
+    def start(self):
+        """启动工作线程"""
+        if self.running:
+            return
+        self.running = True
+
+        # 每个分片的容量，总容量约为 queue_maxsize
+        shard_size = max(1, self.queue_maxsize // self.worker_count)
+        self._queues = [queue.Queue(maxsize=shard_size) for _ in range(self.worker_count)]
+        self._workers = []
+        for index in range(self.worker_count):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                args=(index,),
+                name=f'mqtt-ingest-{index}',
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+        if self.policy == POLICY_SPILL:
+            self._load_spill_backlog()
+            self._spill_thread = threading.Thread(target=self._spill_loop, name='mqtt-spill', daemon=True)
+            self._spill_thread.start()
+
+        logger.info("MQTT分发器已启动: workers=%s, queue_maxsize=%s, policy=%s",
+                    self.worker_count, self.queue_maxsize, self.policy)
+
+    def stop(self, timeout: float = 5.0):
+        """停止工作线程，已入队的消息会先处理完"""
+        if not self.running:
+            return
+        self.running = False
+        # 先停止回放，确保回放入队的消息都排在结束标记之前
+        if self._spill_thread:
+            self._spill_thread.join(timeout)
+            self._spill_thread = None
+        for q in self._queues:
+            q.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+        with self._spill_lock:
+            if self._spill_file:
+                self._spill_file.close()
+                self._spill_file = None
+        logger.info("MQTT分发器已停止")
+
+    def dispatch(self, topic: str, payload: bytes, receive_ts: Optional[float] = None):
+        """在paho网络线程中调用：只做入队，不做任何解码或IO（spill策略除外）"""
+        if receive_ts is None:
+            receive_ts = time.time()
+        item = (topic, payload, receive_ts, tracer.current())
+
+        # 溢出期间新消息继续写入溢出文件，保证回放顺序
+        if self.policy == POLICY_SPILL and self._is_spilling():
+            self._spill(item)
+            return
+
+        q = self._queues[self._shard(topic)]
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            if not self._handle_full(q, item):
+                return
+        self._record_enqueue()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取队列深度与处理统计"""
+        depths = [q.qsize() for q in self._queues]
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats.update({
+            'running': self.running,
+            'workers': self.worker_count,
+            'policy': self.policy,
+            'queue_maxsize': self.queue_maxsize,
+            'queue_depth': sum(depths),
+            'queue_depths': depths,
+            'spill_pending': self._is_spilling(),
+        })
+        return stats
+
+    def _shard(self, topic: str) -> int:
+        """按 client_id 选择分片，主题格式 sensors/{client_id}/{data_type}"""
+        parts = topic.split('/')
+        key = parts[1] if len(parts) > 1 else topic
+        return zlib.crc32(key.encode('utf-8')) % len(self._queues)
+
+    def _handle_full(self, q: queue.Queue, item: tuple) -> bool:
+        """队列已满时按策略处理，返回消息是否已进入队列"""
+        if self.policy == POLICY_DROP_OLDEST:
+            try:
+                q.get_nowait()
+                self._incr('dropped')
+            except queue.Empty:
+                pass
+            try:
+                q.put_nowait(item)
+                return True
+            except queue.Full:
+                self._incr('dropped')
+                return False
+
+        if self.policy == POLICY_SPILL:
+            self._spill(item)
+            return False
+
+        try:
+            q.put(item, timeout=self.block_timeout)
+            return True
+        except queue.Full:
+            self._incr('dropped')
+            logger.warning("MQTT分发队列持续已满，丢弃消息: %s", item[0])
+            return False
+
+    def _worker_loop(self, index: int):
+        """工作线程：在自己的应用上下文中处理分片队列"""
+        q = self._queues[index]
+        with self.app.app_context():
+            while True:
+                item = q.get()
+                if item is None:
+                    break
+                topic, payload, receive_ts, span = item
+                wait_ms = (time.time() - receive_ts) * 1000
+                try:
+                    with tracer.activate(span):
+                        self.handler(topic, payload, receive_ts)
+                    self._incr('processed', last_wait_ms=round(wait_ms, 2))
+                except Exception as e:
+                    self._incr('failed')
+                    logger.error("MQTT消息处理失败: %s", e)
+                finally:
+                    # 每条消息结束后释放会话，避免长事务持有连接
+                    db.session.remove()
+
+    def _record_enqueue(self):
+        depth = sum(q.qsize() for q in self._queues)
+        with self._stats_lock:
+            self.stats['enqueued'] += 1
+            if depth > self.stats['max_depth']:
+                self.stats['max_depth'] = depth
+
+    def _incr(self, key: str, **values):
+        with self._stats_lock:
+            self.stats[key] += 1
+            self.stats.update(values)
+
+    # ---- 溢出到磁盘 ----
+
+    def _is_spilling(self) -> bool:
+        with self._spill_lock:
+            return self._spill_file is not None or bool(self._spill_backlog)
+
+    def _load_spill_backlog(self):
+        """启动时加载上次运行遗留的溢出文件"""
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._spill_backlog = sorted(
+            os.path.join(self.spill_dir, name)
+            for name in os.listdir(self.spill_dir)
+            if name.endswith('.spill')
+        )
+        if self._spill_backlog:
+            logger.info("发现 %d 个待回放的溢出文件", len(self._spill_backlog))
+
+    def _spill(self, item: tuple):
+        """把消息追加到当前溢出文件"""
+        topic, payload, receive_ts = item[:3]
+        topic_bytes = topic.encode('utf-8')
+        try:
+            with self._spill_lock:
+                if self._spill_file is None:
+                    self._spill_seq += 1
+                    path = os.path.join(
+                        self.spill_dir, f"{int(time.time() * 1000):015d}-{self._spill_seq:06d}.spill"
+                    )
+                    self._spill_file = open(path, 'ab')
+                    logger.warning("MQTT分发队列已满，开始溢出到磁盘: %s", path)
+                self._spill_file.write(_SPILL_HEADER.pack(receive_ts, len(topic_bytes), len(payload)))
+                self._spill_file.write(topic_bytes)
+                self._spill_file.write(payload)
+            self._incr('spilled')
+        except OSError as e:
+            self._incr('dropped')
+            logger.error("写入溢出文件失败，丢弃消息: %s", e)
+
+    def _spill_loop(self):
+        """队列恢复后按顺序回放溢出文件"""
+        while self.running:
+            time.sleep(0.5)
+            if not self._has_capacity():
+                continue
+
+            with self._spill_lock:
+                # 切换到新文件，当前文件进入待回放列表
+                if self._spill_file is not None:
+                    self._spill_file.close()
+                    self._spill_backlog.append(self._spill_file.name)
+                    self._spill_file = None
+                if not self._spill_backlog:
+                    continue
+                path = self._spill_backlog[0]
+
+            if self._replay_file(path):
+                with self._spill_lock:
+                    self._spill_backlog.remove(path)
+
+    def _has_capacity(self) -> bool:
+        """所有分片都低于一半容量时才回放"""
+        return all(q.qsize() < q.maxsize // 2 for q in self._queues)
+
+    def _replay_file(self, path: str) -> bool:
+        """回放单个溢出文件，回放过程中阻塞等待队列空位；返回文件是否处理完毕
+
+        停机中断时把下一条未入队记录的偏移写入 <文件>.offset 并返回False，下次
+        启动从该偏移继续回放；已入队的消息在停机前处理完，不会重复回放。
+        """
+        offset_path = path + '.offset'
+        count = 0
+        try:
+            with open(path, 'rb') as f:
+                f.seek(self._read_replay_offset(offset_path))
+                while True:
+                    position = f.tell()
+                    header = f.read(_SPILL_HEADER.size)
+                    if len(header) < _SPILL_HEADER.size:
+                        break
+                    receive_ts, topic_len, payload_len = _SPILL_HEADER.unpack(header)
+                    topic_bytes = f.read(topic_len)
+                    payload = f.read(payload_len)
+                    if len(topic_bytes) < topic_len or len(payload) < payload_len:
+                        logger.warning("溢出文件末尾记录不完整，已跳过: %s", path)
+                        break
+                    topic = topic_bytes.decode('utf-8')
+                    if not self._replay_put((topic, payload, receive_ts, None)):
+                        # 停机中：记录偏移，下次启动时从这条记录继续回放
+                        self._write_replay_offset(offset_path, position)
+                        logger.info("分发器停止，溢出文件回放中断: %s (偏移 %d)", path, position)
+                        return False
+                    count += 1
+            os.remove(path)
+            if os.path.exists(offset_path):
+                os.remove(offset_path)
+            logger.info("溢出文件回放完成: %s, %d 条消息", path, count)
+            return True
+        except Exception as e:
+            # 损坏的文件改名保留在磁盘上供排查，不再重复回放
+            logger.error("溢出文件回放失败 %s: %s", path, e)
+            try:
+                os.replace(path, path + '.failed')
+            except OSError:
+                pass
+            return True
+        finally:
+            with self._stats_lock:
+                self.stats['replayed'] += count
+
+    def _replay_put(self, item: tuple) -> bool:
+        """阻塞等待分片队列空位，分发器停止时放弃并返回False"""
+        q = self._queues[self._shard(item[0])]
+        while self.running:
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @staticmethod
+    def _read_replay_offset(offset_path: str) -> int:
+        try:
+            with open(offset_path, 'r', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    @staticmethod
+    def _write_replay_offset(offset_path: str, position: int):
+        tmp_path = offset_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(str(position))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, offset_path)
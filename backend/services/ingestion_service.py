@@ -3,18 +3,34 @@ import json
 import logging
 import base64
 import hashlib
+import math
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 from pathlib import Path
 
+from sqlalchemy.exc import SQLAlchemyError
+
 from models.reading import Reading
+from models.numeric_reading import NumericReading
 from models.sensor import Sensor
 from models.device_template import DeviceTemplate
 from extensions import db
 from services.storage_service import StorageService
+from services.resolution_cache import resolution_cache
+from services.template_decoder import template_decoders, AGGREGATED_FIELD_MAPPING, QUALITY_GOOD
+from services.dead_letter_store import (
+    REASON_INVALID_PAYLOAD, REASON_UNKNOWN_DEVICE, REASON_UNKNOWN_SENSOR, REASON_DB_ERROR
+)
 
 logger = logging.getLogger(__name__)
 
+class IngestionRejected(Exception):
+    """消息无法入库，reason 为死信原因码"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
 
 class IngestionService:
     """数据摄取服务 - 处理MQTT消息并存储到数据库"""
@@ -56,24 +72,15 @@ class IngestionService:
                 return None
             
             # 查找对应的设备
-            from models.device import Device
-            device = Device.query.filter_by(
-                client_id=client_id,
-                is_active=True
-            ).first()
-            
-            if not device:
+            device_id = resolution_cache.get_device_id(client_id)
+            if device_id is None:
                 logger.warning("未找到启用的设备: client_id=%s", client_id)
                 return None
             
             # 查找对应的传感器
-            sensor = Sensor.query.filter_by(
-                device_id=device.id,
-                type=sensor_type
-            ).first()
-            
+            sensor = resolution_cache.get_sensor(client_id, sensor_type)
             if not sensor:
-                logger.warning("未找到传感器: device_id=%s, sensor_type=%s", device.id, sensor_type)
+                logger.warning("未找到传感器: device_id=%s, sensor_type=%s", device_id, sensor_type)
                 return None
             
             # 根据数据类型处理
@@ -123,17 +130,16 @@ class IngestionService:
                 logger.warning("未找到启用的设备: client_id=%s", client_id)
                 return None
             
-            # 获取设备模板以验证传感器类型
-            device_template = DeviceTemplate.get_by_device_type(device.type)
-            if not device_template:
+            # 使用编译好的模板解码器验证传感器类型，不再逐条查询模板
+            decoder = template_decoders.find(device.type)
+            if not decoder:
                 logger.warning("设备类型 %s 没有对应的模板", device.type)
                 return None
             
             # 验证传感器类型是否在设备模板中定义
-            if not device_template.validate_sensor_type(data_type):
-                allowed_types = [config['type'] for config in device_template.get_sensor_configs()]
+            if not decoder.has_sensor_type(data_type):
                 logger.warning("传感器类型 %s 不在设备 %s 的模板中，允许的类型: %s", 
-                             data_type, device.type, allowed_types)
+                             data_type, device.type, sorted(decoder.template_types))
                 return None
             
             # 尝试查找现有传感器
@@ -144,7 +150,8 @@ class IngestionService:
             
             if not sensor:
                 # 从设备模板获取传感器配置
-                sensor_configs = device_template.get_sensor_configs()
+                device_template = DeviceTemplate.get_by_device_type(device.type)
+                sensor_configs = device_template.get_sensor_configs() if device_template else []
                 sensor_template = next((config for config in sensor_configs 
                                       if config['type'] == data_type), None)
                 
@@ -169,6 +176,7 @@ class IngestionService:
                 
                 db.session.add(sensor)
                 db.session.commit()
+                resolution_cache.invalidate_device(device.id)
                 logger.info("为设备 %s 创建新传感器: %s", device.name, sensor.name)
             
             return sensor
@@ -209,75 +217,50 @@ class IngestionService:
             
             # 处理温度数据
             if 'temperature' in data:
-                temp_reading = Reading.create_numeric(
+                temp_reading = NumericReading.create_numeric(
                     sensor_id=sensor.id,
                     value=data['temperature'],
-                    unit=data.get('temperature_unit', '°C'),
-                    timestamp=timestamp,
-                    metadata={
-                        'client_id': payload.get('client_id'),
-                        'data_type': 'temperature'
-                    }
+                    timestamp=timestamp
                 )
                 db.session.add(temp_reading)
                 created_readings.append(temp_reading)
             
             # 处理湿度数据
             if 'humidity' in data:
-                humidity_reading = Reading.create_numeric(
+                humidity_reading = NumericReading.create_numeric(
                     sensor_id=sensor.id,
                     value=data['humidity'],
-                    unit=data.get('humidity_unit', '%'),
-                    timestamp=timestamp,
-                    metadata={
-                        'client_id': payload.get('client_id'),
-                        'data_type': 'humidity'
-                    }
+                    timestamp=timestamp
                 )
                 db.session.add(humidity_reading)
                 created_readings.append(humidity_reading)
             
             # 处理光照数据
             if 'light' in data:
-                light_reading = Reading.create_numeric(
+                light_reading = NumericReading.create_numeric(
                     sensor_id=sensor.id,
                     value=data['light'],
-                    unit=data.get('light_unit', 'lux'),
-                    timestamp=timestamp,
-                    metadata={
-                        'client_id': payload.get('client_id'),
-                        'data_type': 'light'
-                    }
+                    timestamp=timestamp
                 )
                 db.session.add(light_reading)
                 created_readings.append(light_reading)
             
             # 处理PH值数据
             if 'ph' in data:
-                ph_reading = Reading.create_numeric(
+                ph_reading = NumericReading.create_numeric(
                     sensor_id=sensor.id,
                     value=data['ph'],
-                    unit=data.get('ph_unit', 'pH'),
-                    timestamp=timestamp,
-                    metadata={
-                        'client_id': payload.get('client_id'),
-                        'data_type': 'ph'
-                    }
+                    timestamp=timestamp
                 )
                 db.session.add(ph_reading)
                 created_readings.append(ph_reading)
             
             # 处理土壤湿度数据
             if 'moisture' in data:
-                moisture_reading = Reading.create_numeric(
+                moisture_reading = NumericReading.create_numeric(
                     sensor_id=sensor.id,
                     value=data['moisture'],
-                    unit=data.get('moisture_unit', '%'),
-                    timestamp=timestamp,
-                    metadata={
-                        'client_id': payload.get('client_id'),
-                        'data_type': 'moisture'
-                    }
+                    timestamp=timestamp
                 )
                 db.session.add(moisture_reading)
                 created_readings.append(moisture_reading)
@@ -439,6 +422,71 @@ class IngestionService:
             db.session.rollback()
             return None
     
+    def ingest_media_file(self, client_id: str, file_path: str, manifest: Dict[str, Any]) -> Optional[Reading]:
+        """存储分块上传组装完成的媒体文件并创建文件型读数"""
+        try:
+            data_type = manifest.get('data_type', 'image')
+            sensor_type = manifest.get('sensor_type') or data_type
+
+            sensor = resolution_cache.get_sensor(client_id, sensor_type)
+            if not sensor:
+                logger.warning("未找到传感器: client_id=%s, sensor_type=%s", client_id, sensor_type)
+                return None
+
+            timestamp = self._parse_timestamp(manifest.get('timestamp'))
+            file_format = manifest.get('format', 'mp4' if data_type == 'video' else 'jpg')
+
+            storage_result = self.storage_service.store_local_file(
+                file_path=file_path,
+                data_type=data_type,
+                device_id=str(sensor.device_id),
+                sensor_id=str(sensor.id),
+                file_format=file_format,
+                content_type=f"{data_type}/{file_format}",
+                metadata={
+                    'timestamp': timestamp.isoformat(),
+                    'hash': manifest.get('sha256'),
+                    'client_id': client_id
+                }
+            )
+
+            if not storage_result:
+                logger.error("媒体文件存储失败: %s", file_path)
+                return None
+
+            reading = Reading.create_file(
+                sensor_id=sensor.id,
+                data_type=data_type,
+                file_path=storage_result.get('file_path'),
+                file_size=storage_result.get('file_size'),
+                file_format=file_format,
+                bucket_name=storage_result.get('bucket_name'),
+                object_key=storage_result.get('object_key'),
+                object_url=storage_result.get('object_url'),
+                object_etag=storage_result.get('object_etag'),
+                storage_backend=storage_result.get('storage_backend', 'local'),
+                timestamp=timestamp,
+                metadata={
+                    'client_id': client_id,
+                    'hash': manifest.get('sha256'),
+                    'encoding': 'chunked',
+                    'upload_id': manifest.get('upload_id'),
+                    **(manifest.get('metadata') or {})
+                }
+            )
+
+            db.session.add(reading)
+            db.session.commit()
+
+            logger.info("媒体数据存储成功: 传感器ID=%s, 类型=%s, 大小=%s",
+                        sensor.id, data_type, storage_result.get('file_size'))
+            return reading
+
+        except Exception as e:
+            logger.error(f"媒体数据处理失败: {e}")
+            db.session.rollback()
+            return None
+
     def _process_single_sensor_data(self, sensor: Sensor, payload: Dict[str, Any]) -> Optional[Reading]:
         """处理单个传感器的数值数据"""
         try:
@@ -448,8 +496,8 @@ class IngestionService:
                 logger.error("payload中缺少value字段: %s", payload)
                 return None
             
-            # 获取单位
-            unit = payload.get('unit', sensor.unit or '')
+            # 窄表不存单位，读数单位以传感器行为准
+            unit = sensor.unit or ''
             
             # 解析时间戳
             timestamp_str = payload.get('timestamp')
@@ -462,16 +510,10 @@ class IngestionService:
                 timestamp = datetime.utcnow()
             
             # 创建读数记录
-            reading = Reading.create_numeric(
+            reading = NumericReading.create_numeric(
                 sensor_id=sensor.id,
                 value=float(value),
-                unit=unit,
-                timestamp=timestamp,
-                metadata={
-                    'client_id': payload.get('client_id'),
-                    'sensor_type': payload.get('sensor_type'),
-                    'sensor_name': payload.get('sensor_name')
-                }
+                timestamp=timestamp
             )
             
             db.session.add(reading)
@@ -501,37 +543,18 @@ class IngestionService:
             data_type = topic_info['data_type']  # 应该是 'numeric'
             
             # 查找对应的设备
-            from models.device import Device
-            device = Device.query.filter_by(
-                client_id=client_id,
-                is_active=True
-            ).first()
-            
-            if not device:
+            device_id = resolution_cache.get_device_id(client_id)
+            if device_id is None:
                 logger.warning("未找到启用的设备: client_id=%s", client_id)
                 return readings
             
-            # 定义传感器类型映射（从payload字段名到传感器类型）
-            sensor_type_mapping = {
-                'temperature': 'temperature',
-                'humidity': 'humidity', 
-                'light': 'light',
-                'ph': 'soil_ph',
-                'moisture': 'soil_moisture',
-                'pressure': 'pressure',
-                'wind_speed': 'wind_speed'
-            }
-            
             # 为每个传感器数据创建读数
             for field_name, value in payload.items():
-                if field_name in sensor_type_mapping and isinstance(value, (int, float)):
-                    sensor_type = sensor_type_mapping[field_name]
+                if field_name in AGGREGATED_FIELD_MAPPING and isinstance(value, (int, float)):
+                    sensor_type = AGGREGATED_FIELD_MAPPING[field_name]
                     
                     # 查找对应的传感器
-                    sensor = Sensor.query.filter_by(
-                        device_id=device.id,
-                        type=sensor_type
-                    ).first()
+                    sensor = resolution_cache.get_sensor(client_id, sensor_type)
                     
                     if sensor:
                         # 创建读数
@@ -544,7 +567,7 @@ class IngestionService:
                             readings.append(reading)
                             logger.info("创建传感器读数: %s = %s %s", sensor.name, value, sensor.unit)
                     else:
-                        logger.warning("未找到传感器: device_id=%s, sensor_type=%s", device.id, sensor_type)
+                        logger.warning("未找到传感器: device_id=%s, sensor_type=%s", device_id, sensor_type)
             
             if readings:
                 db.session.commit()
@@ -559,6 +582,97 @@ class IngestionService:
             logger.error("完整错误信息: %s", traceback.format_exc())
             return readings
     
+    def build_numeric_rows(self, topic: str, payload: Dict[str, Any],
+                           aggregated: bool = False) -> List[Dict[str, Any]]:
+        """将数值型MQTT消息解析为待批量写入的读数行（不提交事务）
+
+        返回的行可直接交给 ReadingBatchWriter（写入 numeric_readings 表）。
+        整条消息无法入库时抛出 IngestionRejected，由调用方写入死信队列。
+        """
+        try:
+            topic_info = self._parse_topic(topic)
+            if not topic_info:
+                raise IngestionRejected(REASON_INVALID_PAYLOAD, f"无效的主题格式: {topic}")
+
+            client_id = topic_info['client_id']
+
+            device = resolution_cache.get_device(client_id)
+            if device is None:
+                raise IngestionRejected(REASON_UNKNOWN_DEVICE, f"未找到启用的设备: client_id={client_id}")
+            device_id = device.id
+
+            timestamp = self._parse_timestamp(payload.get('timestamp'))
+
+            # 按设备模板一次完成字段映射和范围校验
+            decoder = template_decoders.get(device.type)
+            if aggregated:
+                fields = list(decoder.decode(payload))
+            else:
+                sensor_type = payload.get('sensor_type')
+                if not sensor_type:
+                    raise IngestionRejected(REASON_INVALID_PAYLOAD, "payload中缺少sensor_type字段")
+                if payload.get('value') is None:
+                    raise IngestionRejected(REASON_INVALID_PAYLOAD, "payload中缺少value字段")
+                value = float(payload['value'])
+                if not math.isfinite(value):
+                    raise IngestionRejected(REASON_INVALID_PAYLOAD, f"数值无效: {payload['value']}")
+                fields = [(sensor_type, value, decoder.check(sensor_type, value))]
+
+            if not fields:
+                raise IngestionRejected(REASON_INVALID_PAYLOAD, "payload中没有可识别的数值字段")
+
+            rows = []
+            for sensor_type, value, quality in fields:
+                sensor = resolution_cache.get_sensor(client_id, sensor_type)
+                if not sensor:
+                    logger.warning("未找到传感器: device_id=%s, sensor_type=%s", device_id, sensor_type)
+                    continue
+
+                # 单位和客户端/传感器信息由传感器行提供，不再随每条读数重复存储
+                rows.append(self._make_numeric_row(
+                    sensor_id=sensor.id,
+                    value=value,
+                    timestamp=timestamp,
+                    quality=quality
+                ))
+
+            # 聚合消息中部分传感器未注册时只写入已知的部分
+            if not rows:
+                raise IngestionRejected(
+                    REASON_UNKNOWN_SENSOR,
+                    f"未找到传感器: client_id={client_id}, sensor_type={[f[0] for f in fields]}"
+                )
+            return rows
+
+        except IngestionRejected:
+            raise
+        except SQLAlchemyError as e:
+            raise IngestionRejected(REASON_DB_ERROR, f"解析设备/传感器失败: {e}")
+        except Exception as e:
+            raise IngestionRejected(REASON_INVALID_PAYLOAD, f"数值消息解析失败: {e}")
+
+    @staticmethod
+    def _make_numeric_row(sensor_id: int, value, timestamp: datetime,
+                          quality: str = QUALITY_GOOD) -> Dict[str, Any]:
+        """构造数值型读数行数据，由批量写入器写入 numeric_readings 表"""
+        return {
+            'sensor_id': sensor_id,
+            'timestamp': timestamp,
+            'data_type': 'numeric',
+            'numeric_value': float(value),
+            'quality': quality
+        }
+
+    @staticmethod
+    def _parse_timestamp(timestamp_str: Optional[str]) -> datetime:
+        """解析ISO时间戳，缺失或格式错误时使用当前时间"""
+        if timestamp_str:
+            try:
+                return datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+            except (ValueError, AttributeError):
+                pass
+        return datetime.utcnow()
+
     @staticmethod
     def get_latest_reading(device_id):
         """获取最新读数（向后兼容）"""
@@ -567,6 +681,10 @@ class IngestionService:
     @staticmethod
     def get_latest_readings_by_type(sensor_id: int, data_type: str, limit: int = 10):
         """根据类型获取最新读数"""
+        if data_type == 'numeric':
+            return NumericReading.query.filter_by(
+                sensor_id=sensor_id
+            ).order_by(NumericReading.timestamp.desc()).limit(limit).all()
         return Reading.query.filter_by(
             sensor_id=sensor_id,
             data_type=data_type
@@ -0,0 +1,307 @@
+# backend/services/latest_cache.py
+import json
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, List, Iterable
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import object_session
+
+from models.numeric_reading import NumericReading, QUALITY_LABELS
+from models.reading import Reading
+from models.sensor import Sensor
+from extensions import db
+from utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+# 会话中等待提交后写入缓存的读数 / 需要失效的传感器
+_PENDING_KEY = 'latest_cache_pending'
+_DELETED_KEY = 'latest_cache_deleted'
+
+# 批量写入 {传感器ID: 读数}，只有时间戳不早于已缓存值时才覆盖（乱序到达的旧读数不会回退缓存）
+_PUT_SCRIPT = """
+for i = 1, #ARGV, 3 do
+    local current = redis.call('HGET', KEYS[2], ARGV[i])
+    if not current or tonumber(current) <= tonumber(ARGV[i + 1]) then
+        redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 2])
+    end
+end
+return 0
+"""
+
+
+def _naive_utc(ts: datetime) -> datetime:
+    """带时区的时间戳转换为不带时区的UTC时间（与数据库DATETIME列一致）"""
+    if ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _epoch_ms(ts: datetime) -> int:
+    return (_naive_utc(ts) - _EPOCH) // timedelta(milliseconds=1)
+
+
+def _numeric_payload(reading_id, sensor_id, timestamp, value, quality) -> Dict[str, Any]:
+    """数值读数的缓存内容，与 NumericReading.to_dict 一致（单位在读取时取自传感器）"""
+    return {
+        'id': reading_id,
+        'sensor_id': sensor_id,
+        'timestamp': _naive_utc(timestamp).isoformat(),
+        'data_type': 'numeric',
+        'created_at': None,
+        'value': value,
+        'quality': quality,
+    }
+
+
+def _reading_payload(reading) -> Dict[str, Any]:
+    """ORM 读数对象转换为缓存内容"""
+    if isinstance(reading, NumericReading):
+        return _numeric_payload(reading.id, reading.sensor_id, reading.timestamp, reading.value,
+                                QUALITY_LABELS.get(reading.quality_code, 'good'))
+    payload = reading.to_dict()
+    payload['timestamp'] = _naive_utc(reading.timestamp).isoformat()
+    return payload
+
+
+class LatestValueCache:
+    """传感器最新读数缓存 - 每个传感器一条，按传感器ID直接查找
+
+    "最新读数"被设备详情、传感器卡片、LLM上下文和系统诊断频繁请求，
+    原先每个传感器一次 ORDER BY timestamp DESC LIMIT 1 查询。该缓存
+    在写入时更新（write-through）：
+
+      - 批量写入器提交后通过刷新监听器写入新读数；
+      - 其余通过 ORM 写入的读数（HTTP接口、多媒体读数等）在会话提交后写入，
+        删除读数后使对应传感器的条目失效；
+      - 读取未命中（冷启动、失效）时一次分组查询加载所有缺失的传感器并回填。
+
+    Redis 可用时存放在两个哈希中（{prefix}: 读数JSON，{prefix}:ts: 毫秒时间戳），
+    多个进程共享；不可用时退回进程内字典，只能看到本进程的写入，多进程部署应配置 Redis。
+    """
+
+    def __init__(self, key_prefix: str = 'agrinex:latest'):
+        self.enabled = True
+        self.key_prefix = key_prefix
+        self.redis = None
+        self._put_script = None
+        self._entries: Dict[int, tuple] = {}  # 传感器ID -> (毫秒时间戳, 读数)
+        self._lock = threading.Lock()
+        self._redis_stale = False
+        self._listening = False
+
+        # 统计信息
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'loaded': 0,
+            'updates': 0,
+            'invalidations': 0,
+            'redis_errors': 0,
+        }
+
+    def init_app(self, app, writer=None):
+        """读取配置，连接 Redis，并注册到批量写入器和 ORM 会话事件"""
+        self.enabled = app.config.get('LATEST_CACHE_ENABLED', self.enabled)
+        self.key_prefix = app.config.get('LATEST_CACHE_KEY_PREFIX', self.key_prefix)
+        if not self.enabled:
+            return
+
+        if app.config.get('LATEST_CACHE_BACKEND', 'redis') == 'redis':
+            if redis_client.client is None:
+                redis_client.init_app(app)
+            self.redis = redis_client.client
+            if self.redis is not None:
+                self._put_script = self.redis.register_script(_PUT_SCRIPT)
+        if self.redis is None:
+            logger.info("最新读数缓存使用进程内存储")
+
+        if writer is not None:
+            writer.add_flush_listener(self.on_rows_written)
+        if not self._listening:
+            for model in (NumericReading, Reading):
+                event.listen(model, 'after_insert', self._on_insert)
+                event.listen(model, 'after_delete', self._on_delete)
+            event.listen(db.session, 'after_commit', self._on_commit)
+            event.listen(db.session, 'after_rollback', self._on_rollback)
+            self._listening = True
+
+    # ---- 写入 ----
+
+    def on_rows_written(self, rows: List[Dict[str, Any]]):
+        """批量写入器刷新监听器：行数据与 Reading 字段一致，均为已提交的数值读数"""
+        self.put_many(
+            _numeric_payload(row['id'], row['sensor_id'], row['timestamp'],
+                             row['numeric_value'], row.get('quality') or 'good')
+            for row in rows
+        )
+
+    def put_many(self, payloads: Iterable[Dict[str, Any]]):
+        """写入一批读数，每个传感器只保留时间戳最新的一条"""
+        if not self.enabled:
+            return
+        newest: Dict[int, tuple] = {}
+        for payload in payloads:
+            ts = _epoch_ms(datetime.fromisoformat(payload['timestamp']))
+            current = newest.get(payload['sensor_id'])
+            if current is None or ts >= current[0]:
+                newest[payload['sensor_id']] = (ts, payload)
+        if not newest:
+            return
+
+        self.stats['updates'] += len(newest)
+        if self.redis is not None:
+            args = []
+            for sensor_id, (ts, payload) in newest.items():
+                args.extend((sensor_id, ts, json.dumps(payload)))
+            if self._redis_call(lambda: self._put_script(keys=self._keys(), args=args)) is not None:
+                return
+
+        with self._lock:
+            for sensor_id, (ts, payload) in newest.items():
+                current = self._entries.get(sensor_id)
+                if current is None or ts >= current[0]:
+                    self._entries[sensor_id] = (ts, payload)
+
+    def invalidate(self, sensor_ids: Iterable[int]):
+        """删除传感器的缓存条目（下次读取时从数据库重新加载）"""
+        sensor_ids = list(sensor_ids)
+        if not sensor_ids:
+            return
+        self.stats['invalidations'] += len(sensor_ids)
+        if self.redis is not None:
+            self._redis_call(lambda: [self.redis.hdel(key, *sensor_ids) for key in self._keys()])
+        with self._lock:
+            for sensor_id in sensor_ids:
+                self._entries.pop(sensor_id, None)
+
+    def clear(self):
+        """清空缓存"""
+        if self.redis is not None:
+            self._redis_call(lambda: self.redis.delete(*self._keys()))
+        with self._lock:
+            self._entries.clear()
+
+    # ---- 读取 ----
+
+    def get(self, sensor: Sensor) -> Optional[Dict[str, Any]]:
+        """获取单个传感器的最新读数（to_dict 结构），没有读数返回None"""
+        return self.get_many([sensor]).get(sensor.id)
+
+    def get_many(self, sensors: List[Sensor]) -> Dict[int, Dict[str, Any]]:
+        """获取多个传感器的最新读数：一次缓存查找，未命中的传感器一次分组查询加载"""
+        if not sensors:
+            return {}
+        sensor_ids = [sensor.id for sensor in sensors]
+        found = self._lookup(sensor_ids) if self.enabled else {}
+        self.stats['hits'] += len(found)
+
+        missing = [sensor for sensor in sensors if sensor.id not in found]
+        if missing:
+            self.stats['misses'] += len(missing)
+            loaded = self._load(missing)
+            self.stats['loaded'] += len(loaded)
+            self.put_many(loaded.values())
+            found.update(loaded)
+
+        units = {sensor.id: sensor.unit for sensor in sensors}
+        result = {}
+        for sensor_id in sensor_ids:
+            payload = found.get(sensor_id)
+            if payload is not None:
+                if payload['data_type'] == 'numeric':
+                    payload = dict(payload, unit=units[sensor_id])
+                result[sensor_id] = payload
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        total = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'backend': 'redis' if self.redis is not None else 'memory',
+            'entries': len(self._entries) if self.redis is None else None,
+            'hit_rate': round(self.stats['hits'] / total, 4) if total else 0.0
+        }
+
+    def _lookup(self, sensor_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        if self.redis is not None:
+            values = self._redis_call(lambda: self.redis.hmget(self._keys()[0], sensor_ids))
+            if values is not None:
+                return {sensor_id: json.loads(value) for sensor_id, value in zip(sensor_ids, values) if value}
+        with self._lock:
+            return {sensor_id: self._entries[sensor_id][1] for sensor_id in sensor_ids if sensor_id in self._entries}
+
+    def _load(self, sensors: List[Sensor]) -> Dict[int, Dict[str, Any]]:
+        """从数据库加载传感器的最新读数：每个读数表一次 (传感器, 最大时间戳) 分组查询"""
+        media_ids = [sensor.id for sensor in sensors if sensor.is_multimedia_sensor]
+        numeric_ids = [sensor.id for sensor in sensors if not sensor.is_multimedia_sensor]
+        loaded = {}
+        for model, sensor_ids in ((NumericReading, numeric_ids), (Reading, media_ids)):
+            if not sensor_ids:
+                continue
+            newest = db.session.query(
+                model.sensor_id.label('sensor_id'), func.max(model.timestamp).label('timestamp')
+            ).filter(model.sensor_id.in_(sensor_ids)).group_by(model.sensor_id).subquery()
+            readings = model.query.join(
+                newest, (model.sensor_id == newest.c.sensor_id) & (model.timestamp == newest.c.timestamp)
+            ).order_by(model.id).all()
+            # 同一时间戳有多条读数时取ID最大的一条
+            for reading in readings:
+                loaded[reading.sensor_id] = _reading_payload(reading)
+        return loaded
+
+    def _keys(self) -> List[str]:
+        return [self.key_prefix, f'{self.key_prefix}:ts']
+
+    def _redis_call(self, operation):
+        """执行 Redis 操作，失败时返回None（调用方退回进程内存储）
+
+        写入失败后 Redis 中的条目可能落后于数据库，恢复后的第一次操作先清空缓存。
+        """
+        try:
+            if self._redis_stale:
+                self.redis.delete(*self._keys())
+                self._redis_stale = False
+            return operation()
+        except Exception as e:
+            self.stats['redis_errors'] += 1
+            self._redis_stale = True
+            logger.warning("最新读数缓存访问Redis失败，退回进程内存储: %s", e)
+            return None
+
+    # ---- ORM 会话事件 ----
+
+    def _on_insert(self, mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault(_PENDING_KEY, []).append(_reading_payload(target))
+
+    def _on_delete(self, mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault(_DELETED_KEY, set()).add(target.sensor_id)
+
+    def _on_commit(self, session):
+        payloads = session.info.pop(_PENDING_KEY, None)
+        deleted = session.info.pop(_DELETED_KEY, None)
+        try:
+            if payloads:
+                self.put_many(payloads)
+            if deleted:
+                self.invalidate(deleted)
+        except Exception as e:
+            logger.error("更新最新读数缓存失败: %s", e)
+
+    def _on_rollback(self, session):
+        session.info.pop(_PENDING_KEY, None)
+        session.info.pop(_DELETED_KEY, None)
+
+
+# 全局最新读数缓存实例
+latest_cache = LatestValueCache()
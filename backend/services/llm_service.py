@@ -703,33 +703,26 @@ class LLMService:
             
             for sensor_data in sensors_data:
                 sensor = sensor_data['sensor']
-                readings = sensor_data['readings']
+                stats = sensor_data['summary']
                 
-                if not readings:
+                if not stats['count']:
                     continue
                 
-                values = [r.numeric_value for r in readings if r.numeric_value is not None]
-                if not values:
-                    continue
-                
-                report += f"📊 {sensor.name} ({sensor.sensor_type})\n"
-                report += f"   数据点数: {len(values)}\n"
-                report += f"   平均值: {statistics.mean(values):.2f} {sensor.unit}\n"
-                report += f"   最小值: {min(values):.2f} {sensor.unit}\n"
-                report += f"   最大值: {max(values):.2f} {sensor.unit}\n\n"
+                report += f"📊 {sensor.name} ({sensor.type})\n"
+                report += f"   数据点数: {stats['count']}\n"
+                report += f"   平均值: {stats['avg']:.2f} {sensor.unit}\n"
+                report += f"   最小值: {stats['min']:.2f} {sensor.unit}\n"
+                report += f"   最大值: {stats['max']:.2f} {sensor.unit}\n\n"
                 
                 # 数据质量评估
-                if len(values) < 10:
+                if stats['count'] < 10:
                     summary.append(f"{sensor.name}数据点较少，建议检查传感器连接")
                 
-                # 异常值检测
-                avg_val = statistics.mean(values)
-                if len(values) > 1:
-                    std_dev = statistics.stdev(values)
-                    outliers = [v for v in values if abs(v - avg_val) > 2 * std_dev]
-                    if outliers:
-                        summary.append(f"{sensor.name}检测到{len(outliers)}个异常值")
-                        recommendations.append(f"检查{sensor.name}的异常数据")
+                # 异常值检测（偏离均值超过2倍标准差的读数数量）
+                outliers = sensor_data.get('outliers', 0)
+                if outliers:
+                    summary.append(f"{sensor.name}检测到{outliers}个异常值")
+                    recommendations.append(f"检查{sensor.name}的异常数据")
             
             # 系统总结
             report += "📈 报告总结:\n"
@@ -0,0 +1,438 @@
+# backend/services/media_upload_service.py
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+from services.ingestion_service import IngestionService
+
+logger = logging.getLogger(__name__)
+
+# 主题格式: sensors/{client_id}/media/{upload_id}/{init|chunk/{index}|commit}
+# 后端回复: sensors/{client_id}/media/{upload_id}/status
+MEDIA_TOPIC_FILTERS = (
+    'sensors/+/media/+/init',
+    'sensors/+/media/+/chunk/+',
+    'sensors/+/media/+/commit',
+)
+
+STATE_RECEIVING = 'receiving'
+STATE_INCOMPLETE = 'incomplete'
+STATE_COMMITTED = 'committed'
+STATE_FAILED = 'failed'
+STATE_UNKNOWN = 'unknown'
+
+# client_id / upload_id 会出现在文件名中，只允许安全字符
+_SAFE_ID = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+# 状态回复中最多列出的缺失块数量
+MAX_MISSING_REPORTED = 256
+
+# 提交标记超过该时长视为持有者已崩溃，可被其他实例接管
+COMMIT_CLAIM_TIMEOUT = 3600
+
+
+class MediaUploadService:
+    """分块媒体上传服务 - 图像/视频按固定大小分块经MQTT传输
+
+    设备先发送 init（文件大小、块大小、sha256等清单），然后逐块发送原始
+    字节（不再base64编码），最后发送 commit。每个块按偏移直接写入磁盘上的
+    临时文件，并在位图文件中记录已收到的块，整个过程不在内存中保存完整文件。
+    提交时校验块完整性和sha256，再把文件流式转存到 StorageService 并创建
+    文件型读数。
+
+    断线续传：设备重连后重新发送 init，后端从磁盘恢复会话并在 status 主题
+    回复缺失块列表，设备只需补发缺失的块。
+
+    集群模式下上传目录挂载为各实例共享的卷，同一次上传的消息可能由不同实例
+    处理：init 和 commit 总是从磁盘重新读取清单和位图，提交前以独占创建的
+    .lock 文件声明提交权，同一上传只会入库一次。
+    """
+
+    def __init__(self):
+        self.upload_dir = './storage/media_uploads'
+        self.max_bytes = 512 * 1024 * 1024
+        self.max_chunk_bytes = 1024 * 1024
+        self.ttl_seconds = 24 * 3600
+        self.ingestion_service = IngestionService()
+
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+
+        # 统计信息
+        self.stats = {
+            'uploads_started': 0,
+            'uploads_resumed': 0,
+            'uploads_committed': 0,
+            'uploads_failed': 0,
+            'chunks_received': 0,
+            'chunks_duplicated': 0,
+            'bytes_received': 0,
+        }
+
+    def init_app(self, app):
+        """从应用配置读取上传参数"""
+        self.upload_dir = app.config.get('MEDIA_UPLOAD_DIR', self.upload_dir)
+        self.max_bytes = app.config.get('MEDIA_UPLOAD_MAX_BYTES', self.max_bytes)
+        self.max_chunk_bytes = app.config.get('MEDIA_UPLOAD_MAX_CHUNK_BYTES', self.max_chunk_bytes)
+        self.ttl_seconds = app.config.get('MEDIA_UPLOAD_TTL_HOURS', 24) * 3600
+        os.makedirs(self.upload_dir, exist_ok=True)
+
+    @staticmethod
+    def is_media_topic(topic: str) -> bool:
+        """判断是否为分块媒体上传主题"""
+        parts = topic.split('/')
+        return len(parts) >= 5 and parts[0] == 'sensors' and parts[2] == 'media'
+
+    @staticmethod
+    def status_topic(client_id: str, upload_id: str) -> str:
+        return f"sensors/{client_id}/media/{upload_id}/status"
+
+    def handle_message(self, topic: str, payload: bytes) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """处理一条媒体上传消息，需要回复时返回 (状态主题, 状态)"""
+        parts = topic.split('/')
+        client_id, upload_id, action = parts[1], parts[3], parts[4]
+        if not (_SAFE_ID.match(client_id) and _SAFE_ID.match(upload_id)):
+            logger.warning("非法的媒体上传主题: %s", topic)
+            return None
+
+        if action == 'init':
+            status = self.init_upload(client_id, upload_id, json.loads(payload.decode('utf-8')))
+        elif action == 'chunk' and len(parts) == 6 and parts[5].isdigit():
+            status = self.write_chunk(client_id, upload_id, int(parts[5]), payload)
+        elif action == 'commit':
+            status = self.commit(client_id, upload_id)
+        else:
+            logger.warning("未知的媒体上传消息: %s", topic)
+            return None
+
+        if status is None:
+            return None
+        return self.status_topic(client_id, upload_id), status
+
+    def init_upload(self, client_id: str, upload_id: str, manifest: Dict[str, Any]) -> Dict[str, Any]:
+        """开始或恢复一次上传，返回当前状态（含缺失块列表）"""
+        self._cleanup_if_due()
+        key = self._key(client_id, upload_id)
+
+        with self._lock:
+            session = self._load_session(key, reload=True)
+            if session:
+                if session['manifest'].get('state') != STATE_COMMITTED:
+                    self.stats['uploads_resumed'] += 1
+                    logger.info("恢复媒体上传: %s", key)
+                return self._status(session)
+
+            error = self._validate_manifest(manifest)
+            if error:
+                self.stats['uploads_failed'] += 1
+                logger.warning("媒体上传清单无效 %s: %s", key, error)
+                return {'upload_id': upload_id, 'state': STATE_FAILED, 'error': error}
+
+            size = int(manifest['size'])
+            chunk_size = int(manifest['chunk_size'])
+            manifest = {
+                **manifest,
+                'upload_id': upload_id,
+                'client_id': client_id,
+                'size': size,
+                'chunk_size': chunk_size,
+                'total_chunks': max(1, -(-size // chunk_size)),
+                'state': STATE_RECEIVING,
+                'created_at': time.time(),
+            }
+
+            # 预分配稀疏文件，块按偏移写入
+            with open(self._path(key, '.part'), 'wb') as f:
+                f.truncate(size)
+            with open(self._path(key, '.map'), 'wb') as f:
+                f.write(bytes(manifest['total_chunks']))
+            self._write_manifest(key, manifest)
+
+            session = self._new_session(key, manifest, bytearray(manifest['total_chunks']))
+            self.stats['uploads_started'] += 1
+
+        logger.info("开始媒体上传: %s, %d 字节, %d 块", key, size, manifest['total_chunks'])
+        return self._status(session)
+
+    def write_chunk(self, client_id: str, upload_id: str, index: int, data: bytes) -> Optional[Dict[str, Any]]:
+        """按偏移写入一个块；正常情况下不回复，出错时回复状态"""
+        key = self._key(client_id, upload_id)
+        with self._lock:
+            session = self._load_session(key)
+        if session is None:
+            return {'upload_id': upload_id, 'state': STATE_UNKNOWN}
+
+        manifest = session['manifest']
+        if manifest.get('state') == STATE_COMMITTED:
+            return None
+
+        chunk_size = manifest['chunk_size']
+        total_chunks = manifest['total_chunks']
+        expected = min(chunk_size, manifest['size'] - index * chunk_size) if index < total_chunks else -1
+        if len(data) != expected:
+            logger.warning("媒体块大小不符 %s#%d: %d != %d", key, index, len(data), expected)
+            return self._status(session, error=f'invalid chunk {index}')
+
+        # 重复的块也写入磁盘：共享上传目录时其他实例可能已因校验失败清空位图，内存中的位图不一定是最新的
+        with session['lock']:
+            duplicate = bool(session['received'][index])
+            try:
+                with open(self._path(key, '.part'), 'r+b') as f:
+                    f.seek(index * chunk_size)
+                    f.write(data)
+                with open(self._path(key, '.map'), 'r+b') as f:
+                    f.seek(index)
+                    f.write(b'\x01')
+                stale = False
+            except FileNotFoundError:
+                stale = True
+            else:
+                session['received'][index] = 1
+                session['updated_at'] = time.time()
+
+        if stale:
+            # 其他实例已提交或清理了该上传，内存中的会话已过期
+            with self._lock:
+                session = self._load_session(key, reload=True)
+            if session is None:
+                return {'upload_id': upload_id, 'state': STATE_UNKNOWN}
+            if session['manifest'].get('state') == STATE_COMMITTED:
+                return None
+            return self._status(session)
+        if duplicate:
+            self.stats['chunks_duplicated'] += 1
+            return None
+
+        self.stats['chunks_received'] += 1
+        self.stats['bytes_received'] += len(data)
+        return None
+
+    def commit(self, client_id: str, upload_id: str) -> Optional[Dict[str, Any]]:
+        """校验并提交上传：块不全时返回缺失列表，完整时转存并创建读数
+
+        其他实例正在提交同一上传时不回复，由持有提交权的实例回复状态。
+        """
+        key = self._key(client_id, upload_id)
+        if not self._claim_commit(key):
+            logger.info("媒体上传正在由其他实例提交: %s", key)
+            return None
+        try:
+            return self._commit(key, client_id, upload_id)
+        finally:
+            self._remove(key, '.lock')
+
+    def _commit(self, key: str, client_id: str, upload_id: str) -> Dict[str, Any]:
+        # 取得提交权后从磁盘重新读取：其他实例写入的块和已完成的提交都能看到
+        with self._lock:
+            session = self._load_session(key, reload=True)
+        if session is None:
+            return {'upload_id': upload_id, 'state': STATE_UNKNOWN}
+
+        with session['lock']:
+            manifest = session['manifest']
+            if manifest.get('state') == STATE_COMMITTED:
+                return self._status(session)
+            if not all(session['received']):
+                return self._status(session, state=STATE_INCOMPLETE)
+
+            part_path = self._path(key, '.part')
+            expected_hash = manifest.get('sha256')
+            if expected_hash and self._file_sha256(part_path) != expected_hash.lower():
+                # 数据损坏：清空位图让设备整体重传
+                logger.error("媒体上传校验失败: %s", key)
+                self.stats['uploads_failed'] += 1
+                session['received'][:] = bytes(len(session['received']))
+                with open(self._path(key, '.map'), 'wb') as f:
+                    f.write(bytes(len(session['received'])))
+                return self._status(session, state=STATE_INCOMPLETE, error='sha256 mismatch')
+
+            reading = self.ingestion_service.ingest_media_file(client_id, part_path, manifest)
+            if reading is None:
+                self.stats['uploads_failed'] += 1
+                return self._status(session, state=STATE_FAILED, error='storage failed')
+
+            # 保留清单用于识别重复提交，临时文件由存储服务移走
+            manifest.update({'state': STATE_COMMITTED, 'reading_id': reading.id})
+            self._write_manifest(key, manifest)
+            self._remove(key, '.part', '.map')
+            self.stats['uploads_committed'] += 1
+
+        logger.info("媒体上传完成: %s -> 读数 %s", key, reading.id)
+        return self._status(session)
+
+    def cleanup_expired(self) -> int:
+        """清理超过保留时长的上传会话，返回清理数量"""
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        with self._lock:
+            for name in os.listdir(self.upload_dir):
+                if not name.endswith('.json'):
+                    continue
+                key = name[:-len('.json')]
+                try:
+                    if os.path.getmtime(self._path(key, '.json')) >= cutoff:
+                        continue
+                except OSError:
+                    continue
+                self._remove(key, '.json', '.part', '.map', '.lock')
+                self._sessions.pop(key, None)
+                removed += 1
+        if removed:
+            logger.info("清理过期媒体上传: %d 个", removed)
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取上传统计信息"""
+        return {
+            'active_uploads': sum(
+                1 for s in self._sessions.values() if s['manifest'].get('state') != STATE_COMMITTED
+            ),
+            **self.stats
+        }
+
+    # ---- 内部方法 ----
+
+    def _validate_manifest(self, manifest: Dict[str, Any]) -> Optional[str]:
+        try:
+            size = int(manifest.get('size', -1))
+            chunk_size = int(manifest.get('chunk_size', 0))
+        except (TypeError, ValueError):
+            return 'invalid size'
+        if manifest.get('data_type') not in ('image', 'video'):
+            return 'data_type must be image or video'
+        if size <= 0 or size > self.max_bytes:
+            return f'size must be between 1 and {self.max_bytes}'
+        if chunk_size <= 0 or chunk_size > self.max_chunk_bytes:
+            return f'chunk_size must be between 1 and {self.max_chunk_bytes}'
+        return None
+
+    def _status(self, session: Dict[str, Any], state: Optional[str] = None,
+                error: Optional[str] = None) -> Dict[str, Any]:
+        manifest = session['manifest']
+        received = session['received']
+        missing = [i for i, flag in enumerate(received) if not flag]
+        status = {
+            'upload_id': manifest['upload_id'],
+            'state': state or manifest.get('state', STATE_RECEIVING),
+            'total_chunks': manifest['total_chunks'],
+            'received_chunks': len(received) - len(missing),
+            'missing': missing[:MAX_MISSING_REPORTED],
+        }
+        if manifest.get('reading_id'):
+            status['reading_id'] = manifest['reading_id']
+        if error:
+            status['error'] = error
+        return status
+
+    def _load_session(self, key: str, reload: bool = False) -> Optional[Dict[str, Any]]:
+        """从内存或磁盘获取会话，reload=True 时用磁盘上的清单和位图刷新内存中的会话（调用方需持有 self._lock）"""
+        session = self._sessions.get(key)
+        if session and not reload:
+            return session
+
+        try:
+            manifest, received = self._read_session(key)
+        except FileNotFoundError:
+            self._sessions.pop(key, None)
+            return None
+        except (OSError, ValueError) as e:
+            logger.error("媒体上传会话损坏，已丢弃 %s: %s", key, e)
+            self._remove(key, '.json', '.part', '.map')
+            self._sessions.pop(key, None)
+            return None
+
+        if session:
+            with session['lock']:
+                session['manifest'] = manifest
+                session['received'][:] = received
+            return session
+        return self._new_session(key, manifest, received)
+
+    def _read_session(self, key: str) -> Tuple[Dict[str, Any], bytearray]:
+        """读取磁盘上的清单和位图；先读位图再读清单，其他实例恰好完成提交时也能得到一致的结果"""
+        try:
+            with open(self._path(key, '.map'), 'rb') as f:
+                received = bytearray(f.read())
+        except FileNotFoundError:
+            received = None
+        with open(self._path(key, '.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('state') == STATE_COMMITTED:
+            received = bytearray(b'\x01' * manifest['total_chunks'])
+        elif received is None:
+            raise ValueError('chunk map missing')
+        return manifest, received
+
+    def _claim_commit(self, key: str) -> bool:
+        """独占创建 .lock 文件取得提交权；超过 COMMIT_CLAIM_TIMEOUT 的标记视为持有者崩溃后遗留"""
+        path = self._path(key, '.lock')
+        for _ in range(2):
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) < COMMIT_CLAIM_TIMEOUT:
+                        return False
+                    logger.warning("媒体上传提交标记已过期，接管提交: %s", key)
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return False
+
+    def _new_session(self, key: str, manifest: Dict[str, Any], received: bytearray) -> Dict[str, Any]:
+        session = {
+            'manifest': manifest,
+            'received': received,
+            'lock': threading.Lock(),
+            'updated_at': time.time(),
+        }
+        self._sessions[key] = session
+        return session
+
+    def _write_manifest(self, key: str, manifest: Dict[str, Any]):
+        tmp_path = self._path(key, '.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(key, '.json'))
+
+    def _cleanup_if_due(self):
+        """每小时最多清理一次过期会话"""
+        now = time.time()
+        if now - self._last_cleanup >= 3600:
+            self._last_cleanup = now
+            try:
+                self.cleanup_expired()
+            except OSError as e:
+                logger.error("清理媒体上传失败: %s", e)
+
+    def _remove(self, key: str, *suffixes: str):
+        for suffix in suffixes:
+            try:
+                os.remove(self._path(key, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _key(self, client_id: str, upload_id: str) -> str:
+        return f"{client_id}__{upload_id}"
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.upload_dir, key + suffix)
+
+    @staticmethod
+    def _file_sha256(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+
+# 全局媒体上传服务实例
+media_upload_service = MediaUploadService()
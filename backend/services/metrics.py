@@ -0,0 +1,282 @@
+# backend/services/metrics.py
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple, Callable, Iterable, Optional
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+logger = logging.getLogger(__name__)
+
+# 默认直方图桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 采集器返回的一组样本: (指标名, 类型, 说明, [(标签, 值)])
+MetricFamily = Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """单调递增计数器，按标签值分别计数"""
+
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, Any], float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """直方图：按标签值累计各桶的观测数、总和和次数（输出为累积桶）"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[tuple, list] = {}  # 标签值 -> [各桶计数..., +Inf桶计数, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文：退出时（包括异常）记录耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def totals(self) -> Tuple[int, float]:
+        """所有标签值合计的 (次数, 总和)"""
+        with self._lock:
+            entries = list(self._values.values())
+        return sum(sum(entry[:-1]) for entry in entries), sum(entry[-1] for entry in entries)
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, Any], float]]:
+        with self._lock:
+            values = [(key, list(entry)) for key, entry in self._values.items()]
+        for key, entry in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), entry[:-1]):
+                cumulative += count
+                yield self.name + '_bucket', {**labels, 'le': _format_value(float(bound))}, cumulative
+            yield self.name + '_sum', labels, entry[-1]
+            yield self.name + '_count', labels, cumulative
+
+
+class MetricsRegistry:
+    """进程内指标注册表 - 以 Prometheus 文本格式输出
+
+    热路径只做加锁累加（计数器、直方图）；各服务已有的 stats 统计（队列深度、
+    写入行数、缓存命中等）由采集器在抓取时读取，不增加写入路径的开销。
+    多进程部署时每个进程各自输出，由 Prometheus 按实例区分。
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+        self._hooked = False
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        """注册抓取时调用的采集器"""
+        self._collectors.append(collector)
+
+    def init_app(self, app):
+        """读取配置，注册请求耗时钩子和默认采集器"""
+        self.enabled = app.config.get('METRICS_ENABLED', self.enabled)
+        if not self.enabled:
+            return
+        app.before_request(_start_timer)
+        app.after_request(_observe_request)
+        if not self._hooked:
+            event.listen(Pool, 'checkout', lambda *args: DB_POOL_CHECKOUTS.inc())
+            for collector in _default_collectors():
+                self.add_collector(collector)
+            self._hooked = True
+
+    def render(self) -> str:
+        """输出所有指标（Prometheus 文本格式 0.0.4）"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.warning("指标采集器执行失败: %s", e)
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# 全局指标注册表
+metrics = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    'agrinex_http_request_duration_seconds', 'HTTP请求处理耗时', ('blueprint', 'endpoint', 'method', 'status'))
+INGEST_FLUSH_SECONDS = metrics.histogram(
+    'agrinex_ingest_flush_duration_seconds', '读数批量写入一次刷新（INSERT+提交）的耗时')
+ALARM_EVALUATION_SECONDS = metrics.histogram(
+    'agrinex_alarm_evaluation_duration_seconds', '单个读数的告警规则检查耗时',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+ALARMS_TRIGGERED = metrics.counter('agrinex_alarms_triggered_total', '实时检查触发的告警数')
+NOTIFICATION_SECONDS = metrics.histogram(
+    'agrinex_notification_duration_seconds', '告警通知发送耗时', ('channel',))
+NOTIFICATIONS_FAILED = metrics.counter('agrinex_notifications_failed_total', '发送失败的告警通知数', ('channel',))
+FORECAST_SECONDS = metrics.histogram(
+    'agrinex_forecast_duration_seconds', '预测模型训练和预测耗时', ('scope',),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+DB_POOL_CHECKOUTS = metrics.counter('agrinex_db_pool_checkouts_total', '数据库连接池借出连接次数')
+MQTT_MESSAGES_RECEIVED = metrics.counter('agrinex_mqtt_messages_received_total', 'MQTT回调收到的消息数')
+
+
+def _start_timer():
+    g._metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop('_metrics_started', None)
+    if started is not None:
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            blueprint=request.blueprint or '',
+            endpoint=request.endpoint or 'unmatched',
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
+
+def _family(name: str, metric_type: str, documentation: str, value, labels: Optional[Dict[str, Any]] = None):
+    return name, metric_type, documentation, [(labels or {}, value)]
+
+
+def _ingest_collector():
+    """MQTT消息分发队列、批量写入器和死信队列"""
+    from services.mqtt_service import mqtt_service
+    from services.reading_writer import reading_writer
+    from services.dead_letter_store import dead_letter_store
+
+    dispatcher = mqtt_service.dispatcher.get_stats()
+    writer = reading_writer.get_stats()
+    dead_letters = dead_letter_store.get_stats()
+    return [
+        _family('agrinex_mqtt_connected', 'gauge', 'MQTT连接状态', int(bool(mqtt_service.is_connected))),
+        _family('agrinex_mqtt_messages_processed_total', 'counter', '处理完成的MQTT消息数', dispatcher['processed']),
+        _family('agrinex_mqtt_messages_failed_total', 'counter', '处理失败的MQTT消息数', dispatcher['failed']),
+        _family('agrinex_mqtt_messages_dropped_total', 'counter', '队列满时丢弃的MQTT消息数', dispatcher['dropped']),
+        _family('agrinex_mqtt_queue_depth', 'gauge', 'MQTT分发队列中等待处理的消息数', dispatcher['queue_depth']),
+        _family('agrinex_ingest_rows_submitted_total', 'counter', '提交给批量写入器的读数行数', writer['rows_submitted']),
+        _family('agrinex_ingest_rows_written_total', 'counter', '批量写入成功的读数行数', writer['rows_written']),
+        _family('agrinex_ingest_rows_failed_total', 'counter', '批量写入失败的读数行数', writer['rows_failed']),
+        _family('agrinex_ingest_pending_rows', 'gauge', '批量写入器缓冲区中等待刷新的行数', writer['pending_rows']),
+        _family('agrinex_dead_letters_pending', 'gauge', '死信队列中的记录数', dead_letters.get('pending', 0)),
+    ]
+
+
+def _cache_collector():
+    """最新读数缓存（Redis/进程内）和设备/传感器解析缓存的命中统计"""
+    from services.latest_cache import latest_cache
+    from services.resolution_cache import resolution_cache
+
+    latest = latest_cache.get_stats()
+    resolution = resolution_cache.get_stats()
+    backend = {'backend': latest['backend']}
+    return [
+        _family('agrinex_latest_cache_hits_total', 'counter', '最新读数缓存命中次数', latest['hits'], backend),
+        _family('agrinex_latest_cache_misses_total', 'counter', '最新读数缓存未命中次数', latest['misses'], backend),
+        _family('agrinex_latest_cache_redis_errors_total', 'counter', '最新读数缓存访问Redis失败次数',
+                latest['redis_errors']),
+        _family('agrinex_resolution_cache_hits_total', 'counter', '设备/传感器解析缓存命中次数', resolution['hits']),
+        _family('agrinex_resolution_cache_misses_total', 'counter', '设备/传感器解析缓存未命中次数', resolution['misses']),
+    ]
+
+
+def _database_collector():
+    """连接池状态和请求内SQL查询统计"""
+    from extensions import db
+    from services.query_monitor import query_monitor
+
+    families = []
+    pool = db.engine.pool
+    for name, documentation in (('checkedout', '已借出的连接数'), ('overflow', '超出连接池大小的连接数'),
+                                ('size', '连接池大小')):
+        value = getattr(pool, name, None)
+        if callable(value):
+            families.append(_family(f'agrinex_db_pool_{name}', 'gauge', documentation, value()))
+    queries = query_monitor.get_stats()
+    families.append(_family('agrinex_sql_queries_total', 'counter', '请求内执行的SQL语句数', queries['queries']))
+    families.append(_family('agrinex_sql_n_plus_one_total', 'counter', '检测到可能的 N+1 查询的请求数',
+                            queries['n_plus_one_warnings']))
+    return families
+
+
+def _default_collectors() -> List[Callable[[], Iterable[MetricFamily]]]:
+    return [_ingest_collector, _cache_collector, _database_collector]
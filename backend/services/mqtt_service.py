@@ -1,14 +1,30 @@
 # backend/services/mqtt_service.py
 import json
 import logging
+import os
+import socket
 import time
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, Optional, Callable, List
 
 import paho.mqtt.client as mqtt
 from flask import current_app
 
-from services.ingestion_service import IngestionService
+from services.ingestion_service import IngestionService, IngestionRejected
 from services.alarm_monitor import alarm_monitor
+from services.reading_writer import reading_writer
+from services.ingest_journal import ingest_journal
+from services.rollup_service import rollup_service
+from services.resolution_cache import resolution_cache
+from services.ingestion_dispatcher import IngestionDispatcher
+from services.media_upload_service import media_upload_service, MEDIA_TOPIC_FILTERS
+from services.dedup_filter import dedup_filter
+from services.tracing import tracer
+from services.metrics import MQTT_MESSAGES_RECEIVED
+from services.template_decoder import template_decoders, QUALITY_GOOD
+from services.dead_letter_store import (
+    dead_letter_store, REASON_DECODE_ERROR, REASON_DB_ERROR, REASON_INGEST_FAILED
+)
+from utils.payload_codec import decode_payload, parse_content_type, split_topic
 
 logger = logging.getLogger(__name__)
 
@@ -21,10 +37,14 @@ class MQTTService:
         self.client = None
         self.is_connected = False
         self.ingestion_service = IngestionService()
+        self.media_uploads = media_upload_service
         self.message_handlers = {}
         self.connection_thread = None
         self.running = False
         
+        # 消息分发器：paho回调只入队，由工作线程处理
+        self.dispatcher = IngestionDispatcher(self._process_message)
+        
         if app:
             self.init_app(app)
     
@@ -38,11 +58,21 @@ class MQTTService:
             'port': app.config.get('MQTT_PORT', 1883),
             'username': app.config.get('MQTT_USERNAME', ''),
             'password': app.config.get('MQTT_PASSWORD', ''),
-            'keepalive': app.config.get('MQTT_KEEPALIVE', 60)
+            'keepalive': app.config.get('MQTT_KEEPALIVE', 60),
+            'protocol': str(app.config.get('MQTT_PROTOCOL', '3.1.1')),
+            'cluster_enabled': app.config.get('MQTT_CLUSTER_ENABLED', False),
+            'share_group': app.config.get('MQTT_SHARE_GROUP', 'agrinex-ingest'),
         }
+        self.mqtt_config['client_id'] = self._build_client_id(app.config.get('MQTT_CLIENT_ID', ''))
         
         # 注册应用关闭时的清理函数
         app.teardown_appcontext(self._teardown)
+        
+        # 批量写入完成后检查告警
+        reading_writer.add_flush_listener(self._on_readings_flushed)
+        
+        self.dispatcher.init_app(app)
+        self.dispatcher_enabled = app.config.get('MQTT_DISPATCH_ENABLED', True)
     
     def _teardown(self, exception):
         """应用关闭时的清理"""
@@ -57,9 +87,11 @@ class MQTTService:
             if self.client and self.is_connected:
                 self.disconnect()
             
-            # 创建MQTT客户端
-            client_id = f"agrinex_backend_{int(time.time())}"
-            self.client = mqtt.Client(client_id=client_id)
+            # 创建MQTT客户端（MQTT v5 下 clean_session 必须为 None）
+            if self.mqtt_config['protocol'] == '5':
+                self.client = mqtt.Client(client_id=self.mqtt_config['client_id'], protocol=mqtt.MQTTv5)
+            else:
+                self.client = mqtt.Client(client_id=self.mqtt_config['client_id'])
             
             # 设置回调函数
             self.client.on_connect = self._on_connect
@@ -82,6 +114,10 @@ class MQTTService:
                 self.mqtt_config['keepalive']
             )
             
+            # 在网络循环之前启动工作线程
+            if self.dispatcher_enabled:
+                self.dispatcher.start()
+            
             # 启动网络循环（保持连接）
             self.running = True
             self.client.loop_start()  # 使用loop_start而不是单独的线程
@@ -107,7 +143,7 @@ class MQTTService:
         except Exception as e:
             logger.error("MQTT断开失败: %s", e)
     
-    def _on_connect(self, client, userdata, flags, rc):
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
         """连接成功回调"""
         if rc == 0:
             self.is_connected = True
@@ -119,7 +155,7 @@ class MQTTService:
         else:
             logger.error("MQTT连接失败，返回码: %s", rc)
     
-    def _on_disconnect(self, client, userdata, rc):
+    def _on_disconnect(self, client, userdata, rc, properties=None):
         """断开连接回调"""
         self.is_connected = False
         if rc != 0:
@@ -128,29 +164,127 @@ class MQTTService:
             logger.info("MQTT正常断开连接")
     
     def _on_message(self, client, userdata, msg):
-        """消息接收回调"""
-        try:
-            topic = msg.topic
-            payload = json.loads(msg.payload.decode('utf-8'))
-            
-            logger.info("收到MQTT消息: %s", topic)
+        """消息接收回调（paho网络线程）- 创建追踪并入队；启用写前日志时数值消息在此写入日志"""
+        receive_ts = time.time()
+        MQTT_MESSAGES_RECEIVED.inc()
+        topic = self._tag_content_type(msg)
+        root = tracer.start_trace('mqtt.message', start=receive_ts, topic=topic, bytes=len(msg.payload))
+        with tracer.activate(root):
+            # 启用写前日志时数值消息在回调中只追加原始字节（不解码、不访问数据库）：append 等待fsync后
+            # 才返回，回调返回后 paho 才发送 PUBACK，已确认的消息不会因进程崩溃丢失
+            if self._journal_before_ack(topic):
+                self._append_journal(topic, msg.payload)
+                return
             
-            # 处理传感器数据
-            if topic.startswith('sensors/'):
-                self._handle_sensor_data(topic, payload)
+            if self.dispatcher.running:
+                self.dispatcher.dispatch(topic, msg.payload, receive_ts)
+                return
             
-            # 调用自定义处理器
-            if topic in self.message_handlers:
-                self.message_handlers[topic](topic, payload)
-                
+            try:
+                self._process_message(topic, msg.payload, receive_ts)
+            except Exception as e:
+                logger.error("MQTT消息处理失败: %s", e)
+    
+    def _append_journal(self, topic: str, payload_bytes: bytes):
+        """原始消息追加到写前日志，日志未运行时写入死信队列；追加后释放消息的追踪"""
+        root = tracer.current()
+        try:
+            with tracer.span('ingest_journal.append'):
+                ingest_journal.append(topic, payload_bytes)
+        except RuntimeError as e:
+            dead_letter_store.add(topic, REASON_INGEST_FAILED, raw=payload_bytes, error=str(e))
+        finally:
+            tracer.release(root)
+    
+    def build_journal_rows(self, topic: str, payload_bytes: bytes) -> List[Dict[str, Any]]:
+        """写前日志应用线程中把原始消息解析为读数行
+        
+        无法解码或无法入库的消息写入死信队列，重复消息丢弃，均返回空列表；
+        数据库错误向上抛出，由写前日志退避重试。
+        """
+        raw_topic = topic
+        topic, content_type = split_topic(topic)
+        try:
+            payload = decode_payload(payload_bytes, content_type)
+        except ValueError as e:
+            dead_letter_store.add(raw_topic, REASON_DECODE_ERROR, raw=payload_bytes, error=str(e))
+            return []
+        
+        with self.app.app_context():
+            try:
+                rows = self.ingestion_service.build_numeric_rows(
+                    topic, payload, aggregated=self._is_aggregated_data(payload)
+                )
+            except IngestionRejected as e:
+                dead_letter_store.add(topic, e.reason, payload=payload, error=str(e))
+                return []
+        
+        # 解析成功后才记入去重窗口，数据库错误重试时同一条消息不会被当作重复
+        if dedup_filter.is_duplicate(topic, payload):
+            logger.debug("丢弃重复消息: %s", topic)
+            return []
+        return rows
+    
+    def _process_message(self, topic: str, payload_bytes: bytes, receive_ts: float):
+        """处理单条MQTT消息（工作线程），异常由调用方记录；处理完释放消息的追踪"""
+        root = tracer.current()
+        tracer.record('mqtt.queue_wait', receive_ts)
+        try:
+            self._handle_message(topic, payload_bytes)
         except Exception as e:
-            logger.error("MQTT消息处理失败: %s", e)
+            if root is not None:
+                root.set_error(e)
+            raise
+        finally:
+            tracer.release(root)
+    
+    def _handle_message(self, topic: str, payload_bytes: bytes):
+        """解码并分发单条MQTT消息"""
+        # 分块媒体上传的块是原始字节，不做负载解码
+        if self.media_uploads.is_media_topic(topic):
+            self._handle_media_upload(topic, payload_bytes)
+            return
+        
+        raw_topic = topic
+        topic, content_type = split_topic(topic)
+        try:
+            with tracer.span('payload.decode', content_type=content_type or 'json'):
+                payload = decode_payload(payload_bytes, content_type)
+        except ValueError as e:
+            if topic.startswith('sensors/'):
+                # 保留带内容类型后缀的原始主题和字节，回放时按相同方式解码
+                dead_letter_store.add(raw_topic, REASON_DECODE_ERROR, raw=payload_bytes, error=str(e))
+                return
+            raise
+        
+        # QoS1 重连重投的重复消息在入库前丢弃
+        if topic.startswith('sensors/') and dedup_filter.is_duplicate(topic, payload):
+            logger.debug("丢弃重复消息: %s", topic)
+            return
+        
+        logger.info("收到MQTT消息: %s", topic)
+        
+        # 处理传感器数据
+        if topic.startswith('sensors/'):
+            self._handle_sensor_data(topic, payload)
+        
+        # 调用自定义处理器
+        if topic in self.message_handlers:
+            self.message_handlers[topic](topic, payload)
+    
+    def _tag_content_type(self, msg) -> str:
+        """MQTT v5 ContentType 属性转换为主题后缀，使解码信息随消息进入队列"""
+        properties = getattr(msg, 'properties', None)
+        content_type = parse_content_type(getattr(properties, 'ContentType', None))
+        if content_type and split_topic(msg.topic)[1] is None:
+            return f"{msg.topic}/{content_type}"
+        return msg.topic
     
-    def _on_subscribe(self, client, userdata, mid, granted_qos):
+    def _on_subscribe(self, client, userdata, mid, granted_qos, properties=None):
         """订阅成功回调"""
         logger.info("MQTT订阅成功，消息ID: %s", mid)
     
-    def _on_unsubscribe(self, client, userdata, mid):
+    def _on_unsubscribe(self, client, userdata, mid, properties=None, reason_codes=None):
         """取消订阅回调"""
         logger.info("MQTT取消订阅成功，消息ID: %s", mid)
     
@@ -160,57 +294,137 @@ class MQTTService:
             # 使用应用上下文
             if self.app:
                 with self.app.app_context():
+                    # 数值数据进入批量写入器，告警检查在写入数据库后进行
+                    if self._batched_ingest_enabled() and self._is_numeric_topic(topic):
+                        try:
+                            self._submit_numeric(topic, payload)
+                        except IngestionRejected as e:
+                            dead_letter_store.add(topic, e.reason, payload=payload, error=str(e))
+                        return
+                    
                     # 检查是否是聚合数据格式（包含多个传感器类型）
                     if self._is_aggregated_data(payload):
-                        readings = self.ingestion_service.ingest_aggregated_mqtt_message(topic, payload)
+                        with tracer.span('ingestion.ingest_aggregated'):
+                            readings = self.ingestion_service.ingest_aggregated_mqtt_message(topic, payload)
                         if readings:
                             logger.info("聚合传感器数据存储成功: %d 条记录", len(readings))
                             
                             # 为每个读数检查告警条件
                             for reading in readings:
                                 if reading.data_type == 'numeric' and reading.numeric_value is not None:
-                                    try:
-                                        triggered_alarms = alarm_monitor.check_reading_immediately(
-                                            sensor_id=reading.sensor_id,
-                                            value=reading.numeric_value,
-                                            timestamp=reading.timestamp
-                                        )
-                                        
-                                        if triggered_alarms:
-                                            logger.info(f"Triggered {len(triggered_alarms)} alarms for sensor {reading.sensor_id}")
-                                            
-                                    except Exception as e:
-                                        logger.error(f"Error checking alarms for reading {reading.id}: {e}")
+                                    self._check_alarms(reading.id, reading.sensor_id,
+                                                       reading.numeric_value, reading.timestamp)
                         else:
                             logger.warning("聚合传感器数据存储失败")
+                            dead_letter_store.add(topic, REASON_INGEST_FAILED, payload=payload,
+                                                  error="聚合传感器数据存储失败")
                     else:
                         # 处理单一传感器数据
-                        reading = self.ingestion_service.ingest_mqtt_message(topic, payload)
+                        with tracer.span('ingestion.ingest'):
+                            reading = self.ingestion_service.ingest_mqtt_message(topic, payload)
                         if reading:
                             logger.info("传感器数据存储成功: ID=%s", reading.id)
                             
                             # 检查告警条件（仅对数值型数据）
                             if reading.data_type == 'numeric' and reading.numeric_value is not None:
-                                try:
-                                    triggered_alarms = alarm_monitor.check_reading_immediately(
-                                        sensor_id=reading.sensor_id,
-                                        value=reading.numeric_value,
-                                        timestamp=reading.timestamp
-                                    )
-                                    
-                                    if triggered_alarms:
-                                        logger.info(f"Triggered {len(triggered_alarms)} alarms for sensor {reading.sensor_id}")
-                                        
-                                except Exception as e:
-                                    logger.error(f"Error checking alarms for reading {reading.id}: {e}")
+                                self._check_alarms(reading.id, reading.sensor_id,
+                                                   reading.numeric_value, reading.timestamp)
                             
                         else:
                             logger.warning("传感器数据存储失败")
+                            dead_letter_store.add(topic, REASON_INGEST_FAILED, payload=payload,
+                                                  error="传感器数据存储失败")
             else:
                 logger.error("应用上下文不可用")
                     
         except Exception as e:
             logger.error("传感器数据处理失败: %s", e)
+            dead_letter_store.add(topic, REASON_INGEST_FAILED, payload=payload, error=str(e))
+    
+    def _submit_numeric(self, topic: str, payload: Dict[str, Any]):
+        """解析数值消息并提交到批量写入器；写入失败的消息进入死信队列
+        
+        只启用写前日志、批量写入线程未运行时（回放死信）同步写入，失败由调用方重新记录
+        """
+        with tracer.span('ingestion.build_rows') as span:
+            rows = self.ingestion_service.build_numeric_rows(
+                topic, payload, aggregated=self._is_aggregated_data(payload)
+            )
+            span.set_attribute('rows', len(rows))
+        if not reading_writer.running:
+            reading_writer.write_rows(rows)
+            return
+        
+        # 写入和告警检查在批量写入线程中进行，追踪在写入回调完成后结束
+        held = tracer.hold()
+        tracer.tag_rows(rows)
+        future = reading_writer.submit(rows)
+        
+        def on_written(f):
+            error = f.exception()
+            if error is not None:
+                dead_letter_store.add(topic, REASON_DB_ERROR, payload=payload, error=str(error))
+            tracer.release(held)
+        
+        future.add_done_callback(on_written)
+    
+    def replay_dead_letters(self, reason: Optional[str] = None) -> Dict[str, Any]:
+        """回放死信队列（不经过去重窗口），数值消息经批量写入器重新入库"""
+        # 清除解析缓存中"未找到设备/传感器"的结果，使新注册的设备立即生效
+        resolution_cache.clear()
+        return dead_letter_store.replay(self._replay_dead_letter, reason=reason)
+    
+    def _replay_dead_letter(self, record: Dict[str, Any]):
+        """回放单条死信，仍无法入库时抛出异常由死信队列重新记录"""
+        topic, content_type = split_topic(record['topic'])
+        payload = record.get('payload')
+        if payload is None:
+            try:
+                payload = decode_payload(dead_letter_store.decode_raw(record) or b'', content_type)
+            except ValueError as e:
+                raise IngestionRejected(REASON_DECODE_ERROR, str(e))
+        
+        with self.app.app_context():
+            if self._batched_ingest_enabled() and self._is_numeric_topic(topic):
+                self._submit_numeric(topic, payload)
+                return
+            
+            if self._is_aggregated_data(payload):
+                if not self.ingestion_service.ingest_aggregated_mqtt_message(topic, payload):
+                    raise IngestionRejected(REASON_INGEST_FAILED, "聚合传感器数据存储失败")
+            elif not self.ingestion_service.ingest_mqtt_message(topic, payload):
+                raise IngestionRejected(REASON_INGEST_FAILED, "传感器数据存储失败")
+    
+    def _handle_media_upload(self, topic: str, payload_bytes: bytes):
+        """处理分块媒体上传消息，并在需要时回复上传状态"""
+        with self.app.app_context():
+            reply = self.media_uploads.handle_message(topic, payload_bytes)
+        if reply:
+            status_topic, status = reply
+            self.publish(status_topic, status)
+    
+    def _on_readings_flushed(self, rows):
+        """批量写入完成回调 - 对新写入的数值读数检查告警（超出模板范围的读数不参与）"""
+        for row in rows:
+            if row.get('numeric_value') is not None and row.get('quality', QUALITY_GOOD) == QUALITY_GOOD:
+                with tracer.activate(tracer.row_span(row)):
+                    self._check_alarms(row.get('id'), row['sensor_id'],
+                                       row['numeric_value'], row['timestamp'])
+    
+    def _check_alarms(self, reading_id, sensor_id, value, timestamp):
+        """检查单个读数的告警条件"""
+        try:
+            triggered_alarms = alarm_monitor.check_reading_immediately(
+                sensor_id=sensor_id,
+                value=value,
+                timestamp=timestamp
+            )
+            
+            if triggered_alarms:
+                logger.info(f"Triggered {len(triggered_alarms)} alarms for sensor {sensor_id}")
+                
+        except Exception as e:
+            logger.error(f"Error checking alarms for reading {reading_id}: {e}")
     
     def subscribe_to_sensors(self):
         """订阅传感器数据主题"""
@@ -221,10 +435,14 @@ class MQTTService:
         try:
             # 订阅所有传感器数据主题
             topics = [
-                ("sensors/+/numeric", 1),    # 数值数据
-                ("sensors/+/image", 1),      # 图像数据
-                ("sensors/+/video", 1),      # 视频数据
+                (self._sensor_topic("sensors/+/numeric"), 1),    # 数值数据
+                (self._sensor_topic("sensors/+/numeric/+"), 1),  # 二进制编码的数值数据
+                (self._sensor_topic("sensors/+/image"), 1),      # 图像数据
+                (self._sensor_topic("sensors/+/video"), 1),      # 视频数据
             ]
+            # 分块媒体上传（init / chunk / commit）；集群模式下同一上传的消息可能分到不同实例，
+            # 上传目录需为共享卷（见 MediaUploadService）
+            topics.extend((self._sensor_topic(topic_filter), 1) for topic_filter in MEDIA_TOPIC_FILTERS)
             
             for topic, qos in topics:
                 result = self.client.subscribe(topic, qos)
@@ -239,6 +457,24 @@ class MQTTService:
             logger.error("订阅传感器主题失败: %s", e)
             return False
     
+    def _sensor_topic(self, topic_filter: str) -> str:
+        """集群模式下使用共享订阅，同组的多个后端实例分摊同一消息流"""
+        if self.mqtt_config.get('cluster_enabled'):
+            return f"$share/{self.mqtt_config['share_group']}/{topic_filter}"
+        return topic_filter
+    
+    def _build_client_id(self, configured_id: str) -> str:
+        """生成客户端ID
+        
+        集群模式下需要在进程生命周期内稳定、且各实例唯一的ID：默认使用主机名
+        （容器内即容器ID）加进程号，同一主机上的多个 worker 进程不会互相踢下线。
+        """
+        if configured_id:
+            return configured_id
+        if self.mqtt_config.get('cluster_enabled'):
+            return f"agrinex_backend_{socket.gethostname()}_{os.getpid()}"
+        return f"agrinex_backend_{int(time.time())}_{os.getpid()}"
+    
     def publish(self, topic: str, payload: Dict[str, Any], qos: int = 1) -> bool:
         """发布消息到MQTT"""
         if not self.is_connected:
@@ -296,9 +532,32 @@ class MQTTService:
         return {
             'connected': self.is_connected,
             'running': self.running,
-            'config': self.mqtt_config
+            'config': self.mqtt_config,
+            'batch_writer': reading_writer.get_stats(),
+            'resolution_cache': resolution_cache.get_stats(),
+            'dispatcher': self.dispatcher.get_stats(),
+            'media_uploads': self.media_uploads.get_stats(),
+            'dedup': dedup_filter.get_stats(),
+            'template_decoders': template_decoders.get_stats(),
+            'dead_letters': dead_letter_store.get_stats(),
+            'journal': ingest_journal.get_stats(),
+            'rollups': rollup_service.get_stats(),
+            'tracing': tracer.get_stats()
         }
     
+    def _batched_ingest_enabled(self) -> bool:
+        """数值数据是否走批量入库路径（批量写入器或写前日志）"""
+        return reading_writer.running or ingest_journal.running
+    
+    def _journal_before_ack(self, topic: str) -> bool:
+        """消息是否需要在确认前写入写前日志（启用日志时的数值主题）"""
+        return ingest_journal.running and self._is_numeric_topic(split_topic(topic)[0])
+    
+    def _is_numeric_topic(self, topic: str) -> bool:
+        """判断是否为数值数据主题 sensors/{client_id}/numeric"""
+        parts = topic.split('/')
+        return len(parts) >= 3 and parts[2] == 'numeric'
+    
     def _is_aggregated_data(self, payload: Dict[str, Any]) -> bool:
         """判断是否为聚合数据格式（包含多个传感器类型的数据）"""
         # 如果payload直接包含多个已知的传感器类型字段，则认为是聚合数据
@@ -8,6 +8,7 @@ from typing import Dict, Any
 from flask import current_app
 from models.alarm import Alarm
 from models.alarm_rule import AlarmRule
+from services.metrics import NOTIFICATION_SECONDS, NOTIFICATIONS_FAILED
 
 logger = logging.getLogger(__name__)
 
@@ -20,11 +21,13 @@ class NotificationService:
         try:
             # 发送邮件通知
             if rule.email_enabled:
-                NotificationService._send_email_notification(alarm, rule)
+                with NOTIFICATION_SECONDS.time(channel='email'):
+                    NotificationService._send_email_notification(alarm, rule)
             
             # 发送Webhook通知
             if rule.webhook_enabled and rule.webhook_url:
-                NotificationService._send_webhook_notification(alarm, rule)
+                with NOTIFICATION_SECONDS.time(channel='webhook'):
+                    NotificationService._send_webhook_notification(alarm, rule)
                 
         except Exception as e:
             logger.error(f"Failed to send notification for alarm {alarm.id}: {e}")
@@ -83,6 +86,7 @@ class NotificationService:
             logger.info(f"Email notification sent for alarm {alarm.id}")
             
         except Exception as e:
+            NOTIFICATIONS_FAILED.inc(channel='email')
             logger.error(f"Failed to send email notification: {e}")
     
     @staticmethod
@@ -127,6 +131,7 @@ class NotificationService:
             logger.info(f"Webhook notification sent for alarm {alarm.id}")
             
         except requests.RequestException as e:
+            NOTIFICATIONS_FAILED.inc(channel='webhook')
             logger.error(f"Failed to send webhook notification: {e}")
     
     @staticmethod
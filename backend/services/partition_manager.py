@@ -0,0 +1,334 @@
+# backend/services/partition_manager.py
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+from sqlalchemy import func, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.numeric_reading import NumericReading
+from models.sensor import Sensor
+from services.rollup_service import rollup_service
+from services.archive_service import reading_archive
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+READINGS_TABLE = 'numeric_readings'
+HISTORY_PARTITION = 'p_history'
+FUTURE_PARTITION = 'p_future'
+
+
+def month_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, 1)
+
+
+def add_months(ts: datetime, months: int) -> datetime:
+    index = ts.year * 12 + ts.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    """月分区名 pYYYYMM，存放该月 [1日, 下月1日) 的读数"""
+    return f"p{month:%Y%m}"
+
+
+def _bound_literal(bound: datetime) -> str:
+    return f"'{bound:%Y-%m-%d %H:%M:%S}'"
+
+
+class ReadingPartitionManager:
+    """读数表分区管理 - 按月 RANGE COLUMNS(timestamp) 分区的维护与保留
+
+    numeric_readings 表按月分区后，带时间范围的查询只扫描相关分区；过期数据按整个
+    分区 DROP PARTITION 删除（只删除分区文件，与数据量无关），取代逐行
+    DELETE。后台线程定期执行 maintain()：把 p_future 拆分出未来 months_ahead
+    个月的分区，清理已删除传感器的读数，并删除上界早于保留期的分区。汇总表
+    （readings_rollup_*）不分区，删除分区前先回填汇总并归档，原始读数删除后
+    仍保留历史统计和 Parquet 归档。
+
+    只支持MySQL；表未分区时（尚未执行迁移）maintain() 只记录日志。
+    """
+
+    def __init__(self, months_ahead: int = 3, retention_months: int = 0, check_interval_hours: float = 24):
+        self.app = None
+        self.enabled = False
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self.check_interval_hours = check_interval_hours
+        self.running = False
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.stats = {
+            'runs': 0,
+            'partitions_created': 0,
+            'partitions_dropped': 0,
+            'partitions_skipped': 0,
+            'orphans_deleted': 0,
+            'errors': 0,
+            'last_run': None,
+            'last_error': None,
+        }
+
+    def init_app(self, app):
+        """从应用配置读取分区参数"""
+        self.app = app
+        self.enabled = app.config.get('READING_PARTITIONS_ENABLED', self.enabled)
+        self.months_ahead = app.config.get('READING_PARTITION_MONTHS_AHEAD', self.months_ahead)
+        self.retention_months = app.config.get('READING_RETENTION_MONTHS', self.retention_months)
+        self.check_interval_hours = app.config.get('READING_PARTITION_CHECK_HOURS', self.check_interval_hours)
+
+    def start(self):
+        """启动后台维护线程（启动时立即执行一次）"""
+        if self.running:
+            return
+        self.running = True
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='reading-partition-manager', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台维护线程"""
+        self.running = False
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while self.running:
+            errors = self.stats['errors']
+            with self.app.app_context():
+                self.maintain()
+            # 失败时（例如数据库尚未就绪）5分钟后重试
+            interval = self.check_interval_hours * 3600
+            if self.stats['errors'] != errors:
+                interval = min(interval, 300)
+            self._stop_event.wait(interval)
+
+    def maintain(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """创建未来分区并按保留期删除过期分区（需要应用上下文）"""
+        result = {'created': [], 'dropped': [], 'orphans_deleted': 0}
+        self.stats['runs'] += 1
+        self.stats['last_run'] = datetime.utcnow().isoformat()
+        try:
+            if not self.is_partitioned():
+                logger.info("numeric_readings 表未分区，跳过分区维护（执行 scripts/manage_partitions.py migrate 转换）")
+                return result
+            result['created'] = self.ensure_future(now=now)
+            result['orphans_deleted'] = self.purge_orphans()
+            if self.retention_months > 0:
+                result['dropped'] = [p['name'] for p in self.drop_expired(now=now)]
+        except (SQLAlchemyError, RuntimeError) as e:
+            db.session.rollback()
+            self.stats['errors'] += 1
+            self.stats['last_error'] = str(e)
+            logger.error("读数表分区维护失败: %s", e)
+        return result
+
+    # ---- 查询 ----
+
+    def is_partitioned(self) -> bool:
+        """numeric_readings 表是否已分区（非MySQL数据库始终返回False）"""
+        if db.session.get_bind().dialect.name != 'mysql':
+            return False
+        return any(p['name'] for p in self.list_partitions())
+
+    def list_partitions(self) -> List[Dict[str, Any]]:
+        """按顺序列出分区：名称、上界（MAXVALUE 为None）、估算行数和字节数"""
+        rows = db.session.execute(text(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS, DATA_LENGTH + INDEX_LENGTH "
+            "FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION"
+        ), {'table': READINGS_TABLE})
+
+        partitions = []
+        for name, description, table_rows, size in rows:
+            upper_bound = None
+            if description and description.upper() != 'MAXVALUE':
+                upper_bound = datetime.fromisoformat(description.strip("'"))
+            partitions.append({
+                'name': name,
+                'upper_bound': upper_bound,
+                'rows': int(table_rows or 0),
+                'bytes': int(size or 0),
+            })
+        return partitions
+
+    # ---- 维护 ----
+
+    def ensure_future(self, months_ahead: Optional[int] = None, now: Optional[datetime] = None) -> List[str]:
+        """从 p_future 拆分出直到当前月 + months_ahead 的月分区，返回新建的分区名"""
+        months_ahead = self.months_ahead if months_ahead is None else months_ahead
+        target = add_months(month_start(now or datetime.utcnow()), months_ahead + 1)
+
+        partitions = self.list_partitions()
+        bounds = [p['upper_bound'] for p in partitions if p['upper_bound'] is not None]
+        if not bounds or partitions[-1]['name'] != FUTURE_PARTITION:
+            raise RuntimeError(f"numeric_readings 表缺少 {FUTURE_PARTITION} 分区或有界分区，无法自动扩展")
+
+        statement = self.reorganize_future_statement(max(bounds), target)
+        if statement is None:
+            return []
+
+        db.session.execute(text(statement))
+        db.session.commit()
+        created = self._months_between(max(bounds), target)
+        self.stats['partitions_created'] += len(created)
+        logger.info("已创建读数分区: %s", ', '.join(created))
+        return created
+
+    def drop_expired(self, retention_months: Optional[int] = None, now: Optional[datetime] = None,
+                     dry_run: bool = False) -> List[Dict[str, Any]]:
+        """删除全部数据早于保留期（当前月往前 retention_months 个月的1日）的分区
+
+        删除前先对分区时间范围回填汇总、执行归档（ARCHIVE_ENABLED），归档水位
+        未覆盖分区内全部读数的分区本次不删除。dry_run 只列出过期分区。
+        """
+        retention_months = self.retention_months if retention_months is None else retention_months
+        if retention_months <= 0:
+            return []
+        cutoff = add_months(month_start(now or datetime.utcnow()), -retention_months)
+
+        expired, lower = [], None
+        for p in self.list_partitions():
+            if p['upper_bound'] is not None and p['upper_bound'] <= cutoff:
+                expired.append({**p, 'lower_bound': lower})
+            lower = p['upper_bound']
+        if not expired or dry_run:
+            return expired
+
+        droppable = [p for p in expired if self._prepare_drop(p['lower_bound'], p['upper_bound'])]
+        skipped = [p['name'] for p in expired if p not in droppable]
+        if skipped:
+            self.stats['partitions_skipped'] += len(skipped)
+            logger.warning("归档水位未覆盖，暂不删除读数分区: %s", ', '.join(skipped))
+        if not droppable:
+            return []
+
+        names = ', '.join(f"`{p['name']}`" for p in droppable)
+        db.session.execute(text(f"ALTER TABLE `{READINGS_TABLE}` DROP PARTITION {names}"))
+        db.session.commit()
+        self.stats['partitions_dropped'] += len(droppable)
+        logger.warning("已删除过期读数分区 (早于 %s): %s", cutoff.date(), names)
+        return droppable
+
+    def _prepare_drop(self, lower: Optional[datetime], upper: datetime) -> bool:
+        """回填 [lower, upper) 的汇总并归档，返回归档是否已覆盖该范围内的全部读数"""
+        if rollup_service.enabled:
+            rollup_service.backfill_missing(upper, start=lower)
+        if not reading_archive.enabled:
+            return True
+
+        reading_archive.archive(before=upper)
+        filters = [NumericReading.timestamp < upper]
+        if lower is not None:
+            filters.append(NumericReading.timestamp >= lower)
+        last_days = db.session.query(NumericReading.sensor_id, func.max(NumericReading.timestamp)).filter(
+            *filters
+        ).group_by(NumericReading.sensor_id).all()
+        watermarks = reading_archive.watermarks([sensor_id for sensor_id, _ in last_days])
+        return all(sensor_id in watermarks and watermarks[sensor_id] >= last_ts.date()
+                   for sensor_id, last_ts in last_days)
+
+    def purge_orphans(self, batch_size: int = 5000) -> int:
+        """分批删除所属传感器已不存在的读数，返回删除的行数
+
+        分区表没有外键，直接在数据库中删除设备（级联删除传感器）或传感器时
+        读数不会随之删除，由维护线程在这里清理。
+        """
+        # DISTINCT sensor_id 可用 idx_sensor_timestamp 做松散索引扫描，不逐行扫描读数
+        sensor_ids = db.session.execute(text(f"SELECT DISTINCT sensor_id FROM `{READINGS_TABLE}`")).scalars().all()
+        existing = {sensor_id for (sensor_id,) in db.session.query(Sensor.id)}
+        orphans = [sensor_id for sensor_id in sensor_ids if sensor_id not in existing]
+
+        deleted = 0
+        for sensor_id in orphans:
+            while True:
+                count = db.session.execute(text(
+                    f"DELETE FROM `{READINGS_TABLE}` WHERE sensor_id = :sensor_id LIMIT {int(batch_size)}"
+                ), {'sensor_id': sensor_id}).rowcount
+                db.session.commit()
+                deleted += count
+                if count < batch_size:
+                    break
+        if deleted:
+            self.stats['orphans_deleted'] += deleted
+            logger.warning("已删除 %d 个已删除传感器的 %d 条读数", len(orphans), deleted)
+        return deleted
+
+    def reorganize_future_statement(self, start: datetime, target: datetime) -> Optional[str]:
+        """生成把 p_future 拆分为 [start, target) 月分区的语句，无需拆分时返回None"""
+        months = self._months_between(start, target)
+        if not months:
+            return None
+
+        definitions = []
+        lower = start
+        while lower < target:
+            upper = add_months(month_start(lower), 1)
+            definitions.append(f"PARTITION `{partition_name(lower)}` VALUES LESS THAN ({_bound_literal(upper)})")
+            lower = upper
+        definitions.append(f"PARTITION `{FUTURE_PARTITION}` VALUES LESS THAN (MAXVALUE)")
+        return (f"ALTER TABLE `{READINGS_TABLE}` REORGANIZE PARTITION `{FUTURE_PARTITION}` INTO (\n  "
+                + ",\n  ".join(definitions) + "\n)")
+
+    def migrate_statements(self, now: Optional[datetime] = None) -> List[str]:
+        """把未分区的 numeric_readings 表转换为按月分区的语句
+
+        分区表不支持外键，且主键/唯一键必须包含分区列：删除 numeric_readings 上的外键
+        （删除传感器时由ORM事件按 sensor_id 删除读数，数据库中直接删除留下的读数由 purge_orphans
+        清理），主键改为 (id, timestamp)。
+        """
+        statements = []
+        foreign_keys = db.session.execute(text(
+            "SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND CONSTRAINT_TYPE = 'FOREIGN KEY'"
+        ), {'table': READINGS_TABLE}).scalars().all()
+        for name in foreign_keys:
+            statements.append(f"ALTER TABLE `{READINGS_TABLE}` DROP FOREIGN KEY `{name}`")
+        statements.append(f"ALTER TABLE `{READINGS_TABLE}` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `timestamp`)")
+
+        current = month_start(now or datetime.utcnow())
+        first_ts = db.session.execute(text(f"SELECT MIN(`timestamp`) FROM `{READINGS_TABLE}`")).scalar()
+        first_month = month_start(first_ts) if first_ts else current
+        target = add_months(current, self.months_ahead + 1)
+
+        definitions = [f"PARTITION `{HISTORY_PARTITION}` VALUES LESS THAN ({_bound_literal(first_month)})"]
+        lower = first_month
+        while lower < target:
+            upper = add_months(lower, 1)
+            definitions.append(f"PARTITION `{partition_name(lower)}` VALUES LESS THAN ({_bound_literal(upper)})")
+            lower = upper
+        definitions.append(f"PARTITION `{FUTURE_PARTITION}` VALUES LESS THAN (MAXVALUE)")
+        statements.append(f"ALTER TABLE `{READINGS_TABLE}` PARTITION BY RANGE COLUMNS(`timestamp`) (\n  "
+                          + ",\n  ".join(definitions) + "\n)")
+        return statements
+
+    @staticmethod
+    def _months_between(start: datetime, target: datetime) -> List[str]:
+        names = []
+        lower = start
+        while lower < target:
+            names.append(partition_name(lower))
+            lower = add_months(month_start(lower), 1)
+        return names
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取分区维护统计信息"""
+        return {
+            'enabled': self.enabled,
+            'running': self.running,
+            'months_ahead': self.months_ahead,
+            'retention_months': self.retention_months,
+            **self.stats
+        }
+
+
+# 全局读数分区管理实例
+partition_manager = ReadingPartitionManager()
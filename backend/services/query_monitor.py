@@ -0,0 +1,175 @@
+# backend/services/query_monitor.py
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, Optional
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|:\w+)'
+_PLACEHOLDER_LIST = re.compile(rf'\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)')
+_ROW_LIST = re.compile(r'\(\?\)(?:\s*,\s*\(\?\))+')
+_SPACE = re.compile(r'\s+')
+
+# 请求内 flask.g 上的统计对象属性名
+_REQUEST_KEY = '_query_monitor'
+
+
+def fingerprint(statement: str) -> str:
+    """SQL语句形状：字面量和占位符替换为 ?，IN 列表和多行 VALUES 折叠为一个，空白归一
+
+    同一行代码每次执行得到相同的形状，与参数值和 IN 列表长度无关。
+    """
+    shape = _STRING.sub('?', statement)
+    shape = _NUMBER.sub('?', shape)
+    shape = _PLACEHOLDER_LIST.sub('(?)', shape)
+    shape = _ROW_LIST.sub('(?)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+class _RequestQueries:
+    """单个请求的SQL统计"""
+    __slots__ = ('count', 'seconds', 'shapes')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+
+
+class QueryMonitor:
+    """SQL查询监控 - 按请求统计查询次数、数据库耗时和重复的语句形状
+
+    挂在 SQLAlchemy Engine 的游标执行事件上，只统计处于请求上下文中的查询
+    （后台线程、MQTT回调不计入）。请求结束时：
+
+      - 同一语句形状执行超过 n_plus_one_threshold 次时记录警告（典型的 N+1：
+        循环中逐个 Query.get 或访问延迟加载的关系）；
+      - 开启 headers 时在响应头返回 X-DB-Query-Count / X-DB-Time-Ms / X-DB-Max-Repeat；
+      - 按端点累计请求数、查询数、耗时和 N+1 次数，由 get_stats() 提供给监控接口。
+    """
+
+    def __init__(self, n_plus_one_threshold: int = 10):
+        self.enabled = True
+        self.headers = False
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = threading.Lock()
+        self._listening = False
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+
+        # 统计信息
+        self.stats = {
+            'requests': 0,
+            'queries': 0,
+            'n_plus_one_warnings': 0,
+        }
+
+    def init_app(self, app):
+        """读取配置，注册 Engine 事件和请求钩子"""
+        self.enabled = app.config.get('SQL_MONITOR_ENABLED', self.enabled)
+        self.headers = app.config.get('SQL_MONITOR_HEADERS', app.debug)
+        self.n_plus_one_threshold = app.config.get('SQL_N_PLUS_ONE_THRESHOLD', self.n_plus_one_threshold)
+        if not self.enabled:
+            return
+
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_execute)
+            self._listening = True
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取监控统计：总计和按端点的累计值（平均每请求查询数、耗时）"""
+        with self._lock:
+            endpoints = {}
+            for name, totals in self._endpoints.items():
+                requests = totals['requests']
+                endpoints[name] = {
+                    **totals,
+                    'db_ms': round(totals['db_ms'], 2),
+                    'avg_queries': round(totals['queries'] / requests, 2),
+                    'avg_db_ms': round(totals['db_ms'] / requests, 3),
+                }
+            return {
+                **self.stats,
+                'n_plus_one_threshold': self.n_plus_one_threshold,
+                'endpoints': endpoints
+            }
+
+    def reset(self):
+        """清空累计统计"""
+        with self._lock:
+            self._endpoints.clear()
+            self.stats.update(requests=0, queries=0, n_plus_one_warnings=0)
+
+    # ---- Engine 事件 ----
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None and has_request_context() and _REQUEST_KEY in g:
+            context._query_monitor_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_query_monitor_started', None)
+        if started is None or not has_request_context():
+            return
+        queries = g.get(_REQUEST_KEY)
+        if queries is not None:
+            queries.count += 1
+            queries.seconds += time.perf_counter() - started
+            queries.shapes[fingerprint(statement)] += 1
+
+    # ---- 请求钩子 ----
+
+    def _start_request(self):
+        setattr(g, _REQUEST_KEY, _RequestQueries())
+
+    def _finish_request(self, response):
+        queries = g.pop(_REQUEST_KEY, None)
+        if queries is None:
+            return response
+
+        shape, repeats = queries.shapes.most_common(1)[0] if queries.shapes else (None, 0)
+        endpoint = request.endpoint or request.path
+        self.record(endpoint, queries.count, queries.seconds, repeats, shape)
+
+        if self.headers:
+            response.headers['X-DB-Query-Count'] = str(queries.count)
+            response.headers['X-DB-Time-Ms'] = f'{queries.seconds * 1000:.2f}'
+            response.headers['X-DB-Max-Repeat'] = str(repeats)
+        return response
+
+    def record(self, endpoint: str, count: int, seconds: float, repeats: int = 0, shape: Optional[str] = None):
+        """累计一个请求的统计，重复次数超过阈值时记录警告"""
+        n_plus_one = repeats > self.n_plus_one_threshold
+        if n_plus_one:
+            logger.warning("可能的 N+1 查询: %s 执行 %d 条SQL，同一语句重复 %d 次: %s",
+                           endpoint, count, repeats, shape[:300])
+
+        with self._lock:
+            totals = self._endpoints.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'db_ms': 0.0, 'max_queries': 0,
+                'n_plus_one': 0, 'last_repeated_statement': None
+            })
+            totals['requests'] += 1
+            totals['queries'] += count
+            totals['db_ms'] += seconds * 1000
+            totals['max_queries'] = max(totals['max_queries'], count)
+            if n_plus_one:
+                totals['n_plus_one'] += 1
+                totals['last_repeated_statement'] = shape
+            self.stats['requests'] += 1
+            self.stats['queries'] += count
+            self.stats['n_plus_one_warnings'] += n_plus_one
+
+
+# 全局SQL查询监控实例
+query_monitor = QueryMonitor()
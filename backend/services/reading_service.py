@@ -1,20 +1,39 @@
 # backend/services/reading_service.py
-from typing import List, Optional, Dict, Any, BinaryIO
+from typing import List, Optional, Dict, Any, BinaryIO, Iterator
 from datetime import datetime, timedelta
 from models.reading import Reading
+from models.numeric_reading import NumericReading
 from models.sensor import Sensor
 from extensions import db
+from sqlalchemy import func
 from services.storage_service import storage_service
+from services.rollup_service import rollup_service
+from services.archive_service import reading_archive
+from services.latest_cache import latest_cache
+from utils.downsample import downsample
+import numpy as np
+import pandas as pd
 import logging
 import json
+import csv
+import io
+import zlib
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_COLUMNS = ['sensor_id', 'timestamp', 'data_type', 'value', 'unit', 'quality',
+                  'file_path', 'file_format', 'file_size']
+# 批量查询的分桶粒度（对应汇总表）及原始读数聚合时的 pandas 频率
+BULK_BUCKETS = {'1m': '1min', '1h': '1h', '1d': '1D'}
+BULK_COLUMNS = ['sensor_id', 'ts', 'v', 'min', 'max', 'n']
+# 每块写出的行数（同时作为数据库流式读取的批大小）
+EXPORT_BATCH_ROWS = 1000
 
 class ReadingService:
     """传感器读数业务逻辑服务"""
     
     @staticmethod
     def create_numeric_reading(sensor_id: int, value: float, 
-                             timestamp: Optional[datetime] = None,
-                             metadata: Optional[Dict[str, Any]] = None) -> Reading:
+                             timestamp: Optional[datetime] = None) -> NumericReading:
         """创建数值型读数"""
         try:
             sensor = Sensor.query.get(sensor_id)
@@ -24,13 +43,10 @@ class ReadingService:
             if not sensor.is_numeric_sensor:
                 raise ValueError(f"Sensor {sensor_id} is not a numeric sensor")
             
-            reading = Reading(
+            reading = NumericReading.create_numeric(
                 sensor_id=sensor_id,
-                device_id=sensor.device_id,
-                data_type='numeric',
-                numeric_value=value,
-                timestamp=timestamp or datetime.utcnow(),
-                metadata=metadata or {}
+                value=value,
+                timestamp=timestamp
             )
             
             db.session.add(reading)
@@ -111,9 +127,11 @@ class ReadingService:
     def get_readings_by_sensor(sensor_id: int, limit: int = 100, 
                               offset: int = 0) -> List[Reading]:
         """获取传感器的读数"""
-        return Reading.query.filter_by(
+        sensor = Sensor.query.get(sensor_id)
+        model = sensor.reading_model if sensor else Reading
+        return model.query.filter_by(
             sensor_id=sensor_id
-        ).order_by(Reading.timestamp.desc()).offset(offset).limit(limit).all()
+        ).order_by(model.timestamp.desc()).offset(offset).limit(limit).all()
     
     @staticmethod
     def get_readings_by_device(device_id: int, limit: int = 100,
@@ -154,25 +172,101 @@ class ReadingService:
         return query.order_by(Reading.timestamp.desc()).limit(limit).all()
     
     @staticmethod
-    def get_latest_reading(sensor_id: int) -> Optional[Reading]:
-        """获取传感器的最新读数"""
-        return Reading.query.filter_by(
-            sensor_id=sensor_id
-        ).order_by(Reading.timestamp.desc()).first()
+    def get_latest_reading(sensor_id: int) -> Optional[Dict[str, Any]]:
+        """获取传感器的最新读数（to_dict 结构，来自最新读数缓存）"""
+        sensor = Sensor.query.get(sensor_id)
+        return latest_cache.get(sensor) if sensor else None
+    
+    @staticmethod
+    def get_latest_readings(sensors: List[Sensor]) -> Dict[int, Dict[str, Any]]:
+        """获取多个传感器的最新读数 {传感器ID: 读数}，没有读数的传感器不出现在结果中"""
+        return latest_cache.get_many(sensors)
     
     @staticmethod
-    def get_latest_readings_by_device(device_id: int) -> List[Reading]:
-        """获取设备每个传感器的最新读数"""
-        # 获取设备的所有传感器
+    def count_sensor_readings(sensor: Sensor, start_time: Optional[datetime] = None,
+                              end_time: Optional[datetime] = None, source: str = 'exact') -> int:
+        """统计传感器在 [start_time, end_time] 内的读数数量
+
+        source='rollup' 时数值传感器从汇总表计数（不扫描原始读数；批量写入器和ORM会话
+        写入的读数都在同一事务中计入汇总，只统计质量为 good 的读数）；其余情况执行 COUNT(*)。
+        """
+        if source == 'rollup' and not sensor.is_multimedia_sensor:
+            # 汇总区间为 [start, end)，与列表接口的闭区间对齐
+            end = end_time + timedelta(microseconds=1) if end_time else None
+            summary = rollup_service.summarize([sensor.id], start_time, end).get(sensor.id)
+            return summary['count'] if summary else 0
+
+        model = sensor.reading_model
+        query = db.session.query(func.count(model.id)).filter(model.sensor_id == sensor.id)
+        if start_time:
+            query = query.filter(model.timestamp >= start_time)
+        if end_time:
+            query = query.filter(model.timestamp <= end_time)
+        return query.scalar() or 0
+
+    @staticmethod
+    def get_downsampled_series(sensor_id: int, points: int, method: str = 'lttb',
+                               start_time: Optional[datetime] = None,
+                               end_time: Optional[datetime] = None) -> Dict[str, Any]:
+        """图表用的降采样序列：按列取出 [start_time, end_time] 内的 (时间戳, 数值)，
+        用 NumPy 降采样到 points 个点以内
+
+        时间戳以毫秒 epoch 返回，与数值分别成列，避免逐条 to_dict() 的开销。
+        已归档的日期从 Parquet 文件读取，其余为一次 (sensor_id, timestamp) 索引范围扫描。
+        """
+        df = reading_archive.read_numeric([sensor_id], start_time, end_time)
+        if df.empty:
+            x = np.empty(0, dtype=np.int64)
+            y = np.empty(0, dtype=np.float64)
+        else:
+            x = df['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+            y = df['value'].to_numpy(dtype=np.float64)
+        sampled_x, sampled_y = downsample(x, y, points, method)
+        return {
+            'sensor_id': sensor_id,
+            'method': method,
+            'source_points': len(x),
+            'points': len(sampled_x),
+            'timestamps': sampled_x.tolist(),
+            'values': sampled_y.tolist()
+        }
+
+    @staticmethod
+    def get_bulk_series(sensor_ids: List[int], start_time: Optional[datetime] = None,
+                        end_time: Optional[datetime] = None, bucket: Optional[str] = None) -> Dict[int, Dict[str, list]]:
+        """多个传感器的列式序列：{传感器ID: {ts: [毫秒时间戳], v: [数值]}}
+
+        不分桶时返回原始读数（一次 sensor_id IN 查询，已归档的日期读取 Parquet 文件）；
+        bucket 为 1m/1h/1d 时 v 为桶内均值，并附带 min/max/n 三列，启用汇总表时从汇总表
+        一次查询，否则由原始读数按桶聚合。
+        """
+        if bucket is None:
+            df = reading_archive.read_numeric(sensor_ids, start_time, end_time)
+            df = df.rename(columns={'timestamp': 'ts', 'value': 'v'})[['sensor_id', 'ts', 'v']]
+        elif rollup_service.enabled:
+            df = pd.DataFrame(rollup_service.series(sensor_ids, bucket, start_time, end_time),
+                              columns=['sensor_id', 'ts', 'n', 'v', 'min', 'max'])[BULK_COLUMNS]
+        else:
+            raw = reading_archive.read_numeric(sensor_ids, start_time, end_time)
+            raw['ts'] = pd.to_datetime(raw['timestamp']).dt.floor(BULK_BUCKETS[bucket])
+            df = raw.groupby(['sensor_id', 'ts'], sort=True)['value'].agg(
+                n='count', v='mean', min='min', max='max'
+            ).reset_index()[BULK_COLUMNS]
+
+        columns = [column for column in df.columns if column != 'sensor_id']
+        result = {sensor_id: {column: [] for column in columns} for sensor_id in sensor_ids}
+        if df.empty:
+            return result
+        df['ts'] = pd.to_datetime(df['ts']).to_numpy(dtype='datetime64[ms]').astype(np.int64)
+        for sensor_id, group in df.groupby('sensor_id', sort=False):
+            result[int(sensor_id)] = {column: group[column].tolist() for column in columns}
+        return result
+
+    @staticmethod
+    def get_latest_readings_by_device(device_id: int) -> List[Dict[str, Any]]:
+        """获取设备每个启用传感器的最新读数"""
         sensors = Sensor.query.filter_by(device_id=device_id, status='active').all()
-        latest_readings = []
-        
-        for sensor in sensors:
-            latest = ReadingService.get_latest_reading(sensor.id)
-            if latest:
-                latest_readings.append(latest)
-        
-        return latest_readings
+        return list(ReadingService.get_latest_readings(sensors).values())
     
     @staticmethod
     def delete_reading(reading_id: int) -> bool:
@@ -201,18 +295,15 @@ class ReadingService:
             return False
     
     @staticmethod
-    def batch_create_numeric_readings(readings_data: List[Dict[str, Any]]) -> List[Reading]:
+    def batch_create_numeric_readings(readings_data: List[Dict[str, Any]]) -> List[NumericReading]:
         """批量创建数值型读数"""
         readings = []
         try:
             for data in readings_data:
-                reading = Reading(
+                reading = NumericReading.create_numeric(
                     sensor_id=data['sensor_id'],
-                    device_id=data['device_id'],
-                    data_type='numeric',
-                    numeric_value=data['value'],
-                    timestamp=data.get('timestamp', datetime.utcnow()),
-                    metadata=data.get('metadata', {})
+                    value=data['value'],
+                    timestamp=data.get('timestamp')
                 )
                 readings.append(reading)
                 db.session.add(reading)
@@ -237,23 +328,16 @@ class ReadingService:
             end_time = datetime.utcnow()
             start_time = end_time - timedelta(days=days)
             
-            query = Reading.query.filter(
-                Reading.timestamp >= start_time,
-                Reading.timestamp <= end_time
-            )
-            
+            # 统计范围内的传感器
             if sensor_id:
-                query = query.filter_by(sensor_id=sensor_id)
+                sensor_ids = [sensor_id]
             elif device_id:
-                query = query.filter_by(device_id=device_id)
-            
-            if data_type:
-                query = query.filter_by(data_type=data_type)
-            
-            readings = query.all()
+                sensor_ids = [sid for (sid,) in db.session.query(Sensor.id).filter_by(device_id=device_id)]
+            else:
+                sensor_ids = [sid for (sid,) in db.session.query(Sensor.id)]
             
             stats = {
-                'total_count': len(readings),
+                'total_count': 0,
                 'time_range': {
                     'start': start_time.isoformat(),
                     'end': end_time.isoformat(),
@@ -261,31 +345,41 @@ class ReadingService:
                 }
             }
             
-            # 按数据类型分组
+            # 文件型读数按数据类型分组计数（数据库端聚合）
             type_stats = {}
-            for reading in readings:
-                dtype = reading.data_type
-                if dtype not in type_stats:
-                    type_stats[dtype] = {'count': 0, 'size_total': 0}
-                
-                type_stats[dtype]['count'] += 1
-                if reading.file_size:
-                    type_stats[dtype]['size_total'] += reading.file_size
-            
+            if data_type != 'numeric' and sensor_ids:
+                query = db.session.query(
+                    Reading.data_type, func.count(Reading.id), func.sum(Reading.file_size)
+                ).filter(
+                    Reading.sensor_id.in_(sensor_ids),
+                    Reading.data_type != 'numeric',
+                    Reading.timestamp >= start_time,
+                    Reading.timestamp <= end_time
+                )
+                if data_type:
+                    query = query.filter(Reading.data_type == data_type)
+                for dtype, count, size_total in query.group_by(Reading.data_type):
+                    type_stats[dtype] = {'count': count, 'size_total': int(size_total or 0)}
+            
+            # 数值型读数由汇总表计算
+            if data_type in (None, 'numeric') and sensor_ids:
+                summaries = rollup_service.summarize(sensor_ids, start_time, end_time)
+                numeric = [summary for summary in summaries.values() if summary['count']]
+                if numeric:
+                    count = sum(summary['count'] for summary in numeric)
+                    latest = max(numeric, key=lambda summary: summary['last_ts'])
+                    type_stats['numeric'] = {'count': count, 'size_total': 0}
+                    stats['numeric_stats'] = {
+                        'count': count,
+                        'min': min(summary['min'] for summary in numeric),
+                        'max': max(summary['max'] for summary in numeric),
+                        'avg': sum(summary['sum'] for summary in numeric) / count,
+                        'latest': latest['last_value']
+                    }
+            
+            stats['total_count'] = sum(entry['count'] for entry in type_stats.values())
             stats['by_type'] = type_stats
             
-            # 如果是数值型数据，计算统计值
-            numeric_readings = [r for r in readings if r.data_type == 'numeric' and r.numeric_value is not None]
-            if numeric_readings:
-                values = [r.numeric_value for r in numeric_readings]
-                stats['numeric_stats'] = {
-                    'count': len(values),
-                    'min': min(values),
-                    'max': max(values),
-                    'avg': sum(values) / len(values),
-                    'latest': values[0] if values else None
-                }
-            
             return stats
             
         except Exception as e:
@@ -297,44 +391,82 @@ class ReadingService:
                            device_id: Optional[int] = None,
                            start_time: Optional[datetime] = None,
                            end_time: Optional[datetime] = None) -> str:
-        """导出读数为CSV格式"""
+        """导出读数为CSV格式（一次性返回字符串，大范围导出使用 stream_export）"""
         try:
-            readings = ReadingService.get_readings_in_timerange(
-                sensor_id=sensor_id,
-                device_id=device_id,
-                start_time=start_time,
-                end_time=end_time
-            )
-            
-            import csv
-            import io
-            
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # 写入表头
-            headers = ['id', 'sensor_id', 'device_id', 'data_type', 'timestamp', 
-                      'numeric_value', 'file_path', 'file_format', 'file_size', 'metadata']
-            writer.writerow(headers)
-            
-            # 写入数据
-            for reading in readings:
-                row = [
-                    reading.id,
-                    reading.sensor_id,
-                    reading.device_id,
-                    reading.data_type,
-                    reading.timestamp.isoformat(),
-                    reading.numeric_value,
-                    reading.file_path,
-                    reading.file_format,
-                    reading.file_size,
-                    json.dumps(reading.metadata) if reading.metadata else ''
-                ]
-                writer.writerow(row)
-            
-            return output.getvalue()
+            if sensor_id:
+                sensors = Sensor.query.filter_by(id=sensor_id).all()
+            else:
+                sensors = Sensor.query.filter_by(device_id=device_id).order_by(Sensor.id).all()
+            return b''.join(ReadingService.stream_export(sensors, start_time, end_time)).decode('utf-8')
             
         except Exception as e:
             logging.error(f"Failed to export readings to CSV: {e}")
             return ""
+    
+    @staticmethod
+    def iter_export_rows(sensors: List[Sensor], start_time: Optional[datetime] = None,
+                         end_time: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """按传感器、时间顺序逐条产出导出行
+
+        数值读数经归档服务读取（归档文件逐个读入，数据库部分 yield_per 流式读取），
+        图片/视频读数以 yield_per 流式查询 readings 表，内存占用与导出范围无关。
+        """
+        for sensor in sensors:
+            if not sensor.is_multimedia_sensor:
+                for timestamp, value, quality in reading_archive.iter_numeric(sensor.id, start_time, end_time):
+                    yield {'sensor_id': sensor.id, 'timestamp': timestamp.isoformat(), 'data_type': 'numeric',
+                           'value': value, 'unit': sensor.unit, 'quality': quality}
+                continue
+            
+            query = db.session.query(
+                Reading.timestamp, Reading.data_type, Reading.file_path, Reading.file_format, Reading.file_size
+            ).filter(Reading.sensor_id == sensor.id)
+            if start_time:
+                query = query.filter(Reading.timestamp >= start_time)
+            if end_time:
+                query = query.filter(Reading.timestamp <= end_time)
+            for timestamp, data_type, file_path, file_format, file_size in query.order_by(
+                Reading.timestamp
+            ).yield_per(EXPORT_BATCH_ROWS):
+                yield {'sensor_id': sensor.id, 'timestamp': timestamp.isoformat(), 'data_type': data_type,
+                       'file_path': file_path, 'file_format': file_format, 'file_size': file_size}
+    
+    @staticmethod
+    def stream_export(sensors: List[Sensor], start_time: Optional[datetime] = None,
+                      end_time: Optional[datetime] = None, fmt: str = 'csv',
+                      compress: bool = False) -> Iterator[bytes]:
+        """以 EXPORT_BATCH_ROWS 行为一块产出 CSV/NDJSON 字节，compress 时边生成边 gzip 压缩"""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        
+        def chunks():
+            buffer = io.StringIO()
+            writer = None
+            if fmt == 'csv':
+                writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+                writer.writeheader()
+            rows = 0
+            for row in ReadingService.iter_export_rows(sensors, start_time, end_time):
+                if writer:
+                    writer.writerow(row)
+                else:
+                    buffer.write(json.dumps(row, ensure_ascii=False))
+                    buffer.write('\n')
+                rows += 1
+                if rows % EXPORT_BATCH_ROWS == 0:
+                    yield buffer.getvalue().encode('utf-8')
+                    buffer.seek(0)
+                    buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue().encode('utf-8')
+        
+        def gzipped():
+            # wbits=31 输出带 gzip 头的流
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+            for chunk in chunks():
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+        
+        return gzipped() if compress else chunks()
@@ -0,0 +1,318 @@
+# backend/services/reading_writer.py
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Any, List, Optional, Callable
+
+from sqlalchemy import insert, text
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from models.numeric_reading import NumericReading, quality_code
+from services.metrics import INGEST_FLUSH_SECONDS
+from services.tracing import tracer
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+def _table_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """摄取行数据（与 Reading 字段一致）转换为 numeric_readings 窄表的列"""
+    return {
+        'sensor_id': row['sensor_id'],
+        'timestamp': row['timestamp'],
+        'value': row['numeric_value'],
+        'quality': quality_code(row.get('quality')),
+    }
+
+
+class ReadingBatchWriter:
+    """读数批量写入器 - 将MQTT数值读数缓冲后按刷新窗口以多行INSERT写入 numeric_readings 表
+
+    submit() 只把行数据放入内存缓冲区并立即返回 Future；后台线程在
+    缓冲行数达到 max_rows 或最早一条等待超过 max_linger_ms 时执行一次
+    多行INSERT + 一次commit，然后把读数ID回填到 Future 并通知刷新监听器
+    （例如告警检查）。被唯一约束拒绝的重复行ID为None，不会通知监听器。
+
+    MySQL 不支持 RETURNING，读数ID由 LAST_INSERT_ID() 推算：行数已知的单条
+    多行INSERT（"simple insert"）在 innodb_autoinc_lock_mode 0/1/2 下都一次
+    分配连续的自增值，相邻两行相差 auto_increment_increment。启动时读取并
+    检查这两个变量，ID 按步长推算。
+    """
+
+    def __init__(self, max_rows: int = 500, max_linger_ms: int = 200):
+        self.app = None
+        self.max_rows = max_rows
+        self.max_linger_ms = max_linger_ms
+        self.running = False
+
+        self._pending: List[tuple] = []  # [(rows, future, enqueued_at)]
+        self._pending_rows = 0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._flush_listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self._commit_hooks: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self._id_step: Optional[int] = None
+
+        # 统计信息
+        self.stats = {
+            'rows_submitted': 0,
+            'rows_written': 0,
+            'rows_failed': 0,
+            'rows_skipped': 0,
+            'flushes': 0,
+            'last_flush_rows': 0,
+            'last_flush_ms': 0.0,
+        }
+
+    def init_app(self, app):
+        """从应用配置读取批量参数"""
+        self.app = app
+        self.max_rows = app.config.get('INGEST_BATCH_MAX_ROWS', self.max_rows)
+        self.max_linger_ms = app.config.get('INGEST_BATCH_MAX_LINGER_MS', self.max_linger_ms)
+
+    def start(self):
+        """启动后台刷新线程"""
+        if self.running:
+            return
+        self.running = True
+        if self.app is not None:
+            with self.app.app_context():
+                try:
+                    self._auto_increment_step()
+                except SQLAlchemyError as e:
+                    # 数据库尚未就绪时在第一次写入时检查
+                    db.session.rollback()
+                    logger.warning("读取自增配置失败，将在首次写入时重试: %s", e)
+        self._thread = threading.Thread(target=self._run, name='reading-batch-writer', daemon=True)
+        self._thread.start()
+        logger.info("读数批量写入器已启动: max_rows=%s, max_linger_ms=%s",
+                    self.max_rows, self.max_linger_ms)
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台线程，停止前会刷新剩余缓冲"""
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        logger.info("读数批量写入器已停止")
+
+    def add_flush_listener(self, listener: Callable[[List[Dict[str, Any]]], None]):
+        """注册刷新监听器，参数为已写入的行（包含 id 字段）"""
+        self._flush_listeners.append(listener)
+
+    def add_commit_hook(self, hook: Callable[[List[Dict[str, Any]]], None]):
+        """注册事务钩子：在写入读数的同一事务中、提交之前调用（例如更新汇总表）
+
+        钩子只会收到实际插入的行；钩子自身的失败需要在内部处理，否则整批读数回滚。
+        """
+        self._commit_hooks.append(hook)
+
+    def submit(self, rows: List[Dict[str, Any]]) -> Future:
+        """提交待写入的读数行，返回在刷新后得到读数ID列表的 Future"""
+        future = Future()
+        if not rows:
+            future.set_result([])
+            return future
+
+        with self._cond:
+            self._pending.append((rows, future, time.monotonic()))
+            self._pending_rows += len(rows)
+            self.stats['rows_submitted'] += len(rows)
+            if self._pending_rows >= self.max_rows:
+                self._cond.notify_all()
+            elif len(self._pending) == 1:
+                # 新窗口开始，唤醒线程开始计时
+                self._cond.notify_all()
+        return future
+
+    def flush(self):
+        """同步刷新当前缓冲（用于停机和测试）"""
+        with self._cond:
+            batch = self._take_pending()
+        if batch:
+            self._flush_batch(batch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取写入器统计信息"""
+        with self._cond:
+            pending_rows = self._pending_rows
+        return {
+            'running': self.running,
+            'max_rows': self.max_rows,
+            'max_linger_ms': self.max_linger_ms,
+            'pending_rows': pending_rows,
+            **self.stats
+        }
+
+    def _take_pending(self) -> List[tuple]:
+        """取出一个刷新窗口的数据（调用方需持有锁）"""
+        batch = []
+        taken_rows = 0
+        while self._pending and taken_rows < self.max_rows:
+            entry = self._pending.pop(0)
+            batch.append(entry)
+            taken_rows += len(entry[0])
+        self._pending_rows -= taken_rows
+        return batch
+
+    def _run(self):
+        """后台刷新循环"""
+        linger = self.max_linger_ms / 1000.0
+        while True:
+            with self._cond:
+                while self.running and not self._pending:
+                    self._cond.wait()
+
+                if self._pending:
+                    deadline = self._pending[0][2] + linger
+                    while self.running and self._pending_rows < self.max_rows:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+
+                batch = self._take_pending()
+                stopping = not self.running and not self._pending
+
+            if batch:
+                self._flush_batch(batch)
+            if stopping:
+                break
+
+    def _flush_batch(self, batch: List[tuple]):
+        """写入一个刷新窗口的数据并回填 Future"""
+        rows = [row for entry in batch for row in entry[0]]
+        try:
+            ids = self.write_rows(rows)
+        except Exception as e:
+            logger.error("批量写入读数失败 (%d 条): %s", len(rows), e)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for entry_rows, future, _ in batch:
+            future.set_result(ids[offset:offset + len(entry_rows)])
+            offset += len(entry_rows)
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """同步执行一次多行INSERT并提交，然后通知刷新监听器
+
+        失败时回滚并抛出异常，由调用方决定重试或放弃（写前日志的应用线程
+        直接调用该方法，数据库不可用时保留日志并重试）。
+        """
+        started = time.monotonic()
+        if self.app is None:
+            raise RuntimeError("应用上下文不可用")
+
+        with self.app.app_context():
+            try:
+                try:
+                    ids = self._insert_rows(rows)
+                    self._run_commit_hooks(rows, ids)
+                    db.session.commit()
+                except IntegrityError as e:
+                    # 启用 (sensor_id, timestamp) 唯一索引时，一条重复读数会使整批失败：
+                    # 回退为逐行写入并跳过被约束拒绝的行
+                    db.session.rollback()
+                    logger.warning("批量写入违反约束，改为逐行写入: %s", e.orig)
+                    ids = self._insert_rows_skipping_conflicts(rows)
+                    self._run_commit_hooks(rows, ids)
+                    db.session.commit()
+            except Exception:
+                try:
+                    db.session.rollback()
+                except Exception:
+                    pass
+                self.stats['rows_failed'] += len(rows)
+                raise
+
+            for row, reading_id in zip(rows, ids):
+                row['id'] = reading_id
+            written = [row for row in rows if row['id'] is not None]
+
+            elapsed_ms = (time.monotonic() - started) * 1000
+            self.stats['rows_written'] += len(written)
+            self.stats['rows_skipped'] += len(rows) - len(written)
+            self.stats['flushes'] += 1
+            self.stats['last_flush_rows'] = len(rows)
+            self.stats['last_flush_ms'] = round(elapsed_ms, 2)
+            INGEST_FLUSH_SECONDS.observe(elapsed_ms / 1000)
+            tracer.record_rows(written, 'reading_writer.write', time.time() - elapsed_ms / 1000,
+                               batch_rows=len(rows))
+            logger.info("批量写入读数成功: %d 条, 耗时 %.1fms", len(rows), elapsed_ms)
+
+            for listener in self._flush_listeners:
+                try:
+                    listener(written)
+                except Exception as e:
+                    logger.error("刷新监听器执行失败: %s", e)
+
+        return ids
+
+    def _run_commit_hooks(self, rows: List[Dict[str, Any]], ids: List[Optional[int]]):
+        """在提交前调用事务钩子"""
+        if not self._commit_hooks:
+            return
+        inserted = [row for row, reading_id in zip(rows, ids) if reading_id is not None]
+        for hook in self._commit_hooks:
+            hook(inserted)
+
+    def _insert_rows(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """多行INSERT并返回按提交顺序排列的读数ID"""
+        table = NumericReading.__table__
+        dialect = db.session.get_bind().dialect
+        rows = [_table_row(row) for row in rows]
+
+        if getattr(dialect, 'insert_executemany_returning_sort_by_parameter_order', False):
+            result = db.session.execute(
+                insert(table).returning(table.c.id, sort_by_parameter_order=True),
+                rows
+            )
+            return [row[0] for row in result]
+
+        # MySQL不支持RETURNING：使用单条多行INSERT，InnoDB对行数已知的
+        # "简单插入"分配连续的自增ID，LAST_INSERT_ID() 为第一行的ID
+        step = self._auto_increment_step()
+        result = db.session.execute(insert(table).values(rows))
+        first_id = result.lastrowid
+        return list(range(first_id, first_id + len(rows) * step, step))
+
+    def _auto_increment_step(self) -> int:
+        """读取并检查 MySQL 自增配置，返回同一条INSERT中相邻两行的ID差（其他数据库为1）"""
+        if self._id_step is not None:
+            return self._id_step
+        if db.session.get_bind().dialect.name != 'mysql':
+            self._id_step = 1
+            return self._id_step
+
+        lock_mode, increment = db.session.execute(
+            text("SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment")
+        ).one()
+        if int(lock_mode) not in (0, 1, 2):
+            raise RuntimeError(f"不支持的 innodb_autoinc_lock_mode={lock_mode}，无法由 LAST_INSERT_ID() 推算读数ID")
+        self._id_step = int(increment)
+        if self._id_step != 1:
+            logger.warning("auto_increment_increment=%d，批量写入按该步长推算读数ID", self._id_step)
+        return self._id_step
+
+    def _insert_rows_skipping_conflicts(self, rows: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """逐行INSERT（每行一个保存点），被约束拒绝的行返回None"""
+        table = NumericReading.__table__
+        ids = []
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    result = db.session.execute(insert(table).values(**_table_row(row)))
+                ids.append(result.inserted_primary_key[0])
+            except IntegrityError:
+                ids.append(None)
+        return ids
+
+
+# 全局读数批量写入器实例
+reading_writer = ReadingBatchWriter()
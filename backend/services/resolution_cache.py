@@ -0,0 +1,162 @@
+# backend/services/resolution_cache.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, NamedTuple
+
+from models.device import Device
+from models.sensor import Sensor
+
+logger = logging.getLogger(__name__)
+
+
+class ResolvedDevice(NamedTuple):
+    """缓存中的设备解析结果，type 用于选择设备模板解码器"""
+    id: int
+    type: Optional[str]
+
+
+class ResolvedSensor(NamedTuple):
+    """缓存中的传感器解析结果，字段与摄取路径用到的 Sensor 属性一致"""
+    id: int
+    device_id: int
+    type: str
+    name: Optional[str]
+    unit: Optional[str]
+
+
+class SensorResolutionCache:
+    """设备/传感器解析缓存 - 将 (client_id, sensor_type) 映射到传感器
+
+    摄取热路径每条消息都要根据 client_id 查设备、再按类型查传感器。
+    该缓存在进程内保存解析结果（包括"未找到"的结果），使用LRU限制
+    条目数并设置TTL；设备或传感器被创建、修改、删除时由调用方通过
+    invalidate_client / invalidate_device 显式失效。
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: int = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[tuple, tuple]' = OrderedDict()  # key -> (value, device_id, expires_at)
+        self._lock = threading.Lock()
+        self._generation = 0
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """从应用配置读取缓存参数"""
+        self.max_entries = app.config.get('SENSOR_CACHE_MAX_ENTRIES', self.max_entries)
+        self.ttl_seconds = app.config.get('SENSOR_CACHE_TTL_SECONDS', self.ttl_seconds)
+
+    def get_device_id(self, client_id: str) -> Optional[int]:
+        """根据client_id获取启用设备的ID，未找到返回None"""
+        device = self.get_device(client_id)
+        return device.id if device else None
+
+    def get_device(self, client_id: str) -> Optional[ResolvedDevice]:
+        """根据client_id获取启用设备（ID和设备类型），未找到返回None"""
+        key = ('device', client_id)
+        found, resolved = self._get(key)
+        if found:
+            return resolved
+
+        generation = self._generation
+        device = Device.query.filter_by(
+            client_id=client_id,
+            is_active=True
+        ).first()
+        resolved = ResolvedDevice(id=device.id, type=device.type) if device else None
+        self._put(key, resolved, resolved.id if resolved else None, generation)
+        return resolved
+
+    def get_sensor(self, client_id: str, sensor_type: str) -> Optional[ResolvedSensor]:
+        """根据client_id和传感器类型获取传感器，未找到返回None"""
+        key = ('sensor', client_id, sensor_type)
+        found, resolved = self._get(key)
+        if found:
+            return resolved
+
+        device_id = self.get_device_id(client_id)
+        if device_id is None:
+            return None
+
+        generation = self._generation
+        sensor = Sensor.query.filter_by(
+            device_id=device_id,
+            type=sensor_type
+        ).first()
+        resolved = ResolvedSensor(
+            id=sensor.id,
+            device_id=sensor.device_id,
+            type=sensor.type,
+            name=sensor.name,
+            unit=sensor.unit
+        ) if sensor else None
+        self._put(key, resolved, device_id, generation)
+        return resolved
+
+    def invalidate_client(self, client_id: Optional[str]):
+        """使某个client_id的所有解析结果失效"""
+        if not client_id:
+            return
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._entries if k[1] == client_id]:
+                del self._entries[key]
+
+    def invalidate_device(self, device_id: Optional[int]):
+        """使某个设备（及其传感器）的所有解析结果失效"""
+        if device_id is None:
+            return
+        with self._lock:
+            self._generation += 1
+            for key in [k for k, v in self._entries.items() if v[1] == device_id]:
+                del self._entries[key]
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
+    def _get(self, key: tuple):
+        """查找缓存条目，返回 (是否命中, 值)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[2] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[0]
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def _put(self, key: tuple, value, device_id: Optional[int], generation: int):
+        """写入缓存条目；加载期间发生过失效则丢弃，避免写回旧数据"""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (value, device_id, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# 全局解析缓存实例
+resolution_cache = SensorResolutionCache()
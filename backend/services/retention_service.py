@@ -0,0 +1,366 @@
+# backend/services/retention_service.py
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.numeric_reading import NumericReading
+from models.reading_rollup import ROLLUP_MODELS
+from models.sensor import Sensor
+from models.device import Device
+from models.device_template import DeviceTemplate
+from services.rollup_service import rollup_service
+from services.archive_service import reading_archive
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+# 保留策略字段（天数，None 表示永久保留），从细到粗
+POLICY_KEYS = ('raw_days', 'rollup_1m_days', 'rollup_1h_days', 'rollup_1d_days')
+ROLLUP_POLICY_KEYS = {'1m': 'rollup_1m_days', '1h': 'rollup_1h_days', '1d': 'rollup_1d_days'}
+
+# 未配置策略时全部永久保留，删除数据须显式声明
+DEFAULT_POLICY = {
+    'raw_days': None,
+    'rollup_1m_days': None,
+    'rollup_1h_days': None,
+    'rollup_1d_days': None,
+}
+
+# 无法从数据库获取表大小时（非MySQL）使用的每行估算字节数
+_FALLBACK_ROW_BYTES = {'readings': 40, 'rollup': 90}
+_SENSOR_CHUNK = 500
+
+
+def _day(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, ts.day)
+
+
+def normalize_policy(policy: Dict[str, Any], base: Optional[Dict[str, Any]] = None) -> Dict[str, Optional[int]]:
+    """在 base 之上合并策略并校验：天数为正整数或None，且粗粒度保留时间不短于细粒度"""
+    merged = dict(base or DEFAULT_POLICY)
+    for key, value in policy.items():
+        if key not in POLICY_KEYS:
+            raise ValueError(f"未知的保留策略字段: {key}")
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value <= 0):
+            raise ValueError(f"保留天数必须为正整数或null: {key}={value!r}")
+        merged[key] = value
+
+    previous = 0
+    for key in POLICY_KEYS:
+        days = merged[key]
+        if previous is None and days is not None:
+            raise ValueError(f"{key} 不能短于更细粒度的保留时间（更细粒度为永久保留）")
+        if days is not None and days < previous:
+            raise ValueError(f"{key}={days} 短于更细粒度的保留时间 {previous} 天")
+        previous = days
+    return merged
+
+
+class RetentionPolicyEngine:
+    """保留与降采样策略引擎 - 按传感器类型/设备模板清理过期的原始读数和汇总数据
+
+    策略按天数声明每一层的保留时间，例如原始读数30天、分钟汇总1年、小时和
+    天汇总永久保留。每个传感器的策略依次取：设备模板中该传感器配置的
+    retention > RETENTION_POLICIES 中按传感器类型的策略 > default 策略。
+
+    后台任务对每组策略相同的传感器：
+      1. 降采样：删除原始读数前，对原始读数多于天汇总计数的日期重新回填汇总
+         （补齐启用汇总之前或直接用SQL写入的读数），保证删除的数据已进入汇总层；
+      2. 按 (传感器, 时间) 索引每次选出 batch_size 条过期的数值读数并按ID删除，
+         批次之间暂停，不会长时间锁表；
+      3. 以同样的批量方式删除各汇总层中过期的桶。
+    启用冷数据归档时，删除原始读数前先把截止时间之前的日期导出为 Parquet。
+    截止时间按天对齐。只处理 numeric_readings 表，图片/视频读数关联对象存储文件，不在此删除。
+    plan() 为演练模式，报告每组策略将删除的行数和估算回收的空间。
+    """
+
+    def __init__(self, batch_size: int = 5000, batch_pause_ms: int = 50, check_interval_hours: float = 24):
+        self.app = None
+        self.enabled = False
+        self.batch_size = batch_size
+        self.batch_pause_ms = batch_pause_ms
+        self.check_interval_hours = check_interval_hours
+        self.policies: Dict[str, Dict[str, Optional[int]]] = {'default': dict(DEFAULT_POLICY)}
+        self.running = False
+
+        self._run_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.stats = {
+            'runs': 0,
+            'raw_deleted': 0,
+            'rollup_deleted': 0,
+            'days_backfilled': 0,
+            'errors': 0,
+            'last_run': None,
+            'last_error': None,
+        }
+
+    def init_app(self, app):
+        """读取配置并解析保留策略（配置错误时抛出 ValueError）"""
+        self.app = app
+        self.enabled = app.config.get('RETENTION_ENABLED', self.enabled)
+        self.batch_size = app.config.get('RETENTION_BATCH_SIZE', self.batch_size)
+        self.batch_pause_ms = app.config.get('RETENTION_BATCH_PAUSE_MS', self.batch_pause_ms)
+        self.check_interval_hours = app.config.get('RETENTION_CHECK_HOURS', self.check_interval_hours)
+        self.policies = self.parse_policies(app.config.get('RETENTION_POLICIES') or '{}')
+
+        # 分区保留（READING_RETENTION_MONTHS）按整月删除全部原始读数，是所有策略的上限
+        partition_months = app.config.get('READING_RETENTION_MONTHS', 0)
+        raw_days = [policy['raw_days'] for policy in self.policies.values()]
+        if partition_months and (None in raw_days or max(raw_days) > partition_months * 28):
+            logger.warning("部分策略的原始读数保留时间超过分区保留期 (%d 个月)，将以分区保留为准", partition_months)
+
+    @staticmethod
+    def parse_policies(raw) -> Dict[str, Dict[str, Optional[int]]]:
+        """解析策略配置: {"default": {...}, "<传感器类型>": {...}}，类型策略在 default 之上合并"""
+        config = json.loads(raw) if isinstance(raw, str) else dict(raw)
+        policies = {'default': normalize_policy(config.pop('default', {}))}
+        for sensor_type, policy in config.items():
+            policies[sensor_type] = normalize_policy(policy, policies['default'])
+        return policies
+
+    def start(self):
+        """启动后台保留任务线程"""
+        if self.running:
+            return
+        self.running = True
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='retention-policy-engine', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台线程（正在进行的批量删除在当前批次后退出）"""
+        self.running = False
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        # 启动后等待一段时间再执行，避开启动时的数据库初始化和积压消息写入
+        self._stop_event.wait(60)
+        while self.running:
+            with self.app.app_context():
+                try:
+                    self.run()
+                except (SQLAlchemyError, OSError, RuntimeError) as e:
+                    # 归档失败（或归档任务正在执行）时不删除原始读数，下个周期重试
+                    db.session.rollback()
+                    self.stats['errors'] += 1
+                    self.stats['last_error'] = str(e)
+                    logger.error("保留策略任务失败: %s", e)
+            self._stop_event.wait(self.check_interval_hours * 3600)
+
+    # ---- 策略解析 ----
+
+    def resolve_groups(self) -> List[Dict[str, Any]]:
+        """按生效策略对传感器分组: [{'policy', 'sources', 'sensor_ids'}]"""
+        template_policies: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for template in DeviceTemplate.get_all_active():
+            for config in template.get_sensor_configs():
+                if config.get('retention'):
+                    template_policies[(template.device_type, config['type'])] = config['retention']
+
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        rows = db.session.query(Sensor.id, Sensor.type, Device.type).join(Device, Sensor.device_id == Device.id)
+        for sensor_id, sensor_type, device_type in rows:
+            base = self.policies.get(sensor_type, self.policies['default'])
+            source = sensor_type if sensor_type in self.policies else 'default'
+            override = template_policies.get((device_type, sensor_type))
+            if override:
+                try:
+                    base = normalize_policy(override, base)
+                    source = f"template:{device_type}/{sensor_type}"
+                except ValueError as e:
+                    logger.error("设备模板 %s 的 %s 保留策略无效，已忽略: %s", device_type, sensor_type, e)
+
+            key = tuple(base[k] for k in POLICY_KEYS)
+            group = groups.setdefault(key, {'policy': base, 'sources': set(), 'sensor_ids': []})
+            group['sources'].add(source)
+            group['sensor_ids'].append(sensor_id)
+
+        return [{**group, 'sources': sorted(group['sources'])} for group in groups.values()]
+
+    # ---- 演练与执行 ----
+
+    def plan(self, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """演练：统计每组策略将删除的行数和估算回收的空间，不修改数据"""
+        now = now or datetime.utcnow()
+        reading_bytes = self._row_bytes(NumericReading.__tablename__, _FALLBACK_ROW_BYTES['readings'])
+        report = []
+        for group in self.resolve_groups():
+            policy, sensor_ids = group['policy'], group['sensor_ids']
+            entry = self._report_entry(group, now)
+
+            if entry['raw_cutoff']:
+                rows = self._count_raw(sensor_ids, entry['raw_cutoff'])
+                entry['raw'] = {'rows': rows, 'bytes': int(rows * reading_bytes)}
+            for name, model in ROLLUP_MODELS.items():
+                cutoff = entry['rollup_cutoffs'][name]
+                if cutoff:
+                    rows = self._count_rollups(model, sensor_ids, cutoff)
+                    row_bytes = self._row_bytes(model.__tablename__, _FALLBACK_ROW_BYTES['rollup'])
+                    entry['rollups'][name] = {'rows': rows, 'bytes': int(rows * row_bytes)}
+
+            entry['bytes'] = entry['raw']['bytes'] + sum(r['bytes'] for r in entry['rollups'].values())
+            report.append(entry)
+        return report
+
+    def run(self, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """执行保留策略：降采样后分批删除过期原始读数，再删除过期汇总"""
+        if not self._run_lock.acquire(blocking=False):
+            raise RuntimeError("保留策略任务正在执行")
+        try:
+            now = now or datetime.utcnow()
+            self.stats['runs'] += 1
+            self.stats['last_run'] = now.isoformat()
+            report = []
+            for group in self.resolve_groups():
+                sensor_ids = group['sensor_ids']
+                entry = self._report_entry(group, now)
+
+                if entry['raw_cutoff']:
+                    if reading_archive.enabled:
+                        entry['archived'] = reading_archive.archive(before=entry['raw_cutoff'], sensor_ids=sensor_ids)
+                    entry['days_backfilled'] = self._downsample(sensor_ids, entry['raw_cutoff'])
+                    entry['raw']['rows'] = self._delete_raw(sensor_ids, entry['raw_cutoff'])
+                for name, model in ROLLUP_MODELS.items():
+                    cutoff = entry['rollup_cutoffs'][name]
+                    if cutoff:
+                        entry['rollups'][name] = {'rows': self._delete_rollups(model, sensor_ids, cutoff), 'bytes': 0}
+
+                deleted = entry['raw']['rows'] + sum(r['rows'] for r in entry['rollups'].values())
+                if deleted:
+                    logger.info("保留策略 %s: 删除原始读数 %d 条, 汇总 %s",
+                                ', '.join(entry['sources']), entry['raw']['rows'],
+                                {name: r['rows'] for name, r in entry['rollups'].items()})
+                report.append(entry)
+            return report
+        finally:
+            self._run_lock.release()
+
+    @staticmethod
+    def _report_entry(group: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        policy = group['policy']
+
+        def cutoff(days):
+            return _day(now - timedelta(days=days)) if days else None
+
+        return {
+            'sources': group['sources'],
+            'policy': policy,
+            'sensors': len(group['sensor_ids']),
+            'raw_cutoff': cutoff(policy['raw_days']),
+            'rollup_cutoffs': {name: cutoff(policy[key]) for name, key in ROLLUP_POLICY_KEYS.items()},
+            'raw': {'rows': 0, 'bytes': 0},
+            'rollups': {},
+            'bytes': 0,
+            'days_backfilled': 0,
+        }
+
+    # ---- 降采样 ----
+
+    def _downsample(self, sensor_ids: List[int], cutoff: datetime) -> int:
+        """对截止时间之前、原始读数多于天汇总计数的日期回填汇总，返回回填的天数"""
+        backfilled = rollup_service.backfill_missing(cutoff, sensor_ids=sensor_ids,
+                                                     should_continue=self._should_continue)
+        self.stats['days_backfilled'] += backfilled
+        return backfilled
+
+    # ---- 分批删除 ----
+
+    def _delete_raw(self, sensor_ids: List[int], cutoff: datetime) -> int:
+        """按ID分批删除截止时间之前的数值读数"""
+        deleted = 0
+        for i in range(0, len(sensor_ids), _SENSOR_CHUNK):
+            chunk = sensor_ids[i:i + _SENSOR_CHUNK]
+            while self._should_continue():
+                filters = (NumericReading.sensor_id.in_(chunk), NumericReading.timestamp < cutoff)
+                ids = [reading_id for (reading_id,) in
+                       db.session.query(NumericReading.id).filter(*filters).limit(self.batch_size)]
+                if not ids:
+                    break
+                NumericReading.query.filter(
+                    NumericReading.id.in_(ids), NumericReading.timestamp < cutoff
+                ).delete(synchronize_session=False)
+                db.session.commit()
+                deleted += len(ids)
+                self.stats['raw_deleted'] += len(ids)
+                self._pause()
+        return deleted
+
+    def _delete_rollups(self, model, sensor_ids: List[int], cutoff: datetime) -> int:
+        """按传感器分批删除截止时间之前的汇总桶"""
+        deleted = 0
+        for sensor_id in sensor_ids:
+            while self._should_continue():
+                buckets = [bucket for (bucket,) in db.session.query(model.bucket_start).filter(
+                    model.sensor_id == sensor_id, model.bucket_start < cutoff
+                ).order_by(model.bucket_start).limit(self.batch_size)]
+                if not buckets:
+                    break
+                model.query.filter(
+                    model.sensor_id == sensor_id, model.bucket_start <= buckets[-1]
+                ).delete(synchronize_session=False)
+                db.session.commit()
+                deleted += len(buckets)
+                self.stats['rollup_deleted'] += len(buckets)
+                if len(buckets) < self.batch_size:
+                    break
+                self._pause()
+        return deleted
+
+    def _should_continue(self) -> bool:
+        # 后台线程停止时在当前批次后退出；命令行直接调用 run() 时不受影响
+        return self.running or self._thread is None
+
+    def _pause(self):
+        if self.batch_pause_ms:
+            self._stop_event.wait(self.batch_pause_ms / 1000.0)
+
+    # ---- 统计 ----
+
+    def _count_raw(self, sensor_ids: List[int], cutoff: datetime) -> int:
+        return db.session.query(func.count(NumericReading.id)).filter(
+            NumericReading.sensor_id.in_(sensor_ids), NumericReading.timestamp < cutoff
+        ).scalar() or 0
+
+    @staticmethod
+    def _count_rollups(model, sensor_ids: List[int], cutoff: datetime) -> int:
+        return db.session.query(func.count()).select_from(model).filter(
+            model.sensor_id.in_(sensor_ids), model.bucket_start < cutoff
+        ).scalar() or 0
+
+    @staticmethod
+    def _row_bytes(table: str, fallback: int) -> float:
+        """每行平均占用字节数（含索引），MySQL 从 information_schema 估算"""
+        if db.session.get_bind().dialect.name != 'mysql':
+            return fallback
+        row = db.session.execute(text(
+            "SELECT TABLE_ROWS, DATA_LENGTH + INDEX_LENGTH FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+        ), {'table': table}).first()
+        if not row or not row[0]:
+            return fallback
+        return row[1] / row[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取保留策略统计信息"""
+        return {
+            'enabled': self.enabled,
+            'running': self.running,
+            'policies': self.policies,
+            **self.stats
+        }
+
+
+# 全局保留策略引擎实例
+retention_engine = RetentionPolicyEngine()
@@ -0,0 +1,478 @@
+# backend/services/rollup_service.py
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, List, Iterable, Tuple, Callable
+
+from sqlalchemy import event, func, case, insert, and_, or_
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.numeric_reading import NumericReading, QUALITY_CODES, quality_code
+from models.reading_rollup import ROLLUP_RESOLUTIONS, ROLLUP_MODELS
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+_DAY = timedelta(days=1)
+# 汇总表只统计质量码为 good 的读数，越界读数保留在原始读数中但不参与统计
+_GOOD = QUALITY_CODES['good']
+# 会话 info 中等待在提交前合并进汇总表的 ORM 读数
+_PENDING_KEY = 'rollup_pending_rows'
+
+# 聚合累加器下标: [count, sum, min, max, sum_sq, first_ts, first_value, last_ts, last_value]
+_COUNT, _SUM, _MIN, _MAX, _SUM_SQ, _FIRST_TS, _FIRST_VALUE, _LAST_TS, _LAST_VALUE = range(9)
+
+
+def _floor(ts: datetime, step: timedelta) -> datetime:
+    return _EPOCH + ((ts - _EPOCH) // step) * step
+
+
+def _ceil(ts: datetime, step: timedelta) -> datetime:
+    floored = _floor(ts, step)
+    return floored if floored == ts else floored + step
+
+
+def _naive_utc(ts: datetime) -> datetime:
+    """带时区的时间戳转换为不带时区的UTC时间（与数据库DATETIME列一致）"""
+    if ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _new_acc(ts: datetime, value: float) -> list:
+    return [1, value, value, value, value * value, ts, value, ts, value]
+
+
+def _add_point(acc: list, ts: datetime, value: float):
+    acc[_COUNT] += 1
+    acc[_SUM] += value
+    acc[_SUM_SQ] += value * value
+    if value < acc[_MIN]:
+        acc[_MIN] = value
+    if value > acc[_MAX]:
+        acc[_MAX] = value
+    if ts < acc[_FIRST_TS]:
+        acc[_FIRST_TS], acc[_FIRST_VALUE] = ts, value
+    if ts >= acc[_LAST_TS]:
+        acc[_LAST_TS], acc[_LAST_VALUE] = ts, value
+
+
+def _merge(acc: Optional[list], other: list) -> list:
+    if acc is None:
+        return list(other)
+    acc[_COUNT] += other[_COUNT]
+    acc[_SUM] += other[_SUM]
+    acc[_SUM_SQ] += other[_SUM_SQ]
+    acc[_MIN] = min(acc[_MIN], other[_MIN])
+    acc[_MAX] = max(acc[_MAX], other[_MAX])
+    if other[_FIRST_TS] < acc[_FIRST_TS]:
+        acc[_FIRST_TS], acc[_FIRST_VALUE] = other[_FIRST_TS], other[_FIRST_VALUE]
+    if other[_LAST_TS] >= acc[_LAST_TS]:
+        acc[_LAST_TS], acc[_LAST_VALUE] = other[_LAST_TS], other[_LAST_VALUE]
+    return acc
+
+
+class ReadingRollupService:
+    """读数汇总服务 - 维护 1m/1h/1d 汇总表并用其回答统计查询
+
+    增量更新：批量写入器在写入读数的同一事务中调用 apply_rows，把这一批
+    读数按三种粒度聚合后以 upsert 合并进汇总表（汇总失败只回滚保存点，不
+    影响读数入库，可由回填任务修复）。通过 ORM 逐条写入的读数（读数创建
+    接口、非批量的MQTT处理路径）在 flush 时记录，会话提交前同样经
+    apply_rows 合并。汇总表和原始读数聚合都只统计质量码为 good 的读数。
+
+    查询：summarize 把查询区间拆成对齐的片段，中间部分使用能覆盖的最粗
+    粒度，两端逐级细化，不足一分钟的边缘直接聚合原始读数。关闭汇总时
+    整个区间都按原始读数聚合，返回结构不变。
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self._listening = False
+
+        # 统计信息
+        self.stats = {
+            'rows_applied': 0,
+            'buckets_upserted': 0,
+            'apply_failed': 0,
+            'summaries': 0,
+            'backfilled_days': 0,
+        }
+
+    def init_app(self, app, writer=None):
+        """读取配置并注册到批量写入器的事务钩子和 ORM 会话事件"""
+        self.enabled = app.config.get('READING_ROLLUP_ENABLED', self.enabled)
+        if not self.enabled:
+            return
+        if writer is not None:
+            writer.add_commit_hook(self.apply_rows)
+        if not self._listening:
+            event.listen(db.session, 'after_flush', self._on_flush)
+            event.listen(db.session, 'before_commit', self._on_before_commit)
+            event.listen(db.session, 'after_rollback', self._on_rollback)
+            self._listening = True
+
+    # ---- 增量更新 ----
+
+    def apply_rows(self, rows: List[Dict[str, Any]]):
+        """把一批新写入的读数合并进汇总表（在调用方的事务内执行）"""
+        partials = self._aggregate(
+            (row['sensor_id'], _naive_utc(row['timestamp']), row['numeric_value'])
+            for row in rows
+            if row.get('data_type', 'numeric') == 'numeric' and row.get('numeric_value') is not None
+            and quality_code(row.get('quality')) == _GOOD
+        )
+        if not partials:
+            return
+
+        try:
+            with db.session.begin_nested():
+                for name, buckets in partials.items():
+                    self._upsert(ROLLUP_MODELS[name], buckets)
+        except SQLAlchemyError as e:
+            self.stats['apply_failed'] += 1
+            logger.error("更新读数汇总表失败（可运行回填任务修复）: %s", e)
+            return
+
+        self.stats['rows_applied'] += len(rows)
+        self.stats['buckets_upserted'] += sum(len(buckets) for buckets in partials.values())
+
+    def _on_flush(self, session, flush_context):
+        rows = [{
+            'sensor_id': obj.sensor_id,
+            'timestamp': obj.timestamp,
+            'numeric_value': obj.value,
+            'quality': obj.quality,
+        } for obj in session.new if isinstance(obj, NumericReading)]
+        if rows:
+            session.info.setdefault(_PENDING_KEY, []).extend(rows)
+
+    def _on_before_commit(self, session):
+        # commit() 在触发本事件之后才执行最后一次 flush，这里先 flush 以收集尚未写入的读数
+        session.flush()
+        rows = session.info.pop(_PENDING_KEY, None)
+        if rows and self.enabled:
+            self.apply_rows(rows)
+
+    def _on_rollback(self, session):
+        session.info.pop(_PENDING_KEY, None)
+
+    def _aggregate(self, points: Iterable[Tuple[int, datetime, float]]) -> Dict[str, Dict[tuple, list]]:
+        """按三种粒度聚合 (传感器ID, 时间戳, 数值)，返回 {粒度: {(传感器ID, 桶起点): 累加器}}"""
+        partials: Dict[str, Dict[tuple, list]] = {name: {} for name, _, _ in ROLLUP_RESOLUTIONS}
+        empty = True
+        for sensor_id, ts, value in points:
+            if not math.isfinite(value):
+                continue
+            empty = False
+            for name, step, _ in ROLLUP_RESOLUTIONS:
+                key = (sensor_id, _floor(ts, step))
+                acc = partials[name].get(key)
+                if acc is None:
+                    partials[name][key] = _new_acc(ts, value)
+                else:
+                    _add_point(acc, ts, value)
+        return {} if empty else partials
+
+    @staticmethod
+    def _bucket_values(buckets: Dict[tuple, list]) -> List[Dict[str, Any]]:
+        return [{
+            'sensor_id': sensor_id,
+            'bucket_start': bucket_start,
+            'count': acc[_COUNT],
+            'sum': acc[_SUM],
+            'min': acc[_MIN],
+            'max': acc[_MAX],
+            'sum_sq': acc[_SUM_SQ],
+            'first_ts': acc[_FIRST_TS],
+            'first_value': acc[_FIRST_VALUE],
+            'last_ts': acc[_LAST_TS],
+            'last_value': acc[_LAST_VALUE],
+        } for (sensor_id, bucket_start), acc in buckets.items()]
+
+    def _upsert(self, model, buckets: Dict[tuple, list]):
+        """多行 upsert：已存在的桶与新聚合量合并"""
+        table = model.__table__
+        values = self._bucket_values(buckets)
+        dialect = db.session.get_bind().dialect.name
+
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert as dialect_insert
+        elif dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            raise NotImplementedError(f"汇总表不支持的数据库: {dialect}")
+
+        stmt = dialect_insert(table).values(values)
+        new = stmt.inserted if dialect == 'mysql' else stmt.excluded
+        old = table.c
+        least, greatest = (func.min, func.max) if dialect == 'sqlite' else (func.least, func.greatest)
+
+        # MySQL 按顺序求值 ON DUPLICATE KEY UPDATE，first/last 的值必须在时间戳之前更新
+        updates = [
+            ('count', old['count'] + new['count']),
+            ('sum', old['sum'] + new['sum']),
+            ('sum_sq', old['sum_sq'] + new['sum_sq']),
+            ('min', least(old['min'], new['min'])),
+            ('max', greatest(old['max'], new['max'])),
+            ('first_value', case((new['first_ts'] < old['first_ts'], new['first_value']), else_=old['first_value'])),
+            ('first_ts', least(old['first_ts'], new['first_ts'])),
+            ('last_value', case((new['last_ts'] >= old['last_ts'], new['last_value']), else_=old['last_value'])),
+            ('last_ts', greatest(old['last_ts'], new['last_ts'])),
+        ]
+
+        if dialect == 'mysql':
+            stmt = stmt.on_duplicate_key_update(updates)
+        else:
+            stmt = stmt.on_conflict_do_update(index_elements=[old['sensor_id'], old['bucket_start']],
+                                              set_=dict(updates))
+        db.session.execute(stmt)
+
+    # ---- 查询 ----
+
+    def summarize(self, sensor_ids: List[int], start: Optional[datetime] = None,
+                  end: Optional[datetime] = None) -> Dict[int, Dict[str, Any]]:
+        """汇总传感器在 [start, end) 内的数值读数，start/end 为空表示不限
+
+        返回 {传感器ID: {count, sum, min, max, avg, stddev, first_ts, first_value,
+        last_ts, last_value}}，没有读数的传感器 count 为0、其余为None。
+        """
+        sensor_ids = list(sensor_ids)
+        accs: Dict[int, Optional[list]] = {sensor_id: None for sensor_id in sensor_ids}
+        if not sensor_ids:
+            return {}
+
+        start = _naive_utc(start) if start else None
+        end = _naive_utc(end) if end else None
+        plan = self._plan(start, end, 0) if self.enabled else [('raw', start, end)]
+        for name, seg_start, seg_end in plan:
+            if name == 'raw':
+                partials = self._raw_partials(sensor_ids, seg_start, seg_end)
+            else:
+                partials = self._rollup_partials(ROLLUP_MODELS[name], sensor_ids, seg_start, seg_end)
+            for sensor_id, acc in partials.items():
+                accs[sensor_id] = _merge(accs[sensor_id], acc)
+
+        self.stats['summaries'] += 1
+        return {sensor_id: self._finalize(acc) for sensor_id, acc in accs.items()}
+
+    def series(self, sensor_ids: List[int], resolution: str, start: Optional[datetime] = None,
+               end: Optional[datetime] = None) -> List[tuple]:
+        """多个传感器按粒度的时间桶序列，一次 sensor_id IN 查询
+
+        返回按 (传感器ID, 桶起点) 排序的 (传感器ID, 桶起点, count, avg, min, max)。
+        包含 start 所在的桶，两端的桶可能含有区间外的读数。
+        """
+        step = {name: step for name, step, _ in ROLLUP_RESOLUTIONS}[resolution]
+        model = ROLLUP_MODELS[resolution]
+        query = db.session.query(
+            model.sensor_id, model.bucket_start, model.count, model.sum / model.count, model.min, model.max
+        ).filter(model.sensor_id.in_(sensor_ids), model.count > 0)
+        if start is not None:
+            query = query.filter(model.bucket_start >= _floor(_naive_utc(start), step))
+        if end is not None:
+            query = query.filter(model.bucket_start <= _naive_utc(end))
+        return query.order_by(model.sensor_id, model.bucket_start).all()
+
+    def _plan(self, start: Optional[datetime], end: Optional[datetime], level: int) -> List[tuple]:
+        """把区间拆成 [(粒度, 起点, 终点)]：对齐部分用当前粒度，两端交给更细的粒度"""
+        if start is not None and end is not None and start >= end:
+            return []
+        if level == len(ROLLUP_RESOLUTIONS):
+            return [('raw', start, end)]
+
+        name, step, _ = ROLLUP_RESOLUTIONS[level]
+        lo = _ceil(start, step) if start is not None else None
+        hi = _floor(end, step) if end is not None else None
+        if lo is not None and hi is not None and lo >= hi:
+            return self._plan(start, end, level + 1)
+
+        head = self._plan(start, lo, level + 1) if start is not None else []
+        tail = self._plan(hi, end, level + 1) if end is not None else []
+        return head + [(name, lo, hi)] + tail
+
+    def _rollup_partials(self, model, sensor_ids: List[int], start: Optional[datetime],
+                         end: Optional[datetime]) -> Dict[int, list]:
+        query = model.query.filter(model.sensor_id.in_(sensor_ids))
+        if start is not None:
+            query = query.filter(model.bucket_start >= start)
+        if end is not None:
+            query = query.filter(model.bucket_start < end)
+
+        partials: Dict[int, list] = {}
+        for row in query:
+            acc = [row.count, row.sum, row.min, row.max, row.sum_sq,
+                   row.first_ts, row.first_value, row.last_ts, row.last_value]
+            partials[row.sensor_id] = _merge(partials.get(row.sensor_id), acc)
+        return partials
+
+    def _raw_partials(self, sensor_ids: List[int], start: Optional[datetime],
+                      end: Optional[datetime]) -> Dict[int, list]:
+        value = NumericReading.value
+        filters = [NumericReading.sensor_id.in_(sensor_ids), NumericReading.quality_code == _GOOD]
+        if start is not None:
+            filters.append(NumericReading.timestamp >= start)
+        if end is not None:
+            filters.append(NumericReading.timestamp < end)
+
+        bounds = db.session.query(
+            NumericReading.sensor_id.label('sensor_id'), func.count(value).label('count'),
+            func.sum(value).label('sum'), func.min(value).label('min'), func.max(value).label('max'),
+            func.sum(value * value).label('sum_sq'), func.min(NumericReading.timestamp).label('first_ts'),
+            func.max(NumericReading.timestamp).label('last_ts')
+        ).filter(*filters).group_by(NumericReading.sensor_id).subquery()
+
+        # 分组统计与首末值一次查询：按 (sensor_id, 最早/最晚时间戳) 连接回读数，
+        # 同一时间戳有多条时首值取ID最小、末值取ID最大的一条
+        rows = db.session.query(
+            bounds.c.sensor_id, bounds.c.count, bounds.c.sum, bounds.c.min, bounds.c.max, bounds.c.sum_sq,
+            bounds.c.first_ts, bounds.c.last_ts, NumericReading.id, NumericReading.timestamp, NumericReading.value
+        ).join(NumericReading, and_(
+            NumericReading.sensor_id == bounds.c.sensor_id,
+            or_(NumericReading.timestamp == bounds.c.first_ts, NumericReading.timestamp == bounds.c.last_ts)
+        )).filter(*filters).order_by(NumericReading.id)
+
+        partials = {}
+        for sensor_id, count, total, low, high, total_sq, first_ts, last_ts, _, ts, edge_value in rows:
+            if not count:
+                continue
+            acc = partials.get(sensor_id)
+            if acc is None:
+                acc = partials[sensor_id] = [count, total, low, high, total_sq, first_ts, None, last_ts, None]
+                if ts == first_ts:
+                    acc[_FIRST_VALUE] = edge_value
+            if ts == last_ts:
+                acc[_LAST_VALUE] = edge_value
+        return partials
+
+    @staticmethod
+    def _finalize(acc: Optional[list]) -> Dict[str, Any]:
+        if acc is None:
+            return {'count': 0, 'sum': None, 'min': None, 'max': None, 'avg': None, 'stddev': None,
+                    'first_ts': None, 'first_value': None, 'last_ts': None, 'last_value': None}
+
+        count, total, total_sq = acc[_COUNT], acc[_SUM], acc[_SUM_SQ]
+        stddev = None
+        if count > 1:
+            # 样本标准差，与 statistics.stdev 一致
+            stddev = math.sqrt(max(0.0, (total_sq - total * total / count) / (count - 1)))
+        return {
+            'count': count,
+            'sum': total,
+            'min': acc[_MIN],
+            'max': acc[_MAX],
+            'avg': total / count,
+            'stddev': stddev,
+            'first_ts': acc[_FIRST_TS],
+            'first_value': acc[_FIRST_VALUE],
+            'last_ts': acc[_LAST_TS],
+            'last_value': acc[_LAST_VALUE],
+        }
+
+    # ---- 回填 ----
+
+    def backfill(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 sensor_ids: Optional[List[int]] = None) -> Dict[str, int]:
+        """从原始读数重新计算 [start, end] 覆盖的整天汇总，逐天删除旧汇总、写入并提交"""
+        filters = [NumericReading.quality_code == _GOOD]
+        if sensor_ids:
+            filters.append(NumericReading.sensor_id.in_(sensor_ids))
+
+        if start is None or end is None:
+            first_ts, last_ts = db.session.query(
+                func.min(NumericReading.timestamp), func.max(NumericReading.timestamp)
+            ).filter(*filters).first()
+            if first_ts is None:
+                return {'days': 0, 'readings': 0, 'buckets': 0}
+            start = start or first_ts
+            end = end or last_ts
+
+        result = {'days': 0, 'readings': 0, 'buckets': 0}
+        day = _floor(_naive_utc(start), _DAY)
+        last_day = _floor(_naive_utc(end), _DAY)
+        while day <= last_day:
+            next_day = day + _DAY
+            points = db.session.query(
+                NumericReading.sensor_id, NumericReading.timestamp, NumericReading.value
+            ).filter(
+                *filters, NumericReading.timestamp >= day, NumericReading.timestamp < next_day
+            ).yield_per(5000)
+
+            readings = 0
+
+            def counted(rows):
+                nonlocal readings
+                for row in rows:
+                    readings += 1
+                    yield row
+
+            partials = self._aggregate(counted(points))
+            try:
+                for name, _, model in ROLLUP_RESOLUTIONS:
+                    stale = model.query.filter(model.bucket_start >= day, model.bucket_start < next_day)
+                    if sensor_ids:
+                        stale = stale.filter(model.sensor_id.in_(sensor_ids))
+                    stale.delete(synchronize_session=False)
+                    values = self._bucket_values(partials.get(name, {}))
+                    if values:
+                        db.session.execute(insert(model.__table__), values)
+                        result['buckets'] += len(values)
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                raise
+
+            result['days'] += 1
+            result['readings'] += readings
+            self.stats['backfilled_days'] += 1
+            logger.info("读数汇总回填完成: %s (%d 条读数)", day.date().isoformat(), readings)
+            day = next_day
+        return result
+
+    def backfill_missing(self, end: datetime, start: Optional[datetime] = None,
+                         sensor_ids: Optional[List[int]] = None,
+                         should_continue: Optional[Callable[[], bool]] = None) -> int:
+        """删除原始读数之前调用：对 [start, end) 内原始读数多于天汇总计数的日期回填汇总，返回回填的天数"""
+        filters = [NumericReading.timestamp < end, NumericReading.quality_code == _GOOD]
+        if start is not None:
+            filters.append(NumericReading.timestamp >= start)
+        if sensor_ids is not None:
+            filters.append(NumericReading.sensor_id.in_(sensor_ids))
+        oldest = db.session.query(func.min(NumericReading.timestamp)).filter(*filters).scalar()
+        if oldest is None:
+            return 0
+
+        daily = ROLLUP_MODELS['1d']
+        backfilled = 0
+        day = _floor(oldest, _DAY)
+        while day < end and (should_continue is None or should_continue()):
+            next_day = day + _DAY
+            raw_counts = dict(db.session.query(NumericReading.sensor_id, func.count(NumericReading.id)).filter(
+                *filters, NumericReading.timestamp >= day, NumericReading.timestamp < next_day
+            ).group_by(NumericReading.sensor_id).all())
+            if raw_counts:
+                rollup_counts = dict(db.session.query(daily.sensor_id, daily.count).filter(
+                    daily.sensor_id.in_(list(raw_counts)), daily.bucket_start == day
+                ).all())
+                # 原始读数少于汇总计数说明这一天已部分删除，不能再从原始读数重建
+                missing = [sensor_id for sensor_id, count in raw_counts.items()
+                           if count > rollup_counts.get(sensor_id, 0)]
+                if missing:
+                    self.backfill(start=day, end=day, sensor_ids=missing)
+                    backfilled += 1
+            day = next_day
+        return backfilled
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取汇总服务统计信息"""
+        return {
+            'enabled': self.enabled,
+            **self.stats
+        }
+
+
+# 全局读数汇总服务实例
+rollup_service = ReadingRollupService()
@@ -3,6 +3,7 @@ from typing import List, Optional, Dict, Any
 from models.sensor import Sensor
 from models.reading import Reading
 from extensions import db
+from services.resolution_cache import resolution_cache
 import logging
 
 class SensorService:
@@ -52,6 +53,7 @@ class SensorService:
             )
             db.session.add(sensor)
             db.session.commit()
+            resolution_cache.invalidate_device(device_id)
             logging.info(f"Created sensor {sensor.id} for device {device_id}")
             return sensor
         except Exception as e:
@@ -72,6 +74,7 @@ class SensorService:
                     setattr(sensor, key, value)
             
             db.session.commit()
+            resolution_cache.invalidate_device(sensor.device_id)
             logging.info(f"Updated sensor {sensor_id}")
             return sensor
         except Exception as e:
@@ -89,6 +92,7 @@ class SensorService:
             
             sensor.status = 'deleted'
             db.session.commit()
+            resolution_cache.invalidate_device(sensor.device_id)
             logging.info(f"Deleted sensor {sensor_id}")
             return True
         except Exception as e:
@@ -105,11 +109,12 @@ class SensorService:
                 return {}
             
             # 获取最近的读数
-            recent_readings = Reading.query.filter_by(
+            model = sensor.reading_model
+            recent_readings = model.query.filter_by(
                 sensor_id=sensor_id
-            ).order_by(Reading.timestamp.desc()).limit(limit).all()
+            ).order_by(model.timestamp.desc()).limit(limit).all()
             
-            total_readings = Reading.query.filter_by(sensor_id=sensor_id).count()
+            total_readings = model.query.filter_by(sensor_id=sensor_id).count()
             
             # 计算数值型传感器的统计数据
             stats = {
@@ -1,5 +1,6 @@
 # backend/services/storage_service.py
 import os
+import shutil
 import uuid
 import hashlib
 from datetime import datetime, timedelta
@@ -283,7 +284,7 @@ class StorageService:
         os.makedirs(os.path.dirname(local_path), exist_ok=True)
         
         with open(local_path, 'wb') as f:
-            f.write(file_data.read())
+            shutil.copyfileobj(file_data, f)
         
         file_data.seek(0)  # 重置文件指针
         return local_path
@@ -421,5 +422,77 @@ class StorageService:
             logging.error(f"Failed to store file {filename}: {e}")
             return None
 
+    def store_local_file(self,
+                         file_path: str,
+                         data_type: str,
+                         device_id: str,
+                         sensor_id: str,
+                         file_format: Optional[str] = None,
+                         content_type: str = 'application/octet-stream',
+                         metadata: Optional[Dict[str, Any]] = None,
+                         bucket_name: str = 'agrinex-data') -> Optional[Dict[str, Any]]:
+        """
+        存储已在磁盘上的文件（分块上传组装完成的文件），全程流式处理不读入内存
+        
+        文件会被移动到本地存储目录，MinIO可用时再以流方式上传。
+        """
+        try:
+            object_key = self._generate_object_key(data_type, device_id, sensor_id, file_format)
+            object_metadata = {
+                'device_id': device_id,
+                'sensor_id': sensor_id,
+                'data_type': data_type,
+                'upload_time': datetime.utcnow().isoformat(),
+                'file_format': file_format or 'unknown'
+            }
+            if metadata:
+                object_metadata.update({k: str(v) for k, v in metadata.items()})
+            
+            # 移动到本地存储（同一文件系统上为重命名，不复制数据）
+            local_path = os.path.join(self.local_storage_path, object_key)
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            shutil.move(file_path, local_path)
+            file_size = os.path.getsize(local_path)
+            
+            result = {
+                'success': True,
+                'storage_backend': 'local',
+                'bucket_name': bucket_name,
+                'object_key': object_key,
+                'object_url': None,
+                'object_etag': None,
+                'file_path': local_path,
+                'file_size': file_size,
+                'file_format': file_format,
+                'metadata': object_metadata,
+                'thumbnail_info': None
+            }
+            
+            if self.minio_client:
+                try:
+                    self.ensure_bucket_exists(bucket_name)
+                    with open(local_path, 'rb') as f:
+                        minio_result = self.minio_client.put_object(
+                            bucket_name=bucket_name,
+                            object_name=object_key,
+                            data=f,
+                            length=file_size,
+                            content_type=content_type,
+                            metadata=object_metadata
+                        )
+                    result.update({
+                        'storage_backend': 'minio',
+                        'object_url': self._generate_object_url(bucket_name, object_key),
+                        'object_etag': minio_result.etag
+                    })
+                except Exception as e:
+                    logging.error(f"Failed to upload to MinIO: {e}")
+            
+            return result
+            
+        except Exception as e:
+            logging.error(f"Failed to store local file {file_path}: {e}")
+            return None
+
 # 创建全局存储服务实例
 storage_service = StorageService()
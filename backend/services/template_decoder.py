@@ -0,0 +1,181 @@
+# backend/services/template_decoder.py
+import logging
+import math
+import threading
+from array import array
+from typing import Dict, Any, Optional, List, Tuple
+
+from models.device_template import DeviceTemplate
+
+logger = logging.getLogger(__name__)
+
+# 读数质量码
+QUALITY_GOOD = 'good'
+QUALITY_OUT_OF_RANGE = 'out_of_range'
+
+# 聚合数据中payload字段名到传感器类型的映射
+AGGREGATED_FIELD_MAPPING = {
+    'temperature': 'temperature',
+    'humidity': 'humidity',
+    'light': 'light',
+    'ph': 'soil_ph',
+    'moisture': 'soil_moisture',
+    'pressure': 'pressure',
+    'wind_speed': 'wind_speed'
+}
+
+
+class CompiledTemplateDecoder:
+    """由设备模板编译得到的负载解码器
+
+    编译时把模板的 sensor_configs 展开为：字段名 -> 传感器序号的字典，
+    以及按序号排列的下限、上限数组；解码聚合负载时对负载字段做一次遍历
+    完成映射和范围校验，不再逐条查询模板或重建列表。模板之外、但在聚合
+    字段映射中的传感器类型不设范围，保持原有的映射行为。
+    """
+
+    def __init__(self, device_type: Optional[str], sensor_configs: List[Dict[str, Any]]):
+        self.device_type = device_type
+
+        sensor_types = [config['type'] for config in sensor_configs]
+        lows = [self._bound(config, 'min', -math.inf) for config in sensor_configs]
+        highs = [self._bound(config, 'max', math.inf) for config in sensor_configs]
+        for sensor_type in AGGREGATED_FIELD_MAPPING.values():
+            if sensor_type not in sensor_types:
+                sensor_types.append(sensor_type)
+                lows.append(-math.inf)
+                highs.append(math.inf)
+
+        self.sensor_types: Tuple[str, ...] = tuple(sensor_types)
+        self.lows = array('d', lows)
+        self.highs = array('d', highs)
+        self.template_types = frozenset(config['type'] for config in sensor_configs)
+
+        self.index: Dict[str, int] = {sensor_type: i for i, sensor_type in enumerate(self.sensor_types)}
+        self.field_map: Dict[str, int] = {sensor_type: self.index[sensor_type] for sensor_type in self.template_types}
+        for field_name, sensor_type in AGGREGATED_FIELD_MAPPING.items():
+            self.field_map.setdefault(field_name, self.index[sensor_type])
+
+    @classmethod
+    def from_template(cls, template: DeviceTemplate) -> 'CompiledTemplateDecoder':
+        return cls(template.device_type, template.get_sensor_configs())
+
+    @staticmethod
+    def _bound(config: Dict[str, Any], key: str, default: float) -> float:
+        value = (config.get('validation_rules') or {}).get(key)
+        try:
+            return float(value) if value is not None else default
+        except (TypeError, ValueError):
+            return default
+
+    def has_sensor_type(self, sensor_type: str) -> bool:
+        """传感器类型是否属于该模板"""
+        return sensor_type in self.template_types
+
+    def check(self, sensor_type: str, value: float) -> str:
+        """按模板校验单个读数，返回质量码；模板未定义的类型不做范围校验"""
+        i = self.index.get(sensor_type)
+        if i is None or self.lows[i] <= value <= self.highs[i]:
+            return QUALITY_GOOD
+        return QUALITY_OUT_OF_RANGE
+
+    def decode(self, payload: Dict[str, Any]) -> List[Tuple[str, float, str]]:
+        """映射并校验聚合负载，返回 [(传感器类型, 数值, 质量码)]
+
+        非数值或非有限值（NaN/Inf）的字段直接丢弃；超出模板范围的值保留原值
+        并标记 out_of_range，由下游决定是否参与统计和告警。
+        """
+        fields = []
+        field_map, lows, highs, sensor_types = self.field_map, self.lows, self.highs, self.sensor_types
+        for name, value in payload.items():
+            i = field_map.get(name)
+            if i is None or isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if not math.isfinite(value):
+                continue
+            quality = QUALITY_GOOD if lows[i] <= value <= highs[i] else QUALITY_OUT_OF_RANGE
+            fields.append((sensor_types[i], value, quality))
+        return fields
+
+
+class TemplateDecoderRegistry:
+    """模板解码器注册表 - 按设备类型缓存编译好的解码器
+
+    首次使用时编译全部启用的模板；之后只有 device_template_controller
+    创建、更新或停用模板时才调用 rebuild 重新编译对应的解码器。没有模板
+    的设备类型（或关闭校验时）使用只含聚合字段映射、不设范围的默认解码器。
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self._decoders: Dict[str, CompiledTemplateDecoder] = {}
+        self._default = CompiledTemplateDecoder(None, [])
+        self._loaded = False
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.stats = {
+            'compiled': 0,
+            'rebuilds': 0,
+        }
+
+    def init_app(self, app):
+        """从应用配置读取开关"""
+        self.enabled = app.config.get('INGEST_TEMPLATE_VALIDATION_ENABLED', self.enabled)
+
+    def get(self, device_type: Optional[str]) -> CompiledTemplateDecoder:
+        """获取设备类型对应的解码器（首次调用需要应用上下文）"""
+        if not self.enabled or not device_type:
+            return self._default
+        if not self._loaded:
+            self._load_all()
+        return self._decoders.get(device_type, self._default)
+
+    def find(self, device_type: Optional[str]) -> Optional[CompiledTemplateDecoder]:
+        """获取设备类型对应模板的解码器，没有模板时返回None（不受校验开关影响）"""
+        if not self._loaded:
+            self._load_all()
+        return self._decoders.get(device_type)
+
+    def rebuild(self, device_type: Optional[str] = None):
+        """重新编译指定设备类型的解码器；不指定时重新编译全部模板"""
+        if device_type is None:
+            self._load_all()
+            return
+
+        template = DeviceTemplate.get_by_device_type(device_type)
+        with self._lock:
+            if template:
+                self._decoders[device_type] = CompiledTemplateDecoder.from_template(template)
+                self.stats['compiled'] += 1
+            else:
+                self._decoders.pop(device_type, None)
+            self.stats['rebuilds'] += 1
+        logger.info("设备模板解码器已重建: %s", device_type)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取注册表统计信息"""
+        return {
+            'enabled': self.enabled,
+            'loaded': self._loaded,
+            'device_types': sorted(self._decoders),
+            **self.stats
+        }
+
+    def _load_all(self):
+        """编译全部启用的模板"""
+        decoders = {}
+        for template in DeviceTemplate.get_all_active():
+            try:
+                decoders[template.device_type] = CompiledTemplateDecoder.from_template(template)
+            except (KeyError, TypeError) as e:
+                logger.error("设备模板 %s 编译失败: %s", template.device_type, e)
+        with self._lock:
+            self._decoders = decoders
+            self._loaded = True
+            self.stats['compiled'] += len(decoders)
+        logger.info("已编译 %d 个设备模板解码器", len(decoders))
+
+
+# 全局模板解码器注册表实例
+template_decoders = TemplateDecoderRegistry()
@@ -0,0 +1,407 @@
+# backend/services/tracing.py
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Iterable
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 读数行上记录所属span的键（批量写入器刷新后按行恢复追踪上下文，不写入数据库）
+_ROW_KEY = '_trace_span'
+
+# OTLP span kind / status code
+_KIND_INTERNAL = 1
+_KIND_CONSUMER = 5
+_STATUS_ERROR = 2
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('agrinex_trace_span', default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+
+class Span:
+    """一个计时区间（墙钟时间，秒）；end 为 None 表示尚未结束"""
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, trace: 'Trace', name: str, parent_id: Optional[str], start: float,
+                 attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.end = None
+        self.attributes = attributes
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_error(self, error: BaseException):
+        self.error = f'{type(error).__name__}: {error}'
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end is None else (self.end - self.start) * 1000
+
+
+class _NoopSpan:
+    """未处于追踪中时 span() 返回的占位对象"""
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def set_error(self, error: BaseException):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """一条MQTT消息的全部span
+
+    消息会跨越 paho 网络线程、分发工作线程和批量写入线程，使用引用计数决定
+    何时结束：创建时持有一次（工作线程处理完释放），交给批量写入器的读数
+    再持有一次（写入、告警检查完成后释放），计数归零时整条追踪结束。
+    """
+    __slots__ = ('trace_id', 'root', 'spans', 'sampled', '_refs', '_lock')
+
+    def __init__(self, sampled: bool):
+        self.trace_id = _new_id(128)
+        self.root: Optional[Span] = None
+        self.spans: List[Span] = []
+        self.sampled = sampled
+        self._refs = 1
+        self._lock = threading.Lock()
+
+    def add(self, name: str, parent_id: Optional[str], start: Optional[float], attributes: Dict[str, Any]) -> Span:
+        span = Span(self, name, parent_id, time.time() if start is None else start, attributes)
+        self.spans.append(span)
+        return span
+
+    def hold(self):
+        with self._lock:
+            self._refs += 1
+
+    def release(self) -> bool:
+        """释放一次引用，返回追踪是否就此结束"""
+        with self._lock:
+            self._refs -= 1
+            return self._refs == 0
+
+
+def format_tree(trace: Trace) -> str:
+    """span树的文本形式：每行为 名称 +相对消息接收的起点 耗时 属性"""
+    children: Dict[Optional[str], List[Span]] = {}
+    for span in list(trace.spans):
+        children.setdefault(span.parent_id, []).append(span)
+
+    lines = [f'trace={trace.trace_id}']
+
+    def walk(span: Span, depth: int):
+        offset = (span.start - trace.root.start) * 1000
+        duration = '?' if span.duration_ms is None else f'{span.duration_ms:.1f}ms'
+        attributes = ' '.join(f'{key}={value}' for key, value in span.attributes.items())
+        error = f' ERROR {span.error}' if span.error else ''
+        lines.append(f"{'  ' * depth}{span.name} +{offset:.1f}ms {duration} {attributes}".rstrip() + error)
+        for child in sorted(children.get(span.span_id, []), key=lambda s: s.start):
+            walk(child, depth + 1)
+
+    walk(trace.root, 0)
+    return '\n'.join(lines)
+
+
+def _otlp_value(value) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_span(trace: Trace, span: Span) -> Dict[str, Any]:
+    item = {
+        'traceId': trace.trace_id,
+        'spanId': span.span_id,
+        'name': span.name,
+        'kind': _KIND_CONSUMER if span is trace.root else _KIND_INTERNAL,
+        'startTimeUnixNano': str(int(span.start * 1e9)),
+        'endTimeUnixNano': str(int((span.end if span.end is not None else trace.root.end) * 1e9)),
+        'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in span.attributes.items()],
+        'status': {'code': _STATUS_ERROR, 'message': span.error} if span.error else {},
+    }
+    if span.parent_id:
+        item['parentSpanId'] = span.parent_id
+    return item
+
+
+def to_otlp(traces: Iterable[Trace], service_name: str) -> Dict[str, Any]:
+    """转换为 OTLP/JSON 的 ExportTraceServiceRequest 结构"""
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': _otlp_value(service_name)}]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [_otlp_span(trace, span) for trace in traces for span in list(trace.spans)]
+            }]
+        }]
+    }
+
+
+class Tracer:
+    """入库链路追踪 - MQTT消息从接收到入库、告警检查和通知的span树
+
+    MQTTService._on_message 为每条消息创建追踪，当前span保存在 contextvars 中，
+    随消息进入分发队列，由工作线程恢复；交给批量写入器的读数行携带所属span，
+    刷新后的告警检查在对应追踪中进行。未处于追踪中时 span() 不做任何记录，
+    HTTP接口等其他调用方不受影响。
+
+    每条追踪都会记录，结束时：
+      - 总耗时超过 slow_ms 的消息在日志中输出完整span树；
+      - 按 sample_rate 采样的追踪和慢消息交给后台线程导出：以 OTLP/JSON 格式
+        追加到本地文件（每行一个请求体），配置 otlp_endpoint 时同时 POST 到
+        OTLP/HTTP 收集器的 /v1/traces。导出队列满时丢弃并计数。
+    被分发队列丢弃或溢出到磁盘的消息不会结束追踪，也不会导出。
+    """
+
+    def __init__(self, sample_rate: float = 0.01, slow_ms: float = 2000,
+                 export_path: Optional[str] = './storage/traces/spans.jsonl',
+                 export_max_bytes: int = 64 * 1024 * 1024,
+                 otlp_endpoint: Optional[str] = None,
+                 service_name: str = 'agrinex-backend',
+                 queue_maxsize: int = 1000):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.export_path = export_path
+        self.export_max_bytes = export_max_bytes
+        self.otlp_endpoint = otlp_endpoint
+        self.service_name = service_name
+        self.running = False
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_maxsize)
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.stats = {
+            'traces': 0,
+            'finished': 0,
+            'slow': 0,
+            'exported': 0,
+            'dropped': 0,
+            'export_errors': 0,
+        }
+
+    def init_app(self, app):
+        """从应用配置读取采样率、延迟预算和导出目标"""
+        self.sample_rate = app.config.get('TRACING_SAMPLE_RATE', self.sample_rate)
+        self.slow_ms = app.config.get('TRACING_SLOW_MS', self.slow_ms)
+        self.export_path = app.config.get('TRACING_EXPORT_PATH', self.export_path)
+        self.export_max_bytes = app.config.get('TRACING_EXPORT_MAX_BYTES', self.export_max_bytes)
+        self.otlp_endpoint = app.config.get('TRACING_OTLP_ENDPOINT', self.otlp_endpoint) or None
+        self.service_name = app.config.get('TRACING_SERVICE_NAME', self.service_name)
+
+    def start(self):
+        """开始记录追踪并启动导出线程"""
+        if self.running:
+            return
+        if self.export_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.export_path)), exist_ok=True)
+        self.running = True
+        self._thread = threading.Thread(target=self._export_loop, name='trace-exporter', daemon=True)
+        self._thread.start()
+        logger.info("链路追踪已启动: sample_rate=%s, slow_ms=%s, export=%s, otlp=%s",
+                    self.sample_rate, self.slow_ms, self.export_path, self.otlp_endpoint)
+
+    def stop(self, timeout: float = 5.0):
+        """停止记录，导出队列中已结束的追踪会先导出"""
+        if not self.running:
+            return
+        self.running = False
+        self._queue.put(None)
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取追踪统计信息"""
+        return {
+            **self.stats,
+            'running': self.running,
+            'sample_rate': self.sample_rate,
+            'slow_ms': self.slow_ms,
+            'export_queue': self._queue.qsize(),
+        }
+
+    # ---- 创建span ----
+
+    def start_trace(self, name: str, start: Optional[float] = None, **attributes) -> Optional[Span]:
+        """创建新追踪并返回根span（未启动时返回None）"""
+        if not self.running:
+            return None
+        trace = Trace(sampled=random.random() < self.sample_rate)
+        trace.root = trace.add(name, None, start, attributes)
+        self.stats['traces'] += 1
+        return trace.root
+
+    def current(self) -> Optional[Span]:
+        """当前上下文中的span"""
+        return _current_span.get()
+
+    @contextmanager
+    def activate(self, span: Optional[Span]):
+        """在给定span的上下文中执行（用于跨线程恢复追踪上下文），span为None时不做任何事"""
+        if span is None:
+            yield
+            return
+        token = _current_span.set(span)
+        try:
+            yield
+        finally:
+            _current_span.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """在当前追踪中创建子span；异常会记录到span上并继续抛出"""
+        parent = _current_span.get()
+        if parent is None:
+            yield _NOOP_SPAN
+            return
+        span = parent.trace.add(name, parent.span_id, None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.set_error(e)
+            raise
+        finally:
+            span.end = time.time()
+            _current_span.reset(token)
+
+    def record(self, name: str, start: float, end: Optional[float] = None,
+               parent: Optional[Span] = None, **attributes):
+        """添加一个已结束的span（排队等待等不在调用栈上的区间），默认挂在当前span下"""
+        parent = parent or _current_span.get()
+        if parent is None:
+            return
+        span = parent.trace.add(name, parent.span_id, start, attributes)
+        span.end = time.time() if end is None else end
+
+    def set_error(self, error: BaseException):
+        """标记当前span失败（异常已在调用处处理、不会从 span() 中抛出时）"""
+        span = _current_span.get()
+        if span is not None:
+            span.set_error(error)
+
+    # ---- 追踪生命周期 ----
+
+    def hold(self) -> Optional[Span]:
+        """为异步处理持有当前追踪，返回之后传给 release() 的span"""
+        span = _current_span.get()
+        if span is not None:
+            span.trace.hold()
+        return span
+
+    def release(self, span: Optional[Span]):
+        """释放一次引用，最后一次释放时结束追踪"""
+        if span is not None and span.trace.release():
+            self._finish(span.trace)
+
+    # ---- 批量写入器 ----
+
+    def tag_rows(self, rows: List[Dict[str, Any]]):
+        """读数行记录当前span"""
+        span = _current_span.get()
+        if span is not None:
+            for row in rows:
+                row[_ROW_KEY] = span
+
+    def row_span(self, row: Dict[str, Any]) -> Optional[Span]:
+        """读数行所属的span"""
+        return row.get(_ROW_KEY)
+
+    def record_rows(self, rows: List[Dict[str, Any]], name: str, start: float,
+                    end: Optional[float] = None, **attributes):
+        """一次批量操作覆盖多条消息：在这些读数行所属的每条追踪中各记录一个span"""
+        parents = {}
+        for row in rows:
+            span = row.get(_ROW_KEY)
+            if span is not None:
+                parents[id(span)] = span
+        end = time.time() if end is None else end
+        for parent in parents.values():
+            self.record(name, start, end, parent=parent, **attributes)
+
+    # ---- 结束和导出 ----
+
+    def _finish(self, trace: Trace):
+        root = trace.root
+        root.end = time.time()
+        self.stats['finished'] += 1
+
+        slow = bool(self.slow_ms) and root.duration_ms > self.slow_ms
+        if slow:
+            self.stats['slow'] += 1
+            logger.warning("消息处理超过延迟预算 (%.1fms > %sms):\n%s",
+                           root.duration_ms, self.slow_ms, format_tree(trace))
+
+        if trace.sampled or slow:
+            try:
+                self._queue.put_nowait(trace)
+            except queue.Full:
+                self.stats['dropped'] += 1
+
+    def _export_loop(self):
+        """导出线程：每次取出队列中所有已结束的追踪一起导出"""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch = []
+            while True:
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self.export(batch)
+
+    def export(self, traces: List[Trace]):
+        """写入本地文件并（可选）发送到 OTLP 收集器，失败只计数不重试"""
+        document = to_otlp(traces, self.service_name)
+        try:
+            if self.export_path:
+                self._write_file(json.dumps(document, ensure_ascii=False, separators=(',', ':')))
+            if self.otlp_endpoint:
+                response = requests.post(self.otlp_endpoint, json=document, timeout=5)
+                response.raise_for_status()
+            self.stats['exported'] += len(traces)
+        except Exception as e:
+            self.stats['export_errors'] += 1
+            logger.error("导出追踪失败 (%d 条): %s", len(traces), e)
+
+    def _write_file(self, line: str):
+        """追加一行，文件超过 export_max_bytes 时轮转为 .1（只保留一个旧文件）"""
+        if os.path.exists(self.export_path) and os.path.getsize(self.export_path) >= self.export_max_bytes:
+            os.replace(self.export_path, self.export_path + '.1')
+        with open(self.export_path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+# 全局链路追踪实例
+tracer = Tracer()
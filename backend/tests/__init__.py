@@ -0,0 +1,3 @@
+"""
+AgriNex 后端测试 - 服务、模型和脚本的单元测试（不依赖 MySQL、Redis 或 MQTT Broker）
+"""
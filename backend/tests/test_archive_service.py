@@ -0,0 +1,81 @@
+"""
+读数归档测试 - 验证 Parquet 文件的写入、时间条件下推和读取
+"""
+
+import sys
+from datetime import datetime, date, timedelta
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+ds = pytest.importorskip('pyarrow.dataset')
+
+import services.archive_service as archive_module
+from services.archive_service import ReadingArchiveService
+from services.storage_service import storage_service
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_service, 'local_storage_path', str(tmp_path))
+    monkeypatch.setattr(storage_service, 'minio_client', None)
+    return ReadingArchiveService()
+
+
+class TestReadingArchive:
+    """读数归档测试"""
+
+    def test_written_file_round_trips_with_time_filter(self, archive, tmp_path):
+        """按传感器/天写入的文件可按时间区间读回，索引记录行数和时间范围"""
+        day = date(2026, 1, 5)
+        base = datetime(2026, 1, 5)
+        rows = [(7, base + timedelta(minutes=i), 20.0 + i / 10, 'good') for i in range(1440)]
+
+        entry = archive._write_file(7, day, rows)
+
+        assert entry.object_key == 'archive/readings/sensor_id=7/date=2026-01-05.parquet'
+        assert (tmp_path / entry.object_key).exists()
+        assert entry.row_count == 1440 and entry.storage_backend == 'local'
+        assert entry.min_ts == base and entry.max_ts == base + timedelta(minutes=1439)
+
+        df = archive._read_files([entry], base + timedelta(hours=6), base + timedelta(hours=7))
+        assert list(df.columns) == ['sensor_id', 'timestamp', 'value', 'quality']
+        assert len(df) == 61
+        assert df['timestamp'].iloc[0] == base + timedelta(hours=6)
+        assert df['value'].iloc[-1] == pytest.approx(20.0 + 420 / 10)
+
+    def test_value_predicate_counts_outliers_in_file(self, archive):
+        """数值条件与时间条件一起下推到数据集计数"""
+        base = datetime(2026, 1, 6)
+        rows = [(3, base + timedelta(minutes=i), float(i % 100), 'good') for i in range(1000)]
+        entry = archive._write_file(3, date(2026, 1, 6), rows)
+
+        dataset = archive._dataset([entry])
+        outside = (ds.field('value') < 10) | (ds.field('value') > 89)
+
+        assert dataset.count_rows(filter=archive._time_expression(None, None, outside)) == 200
+        assert dataset.count_rows(filter=archive._time_expression(None, base + timedelta(minutes=499), outside)) == 100
+
+    def test_count_outside_many_loads_entries_once(self, archive):
+        """多个已归档传感器的索引条目一次查询取回，按传感器分组后分别按各自区间计数"""
+        base = datetime(2026, 1, 7)
+        entries = [
+            archive._write_file(sensor_id, date(2026, 1, 7),
+                                [(sensor_id, base + timedelta(minutes=i), float(i), 'good') for i in range(100)])
+            for sensor_id in (1, 2, 3)
+        ]
+        entries_query = mock.Mock(all=mock.Mock(return_value=entries))
+        watermarks = {sensor_id: date(2026, 1, 7) for sensor_id in (1, 2, 3)}
+
+        with mock.patch.object(archive, 'watermarks', return_value=watermarks), \
+                mock.patch.object(archive, '_entries', return_value=entries_query) as load_entries, \
+                mock.patch.object(archive_module, 'db') as db:
+            db.session.query.return_value.filter.return_value.group_by.return_value = [(3, 4)]
+            counts = archive.count_outside_many({1: (10, 89), 2: (0, 49), 3: (0, 99), 4: (0, 1)}, None, None)
+
+        load_entries.assert_called_once_with([1, 2, 3], None, None)
+        assert counts == {1: 20, 2: 50, 3: 4, 4: 0}
@@ -0,0 +1,75 @@
+"""
+入库基准测试脚本测试 - 验证百分位计算、延迟关联、生成的消息格式和小规模端到端运行
+"""
+
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import scripts.benchmark_ingestion as bench
+
+SCRIPT = Path(__file__).parent.parent / 'scripts' / 'benchmark_ingestion.py'
+
+
+class TestBenchmarkIngestion:
+    """基准测试脚本测试"""
+
+    def test_percentile_nearest_rank(self):
+        """最近秩百分位数，空列表返回0"""
+        values = list(range(100, 0, -1))
+        assert bench.percentile(values, 50) == 50
+        assert bench.percentile(values, 99) == 99
+        assert bench.percentile(values, 100) == 100
+        assert bench.percentile([7.5], 99) == 7.5
+        assert bench.percentile([], 50) == 0.0
+
+    def test_latency_recorder_matches_sent_and_committed(self):
+        """按 (sensor_id, timestamp) 关联发送和提交时间，未发送或重复提交的键不计入"""
+        recorder = bench.LatencyRecorder()
+        ts = datetime(2026, 1, 5, 8, 0)
+        with mock.patch.object(bench.time, 'perf_counter', side_effect=[1.0, 1.5, 2.25, 3.0]):
+            recorder.mark_sent((1, ts))
+            recorder.mark_sent((2, ts))
+            recorder.mark_committed([(1, ts), (3, ts)])
+            recorder.mark_committed([(2, ts), (1, ts)])
+
+        assert recorder.committed == 2
+        assert recorder.latencies == [1.25, 1.5]
+        assert recorder.last_commit == 3.0
+
+    def test_generated_message_matches_device_payload(self):
+        """消息主题和负载字段与设备端 _generate_sensor_data 一致，数值落在传感器取值范围内"""
+        ts = datetime(2026, 1, 5, 8, 0, 0, 12)
+        msg = bench.generate_message('bench_3', 'humidity', ts, 42)
+        payload = json.loads(msg.payload)
+
+        assert msg.topic == 'sensors/bench_3/numeric'
+        assert payload['device_id'] == 'bench_3' and payload['sensor_type'] == 'humidity'
+        assert payload['unit'] == '%' and 30.0 <= payload['value'] <= 80.0
+        assert payload['timestamp'] == '2026-01-05T08:00:00.000012'
+        assert payload['msg_id'] == 'bench-42'
+
+    def test_small_run_commits_every_message(self, tmp_path):
+        """小规模运行（临时SQLite）全部消息提交，结果写入JSON，吞吐低于阈值时退出码为1"""
+        result_path = tmp_path / 'result.json'
+        completed = subprocess.run(
+            [sys.executable, str(SCRIPT), '--devices', '2', '5', '--messages', '60', '--linger-ms', '20',
+             '--drain-timeout', '30', '--json', str(result_path), '--min-throughput', '1e9'],
+            cwd=str(SCRIPT.parent.parent), env=dict(os.environ), capture_output=True, text=True, timeout=120
+        )
+
+        assert completed.returncode == 1, completed.stderr
+        results = json.loads(result_path.read_text(encoding='utf-8'))['results']
+        assert [r['devices'] for r in results] == [2, 5]
+        for r in results:
+            assert r['committed'] == r['messages'] == 60
+            assert r['writer_flushes'] >= 1 and r['dispatcher_dropped'] == 0
+            assert r['alarm_checks'] == 60
+            assert 0 < r['latency_p50_ms'] <= r['latency_p99_ms'] <= r['latency_max_ms']
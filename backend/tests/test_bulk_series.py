@@ -0,0 +1,51 @@
+"""
+批量序列查询测试 - 验证列式响应和无汇总表时的按桶聚合
+"""
+
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services import reading_service
+from services.reading_service import ReadingService
+
+
+def fake_frame(sensor_ids, start=None, end=None):
+    base = datetime(2026, 1, 5)
+    rows = [(sensor_id, base + timedelta(minutes=20 * i), float(i))
+            for i in range(6) for sensor_id in sensor_ids if sensor_id != 3]
+    return pd.DataFrame(rows, columns=['sensor_id', 'timestamp', 'value']).assign(quality='good')
+
+
+@pytest.fixture
+def archive(monkeypatch):
+    monkeypatch.setattr(reading_service.reading_archive, 'read_numeric', fake_frame)
+    monkeypatch.setattr(reading_service.rollup_service, 'enabled', False)
+
+
+class TestBulkSeries:
+    """批量序列查询测试"""
+
+    def test_raw_columns_per_sensor(self, archive):
+        """每个传感器返回毫秒时间戳和数值两列，无数据的传感器返回空列"""
+        series = ReadingService.get_bulk_series([1, 3])
+
+        assert list(series) == [1, 3]
+        assert series[1]['ts'][:2] == [1767571200000, 1767572400000]
+        assert series[1]['v'] == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+        assert series[3] == {'ts': [], 'v': []}
+
+    def test_bucket_aggregates_without_rollups(self, archive):
+        """分桶时返回均值、最小值、最大值和读数个数"""
+        series = ReadingService.get_bulk_series([1, 2], bucket='1h')
+
+        assert series[2]['ts'] == [1767571200000, 1767574800000]
+        assert series[2]['v'] == [1.0, 4.0]
+        assert series[2]['min'] == [0.0, 3.0] and series[2]['max'] == [2.0, 5.0]
+        assert series[2]['n'] == [3, 3]
@@ -0,0 +1,35 @@
+"""
+仪表盘计数器测试 - 验证分组计数的汇总和数据点总数的增量维护
+"""
+
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.dashboard_counters import DashboardCounters, _status_summary
+
+
+class TestDashboardCounters:
+    """仪表盘计数器测试"""
+
+    def test_status_summary_excludes_deleted(self):
+        """total 不含已删除和状态为空的行，缺少的状态计为0"""
+        counts = {'active': 5, 'offline': 2, 'deleted': 4, None: 1}
+
+        summary = _status_summary(counts, online='active', offline='offline', error='error')
+
+        assert summary == {'total': 7, 'online': 5, 'offline': 2, 'error': 0}
+
+    def test_written_rows_are_added_to_base(self):
+        """写入器刷新的行数累加到基数上，不需要重新计数"""
+        counters = DashboardCounters(resync_seconds=3600)
+        counters._data_points_base = 1000
+        counters._resync_at = float('inf')
+
+        counters.on_rows_written([{}] * 250)
+        counters.on_rows_written([{}] * 3)
+
+        assert counters._data_points() == 1253
+        assert counters.get_stats()['rows_added'] == 253
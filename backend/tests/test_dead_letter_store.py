@@ -0,0 +1,74 @@
+"""
+入库死信队列测试 - 验证分段轮转、原因码计数、重启加载和回放
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.dead_letter_store import (
+    DeadLetterStore, REASON_DB_ERROR, REASON_DECODE_ERROR, REASON_UNKNOWN_DEVICE
+)
+
+
+def _make_store(tmp_path, **config):
+    store = DeadLetterStore()
+    store.init_app(SimpleNamespace(config={'DEAD_LETTER_DIR': str(tmp_path), **config}))
+    return store
+
+
+class TestDeadLetterStore:
+    """死信队列测试"""
+
+    def test_segments_rotate_and_reload(self, tmp_path):
+        """分段超过大小上限后轮转，重启后按原因码恢复计数"""
+        store = _make_store(tmp_path, DEAD_LETTER_SEGMENT_MAX_BYTES=200)
+        for i in range(6):
+            store.add('sensors/dev_1/numeric', REASON_UNKNOWN_DEVICE, payload={'value': i})
+        store.add('sensors/dev_1/numeric/msgpack', REASON_DECODE_ERROR, raw=b'\xc1\x00')
+
+        stats = store.get_stats()
+        assert stats['segments'] > 1
+        assert stats['by_reason'] == {REASON_UNKNOWN_DEVICE: 6, REASON_DECODE_ERROR: 1}
+
+        reloaded = _make_store(tmp_path)
+        assert reloaded.counts_by_reason() == stats['by_reason']
+        records = reloaded.list_records(reason=REASON_DECODE_ERROR)
+        assert DeadLetterStore.decode_raw(records[0]) == b'\xc1\x00'
+
+    def test_replay_filters_by_reason_and_requeues_failures(self, tmp_path):
+        """按原因码回放；处理失败的记录以新原因码重新入队，其他原因原样保留"""
+        store = _make_store(tmp_path)
+        for i in range(4):
+            store.add('sensors/dev_1/numeric', REASON_DB_ERROR, payload={'value': i})
+        store.add('sensors/dev_2/numeric', REASON_UNKNOWN_DEVICE, payload={'value': 9})
+
+        replayed = []
+
+        def handler(record):
+            if record['payload']['value'] == 3:
+                error = RuntimeError('still down')
+                error.reason = REASON_UNKNOWN_DEVICE
+                raise error
+            replayed.append(record['payload']['value'])
+
+        result = store.replay(handler, reason=REASON_DB_ERROR)
+
+        assert replayed == [0, 1, 2]
+        assert result['replayed'] == 3 and result['failed'] == 1 and result['kept'] == 1
+        assert store.counts_by_reason() == {REASON_UNKNOWN_DEVICE: 2}
+
+    def test_total_size_cap_drops_oldest_segments(self, tmp_path):
+        """总大小超过上限时删除最旧的分段"""
+        store = _make_store(tmp_path, DEAD_LETTER_SEGMENT_MAX_BYTES=100, DEAD_LETTER_MAX_TOTAL_BYTES=400)
+        for i in range(20):
+            store.add('sensors/dev_1/numeric', REASON_DB_ERROR, payload={'value': i})
+
+        stats = store.get_stats()
+        assert stats['bytes'] <= 400 + 200
+        assert stats['segments_dropped'] > 0
+        assert stats['pending'] + stats['records_dropped'] == 20
+        assert store.list_records(limit=1)[0]['payload']['value'] > 0
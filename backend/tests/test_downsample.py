@@ -0,0 +1,45 @@
+"""
+时间序列降采样测试 - 验证 LTTB 和 min/max 桶的选点
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.downsample import lttb, minmax, downsample
+
+
+class TestDownsample:
+    """降采样测试"""
+
+    def test_lttb_keeps_endpoints_and_spikes(self):
+        """LTTB 保留首尾点和孤立的尖峰，点数不超过目标时原样返回"""
+        x = np.arange(1000, dtype=np.float64)
+        y = np.zeros(1000)
+        y[333], y[777] = 50.0, -40.0
+
+        index = lttb(x, y, 20)
+
+        assert len(index) == 20
+        assert index[0] == 0 and index[-1] == 999
+        assert (np.diff(index) > 0).all()
+        assert 333 in index and 777 in index
+        assert list(lttb(x[:10], y[:10], 20)) == list(range(10))
+
+    def test_minmax_keeps_extremes_per_bucket(self):
+        """每个桶按时间顺序保留最小值和最大值，未知方法抛出 ValueError"""
+        y = np.array([1, 9, 5, 3, 0, 4, 7, 2, 8, 6], dtype=np.float64)
+        x = np.arange(10) * 1000
+
+        assert list(minmax(y, 4)) == [1, 4, 7, 8]
+
+        sampled_x, sampled_y = downsample(x, y, 4, 'minmax')
+        assert list(sampled_x) == [1000, 4000, 7000, 8000]
+        assert list(sampled_y) == [9, 0, 2, 8]
+        with pytest.raises(ValueError):
+            downsample(x, y, 4, 'average')
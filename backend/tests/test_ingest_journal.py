@@ -0,0 +1,228 @@
+"""
+入库写前日志测试 - 验证组提交、应用线程中的消息解析、检查点推进和崩溃恢复
+"""
+
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from sqlalchemy.exc import OperationalError
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import services.ingest_journal as journal_module
+import services.mqtt_service as mqtt_module
+from services.ingest_journal import IngestJournal, SEGMENT_SUFFIX
+
+
+class FakeWriter:
+    """记录写入行的批量写入器替身，fail=True 时模拟数据库不可用"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.rows = []
+
+    def write_rows(self, rows):
+        if self.fail:
+            raise OperationalError('INSERT INTO readings', {}, Exception('connection refused'))
+        self.rows.extend(rows)
+        return list(range(len(rows)))
+
+
+def _make_journal(tmp_path, **config):
+    journal = IngestJournal()
+    journal.init_app(SimpleNamespace(config={
+        'INGEST_JOURNAL_DIR': str(tmp_path),
+        'INGEST_JOURNAL_FSYNC_INTERVAL_MS': 1,
+        **config
+    }))
+    return journal
+
+
+def _row(value):
+    return {'sensor_id': 1, 'timestamp': datetime(2025, 6, 25, 10, 0, value),
+            'numeric_value': float(value), 'quality': 'good'}
+
+
+def _payload(value):
+    return json.dumps({'value': value}).encode('utf-8')
+
+
+def _resolve(topic, payload_bytes):
+    """应用线程中的解析器替身：原始JSON负载转为一行读数"""
+    return [_row(json.loads(payload_bytes)['value'])]
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestIngestJournal:
+    """写前日志测试"""
+
+    def test_appended_records_applied_in_order(self, tmp_path):
+        """追加的记录按顺序批量写入，分段轮转后已应用的分段被删除"""
+        writer = FakeWriter()
+        journal = _make_journal(tmp_path, INGEST_JOURNAL_SEGMENT_MAX_BYTES=300, INGEST_JOURNAL_APPLY_MAX_ROWS=4)
+        journal.start(writer, _resolve)
+        for i in range(10):
+            journal.append('sensors/dev_1/numeric', _payload(i))
+
+        assert _wait_for(lambda: len(writer.rows) == 10)
+        journal.stop()
+
+        assert [row['numeric_value'] for row in writer.rows] == [float(i) for i in range(10)]
+        assert writer.rows[0]['timestamp'] == datetime(2025, 6, 25, 10, 0, 0)
+        stats = journal.get_stats()
+        assert stats['appended'] == 10 and stats['applied_rows'] == 10
+        assert stats['backlog_bytes'] == 0
+        assert len([n for n in os.listdir(tmp_path) if n.endswith(SEGMENT_SUFFIX)]) == 1
+
+    def test_recovers_unapplied_records_after_crash(self, tmp_path):
+        """数据库不可用时记录保留在日志中，重启后补写，末尾不完整的记录被跳过"""
+        journal = _make_journal(tmp_path)
+        journal.start(FakeWriter(fail=True), _resolve)
+        for i in range(3):
+            journal.append('sensors/dev_1/numeric', _payload(i))
+        journal.stop()
+
+        # 模拟写入过程中崩溃：最后一个分段末尾只有半条记录
+        segment = sorted(n for n in os.listdir(tmp_path) if n.endswith(SEGMENT_SUFFIX))[-1]
+        with open(tmp_path / segment, 'ab') as f:
+            f.write(b'\x40\x00\x00\x00\x00\x00')
+
+        writer = FakeWriter()
+        recovered = _make_journal(tmp_path)
+        recovered.start(writer, _resolve)
+        assert recovered.stats['recovered_segments'] >= 1
+        assert _wait_for(lambda: len(writer.rows) == 3)
+        recovered.append('sensors/dev_1/numeric', _payload(3))
+        assert _wait_for(lambda: len(writer.rows) == 4)
+        recovered.stop()
+
+        assert [row['numeric_value'] for row in writer.rows] == [0.0, 1.0, 2.0, 3.0]
+
+        # 检查点之前的记录不会再次应用
+        writer = FakeWriter()
+        restarted = _make_journal(tmp_path)
+        restarted.start(writer, _resolve)
+        time.sleep(0.1)
+        restarted.stop()
+        assert writer.rows == []
+
+    def test_acknowledged_record_survives_restart(self, tmp_path):
+        """append 在覆盖记录的fsync完成后才返回；返回时的磁盘状态重启后能恢复该记录"""
+        journal = _make_journal(tmp_path / 'live', INGEST_JOURNAL_FSYNC_INTERVAL_MS=50)
+        journal.start(FakeWriter(fail=True), _resolve)
+
+        acknowledged = threading.Event()
+        thread = threading.Thread(target=lambda: (
+            journal.append('sensors/dev_1/numeric', _payload(7)), acknowledged.set()
+        ))
+        thread.start()
+        # 组提交间隔内尚未fsync，append 不返回（不会确认消息）
+        assert not acknowledged.wait(0.02)
+        assert journal.stats['fsyncs'] == 0
+        assert acknowledged.wait(2.0)
+        assert journal.stats['fsyncs'] >= 1
+
+        # 确认时刻的磁盘内容即崩溃后保留的内容
+        shutil.copytree(tmp_path / 'live', tmp_path / 'crashed')
+        journal.stop()
+
+        writer = FakeWriter()
+        recovered = _make_journal(tmp_path / 'crashed')
+        recovered.start(writer, _resolve)
+        assert _wait_for(lambda: len(writer.rows) == 1)
+        recovered.stop()
+        assert writer.rows[0]['numeric_value'] == 7.0
+
+    def test_concurrent_appends_share_fsyncs(self, tmp_path):
+        """多个线程同时追加时一次fsync覆盖多条记录，每个 append 都在覆盖它的fsync之后返回"""
+        journal = _make_journal(tmp_path, INGEST_JOURNAL_FSYNC_INTERVAL_MS=0)
+        writer = FakeWriter(fail=True)
+        real_fsync = os.fsync
+
+        def slow_fsync(fd):
+            time.sleep(0.02)
+            real_fsync(fd)
+
+        with mock.patch.object(journal_module.os, 'fsync', side_effect=slow_fsync):
+            journal.start(writer, _resolve)
+            barrier = threading.Barrier(16)
+
+            def append(i):
+                barrier.wait()
+                journal.append(f'sensors/dev_{i}/numeric', _payload(i))
+
+            threads = [threading.Thread(target=append, args=(i,)) for i in range(16)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+            fsyncs = journal.stats['fsyncs']
+            journal.stop()
+
+        assert journal.stats['appended'] == 16
+        assert 1 <= fsyncs < 16
+
+    def test_records_resolved_once_in_apply_thread(self, tmp_path):
+        """原始负载原样写入日志，在应用线程中解析；数据库错误重试时不重复解析，解析异常的消息进入死信队列"""
+        writer = FakeWriter()
+        calls = []
+        failures = [OperationalError('SELECT devices', {}, Exception('connection refused'))]
+
+        def resolve(topic, payload_bytes):
+            calls.append((topic, payload_bytes))
+            if topic == 'sensors/dev_2/numeric/json' and failures:
+                raise failures.pop()
+            if topic == 'sensors/dev_3/numeric/json':
+                raise KeyError('sensor_type')
+            return _resolve(topic, payload_bytes)
+
+        journal = _make_journal(tmp_path)
+        with mock.patch.object(journal_module, 'dead_letter_store') as dead_letters:
+            journal.start(writer, resolve)
+            for i in (1, 2, 3):
+                journal.append(f'sensors/dev_{i}/numeric/json', _payload(i))
+            assert _wait_for(lambda: len(writer.rows) == 2)
+            journal.stop()
+
+        # dev_2 第一次解析遇到数据库错误后退避重试，已解析成功的记录不再重复解析
+        assert sorted(topic for topic, _ in calls) == [
+            'sensors/dev_1/numeric/json', 'sensors/dev_2/numeric/json',
+            'sensors/dev_2/numeric/json', 'sensors/dev_3/numeric/json',
+        ]
+        assert set(payload for _, payload in calls) == {_payload(1), _payload(2), _payload(3)}
+        assert [row['numeric_value'] for row in writer.rows] == [1.0, 2.0]
+        assert journal.stats['apply_retries'] >= 1 and journal.stats['dead_lettered'] == 1
+        dead_letters.add.assert_called_once()
+        assert dead_letters.add.call_args.kwargs['raw'] == _payload(3)
+
+    def test_mqtt_callback_appends_raw_bytes_only(self):
+        """启用写前日志时MQTT回调只追加原始主题和字节，不解码也不查询设备/传感器"""
+        service = mqtt_module.MQTTService()
+        service.ingestion_service = mock.Mock()
+        msg = SimpleNamespace(topic='sensors/dev_1/numeric', payload=b'\xa1\x01', properties=None)
+
+        with mock.patch.object(mqtt_module, 'ingest_journal') as journal, \
+                mock.patch.object(mqtt_module, 'dead_letter_store') as dead_letters:
+            journal.running = True
+            service._on_message(None, None, msg)
+            service._on_message(None, None, SimpleNamespace(topic='sensors/dev_1/numeric/cbor', payload=b'\xa0'))
+
+        assert journal.append.call_args_list == [mock.call('sensors/dev_1/numeric', b'\xa1\x01'),
+                                                 mock.call('sensors/dev_1/numeric/cbor', b'\xa0')]
+        assert service.ingestion_service.mock_calls == []
+        dead_letters.add.assert_not_called()
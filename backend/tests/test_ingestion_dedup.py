@@ -0,0 +1,57 @@
+"""
+摄取去重测试 - 验证QoS1重投消息在去重窗口内被丢弃
+"""
+
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.dedup_filter import MessageDedupFilter
+
+
+class TestMessageDedupFilter:
+    """消息去重窗口测试"""
+
+    def test_redelivery_with_message_id_is_dropped(self):
+        """相同消息ID的重投被识别为重复，不同ID正常通过"""
+        dedup = MessageDedupFilter()
+        topic = 'sensors/device_1/numeric'
+
+        assert not dedup.is_duplicate(topic, {'temperature': 21.5, 'msg_id': 'a1-1'})
+        assert dedup.is_duplicate(topic, {'temperature': 21.5, 'msg_id': 'a1-1'})
+        assert not dedup.is_duplicate(topic, {'temperature': 21.5, 'msg_id': 'a1-2'})
+        # 不同设备的相同消息ID互不影响
+        assert not dedup.is_duplicate('sensors/device_2/numeric', {'msg_id': 'a1-1'})
+        assert dedup.get_stats()['duplicates'] == 1
+
+    def test_device_timestamp_key(self):
+        """没有消息ID时按设备时间戳和传感器类型识别"""
+        dedup = MessageDedupFilter()
+        topic = 'sensors/device_1/numeric'
+        reading = {'sensor_type': 'humidity', 'value': 60, 'timestamp': '2025-06-25T10:00:00'}
+
+        assert not dedup.is_duplicate(topic, reading)
+        assert dedup.is_duplicate(topic, dict(reading))
+        assert not dedup.is_duplicate(topic, {**reading, 'sensor_type': 'temperature'})
+
+    def test_unidentifiable_messages_pass(self):
+        """既无消息ID也无时间戳的消息无法区分重投，不做去重"""
+        dedup = MessageDedupFilter()
+        topic = 'sensors/device_1/numeric'
+
+        assert not dedup.is_duplicate(topic, {'temperature': 21.5})
+        assert not dedup.is_duplicate(topic, {'temperature': 21.5})
+
+    def test_window_is_bounded(self):
+        """超过最大条目数时淘汰最早的键"""
+        dedup = MessageDedupFilter(max_entries=3)
+        topic = 'sensors/device_1/numeric'
+
+        for seq in range(5):
+            dedup.is_duplicate(topic, {'seq': seq})
+
+        assert dedup.get_stats()['entries'] == 3
+        assert not dedup.is_duplicate(topic, {'seq': 0})
+        assert dedup.is_duplicate(topic, {'seq': 4})
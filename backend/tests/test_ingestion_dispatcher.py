@@ -0,0 +1,126 @@
+"""
+MQTT分发器测试 - 验证各背压策略、溢出到磁盘后的按序回放和中断回放
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import services.ingestion_dispatcher as dispatcher_module
+from services.ingestion_dispatcher import IngestionDispatcher, POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_SPILL
+
+
+def _dispatcher(tmp_path, maxsize=2):
+    dispatcher = IngestionDispatcher(handler=lambda *args: None)
+    dispatcher.policy = POLICY_SPILL
+    dispatcher.spill_dir = str(tmp_path)
+    dispatcher._queues = [queue.Queue(maxsize=maxsize)]
+    dispatcher.running = True
+    return dispatcher
+
+
+def _drain(q):
+    items = []
+    while not q.empty():
+        items.append(q.get_nowait())
+    return items
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.02)
+
+
+class TestIngestionDispatcher:
+    """分发器测试"""
+
+    def test_drop_oldest_and_block_policies(self, tmp_path):
+        """drop_oldest 丢弃分片中最旧的消息；block 等待超时后丢弃新消息"""
+        dispatcher = _dispatcher(tmp_path)
+        dispatcher.policy = POLICY_DROP_OLDEST
+        for i in range(3):
+            dispatcher.dispatch('sensors/dev_1/numeric', str(i).encode(), 1000.0 + i)
+        assert [item[1] for item in list(dispatcher._queues[0].queue)] == [b'1', b'2']
+        assert dispatcher.stats['dropped'] == 1 and dispatcher.stats['enqueued'] == 3
+
+        dispatcher.policy = POLICY_BLOCK
+        dispatcher.block_timeout = 0.05
+        started = time.monotonic()
+        dispatcher.dispatch('sensors/dev_1/numeric', b'3', 1003.0)
+        assert time.monotonic() - started >= 0.05
+        assert [item[1] for item in list(dispatcher._queues[0].queue)] == [b'1', b'2']
+        assert dispatcher.stats['dropped'] == 2 and dispatcher.stats['enqueued'] == 3
+        assert os.listdir(tmp_path) == []
+
+    def test_spill_replays_in_order(self, tmp_path):
+        """队列满后消息溢出到磁盘，溢出期间的新消息也写入文件，队列恢复后按接收顺序处理"""
+        gate = threading.Event()
+        handled = []
+
+        def handler(topic, payload, receive_ts):
+            gate.wait(5)
+            handled.append(payload)
+
+        dispatcher = IngestionDispatcher(handler=handler)
+        dispatcher.init_app(SimpleNamespace(app_context=nullcontext, config={
+            'MQTT_WORKER_COUNT': 1, 'MQTT_QUEUE_MAXSIZE': 2,
+            'MQTT_BACKPRESSURE_POLICY': POLICY_SPILL, 'MQTT_SPILL_DIR': str(tmp_path),
+        }))
+        with mock.patch.object(dispatcher_module, 'db'):
+            dispatcher.start()
+            try:
+                payloads = [str(i).encode() for i in range(8)]
+                dispatcher.dispatch('sensors/dev_1/numeric', payloads[0])
+                _wait_for(lambda: dispatcher._queues[0].empty())
+                for payload in payloads[1:]:
+                    dispatcher.dispatch('sensors/dev_1/numeric', payload)
+                assert dispatcher.stats['spilled'] == 5 and dispatcher.get_stats()['spill_pending']
+
+                gate.set()
+                _wait_for(lambda: len(handled) == len(payloads))
+                assert handled == payloads
+                _wait_for(lambda: not dispatcher.get_stats()['spill_pending'])
+            finally:
+                gate.set()
+                dispatcher.stop()
+        assert dispatcher.stats['replayed'] == 5 and dispatcher.stats['processed'] == 8
+        assert os.listdir(tmp_path) == []
+
+    def test_interrupted_replay_resumes_from_offset(self, tmp_path):
+        """停机中断回放时返回False并记录偏移，重启后只回放尚未入队的消息"""
+        dispatcher = _dispatcher(tmp_path)
+        for i in range(5):
+            dispatcher._spill((f'sensors/dev_{i}/numeric', f'{{"value": {i}}}'.encode(), 1000.0 + i))
+        dispatcher._spill_file.close()
+        path = dispatcher._spill_file.name
+        dispatcher._spill_file = None
+
+        # 队列容量为2：入队两条后阻塞，此时停止分发器
+        stopper = threading.Timer(0.2, lambda: setattr(dispatcher, 'running', False))
+        stopper.start()
+        assert dispatcher._replay_file(path) is False
+        stopper.join()
+        first = _drain(dispatcher._queues[0])
+        assert [item[1] for item in first] == [b'{"value": 0}', b'{"value": 1}']
+        assert os.path.exists(path) and os.path.exists(path + '.offset')
+
+        restarted = _dispatcher(tmp_path, maxsize=10)
+        restarted._load_spill_backlog()
+        assert restarted._spill_backlog == [path]
+        assert restarted._replay_file(path) is True
+        second = _drain(restarted._queues[0])
+        assert [item[1] for item in second] == [b'{"value": 2}', b'{"value": 3}', b'{"value": 4}']
+        assert [item[2] for item in second] == [1002.0, 1003.0, 1004.0]
+        assert os.listdir(tmp_path) == []
+        assert dispatcher.stats['replayed'] + restarted.stats['replayed'] == 5
@@ -0,0 +1,49 @@
+"""
+最新读数缓存测试 - 验证按时间戳保留最新读数和读取时补充单位
+"""
+
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.sensor import Sensor
+from services.latest_cache import LatestValueCache
+
+
+def written(reading_id, sensor_id, timestamp, value):
+    return {'id': reading_id, 'sensor_id': sensor_id, 'timestamp': timestamp, 'data_type': 'numeric',
+            'numeric_value': value, 'quality': 'good', 'unit': None, 'meta_info': None}
+
+
+class TestLatestValueCache:
+    """最新读数缓存测试（进程内存储）"""
+
+    def test_out_of_order_rows_do_not_replace_newer(self):
+        """同一批及之后写入的旧读数不会覆盖较新的读数，带时区的时间戳按UTC保存"""
+        cache = LatestValueCache()
+        cache.on_rows_written([
+            written(2, 4, datetime(2026, 1, 5, 9, 0, tzinfo=timezone.utc), 21.5),
+            written(1, 4, datetime(2026, 1, 5, 8, 0), 20.0),
+        ])
+        cache.on_rows_written([written(3, 4, datetime(2026, 1, 5, 7, 0), 19.0)])
+
+        entry = cache._entries[4][1]
+        assert entry['id'] == 2 and entry['value'] == 21.5
+        assert entry['timestamp'] == '2026-01-05T09:00:00'
+
+    def test_get_many_adds_sensor_unit(self):
+        """命中时不查询数据库，数值读数的单位取自传感器"""
+        cache = LatestValueCache()
+        cache.on_rows_written([written(1, 4, datetime(2026, 1, 5, 8, 0), 61.5)])
+        cache.on_rows_written([written(2, 5, datetime(2026, 1, 5, 8, 0), 300.0)])
+
+        sensors = [Sensor(id=5, type='light', unit='lux'), Sensor(id=4, type='humidity', unit='%')]
+        latest = cache.get_many(sensors)
+
+        assert list(latest) == [5, 4]
+        assert latest[4]['unit'] == '%' and latest[4]['value'] == 61.5
+        assert 'unit' not in cache._entries[4][1]
+        assert cache.get_stats()['hits'] == 2
@@ -0,0 +1,135 @@
+"""
+分块媒体上传测试 - 验证乱序/重复块的组装、重启后断点续传、sha256 校验失败重传、提交权和非法输入
+"""
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.media_upload_service import (
+    MediaUploadService, STATE_RECEIVING, STATE_INCOMPLETE, STATE_COMMITTED, STATE_FAILED, STATE_UNKNOWN,
+    COMMIT_CLAIM_TIMEOUT
+)
+
+CHUNK = 4
+
+
+def _service(tmp_path):
+    service = MediaUploadService()
+    service.init_app(SimpleNamespace(config={'MEDIA_UPLOAD_DIR': str(tmp_path), 'MEDIA_UPLOAD_MAX_CHUNK_BYTES': 16}))
+    stored = {}
+
+    def ingest_media_file(client_id, part_path, manifest):
+        with open(part_path, 'rb') as f:
+            stored['data'] = f.read()
+        stored['manifest'] = manifest
+        return SimpleNamespace(id=42)
+
+    service.ingestion_service = mock.Mock(ingest_media_file=mock.Mock(side_effect=ingest_media_file))
+    return service, stored
+
+
+def _chunks(data):
+    return [data[i:i + CHUNK] for i in range(0, len(data), CHUNK)]
+
+
+def _topic(action, upload_id='up-1'):
+    return f'sensors/cam_1/media/{upload_id}/{action}'
+
+
+class TestMediaUploadService:
+    """分块媒体上传测试"""
+
+    def test_out_of_order_chunks_resume_after_restart(self, tmp_path):
+        """乱序和重复块按偏移组装；重启后 init 返回缺失块，补齐后提交的文件与原文件一致"""
+        data = b'agrinex-media-upload!'  # 21 字节，6 块，最后一块 1 字节
+        manifest = {'data_type': 'image', 'size': len(data), 'chunk_size': CHUNK,
+                    'sha256': hashlib.sha256(data).hexdigest(), 'format': 'jpg'}
+        chunks = _chunks(data)
+        service, stored = _service(tmp_path)
+
+        topic, status = service.handle_message(_topic('init'), json.dumps(manifest).encode())
+        assert topic == 'sensors/cam_1/media/up-1/status'
+        assert status['state'] == STATE_RECEIVING and status['total_chunks'] == 6
+        for index in (5, 2, 0, 2):
+            assert service.handle_message(_topic(f'chunk/{index}'), chunks[index]) is None
+        assert service.stats['chunks_received'] == 3 and service.stats['chunks_duplicated'] == 1
+
+        _, status = service.handle_message(_topic('commit'), b'')
+        assert status['state'] == STATE_INCOMPLETE and status['missing'] == [1, 3, 4]
+
+        # 进程重启：会话从磁盘上的清单和位图恢复
+        restarted, stored = _service(tmp_path)
+        _, status = restarted.handle_message(_topic('init'), json.dumps(manifest).encode())
+        assert status['missing'] == [1, 3, 4] and restarted.stats['uploads_resumed'] == 1
+        for index in (4, 1, 3):
+            restarted.write_chunk('cam_1', 'up-1', index, chunks[index])
+
+        _, status = restarted.handle_message(_topic('commit'), b'')
+        assert status == {'upload_id': 'up-1', 'state': STATE_COMMITTED, 'total_chunks': 6,
+                          'received_chunks': 6, 'missing': [], 'reading_id': 42}
+        assert stored['data'] == data and stored['manifest']['format'] == 'jpg'
+        assert sorted(os.listdir(tmp_path)) == ['cam_1__up-1.json']
+
+        # 重复提交和迟到的块不会再次入库
+        assert restarted.commit('cam_1', 'up-1')['state'] == STATE_COMMITTED
+        assert restarted.write_chunk('cam_1', 'up-1', 0, chunks[0]) is None
+        restarted.ingestion_service.ingest_media_file.assert_called_once()
+
+    def test_sha256_mismatch_requires_full_resend(self, tmp_path):
+        """校验失败时清空位图，设备需重传全部块"""
+        data = b'12345678'
+        service, _ = _service(tmp_path)
+        service.init_upload('cam_1', 'up-2', {'data_type': 'video', 'size': len(data), 'chunk_size': CHUNK,
+                                              'sha256': hashlib.sha256(b'other').hexdigest()})
+        for index, chunk in enumerate(_chunks(data)):
+            service.write_chunk('cam_1', 'up-2', index, chunk)
+
+        status = service.commit('cam_1', 'up-2')
+        assert status['state'] == STATE_INCOMPLETE and status['error'] == 'sha256 mismatch'
+        assert status['missing'] == [0, 1]
+        with open(tmp_path / 'cam_1__up-2.map', 'rb') as f:
+            assert f.read() == b'\x00\x00'
+        service.ingestion_service.ingest_media_file.assert_not_called()
+
+    def test_commit_claim_prevents_double_ingest(self, tmp_path):
+        """其他实例持有提交标记时不回复也不入库；过期的标记被接管，提交后标记删除"""
+        data = b'12345678'
+        service, stored = _service(tmp_path)
+        service.init_upload('cam_1', 'up-5', {'data_type': 'image', 'size': len(data), 'chunk_size': CHUNK})
+        for index, chunk in enumerate(_chunks(data)):
+            service.write_chunk('cam_1', 'up-5', index, chunk)
+
+        lock_path = tmp_path / 'cam_1__up-5.lock'
+        lock_path.touch()
+        assert service.commit('cam_1', 'up-5') is None
+        service.ingestion_service.ingest_media_file.assert_not_called()
+
+        stale = lock_path.stat().st_mtime - COMMIT_CLAIM_TIMEOUT - 1
+        os.utime(lock_path, (stale, stale))
+        assert service.commit('cam_1', 'up-5')['state'] == STATE_COMMITTED
+        assert stored['data'] == data and not lock_path.exists()
+
+    def test_rejects_invalid_input(self, tmp_path):
+        """非法清单、块大小不符、未知会话和不安全的ID都不会写入数据"""
+        service, _ = _service(tmp_path)
+        assert service.init_upload('cam_1', 'bad', {'data_type': 'audio', 'size': 8, 'chunk_size': 4})['state'] \
+            == STATE_FAILED
+        assert service.init_upload('cam_1', 'big', {'data_type': 'image', 'size': 8, 'chunk_size': 32})['state'] \
+            == STATE_FAILED
+        assert service.write_chunk('cam_1', 'missing', 0, b'1234') == {'upload_id': 'missing', 'state': STATE_UNKNOWN}
+
+        service.init_upload('cam_1', 'up-3', {'data_type': 'image', 'size': 6, 'chunk_size': CHUNK})
+        assert service.write_chunk('cam_1', 'up-3', 1, b'123')['error'] == 'invalid chunk 1'
+        assert service.write_chunk('cam_1', 'up-3', 2, b'12')['error'] == 'invalid chunk 2'
+        assert service.stats['chunks_received'] == 0
+
+        assert service.handle_message('sensors/cam:1/media/up-4/init', b'{}') is None
+        assert sorted(os.listdir(tmp_path)) == ['cam_1__up-3.json', 'cam_1__up-3.map', 'cam_1__up-3.part']
@@ -0,0 +1,88 @@
+"""
+Prometheus 指标测试 - 验证直方图累积桶、计数器标签、采集器输出、抓取路径和MQTT接收计数
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from flask import Flask
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import services.mqtt_service as mqtt_module
+from controllers.main_controller import main_bp, metrics_bp
+from services.metrics import MetricsRegistry, MQTT_MESSAGES_RECEIVED
+
+
+class TestMetrics:
+    """进程内指标注册表测试"""
+
+    def test_histogram_renders_cumulative_buckets(self):
+        """各桶输出为累积计数，_count 等于 +Inf 桶，totals 合计所有标签值"""
+        registry = MetricsRegistry()
+        histogram = registry.histogram('flush_seconds', '刷新耗时', ('table',), buckets=(0.1, 1.0))
+        histogram.observe(0.05, table='numeric')
+        histogram.observe(0.1, table='numeric')
+        histogram.observe(0.5, table='numeric')
+        histogram.observe(3.0, table='numeric')
+        histogram.observe(0.2, table='media')
+
+        lines = registry.render().splitlines()
+        assert '# TYPE flush_seconds histogram' in lines
+        assert 'flush_seconds_bucket{table="numeric",le="0.1"} 2' in lines
+        assert 'flush_seconds_bucket{table="numeric",le="1.0"} 3' in lines
+        assert 'flush_seconds_bucket{table="numeric",le="+Inf"} 4' in lines
+        assert 'flush_seconds_count{table="numeric"} 4' in lines
+        assert 'flush_seconds_sum{table="numeric"} 3.65' in lines
+
+        count, total = histogram.totals()
+        assert count == 5 and round(total, 2) == 3.85
+
+    def test_counter_labels_and_collectors(self):
+        """计数器按标签值分别累加；采集器异常不影响其余指标输出"""
+        registry = MetricsRegistry()
+        failures = registry.counter('notifications_failed_total', '通知失败数', ('channel',))
+        failures.inc(channel='email')
+        failures.inc(2, channel='webhook')
+        failures.inc(channel='email')
+
+        def broken():
+            raise RuntimeError('unavailable')
+
+        registry.add_collector(broken)
+        registry.add_collector(lambda: [('queue_depth', 'gauge', '队列深度', [({}, 7)])])
+
+        lines = registry.render().splitlines()
+        assert 'notifications_failed_total{channel="email"} 2' in lines
+        assert 'notifications_failed_total{channel="webhook"} 2' in lines
+        assert '# TYPE queue_depth gauge' in lines and 'queue_depth 7' in lines
+
+    def test_scrape_endpoint_served_at_root(self):
+        """抓取端点在 /metrics，不在 /api 前缀下"""
+        app = Flask(__name__)
+        app.register_blueprint(main_bp, url_prefix='/api')
+        app.register_blueprint(metrics_bp)
+        client = app.test_client()
+
+        with mock.patch('services.metrics.metrics.render', return_value='up 1\n'):
+            response = client.get('/metrics')
+            assert client.get('/api/metrics').status_code == 404
+
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+        assert response.get_data(as_text=True) == 'up 1\n'
+
+    def test_received_counter_counts_every_mqtt_callback(self):
+        """接收计数在MQTT回调中累加，不经分发队列直接处理的消息同样计入"""
+        service = mqtt_module.MQTTService()
+        service._process_message = mock.Mock()
+        before = sum(value for _, _, value in MQTT_MESSAGES_RECEIVED.samples())
+
+        for _ in range(3):
+            service._on_message(None, None, SimpleNamespace(topic='sensors/dev_1/numeric', payload=b'{}'))
+
+        assert service._process_message.call_count == 3 and not service.dispatcher.running
+        assert sum(value for _, _, value in MQTT_MESSAGES_RECEIVED.samples()) - before == 3
@@ -0,0 +1,228 @@
+"""
+MQTT集群摄取测试 - 使用本地代理替身验证共享订阅的负载分配和跨实例的分块媒体上传
+"""
+
+import hashlib
+import itertools
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from flask import Flask
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import services.mqtt_service as mqtt_module
+from services.mqtt_service import MQTTService
+from services.media_upload_service import MediaUploadService, STATE_COMMITTED
+
+
+def _topic_matches(topic_filter: str, topic: str) -> bool:
+    """MQTT主题过滤匹配（支持 + 和 #）"""
+    filter_parts = topic_filter.split('/')
+    topic_parts = topic.split('/')
+    for index, part in enumerate(filter_parts):
+        if part == '#':
+            return True
+        if index >= len(topic_parts):
+            return False
+        if part != '+' and part != topic_parts[index]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+class FakeBroker:
+    """代理替身：普通订阅广播给所有订阅者，$share 订阅在组内轮询分配"""
+
+    def __init__(self):
+        self.subscriptions = []   # [(filter, client)]
+        self.shared = {}          # (group, filter) -> [clients]
+        self.published = []       # 后端发布的消息 [(topic, payload)]
+        self._round_robin = {}
+
+    def subscribe(self, client, topic_filter: str):
+        if topic_filter.startswith('$share/'):
+            _, group, real_filter = topic_filter.split('/', 2)
+            key = (group, real_filter)
+            self.shared.setdefault(key, []).append(client)
+            self._round_robin[key] = itertools.cycle(self.shared[key])
+        else:
+            self.subscriptions.append((topic_filter, client))
+
+    def publish(self, topic: str, payload: bytes):
+        for topic_filter, client in self.subscriptions:
+            if _topic_matches(topic_filter, topic):
+                client.deliver(topic, payload)
+        for (group, topic_filter), clients in self.shared.items():
+            if clients and _topic_matches(topic_filter, topic):
+                next(self._round_robin[(group, topic_filter)]).deliver(topic, payload)
+
+
+class FakeClient:
+    """paho Client 替身，只实现 MQTTService 用到的接口"""
+
+    broker: FakeBroker = None
+    client_ids = []
+
+    def __init__(self, client_id='', protocol=None, **kwargs):
+        self.client_id = client_id
+        self.protocol = protocol
+        FakeClient.client_ids.append(client_id)
+
+    def username_pw_set(self, username, password):
+        pass
+
+    def connect(self, host, port, keepalive):
+        if self.protocol == mqtt_module.mqtt.MQTTv5:
+            self.on_connect(self, None, {}, 0, None)
+        else:
+            self.on_connect(self, None, {}, 0)
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def subscribe(self, topic, qos=0):
+        self.broker.subscribe(self, topic)
+        return (mqtt_module.mqtt.MQTT_ERR_SUCCESS, 1)
+
+    def publish(self, topic, payload, qos=0):
+        self.broker.published.append((topic, json.loads(payload)))
+        return SimpleNamespace(rc=mqtt_module.mqtt.MQTT_ERR_SUCCESS)
+
+    def deliver(self, topic, payload):
+        self.on_message(self, None, SimpleNamespace(topic=topic, payload=payload))
+
+
+def _make_service(instance: int, cluster_enabled: bool) -> MQTTService:
+    app = Flask(f'backend-{instance}')
+    app.config.update(
+        MQTT_CLUSTER_ENABLED=cluster_enabled,
+        MQTT_PROTOCOL='5',
+        MQTT_SHARE_GROUP='agrinex-ingest',
+        MQTT_CLIENT_ID=f'agrinex_backend_test_{instance}' if cluster_enabled else '',
+        MQTT_DISPATCH_ENABLED=False,
+    )
+    service = MQTTService()
+    service.init_app(app)
+    service.received = []
+    service._handle_sensor_data = lambda topic, payload: service.received.append(payload['seq'])
+    return service
+
+
+class TestSharedSubscription:
+    """共享订阅负载分配测试"""
+
+    @pytest.fixture
+    def broker(self, monkeypatch):
+        broker = FakeBroker()
+        FakeClient.broker = broker
+        FakeClient.client_ids = []
+        monkeypatch.setattr(mqtt_module.mqtt, 'Client', FakeClient)
+        # 测试中多个实例处于同一进程，会共享去重窗口；实际部署中各实例独立
+        monkeypatch.setattr(mqtt_module.dedup_filter, 'enabled', False)
+        return broker
+
+    def _publish(self, broker, count):
+        for seq in range(count):
+            broker.publish(f'sensors/device_{seq % 7}/numeric', ('{"seq": %d, "temperature": 20.5}' % seq).encode())
+
+    def test_cluster_mode_splits_stream(self, broker):
+        """集群模式下N个实例分摊消息，无重复无遗漏"""
+        services = [_make_service(i, cluster_enabled=True) for i in range(3)]
+        for service in services:
+            assert service.connect()
+
+        self._publish(broker, 300)
+
+        received = [seq for service in services for seq in service.received]
+        assert sorted(received) == list(range(300))
+        for service in services:
+            assert len(service.received) == 100
+
+        # 订阅使用共享订阅主题，客户端ID稳定且各实例唯一
+        assert ('agrinex-ingest', 'sensors/+/numeric') in broker.shared
+        assert FakeClient.client_ids == [f'agrinex_backend_test_{i}' for i in range(3)]
+
+    def test_reconnect_keeps_client_id(self, broker):
+        """重连后客户端ID保持不变"""
+        service = _make_service(0, cluster_enabled=True)
+        service.connect()
+        service.connect()
+        assert FakeClient.client_ids == ['agrinex_backend_test_0'] * 2
+
+    def test_default_cluster_client_id_unique_per_process(self, broker, monkeypatch):
+        """未配置 MQTT_CLIENT_ID 时集群客户端ID包含主机名和进程号，同一主机的多个进程互不冲突"""
+        monkeypatch.setattr(mqtt_module.socket, 'gethostname', lambda: 'node-a')
+        client_ids = []
+        for pid in (101, 102):
+            monkeypatch.setattr(mqtt_module.os, 'getpid', lambda pid=pid: pid)
+            service = MQTTService()
+            service.mqtt_config = {'cluster_enabled': True}
+            client_ids.append(service._build_client_id(''))
+        assert client_ids == ['agrinex_backend_node-a_101', 'agrinex_backend_node-a_102']
+
+    def test_chunked_upload_spread_across_instances(self, broker, tmp_path):
+        """集群模式下 init/chunk/commit 轮流分到两个实例，共享上传目录时上传只入库一次且无 unknown 状态"""
+        data = bytes(range(256)) * 3 + b'tail'
+        chunk_size = 100
+        stored = []
+
+        def ingest_media_file(client_id, part_path, manifest):
+            with open(part_path, 'rb') as f:
+                stored.append(f.read())
+            return SimpleNamespace(id=len(stored))
+
+        services = []
+        for i in range(2):
+            service = _make_service(i, cluster_enabled=True)
+            service.media_uploads = MediaUploadService()
+            service.media_uploads.init_app(SimpleNamespace(config={'MEDIA_UPLOAD_DIR': str(tmp_path)}))
+            service.media_uploads.ingestion_service = mock.Mock(
+                ingest_media_file=mock.Mock(side_effect=ingest_media_file))
+            service.connect()
+            services.append(service)
+        assert ('agrinex-ingest', 'sensors/+/media/+/chunk/+') in broker.shared
+
+        prefix = 'sensors/cam_1/media/up-1'
+        manifest = {'data_type': 'image', 'size': len(data), 'chunk_size': chunk_size,
+                    'sha256': hashlib.sha256(data).hexdigest()}
+        broker.publish(f'{prefix}/init', json.dumps(manifest).encode())
+        for index in range(0, len(data), chunk_size):
+            broker.publish(f'{prefix}/chunk/{index // chunk_size}', data[index:index + chunk_size])
+        # 设备未及时收到回复时重发 commit，第二次由另一个实例处理
+        broker.publish(f'{prefix}/commit', b'')
+        broker.publish(f'{prefix}/commit', b'')
+
+        statuses = [payload for topic, payload in broker.published if topic == f'{prefix}/status']
+        assert [status['state'] for status in statuses] == ['receiving', STATE_COMMITTED, STATE_COMMITTED]
+        assert statuses[-1]['reading_id'] == 1 and statuses[-1]['missing'] == []
+        assert stored == [data]
+        assert sum(s.media_uploads.stats['chunks_received'] for s in services) == 8
+        assert all(s.media_uploads.stats['chunks_received'] for s in services)
+
+    def test_default_mode_duplicates_stream(self, broker):
+        """非集群模式下每个实例都会收到全部消息"""
+        services = [_make_service(i, cluster_enabled=False) for i in range(3)]
+        for service in services:
+            service.connect()
+
+        self._publish(broker, 30)
+
+        counts = Counter(seq for service in services for seq in service.received)
+        assert all(count == 3 for count in counts.values())
+        assert len(counts) == 30
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,54 @@
+"""
+数值读数窄表测试 - 验证摄取行到窄表列的转换、兼容 Reading 的读取接口和删除传感器时的读数清理
+"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.numeric_reading import NumericReading
+from models.sensor import Sensor, _delete_numeric_readings
+from services.reading_writer import _table_row
+
+
+class TestNumericReading:
+    """数值读数窄表测试"""
+
+    def test_table_row_keeps_only_narrow_columns(self):
+        """摄取行去掉单位和元信息，质量码转为 smallint"""
+        ts = datetime(2026, 1, 5, 8, 30)
+        row = {
+            'sensor_id': 4, 'timestamp': ts, 'data_type': 'numeric', 'numeric_value': 61.5,
+            'unit': '%', 'quality': 'out_of_range', 'meta_info': '{"source": "mqtt"}',
+        }
+
+        assert _table_row(row) == {'sensor_id': 4, 'timestamp': ts, 'value': 61.5, 'quality': 1}
+        assert _table_row({**row, 'quality': None})['quality'] == 0
+
+    def test_to_dict_matches_reading_shape(self):
+        """to_dict 与 Reading 数值读数的结构一致，单位取自传感器"""
+        reading = NumericReading.create_numeric(4, 21.5, timestamp=datetime(2026, 1, 5), quality='out_of_range')
+        reading.id = 9
+        reading.sensor = Sensor(id=4, type='temperature', unit='°C')
+
+        assert reading.numeric_value == 21.5
+        assert reading.quality == 'out_of_range' and reading.quality_code == 1
+        assert reading.to_dict() == {
+            'id': 9, 'sensor_id': 4, 'timestamp': '2026-01-05T00:00:00', 'data_type': 'numeric',
+            'created_at': None, 'value': 21.5, 'unit': '°C', 'quality': 'out_of_range',
+        }
+
+    def test_sensor_delete_removes_readings_in_one_statement(self):
+        """删除传感器不逐行加载读数，before_delete 事件按 sensor_id 一条 DELETE"""
+        assert Sensor.numeric_readings.property.passive_deletes is True
+
+        connection = mock.Mock()
+        _delete_numeric_readings(None, connection, Sensor(id=7))
+
+        (statement,) = connection.execute.call_args.args
+        assert str(statement) == "DELETE FROM numeric_readings WHERE numeric_readings.sensor_id = :sensor_id_1"
+        assert statement.compile().params == {'sensor_id_1': 7}
@@ -0,0 +1,39 @@
+"""
+游标分页测试 - 验证游标编解码和每页条数限制
+"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.pagination import encode_cursor, decode_cursor, clamp_limit, MAX_PAGE_LIMIT
+
+
+class TestKeysetPagination:
+    """游标分页测试"""
+
+    def test_cursor_round_trips(self):
+        """不透明游标可还原时间戳和ID，也接受未编码和带时区的写法"""
+        ts = datetime(2026, 1, 5, 8, 30, 0, 250000)
+        cursor = encode_cursor(ts, 123456)
+
+        assert ',' not in cursor and '=' not in cursor
+        assert decode_cursor(cursor) == (ts, 123456)
+        assert decode_cursor('2026-01-05T08:30:00,7') == (datetime(2026, 1, 5, 8, 30), 7)
+        assert decode_cursor('2026-01-05T16:30:00+08:00,7') == (datetime(2026, 1, 5, 8, 30), 7)
+
+    def test_invalid_cursor_and_limit(self):
+        """格式错误的游标抛出 ValueError，每页条数限制在 1..MAX_PAGE_LIMIT"""
+        for cursor in ('bad!', encode_cursor(datetime(2026, 1, 5), 1)[:-3], '2026-01-05,abc', 'not-a-date,1'):
+            with pytest.raises(ValueError):
+                decode_cursor(cursor)
+
+        assert clamp_limit(None) == 100
+        assert clamp_limit(0) == 100
+        assert clamp_limit(50) == 50
+        assert clamp_limit(10 ** 6) == MAX_PAGE_LIMIT
@@ -0,0 +1,91 @@
+"""
+读数表分区管理测试 - 验证月分区命名、未来分区拆分语句、保留期计算和删除前的归档检查
+"""
+
+import sys
+from datetime import date, datetime
+from pathlib import Path
+from unittest import mock
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import services.partition_manager as partition_module
+from services.partition_manager import ReadingPartitionManager, add_months
+
+
+class TestReadingPartitionManager:
+    """分区管理测试"""
+
+    def test_reorganize_future_splits_monthly_partitions(self):
+        """从最后一个有界分区拆分到目标月，跨年命名正确，p_future 保持在最后"""
+        manager = ReadingPartitionManager()
+        statement = manager.reorganize_future_statement(datetime(2025, 11, 1), datetime(2026, 2, 1))
+
+        assert "REORGANIZE PARTITION `p_future` INTO" in statement
+        assert "PARTITION `p202511` VALUES LESS THAN ('2025-12-01 00:00:00')" in statement
+        assert "PARTITION `p202512` VALUES LESS THAN ('2026-01-01 00:00:00')" in statement
+        assert "PARTITION `p202601` VALUES LESS THAN ('2026-02-01 00:00:00')" in statement
+        assert statement.rstrip(')\n').endswith("PARTITION `p_future` VALUES LESS THAN (MAXVALUE")
+        assert manager.reorganize_future_statement(datetime(2026, 2, 1), datetime(2026, 2, 1)) is None
+        assert add_months(datetime(2026, 1, 1), -13) == datetime(2024, 12, 1)
+
+    def test_drop_expired_keeps_retention_window(self):
+        """只删除上界不晚于保留期起点的分区，MAXVALUE 分区永不删除"""
+        manager = ReadingPartitionManager(retention_months=2)
+        partitions = [
+            {'name': 'p_history', 'upper_bound': datetime(2026, 6, 1), 'rows': 10, 'bytes': 0},
+            {'name': 'p202606', 'upper_bound': datetime(2026, 7, 1), 'rows': 10, 'bytes': 0},
+            {'name': 'p202607', 'upper_bound': datetime(2026, 8, 1), 'rows': 10, 'bytes': 0},
+            {'name': 'p202608', 'upper_bound': datetime(2026, 9, 1), 'rows': 10, 'bytes': 0},
+            {'name': 'p_future', 'upper_bound': None, 'rows': 0, 'bytes': 0},
+        ]
+        with mock.patch.object(manager, 'list_partitions', return_value=partitions):
+            expired = manager.drop_expired(now=datetime(2026, 10, 17), dry_run=True)
+
+        assert [p['name'] for p in expired] == ['p_history', 'p202606', 'p202607']
+
+    def test_drop_expired_skips_unarchived_partitions(self):
+        """按分区范围准备删除，归档未覆盖的分区保留，其余分区一次 DROP"""
+        manager = ReadingPartitionManager(retention_months=2)
+        partitions = [
+            {'name': 'p_history', 'upper_bound': datetime(2026, 6, 1), 'rows': 10, 'bytes': 0},
+            {'name': 'p202606', 'upper_bound': datetime(2026, 7, 1), 'rows': 10, 'bytes': 0},
+            {'name': 'p202607', 'upper_bound': datetime(2026, 8, 1), 'rows': 10, 'bytes': 0},
+            {'name': 'p_future', 'upper_bound': None, 'rows': 0, 'bytes': 0},
+        ]
+        covered = {datetime(2026, 6, 1): True, datetime(2026, 7, 1): False, datetime(2026, 8, 1): True}
+        with mock.patch.object(manager, 'list_partitions', return_value=partitions), \
+                mock.patch.object(manager, '_prepare_drop', side_effect=lambda lower, upper: covered[upper]) as prepare, \
+                mock.patch.object(partition_module, 'db') as db:
+            dropped = manager.drop_expired(now=datetime(2026, 10, 17))
+
+        assert [call.args for call in prepare.call_args_list] == [
+            (None, datetime(2026, 6, 1)),
+            (datetime(2026, 6, 1), datetime(2026, 7, 1)),
+            (datetime(2026, 7, 1), datetime(2026, 8, 1)),
+        ]
+        assert [p['name'] for p in dropped] == ['p_history', 'p202607']
+        statement = str(db.session.execute.call_args.args[0])
+        assert statement == "ALTER TABLE `numeric_readings` DROP PARTITION `p_history`, `p202607`"
+        assert manager.stats['partitions_dropped'] == 2 and manager.stats['partitions_skipped'] == 1
+
+    def test_prepare_drop_requires_archive_watermark(self):
+        """删除前回填汇总并归档；任一传感器最后一条读数所在日期未归档时不允许删除"""
+        manager = ReadingPartitionManager()
+        archive = mock.Mock(enabled=True)
+        archive.watermarks.return_value = {1: date(2026, 6, 30), 2: date(2026, 6, 14)}
+        rollup = mock.Mock(enabled=True)
+        with mock.patch.object(partition_module, 'reading_archive', archive), \
+                mock.patch.object(partition_module, 'rollup_service', rollup), \
+                mock.patch.object(partition_module, 'db') as db:
+            query = db.session.query.return_value.filter.return_value.group_by.return_value
+            query.all.return_value = [(1, datetime(2026, 6, 30, 23, 59)), (2, datetime(2026, 6, 15, 8))]
+            assert manager._prepare_drop(datetime(2026, 6, 1), datetime(2026, 7, 1)) is False
+
+            archive.watermarks.return_value[2] = date(2026, 6, 15)
+            assert manager._prepare_drop(datetime(2026, 6, 1), datetime(2026, 7, 1)) is True
+
+        rollup.backfill_missing.assert_called_with(datetime(2026, 7, 1), start=datetime(2026, 6, 1))
+        archive.archive.assert_called_with(before=datetime(2026, 7, 1))
+        archive.watermarks.assert_called_with([1, 2])
@@ -0,0 +1,63 @@
+"""
+SQL查询监控测试 - 验证语句形状归一化、按端点的 N+1 统计和统计接口路径
+"""
+
+import logging
+import sys
+from pathlib import Path
+from unittest import mock
+
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from controllers.main_controller import main_bp
+from services.query_monitor import QueryMonitor, fingerprint
+
+
+class TestQueryMonitor:
+    """SQL查询监控测试"""
+
+    def test_fingerprint_ignores_values_and_list_lengths(self):
+        """字面量、IN 列表长度和多行 VALUES 不影响语句形状"""
+        assert fingerprint("SELECT * FROM sensors WHERE id IN (?, ?, ?) AND type = 'ph'") == \
+            fingerprint("SELECT *\n  FROM sensors WHERE id IN (?) AND type = 'humidity'")
+        assert fingerprint("INSERT INTO numeric_readings (sensor_id, value) VALUES (%s, %s), (%s, %s)") == \
+            'INSERT INTO numeric_readings (sensor_id, value) VALUES (?)'
+        assert fingerprint('SELECT * FROM reading_rollups_1m LIMIT 10') == 'SELECT * FROM reading_rollups_1m LIMIT ?'
+
+    def test_repeated_statement_is_flagged_per_endpoint(self, caplog):
+        """同一语句重复超过阈值时记录警告并计入端点的 n_plus_one"""
+        monitor = QueryMonitor(n_plus_one_threshold=10)
+
+        with caplog.at_level(logging.WARNING, logger='services.query_monitor'):
+            monitor.record('device.get_devices', 3, 0.002, repeats=1)
+            monitor.record('device.get_devices', 25, 0.010, repeats=24, shape='SELECT * FROM sensors WHERE id = ?')
+
+        stats = monitor.get_stats()
+        endpoint = stats['endpoints']['device.get_devices']
+        assert endpoint['requests'] == 2 and endpoint['queries'] == 28 and endpoint['max_queries'] == 25
+        assert endpoint['avg_queries'] == 14.0 and endpoint['db_ms'] == 12.0
+        assert endpoint['n_plus_one'] == 1 and stats['n_plus_one_warnings'] == 1
+        assert len(caplog.records) == 1 and 'N+1' in caplog.records[0].getMessage()
+
+    def test_stats_endpoint_url(self):
+        """统计接口在 /api/status/queries，需要登录"""
+        app = Flask(__name__)
+        app.config['JWT_SECRET_KEY'] = 'query-monitor-test-secret-key-0123456789'
+        JWTManager(app)
+        app.register_blueprint(main_bp, url_prefix='/api')
+        client = app.test_client()
+        with app.app_context():
+            token = create_access_token(identity='1')
+
+        stats = {'queries': 3, 'n_plus_one_warnings': 0, 'endpoints': {}}
+        with mock.patch('services.query_monitor.query_monitor.get_stats', return_value=stats):
+            response = client.get('/api/status/queries', headers={'Authorization': f'Bearer {token}'})
+
+        assert response.status_code == 200
+        assert response.get_json() == {'success': True, 'data': stats}
+        assert client.get('/api/status/queries').status_code == 401
+        assert client.get('/api/api/status/queries').status_code == 404
@@ -0,0 +1,54 @@
+"""
+读数流式导出测试 - 验证分块输出、CSV/NDJSON格式和gzip压缩
+"""
+
+import csv
+import gzip
+import io
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services import reading_service
+from services.reading_service import ReadingService
+
+
+def fake_rows(count):
+    for i in range(count):
+        yield {'sensor_id': 1, 'timestamp': f'2026-01-05T00:00:{i % 60:02d}', 'data_type': 'numeric',
+               'value': i / 2, 'unit': '°C', 'quality': 'good'}
+
+
+@pytest.fixture
+def rows(monkeypatch):
+    monkeypatch.setattr(ReadingService, 'iter_export_rows', staticmethod(lambda *args: fake_rows(2500)))
+    monkeypatch.setattr(reading_service, 'EXPORT_BATCH_ROWS', 1000)
+
+
+class TestReadingExport:
+    """流式导出测试"""
+
+    def test_csv_is_written_in_chunks(self, rows):
+        """每 EXPORT_BATCH_ROWS 行产出一块，表头只出现一次"""
+        chunks = list(ReadingService.stream_export([]))
+
+        assert len(chunks) == 3
+        parsed = list(csv.DictReader(io.StringIO(b''.join(chunks).decode('utf-8'))))
+        assert len(parsed) == 2500
+        assert parsed[1]['value'] == '0.5' and parsed[1]['unit'] == '°C'
+        assert parsed[1]['file_path'] == ''
+
+    def test_gzip_ndjson_round_trips(self, rows):
+        """gzip 输出可直接解压为逐行JSON，未知格式立即抛出 ValueError"""
+        body = b''.join(ReadingService.stream_export([], fmt='ndjson', compress=True))
+
+        lines = gzip.decompress(body).decode('utf-8').splitlines()
+        assert len(lines) == 2500
+        assert json.loads(lines[-1])['value'] == 1249.5
+        with pytest.raises(ValueError):
+            ReadingService.stream_export([], fmt='xml')
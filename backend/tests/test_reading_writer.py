@@ -0,0 +1,125 @@
+"""
+读数批量写入器测试 - 验证按行数/等待时间刷新、Future 的读数ID分配、约束冲突时的逐行回退和 MySQL 读数ID推算
+"""
+
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import services.reading_writer as writer_module
+from services.reading_writer import ReadingBatchWriter
+
+
+def _rows(sensor_id, count):
+    ts = datetime(2026, 1, 5, 8, 0)
+    return [{'sensor_id': sensor_id, 'timestamp': ts, 'numeric_value': float(i)} for i in range(count)]
+
+
+def _counting_writer(**kwargs):
+    """write_rows 只记录批次并按顺序分配ID的写入器"""
+    writer = ReadingBatchWriter(**kwargs)
+    batches = []
+
+    def write_rows(rows):
+        batches.append(len(rows))
+        first = sum(batches[:-1]) + 1
+        return list(range(first, first + len(rows)))
+
+    writer.write_rows = write_rows
+    return writer, batches
+
+
+class TestReadingBatchWriter:
+    """批量写入器测试"""
+
+    def test_flushes_when_batch_is_full(self):
+        """缓冲行数达到 max_rows 时立即刷新，不等待 linger 窗口"""
+        writer, batches = _counting_writer(max_rows=4, max_linger_ms=60000)
+        writer.start()
+        try:
+            first = writer.submit(_rows(1, 2))
+            second = writer.submit(_rows(2, 2))
+            assert first.result(timeout=2) == [1, 2]
+            assert second.result(timeout=2) == [3, 4]
+        finally:
+            writer.stop()
+        assert batches == [4]
+
+    def test_flushes_after_linger(self):
+        """不足 max_rows 时，最早一条等待超过 max_linger_ms 后刷新"""
+        writer, batches = _counting_writer(max_rows=500, max_linger_ms=50)
+        writer.start()
+        try:
+            started = time.monotonic()
+            future = writer.submit(_rows(1, 3))
+            assert future.result(timeout=2) == [1, 2, 3]
+            assert time.monotonic() - started >= 0.045
+        finally:
+            writer.stop()
+        assert batches == [3]
+
+    def test_futures_receive_their_own_ids(self):
+        """一次刷新合并多个提交，每个 Future 按提交顺序拿到自己那几行的ID；失败时全部收到异常"""
+        writer = ReadingBatchWriter(max_rows=500)
+        writer.write_rows = lambda rows: [100 + i if i != 3 else None for i in range(len(rows))]
+        futures = [writer.submit(_rows(1, 2)), writer.submit([]), writer.submit(_rows(2, 3))]
+        writer.flush()
+        assert [f.result(timeout=0) for f in futures] == [[100, 101], [], [102, None, 104]]
+
+        error = RuntimeError('database unavailable')
+        writer.write_rows = mock.Mock(side_effect=error)
+        futures = [writer.submit(_rows(1, 1)), writer.submit(_rows(2, 1))]
+        writer.flush()
+        assert all(f.exception(timeout=0) is error for f in futures)
+
+    def test_integrity_error_falls_back_to_row_inserts(self):
+        """多行INSERT违反唯一约束时回滚并逐行写入，被拒绝的行ID为None且不通知监听器和事务钩子"""
+        writer = ReadingBatchWriter()
+        writer.app = SimpleNamespace(app_context=nullcontext)
+        rows = _rows(1, 3)
+        conflict = IntegrityError('INSERT', {}, Exception('Duplicate entry'))
+        hook, listener = mock.Mock(), mock.Mock()
+        writer.add_commit_hook(hook)
+        writer.add_flush_listener(listener)
+
+        with mock.patch.object(writer_module, 'db') as db, \
+                mock.patch.object(writer, '_insert_rows', side_effect=conflict), \
+                mock.patch.object(writer, '_insert_rows_skipping_conflicts', return_value=[7, None, 9]):
+            ids = writer.write_rows(rows)
+
+        assert ids == [7, None, 9]
+        db.session.rollback.assert_called_once()
+        db.session.commit.assert_called_once()
+        assert [row['id'] for row in hook.call_args.args[0]] == [7, 9]
+        assert listener.call_args.args[0] == [rows[0], rows[2]]
+        assert writer.stats['rows_written'] == 2 and writer.stats['rows_skipped'] == 1
+
+    def test_mysql_ids_follow_auto_increment_step(self):
+        """MySQL 由 LAST_INSERT_ID() 按 auto_increment_increment 推算各行ID，配置只读取一次"""
+        writer = ReadingBatchWriter()
+        with mock.patch.object(writer_module, 'db') as db:
+            bind = db.session.get_bind.return_value
+            bind.dialect = SimpleNamespace(name='mysql', insert_executemany_returning_sort_by_parameter_order=False)
+            db.session.execute.side_effect = [
+                mock.Mock(one=mock.Mock(return_value=(2, 2))),
+                SimpleNamespace(lastrowid=101),
+                SimpleNamespace(lastrowid=107),
+            ]
+            assert writer._insert_rows(_rows(1, 3)) == [101, 103, 105]
+            assert writer._insert_rows(_rows(1, 2)) == [107, 109]
+            assert db.session.execute.call_count == 3
+
+            writer._id_step = None
+            db.session.execute.side_effect = [mock.Mock(one=mock.Mock(return_value=(3, 1)))]
+            with pytest.raises(RuntimeError):
+                writer._insert_rows(_rows(1, 1))
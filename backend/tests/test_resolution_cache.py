@@ -0,0 +1,116 @@
+"""
+设备/传感器解析缓存测试 - 验证命中与未找到结果的缓存、按客户端和设备失效、加载期间失效、TTL 和 LRU 淘汰
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import services.resolution_cache as cache_module
+from services.resolution_cache import SensorResolutionCache, ResolvedSensor
+
+DEVICES = {'farm-1': SimpleNamespace(id=1, type='smart_farm'), 'farm-2': SimpleNamespace(id=2, type='smart_farm')}
+SENSORS = {
+    (1, 'temperature'): SimpleNamespace(id=11, device_id=1, type='temperature', name='温度', unit='°C'),
+    (2, 'temperature'): SimpleNamespace(id=21, device_id=2, type='temperature', name='温度', unit='°C'),
+}
+
+
+def _query(lookup):
+    """模拟 Model.query.filter_by(...).first()，记录查询次数"""
+    query = mock.Mock()
+    query.filter_by.side_effect = lambda **kw: mock.Mock(first=mock.Mock(return_value=lookup(kw)))
+    return query
+
+
+class TestSensorResolutionCache:
+    """解析缓存测试"""
+
+    def setup_method(self):
+        self.device_query = _query(lambda kw: DEVICES.get(kw['client_id']))
+        self.sensor_query = _query(lambda kw: SENSORS.get((kw['device_id'], kw['type'])))
+        self.patches = [
+            mock.patch.object(cache_module, 'Device', SimpleNamespace(query=self.device_query)),
+            mock.patch.object(cache_module, 'Sensor', SimpleNamespace(query=self.sensor_query)),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def teardown_method(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def test_caches_found_and_missing_results(self):
+        """解析结果和"未找到"结果都被缓存，重复查询不再访问数据库"""
+        cache = SensorResolutionCache()
+        expected = ResolvedSensor(id=11, device_id=1, type='temperature', name='温度', unit='°C')
+
+        assert cache.get_sensor('farm-1', 'temperature') == expected
+        assert cache.get_sensor('farm-1', 'humidity') is None
+        assert cache.get_device('unknown') is None
+        for _ in range(3):
+            assert cache.get_sensor('farm-1', 'temperature') == expected
+            assert cache.get_sensor('farm-1', 'humidity') is None
+            assert cache.get_device('unknown') is None
+
+        assert self.device_query.filter_by.call_count == 2
+        assert self.sensor_query.filter_by.call_count == 2
+        assert cache.get_stats()['hits'] == 10
+
+    def test_invalidation_by_client_and_device(self):
+        """按 client_id 或设备ID失效只删除该设备的条目，其他设备的结果仍命中"""
+        cache = SensorResolutionCache()
+        for client_id in ('farm-1', 'farm-2'):
+            cache.get_sensor(client_id, 'temperature')
+            cache.get_sensor(client_id, 'humidity')
+        assert cache.get_stats()['entries'] == 6
+
+        cache.invalidate_device(1)
+        assert cache.get_stats()['entries'] == 3
+        cache.get_sensor('farm-1', 'temperature')
+        cache.get_sensor('farm-2', 'temperature')
+        assert self.sensor_query.filter_by.call_count == 5
+
+        cache.invalidate_client('farm-2')
+        assert cache.get_stats()['entries'] == 2
+        assert all(key[1] == 'farm-1' for key in cache._entries)
+
+        # 新增传感器后失效，"未找到"结果不会继续遮蔽新传感器
+        assert cache.get_sensor('farm-1', 'humidity') is None
+        SENSORS[(1, 'humidity')] = SimpleNamespace(id=12, device_id=1, type='humidity', name=None, unit='%')
+        try:
+            assert cache.get_sensor('farm-1', 'humidity') is None
+            cache.invalidate_device(1)
+            assert cache.get_sensor('farm-1', 'humidity').id == 12
+        finally:
+            del SENSORS[(1, 'humidity')]
+
+    def test_invalidation_during_load_discards_stale_result(self):
+        """加载期间发生失效时，查询到的旧结果不写回缓存"""
+        cache = SensorResolutionCache()
+
+        def stale_lookup(**kw):
+            cache.invalidate_client('farm-1')
+            return mock.Mock(first=mock.Mock(return_value=DEVICES[kw['client_id']]))
+
+        self.device_query.filter_by.side_effect = stale_lookup
+        assert cache.get_device_id('farm-1') == 1
+        assert cache.get_stats()['entries'] == 0
+
+    def test_ttl_expiry_and_lru_eviction(self):
+        """过期条目重新加载；超过 max_entries 时淘汰最久未使用的条目"""
+        cache = SensorResolutionCache(max_entries=2, ttl_seconds=60)
+        with mock.patch.object(cache_module.time, 'monotonic', return_value=1000.0) as clock:
+            cache.get_device('farm-1')
+            cache.get_device('farm-2')
+            cache.get_device('farm-1')
+            cache.get_device('unknown')
+            assert [key[1] for key in cache._entries] == ['farm-1', 'unknown']
+
+            clock.return_value = 1061.0
+            cache.get_device('farm-1')
+        assert self.device_query.filter_by.call_count == 4
@@ -0,0 +1,122 @@
+"""
+保留策略测试 - 验证策略合并、层级校验、按传感器类型解析和按截止时间分批删除
+"""
+
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from extensions import db
+from models.numeric_reading import NumericReading
+from models.reading_rollup import ReadingRollup1m
+import services.retention_service as retention_module
+from services.retention_service import RetentionPolicyEngine, normalize_policy, DEFAULT_POLICY
+
+NOW = datetime(2026, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def sqlite_app():
+    """内存 SQLite，只建读数表和分钟汇总表"""
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=[NumericReading.__table__, ReadingRollup1m.__table__])
+        yield app
+        db.session.remove()
+
+
+class TestRetentionPolicies:
+    """保留策略测试"""
+
+    def test_type_policies_merge_over_default(self):
+        """类型策略只覆盖声明的字段，其余继承 default"""
+        policies = RetentionPolicyEngine.parse_policies(
+            '{"default": {"raw_days": 14}, "camera": {"rollup_1m_days": 30}, "temperature": {"raw_days": 90}}'
+        )
+
+        assert policies['default'] == {**DEFAULT_POLICY, 'raw_days': 14}
+        assert policies['camera']['raw_days'] == 14 and policies['camera']['rollup_1m_days'] == 30
+        assert policies['temperature'] == {**DEFAULT_POLICY, 'raw_days': 90}
+
+    def test_default_policy_keeps_everything(self):
+        """未配置策略时所有层级永久保留，默认不删除任何数据"""
+        engine = RetentionPolicyEngine()
+        engine.init_app(Flask(__name__))
+
+        assert engine.enabled is False
+        assert set(DEFAULT_POLICY.values()) == {None}
+        assert engine.policies == {'default': DEFAULT_POLICY}
+
+    def test_coarser_layers_must_outlive_finer_layers(self):
+        """粗粒度保留时间短于细粒度、字段未知或天数非法时拒绝"""
+        with pytest.raises(ValueError):
+            normalize_policy({'raw_days': 400, 'rollup_1m_days': 365})
+        with pytest.raises(ValueError):
+            normalize_policy({'raw_days': 30, 'rollup_1m_days': 365, 'rollup_1h_days': 30})
+        with pytest.raises(ValueError):
+            normalize_policy({'raw_days': None, 'rollup_1m_days': 30})
+        with pytest.raises(ValueError):
+            normalize_policy({'raw_hours': 12})
+        with pytest.raises(ValueError):
+            normalize_policy({'raw_days': 0})
+
+        assert normalize_policy({'raw_days': None, 'rollup_1m_days': None}) == {
+            'raw_days': None, 'rollup_1m_days': None, 'rollup_1h_days': None, 'rollup_1d_days': None
+        }
+
+
+class TestRetentionRun:
+    """保留策略执行测试"""
+
+    def test_run_deletes_expired_rows_in_bounded_batches(self, sqlite_app):
+        """截止时间按天对齐，过期读数和汇总桶每批最多 batch_size 行删除，截止时间之后和其他传感器的数据保留"""
+        raw_cutoff = datetime(2026, 2, 19)       # NOW - 10 天，按天对齐
+        rollup_cutoff = datetime(2026, 1, 30)    # NOW - 30 天
+        expired = [raw_cutoff - timedelta(days=3, minutes=i) for i in range(5)]
+        kept = [raw_cutoff, raw_cutoff + timedelta(hours=1), NOW]
+        readings = [(1, ts) for ts in expired + kept] + [(2, ts) for ts in expired]
+        db.session.add_all(NumericReading(id=i + 1, sensor_id=sensor_id, timestamp=ts, value=1.0, quality=0)
+                           for i, (sensor_id, ts) in enumerate(readings))
+        buckets = [rollup_cutoff - timedelta(minutes=m) for m in (1, 2, 3)] + [rollup_cutoff]
+        db.session.add_all(ReadingRollup1m(sensor_id=1, bucket_start=ts, count=1, sum=1.0, sum_sq=1.0)
+                           for ts in buckets)
+        db.session.commit()
+
+        engine = RetentionPolicyEngine(batch_size=2, batch_pause_ms=0)
+        policy = normalize_policy({'raw_days': 10, 'rollup_1m_days': 30})
+        group = {'policy': policy, 'sources': ['default'], 'sensor_ids': [1]}
+        deletes = []
+
+        def record_delete(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('DELETE'):
+                deletes.append((statement.split()[2], cursor.rowcount))
+
+        event.listen(db.engine, 'after_cursor_execute', record_delete)
+        try:
+            with mock.patch.object(engine, 'resolve_groups', return_value=[group]), \
+                    mock.patch.object(retention_module.rollup_service, 'backfill_missing', return_value=0) as backfill:
+                (entry,) = engine.run(now=NOW)
+        finally:
+            event.remove(db.engine, 'after_cursor_execute', record_delete)
+
+        assert entry['raw_cutoff'] == raw_cutoff and entry['rollup_cutoffs']['1m'] == rollup_cutoff
+        assert backfill.call_args.args == (raw_cutoff,) and backfill.call_args.kwargs['sensor_ids'] == [1]
+        assert entry['raw']['rows'] == 5 and entry['rollups']['1m']['rows'] == 3
+        assert deletes == [('numeric_readings', 2), ('numeric_readings', 2), ('numeric_readings', 1),
+                           ('readings_rollup_1m', 2), ('readings_rollup_1m', 1)]
+
+        remaining = db.session.query(NumericReading.sensor_id, NumericReading.timestamp).order_by(
+            NumericReading.sensor_id, NumericReading.timestamp).all()
+        assert remaining == [(1, ts) for ts in kept] + sorted((2, ts) for ts in expired)
+        assert [b for (b,) in db.session.query(ReadingRollup1m.bucket_start)] == [rollup_cutoff]
+        assert engine.stats['raw_deleted'] == 5 and engine.stats['rollup_deleted'] == 3
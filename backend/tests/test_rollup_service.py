@@ -0,0 +1,155 @@
+"""
+读数汇总服务测试 - 验证查询区间拆分、多粒度聚合的合并结果、质量码过滤、原始读数边缘段的单次查询和 ORM 写入的增量更新
+"""
+
+import statistics
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import services.rollup_service as rollup_module
+from extensions import db
+from models.numeric_reading import NumericReading
+from services.rollup_service import ReadingRollupService, _merge
+
+
+@pytest.fixture
+def sqlite_app():
+    """内存 SQLite，只建读数表"""
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=[NumericReading.__table__])
+        yield app
+        db.session.remove()
+
+
+class TestReadingRollupService:
+    """汇总服务测试"""
+
+    def test_plan_uses_coarsest_covering_resolution(self):
+        """区间中间使用整天汇总，两端逐级细化，不足一分钟的边缘查询原始读数"""
+        service = ReadingRollupService()
+        start = datetime(2025, 6, 1, 22, 30, 15)
+        end = datetime(2025, 6, 4, 1, 5, 0)
+
+        plan = service._plan(start, end, 0)
+
+        assert plan == [
+            ('raw', start, datetime(2025, 6, 1, 22, 31)),
+            ('1m', datetime(2025, 6, 1, 22, 31), datetime(2025, 6, 1, 23, 0)),
+            ('1h', datetime(2025, 6, 1, 23, 0), datetime(2025, 6, 2)),
+            ('1d', datetime(2025, 6, 2), datetime(2025, 6, 4)),
+            ('1h', datetime(2025, 6, 4), datetime(2025, 6, 4, 1, 0)),
+            ('1m', datetime(2025, 6, 4, 1, 0), end),
+        ]
+        # 不限起止时间时整个区间由天汇总覆盖
+        assert service._plan(None, None, 0) == [('1d', None, None)]
+
+    def test_merged_buckets_match_raw_statistics(self):
+        """分钟桶合并后的计数、极值、均值、标准差和首末值与原始数据一致"""
+        service = ReadingRollupService()
+        base = datetime(2025, 6, 1, 10, 0, 0)
+        points = [(7, base + timedelta(seconds=17 * i), 20.0 + (i * 37 % 11) / 3) for i in range(300)]
+
+        partials = service._aggregate(reversed(points))
+        acc = None
+        for bucket in partials['1m'].values():
+            acc = _merge(acc, bucket)
+        summary = service._finalize(acc)
+
+        values = [value for _, _, value in points]
+        assert len(partials['1m']) == 85 and len(partials['1h']) == 2 and len(partials['1d']) == 1
+        assert summary['count'] == 300
+        assert summary['min'] == min(values) and summary['max'] == max(values)
+        assert abs(summary['avg'] - statistics.mean(values)) < 1e-9
+        assert abs(summary['stddev'] - statistics.stdev(values)) < 1e-9
+        assert summary['first_value'] == values[0] and summary['last_value'] == values[-1]
+        assert summary['last_ts'] == points[-1][1]
+
+    def test_raw_partials_single_query_for_many_sensors(self, sqlite_app):
+        """原始读数边缘段的统计和首末值一次查询得到，同一时间戳取ID最小/最大的读数，非 good 读数不参与"""
+        base = datetime(2025, 6, 1, 8, 0, 0)
+        readings = []
+        for sensor_id in (1, 2, 3):
+            readings += [(sensor_id, base + timedelta(seconds=s), float(sensor_id * 10 + s), 'good') for s in range(5)]
+        readings += [
+            (1, base, 99.0, 'good'),                                  # 与首条同一时间戳，ID更大
+            (1, base + timedelta(seconds=4), 98.0, 'good'),           # 与末条同一时间戳，ID更大
+            (2, base + timedelta(seconds=5), -1.0, 'out_of_range'),   # 超出范围，不参与
+        ]
+        db.session.add_all(NumericReading(id=i + 1, sensor_id=sensor_id, timestamp=ts, value=value, quality=quality)
+                           for i, (sensor_id, ts, value, quality) in enumerate(readings))
+        db.session.commit()
+
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            partials = ReadingRollupService()._raw_partials([1, 2, 3, 4], base, base + timedelta(minutes=1))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        assert len(statements) == 1
+        assert set(partials) == {1, 2, 3}
+        assert partials[1] == [7, 10 + 11 + 12 + 13 + 14 + 99 + 98, 10.0, 99.0,
+                               sum(v * v for v in (10, 11, 12, 13, 14, 99, 98)),
+                               base, 10.0, base + timedelta(seconds=4), 98.0]
+        assert partials[2][0] == 5 and partials[2][5:] == [base, 20.0, base + timedelta(seconds=4), 24.0]
+        assert partials[3][6] == 30.0 and partials[3][8] == 34.0
+
+    def test_apply_rows_skips_out_of_range_readings(self):
+        """越界读数不计入汇总，整批都越界时不写汇总表"""
+        service = ReadingRollupService()
+        ts = datetime(2025, 6, 1, 10, 0, 30)
+        rows = [
+            {'sensor_id': 3, 'timestamp': ts, 'numeric_value': 21.5, 'quality': 'good'},
+            {'sensor_id': 3, 'timestamp': ts, 'numeric_value': 22.5},
+            {'sensor_id': 3, 'timestamp': ts, 'numeric_value': 999.0, 'quality': 'out_of_range'},
+        ]
+        with mock.patch.object(rollup_module, 'db'), mock.patch.object(service, '_upsert') as upsert:
+            service.apply_rows(rows)
+            upserted = {call.args[0].__tablename__: call.args[1] for call in upsert.call_args_list}
+            assert len(upserted) == 3
+            (bucket,) = upserted['readings_rollup_1m'].values()
+            summary = service._finalize(bucket)
+            assert summary['count'] == 2 and summary['max'] == 22.5
+
+            upsert.reset_mock()
+            service.apply_rows(rows[2:])
+            upsert.assert_not_called()
+
+    def test_orm_readings_applied_before_commit(self):
+        """flush 时记录 ORM 新增的读数，提交前合并进汇总表；回滚时丢弃"""
+        service = ReadingRollupService()
+        ts = datetime(2025, 6, 1, 10, 0, 0)
+        session = SimpleNamespace(info={}, flush=mock.Mock(), new=[
+            NumericReading.create_numeric(sensor_id=4, value=12.5, timestamp=ts),
+            NumericReading.create_numeric(sensor_id=4, value=80.0, timestamp=ts, quality='out_of_range'),
+            object(),
+        ])
+
+        with mock.patch.object(service, 'apply_rows') as apply_rows:
+            service._on_flush(session, None)
+            service._on_before_commit(session)
+            session.flush.assert_called_once()
+            apply_rows.assert_called_once_with([
+                {'sensor_id': 4, 'timestamp': ts, 'numeric_value': 12.5, 'quality': 'good'},
+                {'sensor_id': 4, 'timestamp': ts, 'numeric_value': 80.0, 'quality': 'out_of_range'},
+            ])
+
+            apply_rows.reset_mock()
+            service._on_flush(session, None)
+            service._on_rollback(session)
+            service._on_before_commit(session)
+            apply_rows.assert_not_called()
@@ -0,0 +1,48 @@
+"""
+数据库脚本测试 - 校验 db/*.sql 中触发器引用的列在对应表中存在
+
+MySQL 在 CREATE TRIGGER 时就会拒绝不存在的 NEW/OLD 列，脚本中途失败会使
+全新安装不完整；这里按 init_db.sql 的表定义静态检查，不需要数据库。
+"""
+
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+DB_DIR = Path(__file__).parent.parent.parent / 'db'
+
+_TABLE = re.compile(r'CREATE TABLE `(\w+)` \((.*?)\n\)', re.S)
+_COLUMN = re.compile(r'^\s*`(\w+)`', re.M)
+_TRIGGER = re.compile(r'CREATE TRIGGER (\w+)\s+(?:BEFORE|AFTER) (?:INSERT|UPDATE|DELETE) ON (\w+)(.*?)END\$\$', re.S)
+_ROW_REF = re.compile(r'\b(?:NEW|OLD)\.(\w+)')
+_INSERT = re.compile(r'INSERT INTO (\w+) \(([^)]*)\)')
+
+
+def _tables():
+    """init_db.sql 中的表 -> 列名集合"""
+    schema = (DB_DIR / 'init_db.sql').read_text(encoding='utf-8')
+    return {name: set(_COLUMN.findall(body)) for name, body in _TABLE.findall(schema)}
+
+
+def _triggers():
+    for path in sorted(DB_DIR.glob('*.sql')):
+        for name, table, body in _TRIGGER.findall(path.read_text(encoding='utf-8')):
+            yield pytest.param(table, body, id=f'{path.name}:{name}')
+
+
+class TestSchema:
+    """数据库脚本测试"""
+
+    @pytest.mark.parametrize('table,body', list(_triggers()))
+    def test_trigger_columns_exist(self, table, body):
+        """触发器的 NEW/OLD 列和 INSERT 列在表定义中存在"""
+        tables = _tables()
+        assert table in tables
+        assert set(_ROW_REF.findall(body)) <= tables[table]
+        for target, columns in _INSERT.findall(body):
+            assert {column.strip() for column in columns.split(',')} <= tables[target]
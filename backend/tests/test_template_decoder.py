@@ -0,0 +1,56 @@
+"""
+设备模板解码器测试 - 验证聚合负载映射和模板范围校验
+"""
+
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.device_template import PREDEFINED_DEVICE_TEMPLATES
+from services.template_decoder import CompiledTemplateDecoder, QUALITY_GOOD, QUALITY_OUT_OF_RANGE
+
+
+def _smart_farm_decoder():
+    template = next(t for t in PREDEFINED_DEVICE_TEMPLATES if t['device_type'] == 'smart_farm')
+    return CompiledTemplateDecoder('smart_farm', template['sensor_configs'])
+
+
+class TestCompiledTemplateDecoder:
+    """模板解码器测试"""
+
+    def test_aggregated_payload_mapped_and_flagged(self):
+        """聚合字段按模板映射，超出范围的值保留并标记质量码"""
+        decoder = _smart_farm_decoder()
+        fields = decoder.decode({
+            'temperature': 95.0,     # 模板范围 -40 ~ 80
+            'humidity': 55,
+            'ph': 6.8,               # 简写字段映射到 soil_ph
+            'light': 'n/a',          # 非数值字段丢弃
+            'moisture': float('nan'),
+            'timestamp': '2025-06-25T10:00:00',
+        })
+
+        assert fields == [
+            ('temperature', 95.0, QUALITY_OUT_OF_RANGE),
+            ('humidity', 55, QUALITY_GOOD),
+            ('soil_ph', 6.8, QUALITY_GOOD),
+        ]
+
+    def test_single_reading_check(self):
+        """单传感器读数按类型校验，模板外的类型不做范围限制"""
+        decoder = _smart_farm_decoder()
+
+        assert decoder.check('humidity', 100) == QUALITY_GOOD
+        assert decoder.check('humidity', 100.5) == QUALITY_OUT_OF_RANGE
+        assert decoder.check('wind_speed', 500) == QUALITY_GOOD
+        assert decoder.has_sensor_type('soil_ec')
+        assert not decoder.has_sensor_type('wind_speed')
+
+    def test_default_decoder_keeps_legacy_mapping(self):
+        """没有模板时只做原有的聚合字段映射，不做范围校验"""
+        decoder = CompiledTemplateDecoder(None, [])
+        fields = decoder.decode({'temperature': 500, 'moisture': 40, 'soil_ec': 1.2})
+
+        assert fields == [('temperature', 500, QUALITY_GOOD), ('soil_moisture', 40, QUALITY_GOOD)]
@@ -0,0 +1,109 @@
+"""
+链路追踪测试 - 验证跨线程的追踪结束、批量写入span、慢消息日志和 OTLP/JSON 导出
+"""
+
+import json
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.tracing import Tracer
+
+
+def _make_tracer(tmp_path, **config):
+    tracer = Tracer()
+    tracer.init_app(SimpleNamespace(config={
+        'TRACING_SAMPLE_RATE': 1.0,
+        'TRACING_EXPORT_PATH': str(tmp_path / 'spans.jsonl'),
+        **config
+    }))
+    tracer.start()
+    return tracer
+
+
+def _exported_spans(tmp_path):
+    spans = []
+    for line in (tmp_path / 'spans.jsonl').read_text(encoding='utf-8').splitlines():
+        for resource in json.loads(line)['resourceSpans']:
+            for scope in resource['scopeSpans']:
+                spans.extend(scope['spans'])
+    return spans
+
+
+class TestTracer:
+    """链路追踪测试"""
+
+    def test_trace_ends_after_async_release(self, tmp_path):
+        """工作线程处理完后追踪仍被批量写入持有，写入线程释放后才结束并导出"""
+        tracer = _make_tracer(tmp_path)
+        root = tracer.start_trace('mqtt.message', topic='sensors/dev_1/numeric')
+
+        with tracer.activate(root):
+            with tracer.span('ingestion.build_rows') as span:
+                span.set_attribute('rows', 2)
+            held = tracer.hold()
+            rows = [{'sensor_id': 1}, {'sensor_id': 2}]
+            tracer.tag_rows(rows)
+        tracer.release(root)
+        assert tracer.stats['finished'] == 0
+
+        def flush():
+            tracer.record_rows(rows, 'reading_writer.write', time.time(), batch_rows=len(rows))
+            for row in rows:
+                with tracer.activate(tracer.row_span(row)):
+                    with tracer.span('alarm.evaluate', sensor_id=row['sensor_id']):
+                        pass
+            tracer.release(held)
+
+        thread = threading.Thread(target=flush)
+        thread.start()
+        thread.join()
+        tracer.stop()
+
+        spans = {span['name']: span for span in _exported_spans(tmp_path)}
+        assert tracer.stats['finished'] == 1 and tracer.stats['exported'] == 1
+        assert set(spans) == {'mqtt.message', 'ingestion.build_rows', 'reading_writer.write', 'alarm.evaluate'}
+        root_id = spans['mqtt.message']['spanId']
+        assert 'parentSpanId' not in spans['mqtt.message']
+        assert all(span['parentSpanId'] == root_id for name, span in spans.items() if name != 'mqtt.message')
+        assert len({span['traceId'] for span in spans.values()}) == 1
+        assert {'key': 'batch_rows', 'value': {'intValue': '2'}} in spans['reading_writer.write']['attributes']
+
+    def test_slow_message_logs_span_tree(self, tmp_path, caplog):
+        """未被采样的慢消息也输出span树并导出；未处于追踪中时 span() 不记录"""
+        tracer = _make_tracer(tmp_path, TRACING_SAMPLE_RATE=0.0, TRACING_SLOW_MS=50)
+
+        with tracer.span('alarm.evaluate') as span:
+            span.set_attribute('triggered', 1)
+
+        fast = tracer.start_trace('mqtt.message')
+        tracer.release(fast)
+
+        slow = tracer.start_trace('mqtt.message', start=time.time() - 0.2, topic='sensors/dev_2/numeric')
+        with caplog.at_level(logging.WARNING, logger='services.tracing'):
+            with tracer.activate(slow):
+                tracer.record('mqtt.queue_wait', slow.start, slow.start + 0.15)
+                try:
+                    with tracer.span('notification.webhook', alarm_id=7):
+                        raise TimeoutError('read timed out')
+                except TimeoutError:
+                    pass
+            tracer.release(slow)
+        tracer.stop()
+
+        assert tracer.stats['finished'] == 2 and tracer.stats['slow'] == 1
+        message = caplog.records[0].getMessage()
+        assert 'mqtt.message +0.0ms' in message and 'topic=sensors/dev_2/numeric' in message
+        assert '  mqtt.queue_wait +0.0ms 150.0ms' in message
+        assert 'notification.webhook' in message and 'ERROR TimeoutError: read timed out' in message
+
+        spans = _exported_spans(tmp_path)
+        assert len(spans) == 3
+        webhook = next(span for span in spans if span['name'] == 'notification.webhook')
+        assert webhook['status'] == {'code': 2, 'message': 'TimeoutError: read timed out'}
@@ -0,0 +1,74 @@
+# backend/utils/downsample.py
+"""
+时间序列降采样 - 图表只需要与像素宽度相当的点数
+
+- lttb: Largest-Triangle-Three-Buckets，保留视觉形状（峰值、拐点），输出 points 个点
+- minmax: 每个桶保留最小值和最大值（按时间顺序），输出不超过 points 个点，
+  适合需要保留所有极值的场景
+
+两个函数都返回被选中点在原序列中的下标（升序），调用方据此切片时间戳和数值。
+输入需按时间升序排列。
+"""
+from typing import Tuple
+
+import numpy as np
+
+METHODS = ('lttb', 'minmax')
+
+
+def _bucket_bounds(n: int, buckets: int, offset: int = 0) -> np.ndarray:
+    """把 [offset, offset + n) 均分为 buckets 段，返回 buckets+1 个边界"""
+    return offset + np.floor(np.arange(buckets + 1) * (n / buckets)).astype(np.int64)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """LTTB 降采样：首尾点保留，中间每个桶选出与前一选中点、下一桶均值点构成三角形面积最大的点"""
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # 中间 n-2 个点分成 points-2 个桶；最后一个点单独成为最后一桶
+    bounds = np.append(_bucket_bounds(n - 2, points - 2, offset=1), n)
+    sizes = np.diff(bounds)
+    avg_x = np.add.reduceat(x, bounds[:-1]) / sizes
+    avg_y = np.add.reduceat(y, bounds[:-1]) / sizes
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = a = 0
+    for i in range(points - 2):
+        start, end = bounds[i], bounds[i + 1]
+        # 2倍三角形面积（常数因子不影响比较）
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def minmax(y: np.ndarray, points: int) -> np.ndarray:
+    """每个桶保留最小值和最大值所在的点（桶数为 points // 2），同一点只保留一次"""
+    n = len(y)
+    buckets = points // 2
+    if points >= n or buckets < 1:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    bounds = _bucket_bounds(n, buckets)
+    selected = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        segment = y[start:end]
+        low, high = start + int(np.argmin(segment)), start + int(np.argmax(segment))
+        selected.extend(sorted({low, high}))
+    return np.asarray(selected, dtype=np.int64)
+
+
+def downsample(x: np.ndarray, y: np.ndarray, points: int, method: str = 'lttb') -> Tuple[np.ndarray, np.ndarray]:
+    """按 method 降采样，返回 (x, y)"""
+    if method not in METHODS:
+        raise ValueError(f"不支持的降采样方法: {method}")
+    index = lttb(x, y, points) if method == 'lttb' else minmax(y, points)
+    return np.asarray(x)[index], np.asarray(y)[index]
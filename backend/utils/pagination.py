@@ -0,0 +1,70 @@
+# backend/utils/pagination.py
+"""
+读数列表的游标（keyset）分页
+
+按 (timestamp DESC, id DESC) 排序，下一页的条件为「时间戳更早，或时间戳相同且ID
+更小」，查询沿 (sensor_id, timestamp) 索引从上一页的位置继续扫描，深翻页不再需要
+OFFSET 跳过前面的行，也不需要 COUNT(*)。
+
+游标对客户端不透明：上一页最后一条读数的 "时间戳,ID" 经 base64url 编码。为便于
+调试，也接受未编码的 "2026-01-05T08:30:00,123"。
+"""
+import base64
+import binascii
+from datetime import datetime, timezone
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+
+def encode_cursor(timestamp: datetime, reading_id: int) -> str:
+    raw = f"{timestamp.isoformat()},{reading_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析游标为 (时间戳, ID)，格式错误时抛出 ValueError"""
+    text = cursor.strip()
+    if ',' not in text:
+        try:
+            text = base64.urlsafe_b64decode(text + '=' * (-len(text) % 4)).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            raise ValueError(f"无效的分页游标: {cursor}")
+    timestamp, sep, reading_id = text.rpartition(',')
+    if not sep:
+        raise ValueError(f"无效的分页游标: {cursor}")
+    try:
+        ts = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        reading_id = int(reading_id)
+    except ValueError:
+        raise ValueError(f"无效的分页游标: {cursor}")
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts, reading_id
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_LIMIT
+    return min(limit, MAX_PAGE_LIMIT)
+
+
+def keyset_page(query, model, limit: int, after: Optional[str] = None) -> Tuple[List[Any], Optional[str]]:
+    """按游标取一页（时间倒序），返回 (读数列表, 下一页游标)；没有下一页时游标为 None
+
+    query 为已按传感器/时间范围过滤、尚未排序的查询。多取一行判断是否还有下一页。
+    """
+    if after:
+        ts, reading_id = decode_cursor(after)
+        # timestamp <= ts 让数据库对索引做范围扫描，OR 条件只排除同一时间戳中已返回的行
+        query = query.filter(model.timestamp <= ts, or_(
+            model.timestamp < ts, and_(model.timestamp == ts, model.id < reading_id)
+        ))
+    rows = query.order_by(model.timestamp.desc(), model.id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].timestamp, rows[-1].id)
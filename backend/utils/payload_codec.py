@@ -0,0 +1,131 @@
+# backend/utils/payload_codec.py
+"""
+MQTT负载编解码 - 支持JSON、MessagePack、CBOR以及可选的zlib压缩
+
+编码方式通过以下任一方式协商（两者都没有时按JSON处理）：
+- 主题后缀: sensors/{client_id}/numeric/{content_type}，例如 numeric/msgpack-zlib
+- MQTT v5 ContentType 属性: application/msgpack、application/cbor+zlib 等
+
+内容类型标记为 "{编码}" 或 "{编码}-zlib"，编码取值 json / msgpack / cbor。
+"""
+import json
+import logging
+import zlib
+from typing import Dict, Any, Optional, Tuple
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+    msgpack = None
+
+try:
+    import cbor2
+    CBOR_AVAILABLE = True
+except ImportError:
+    CBOR_AVAILABLE = False
+    cbor2 = None
+
+logger = logging.getLogger(__name__)
+
+ENCODING_JSON = 'json'
+ENCODING_MSGPACK = 'msgpack'
+ENCODING_CBOR = 'cbor'
+ENCODINGS = (ENCODING_JSON, ENCODING_MSGPACK, ENCODING_CBOR)
+COMPRESSION_SUFFIX = '-zlib'
+
+# MQTT v5 ContentType 中常见的MIME写法
+_MIME_ALIASES = {
+    'application/json': ENCODING_JSON,
+    'application/msgpack': ENCODING_MSGPACK,
+    'application/x-msgpack': ENCODING_MSGPACK,
+    'application/vnd.msgpack': ENCODING_MSGPACK,
+    'application/cbor': ENCODING_CBOR,
+}
+
+
+class PayloadDecodeError(ValueError):
+    """负载无法解码（未知编码、依赖缺失或数据损坏）"""
+
+
+def parse_content_type(content_type: Optional[str]) -> Optional[str]:
+    """把主题后缀或v5 ContentType规范化为内容类型标记，无法识别返回None"""
+    if not content_type:
+        return None
+    value = content_type.strip().lower()
+
+    compressed = False
+    for suffix in (COMPRESSION_SUFFIX, '+zlib'):
+        if value.endswith(suffix):
+            value = value[:-len(suffix)]
+            compressed = True
+            break
+
+    encoding = _MIME_ALIASES.get(value, value)
+    if encoding not in ENCODINGS:
+        return None
+    return encoding + COMPRESSION_SUFFIX if compressed else encoding
+
+
+def split_topic(topic: str) -> Tuple[str, Optional[str]]:
+    """拆分带内容类型后缀的主题，返回 (规范主题, 内容类型标记)
+
+    sensors/{client_id}/{data_type}/{content_type} -> (sensors/{client_id}/{data_type}, content_type)
+    """
+    parts = topic.split('/')
+    if len(parts) == 4 and parts[0] == 'sensors':
+        content_type = parse_content_type(parts[3])
+        if content_type:
+            return '/'.join(parts[:3]), content_type
+    return topic, None
+
+
+def decode_payload(payload_bytes: bytes, content_type: Optional[str] = None) -> Dict[str, Any]:
+    """按内容类型解码负载为字典"""
+    content_type = content_type or ENCODING_JSON
+    encoding = content_type
+    if content_type.endswith(COMPRESSION_SUFFIX):
+        encoding = content_type[:-len(COMPRESSION_SUFFIX)]
+        try:
+            payload_bytes = zlib.decompress(payload_bytes)
+        except zlib.error as e:
+            raise PayloadDecodeError(f"zlib解压失败: {e}")
+
+    if encoding == ENCODING_JSON:
+        return json.loads(payload_bytes.decode('utf-8'))
+
+    if encoding == ENCODING_MSGPACK:
+        if not MSGPACK_AVAILABLE:
+            raise PayloadDecodeError("msgpack 未安装，无法解码 MessagePack 负载")
+        try:
+            return msgpack.unpackb(payload_bytes, raw=False)
+        except Exception as e:
+            raise PayloadDecodeError(f"MessagePack解码失败: {e}")
+
+    if encoding == ENCODING_CBOR:
+        if not CBOR_AVAILABLE:
+            raise PayloadDecodeError("cbor2 未安装，无法解码 CBOR 负载")
+        try:
+            return cbor2.loads(payload_bytes)
+        except Exception as e:
+            raise PayloadDecodeError(f"CBOR解码失败: {e}")
+
+    raise PayloadDecodeError(f"不支持的内容类型: {content_type}")
+
+
+def encode_payload(payload: Dict[str, Any], content_type: str = ENCODING_JSON) -> bytes:
+    """按内容类型编码负载（用于下行消息和测试）"""
+    compressed = content_type.endswith(COMPRESSION_SUFFIX)
+    encoding = content_type[:-len(COMPRESSION_SUFFIX)] if compressed else content_type
+
+    if encoding == ENCODING_MSGPACK and MSGPACK_AVAILABLE:
+        data = msgpack.packb(payload, use_bin_type=True)
+    elif encoding == ENCODING_CBOR and CBOR_AVAILABLE:
+        data = cbor2.dumps(payload)
+    elif encoding == ENCODING_JSON:
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    else:
+        raise ValueError(f"不支持的内容类型或依赖未安装: {content_type}")
+
+    return zlib.compress(data) if compressed else data
@@ -58,7 +58,7 @@ CREATE TABLE `sensors` (
   CONSTRAINT `fk_sensors_device` FOREIGN KEY (`device_id`) REFERENCES `devices` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='传感器表';
 
--- 4. 读数表 (readings) - 支持多种数据类型
+-- 4. 读数表 (readings) - 图片/视频读数（数值读数存放在 numeric_readings）
 DROP TABLE IF EXISTS `readings`;
 CREATE TABLE `readings` (
   `id` bigint(20) NOT NULL AUTO_INCREMENT COMMENT '读数ID',
@@ -71,6 +71,7 @@ CREATE TABLE `readings` (
   -- 数值型数据字段（温度、湿度、光照等）
   `numeric_value` float COMMENT '数值型读数',
   `unit` varchar(10) COMMENT '单位: °C, %, lux等',
+  `quality` varchar(16) NOT NULL DEFAULT 'good' COMMENT '质量码: good/out_of_range（按设备模板范围校验）',
   
   -- 文件型数据字段（图片、视频等）
   `file_path` varchar(512) COMMENT '本地文件存储路径（备份）',
@@ -94,7 +95,6 @@ CREATE TABLE `readings` (
   KEY `idx_timestamp` (`timestamp`),
   KEY `idx_data_type` (`data_type`),
   KEY `idx_sensor_data_type` (`sensor_id`, `data_type`),
-  CONSTRAINT `fk_readings_sensor` FOREIGN KEY (`sensor_id`) REFERENCES `sensors` (`id`) ON DELETE CASCADE,
   
   -- 约束：根据数据类型检查必需字段
   CONSTRAINT `chk_numeric_data` CHECK (
@@ -104,8 +104,98 @@ CREATE TABLE `readings` (
   CONSTRAINT `chk_file_data` CHECK (
     (data_type IN ('image', 'video') AND file_path IS NOT NULL AND file_format IS NOT NULL) OR 
     (data_type NOT IN ('image', 'video'))
-  )
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='传感器读数表(支持多种数据类型)';
+  ),
+  CONSTRAINT `fk_readings_sensor` FOREIGN KEY (`sensor_id`) REFERENCES `sensors` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='传感器读数表(图片/视频)';
+
+-- 4.0 数值读数表 (numeric_readings) - 窄表，单位取自 sensors.unit
+DROP TABLE IF EXISTS `numeric_readings`;
+CREATE TABLE `numeric_readings` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT COMMENT '读数ID',
+  `sensor_id` int(11) NOT NULL COMMENT '传感器ID',
+  `timestamp` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '时间戳',
+  `value` float NOT NULL COMMENT '数值',
+  `quality` smallint NOT NULL DEFAULT 0 COMMENT '质量码: 0=good, 1=out_of_range',
+  -- 分区表的主键必须包含分区列 timestamp；分区表不支持外键，
+  -- 删除传感器时由ORM事件按 sensor_id 删除读数，数据库中直接删除留下的读数由分区维护线程清理
+  PRIMARY KEY (`id`, `timestamp`),
+  KEY `idx_sensor_timestamp` (`sensor_id`, `timestamp`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='数值读数表'
+-- 按月分区：后端分区管理线程从 p_future 拆分出 pYYYYMM 月分区，
+-- 并按 READING_RETENTION_MONTHS 整个删除过期分区
+PARTITION BY RANGE COLUMNS(`timestamp`) (
+  PARTITION `p_history` VALUES LESS THAN ('2025-06-01 00:00:00'),
+  PARTITION `p_future` VALUES LESS THAN (MAXVALUE)
+);
+
+-- 4.1 读数汇总表 (readings_rollup_1m/1h/1d) - 由批量写入器增量维护，统计接口优先查询
+DROP TABLE IF EXISTS `readings_rollup_1m`;
+CREATE TABLE `readings_rollup_1m` (
+  `sensor_id` int(11) NOT NULL COMMENT '传感器ID',
+  `bucket_start` datetime NOT NULL COMMENT '时间桶起点（UTC，按分钟对齐）',
+  `count` int(11) NOT NULL DEFAULT 0 COMMENT '读数数量',
+  `sum` double NOT NULL DEFAULT 0 COMMENT '读数之和',
+  `min` double COMMENT '最小值',
+  `max` double COMMENT '最大值',
+  `sum_sq` double NOT NULL DEFAULT 0 COMMENT '读数平方和（计算标准差）',
+  `first_ts` datetime COMMENT '桶内第一条读数时间',
+  `first_value` double COMMENT '桶内第一条读数',
+  `last_ts` datetime COMMENT '桶内最后一条读数时间',
+  `last_value` double COMMENT '桶内最后一条读数',
+  PRIMARY KEY (`sensor_id`, `bucket_start`),
+  CONSTRAINT `fk_readings_rollup_1m_sensor` FOREIGN KEY (`sensor_id`) REFERENCES `sensors` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='读数分钟汇总表';
+
+DROP TABLE IF EXISTS `readings_rollup_1h`;
+CREATE TABLE `readings_rollup_1h` (
+  `sensor_id` int(11) NOT NULL COMMENT '传感器ID',
+  `bucket_start` datetime NOT NULL COMMENT '时间桶起点（UTC，按小时对齐）',
+  `count` int(11) NOT NULL DEFAULT 0 COMMENT '读数数量',
+  `sum` double NOT NULL DEFAULT 0 COMMENT '读数之和',
+  `min` double COMMENT '最小值',
+  `max` double COMMENT '最大值',
+  `sum_sq` double NOT NULL DEFAULT 0 COMMENT '读数平方和（计算标准差）',
+  `first_ts` datetime COMMENT '桶内第一条读数时间',
+  `first_value` double COMMENT '桶内第一条读数',
+  `last_ts` datetime COMMENT '桶内最后一条读数时间',
+  `last_value` double COMMENT '桶内最后一条读数',
+  PRIMARY KEY (`sensor_id`, `bucket_start`),
+  CONSTRAINT `fk_readings_rollup_1h_sensor` FOREIGN KEY (`sensor_id`) REFERENCES `sensors` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='读数小时汇总表';
+
+DROP TABLE IF EXISTS `readings_rollup_1d`;
+CREATE TABLE `readings_rollup_1d` (
+  `sensor_id` int(11) NOT NULL COMMENT '传感器ID',
+  `bucket_start` datetime NOT NULL COMMENT '时间桶起点（UTC，按天对齐）',
+  `count` int(11) NOT NULL DEFAULT 0 COMMENT '读数数量',
+  `sum` double NOT NULL DEFAULT 0 COMMENT '读数之和',
+  `min` double COMMENT '最小值',
+  `max` double COMMENT '最大值',
+  `sum_sq` double NOT NULL DEFAULT 0 COMMENT '读数平方和（计算标准差）',
+  `first_ts` datetime COMMENT '桶内第一条读数时间',
+  `first_value` double COMMENT '桶内第一条读数',
+  `last_ts` datetime COMMENT '桶内最后一条读数时间',
+  `last_value` double COMMENT '桶内最后一条读数',
+  PRIMARY KEY (`sensor_id`, `bucket_start`),
+  CONSTRAINT `fk_readings_rollup_1d_sensor` FOREIGN KEY (`sensor_id`) REFERENCES `sensors` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='读数天汇总表';
+
+-- 4.2 读数归档索引表 (reading_archives) - 已结束日期的数值读数按 传感器/天 导出为 Parquet 文件
+DROP TABLE IF EXISTS `reading_archives`;
+CREATE TABLE `reading_archives` (
+  `sensor_id` int(11) NOT NULL COMMENT '传感器ID',
+  `day` date NOT NULL COMMENT '归档日期（UTC）',
+  `bucket_name` varchar(100) NOT NULL COMMENT 'MinIO归档桶',
+  `object_key` varchar(500) NOT NULL COMMENT 'Parquet文件对象键（本地存储目录下的相对路径相同）',
+  `storage_backend` varchar(20) NOT NULL DEFAULT 'local' COMMENT '存储位置: local/dual',
+  `row_count` int(11) NOT NULL DEFAULT 0 COMMENT '读数数量',
+  `min_ts` datetime COMMENT '最早读数时间',
+  `max_ts` datetime COMMENT '最晚读数时间',
+  `file_size` bigint(20) COMMENT '文件大小(字节)',
+  `created_at` datetime DEFAULT CURRENT_TIMESTAMP COMMENT '归档时间',
+  PRIMARY KEY (`sensor_id`, `day`),
+  CONSTRAINT `fk_reading_archives_sensor` FOREIGN KEY (`sensor_id`) REFERENCES `sensors` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='读数Parquet归档索引表';
 
 -- 5. 预测表 (predictions)
 DROP TABLE IF EXISTS `predictions`;
@@ -441,15 +531,15 @@ CREATE TRIGGER tr_device_status_change
 BEGIN
     IF OLD.status != NEW.status THEN
         INSERT INTO device_logs (device_id, old_status, new_status, changed_at, changed_by)
-        VALUES (NEW.device_id, OLD.status, NEW.status, NOW(), USER());
+        VALUES (NEW.id, OLD.status, NEW.status, NOW(), USER());
     END IF;
 END$$
 DELIMITER ;
 
 -- 2. 异常读数自动创建告警
 DELIMITER $$
-CREATE TRIGGER tr_readings_anomaly_detection 
-    AFTER INSERT ON readings
+CREATE TRIGGER tr_numeric_readings_anomaly_detection 
+    AFTER INSERT ON numeric_readings
     FOR EACH ROW
 BEGIN
     DECLARE anomaly_detected BOOLEAN DEFAULT FALSE;
@@ -459,36 +549,36 @@ BEGIN
     SELECT device_id INTO sensor_device_id FROM sensors WHERE id = NEW.sensor_id;
     
     -- 温度异常检测 (超出正常范围 0-50度)
-    IF NEW.data_type = 'numeric' AND NEW.numeric_value IS NOT NULL THEN
+    IF NEW.value IS NOT NULL THEN
         -- 检查温度传感器
         IF EXISTS (SELECT 1 FROM sensors WHERE id = NEW.sensor_id AND type = 'temperature') THEN
-            IF NEW.numeric_value < 0 OR NEW.numeric_value > 50 THEN
+            IF NEW.value < 0 OR NEW.value > 50 THEN
                 SET anomaly_detected = TRUE;
                 INSERT INTO alarms (sensor_id, alarm_type, threshold_value, actual_value, message, severity, created_at)
-                VALUES (NEW.sensor_id, 'temperature_anomaly', 25.0, NEW.numeric_value,
-                        CONCAT('Temperature out of range: ', NEW.numeric_value, '°C'), 
+                VALUES (NEW.sensor_id, 'temperature_anomaly', 25.0, NEW.value,
+                        CONCAT('Temperature out of range: ', NEW.value, '°C'), 
                         'medium', NOW());
             END IF;
         END IF;
         
         -- 检查湿度传感器 (超出0-100%)
         IF EXISTS (SELECT 1 FROM sensors WHERE id = NEW.sensor_id AND type = 'humidity') THEN
-            IF NEW.numeric_value < 0 OR NEW.numeric_value > 100 THEN
+            IF NEW.value < 0 OR NEW.value > 100 THEN
                 SET anomaly_detected = TRUE;
                 INSERT INTO alarms (sensor_id, alarm_type, threshold_value, actual_value, message, severity, created_at)
-                VALUES (NEW.sensor_id, 'humidity_anomaly', 50.0, NEW.numeric_value,
-                        CONCAT('Humidity out of range: ', NEW.numeric_value, '%'), 
+                VALUES (NEW.sensor_id, 'humidity_anomaly', 50.0, NEW.value,
+                        CONCAT('Humidity out of range: ', NEW.value, '%'), 
                         'medium', NOW());
             END IF;
         END IF;
         
         -- 检查光照传感器 (负值)
         IF EXISTS (SELECT 1 FROM sensors WHERE id = NEW.sensor_id AND type = 'light') THEN
-            IF NEW.numeric_value < 0 THEN
+            IF NEW.value < 0 THEN
                 SET anomaly_detected = TRUE;
                 INSERT INTO alarms (sensor_id, alarm_type, threshold_value, actual_value, message, severity, created_at)
-                VALUES (NEW.sensor_id, 'light_anomaly', 0.0, NEW.numeric_value,
-                        CONCAT('Invalid light reading: ', NEW.numeric_value, ' lux'), 
+                VALUES (NEW.sensor_id, 'light_anomaly', 0.0, NEW.value,
+                        CONCAT('Invalid light reading: ', NEW.value, ' lux'), 
                         'low', NOW());
             END IF;
         END IF;
@@ -500,6 +590,35 @@ DELIMITER ;
 -- 视图 (Views)
 -- ====================================
 
+-- 0. 读数兼容视图：数值读数（单位取自传感器，质量码还原为字符串）与图片/视频读数合并
+CREATE VIEW v_readings AS
+SELECT
+    n.id,
+    n.sensor_id,
+    n.timestamp,
+    'numeric' AS data_type,
+    n.value AS numeric_value,
+    s.unit,
+    CASE n.quality WHEN 1 THEN 'out_of_range' ELSE 'good' END AS quality,
+    NULL AS file_path,
+    NULL AS file_size,
+    NULL AS file_format,
+    NULL AS storage_backend,
+    NULL AS bucket_name,
+    NULL AS object_key,
+    NULL AS object_url,
+    NULL AS object_etag,
+    NULL AS meta_info,
+    NULL AS created_at
+FROM numeric_readings n
+JOIN sensors s ON n.sensor_id = s.id
+UNION ALL
+SELECT
+    id, sensor_id, timestamp, data_type, numeric_value, unit, quality,
+    file_path, file_size, file_format, storage_backend, bucket_name,
+    object_key, object_url, object_etag, meta_info, created_at
+FROM readings;
+
 -- 1. 设备最新状态视图
 CREATE VIEW v_device_latest_status AS
 SELECT 
@@ -518,10 +637,10 @@ SELECT
     END AS data_freshness
 FROM devices d
 LEFT JOIN (
-    SELECT sensor_id, numeric_value, unit, timestamp,
-           ROW_NUMBER() OVER (PARTITION BY sensor_id ORDER BY timestamp DESC) as rn
-    FROM readings
-    WHERE data_type = 'numeric'
+    SELECT n.sensor_id, n.value AS numeric_value, s.unit, n.timestamp,
+           ROW_NUMBER() OVER (PARTITION BY n.sensor_id ORDER BY n.timestamp DESC) as rn
+    FROM numeric_readings n
+    JOIN sensors s ON n.sensor_id = s.id
 ) r ON d.id IN (SELECT device_id FROM sensors WHERE id = r.sensor_id) AND r.rn = 1;
 
 -- 2. 设备每日统计视图
@@ -539,10 +658,9 @@ SELECT
     AVG(CASE WHEN s.type = 'light' THEN r.numeric_value END) AS avg_light,
     MIN(CASE WHEN s.type = 'light' THEN r.numeric_value END) AS min_light,
     MAX(CASE WHEN s.type = 'light' THEN r.numeric_value END) AS max_light
-FROM readings r
+FROM (SELECT sensor_id, timestamp, value AS numeric_value FROM numeric_readings) r
 JOIN sensors s ON r.sensor_id = s.id
 WHERE r.timestamp >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-  AND r.data_type = 'numeric'
 GROUP BY s.device_id, DATE(r.timestamp);
 
 -- 3. 活跃告警视图
@@ -582,8 +700,7 @@ BEGIN
     
     START TRANSACTION;
     
-    -- 清理旧的读数数据
-    DELETE FROM readings WHERE timestamp < cleanup_date;
+    -- 读数不在此逐行删除：numeric_readings 按月分区，由后端分区管理按保留期整个删除过期分区
     
     -- 清理旧的预测数据
     DELETE FROM predictions WHERE generated_at < cleanup_date;
@@ -615,7 +732,7 @@ BEGIN
         TIMESTAMPDIFF(HOUR, MAX(r.timestamp), NOW()) AS hours_since_last_reading
     FROM devices d
     LEFT JOIN sensors s ON d.id = s.device_id
-    LEFT JOIN readings r ON s.id = r.sensor_id
+    LEFT JOIN v_readings r ON s.id = r.sensor_id
     WHERE d.status = 'active'
     GROUP BY d.id, d.name, d.location, d.status
     HAVING MAX(r.timestamp) < DATE_SUB(NOW(), INTERVAL 2 HOUR) 
@@ -645,11 +762,10 @@ BEGIN
         AVG(CASE WHEN s.type = 'light' THEN r.numeric_value END) AS avg_light,
         MIN(CASE WHEN s.type = 'light' THEN r.numeric_value END) AS min_light,
         MAX(CASE WHEN s.type = 'light' THEN r.numeric_value END) AS max_light
-    FROM readings r
+    FROM (SELECT sensor_id, timestamp, value AS numeric_value FROM numeric_readings) r
     JOIN sensors s ON r.sensor_id = s.id
     WHERE s.device_id = device_id_param 
-      AND r.timestamp >= start_date
-      AND r.data_type = 'numeric';
+      AND r.timestamp >= start_date;
     
     -- 告警统计
     SELECT 
@@ -0,0 +1,106 @@
+-- AgriNex 迁移：数值读数窄表 (numeric_readings)
+--
+-- 作用：数值读数从多类型的 readings 宽表分离到只有
+-- (id, sensor_id, timestamp, value, quality) 的窄表，单位以 sensors.unit 为准，
+-- 质量码以 smallint 存储（0=good, 1=out_of_range）。图片/视频读数仍在 readings 表。
+-- 分区管理、保留策略、汇总和归档都改为处理 numeric_readings。
+--
+-- 新部署使用 init_db.sql 时已包含该表、视图和触发器，无需执行本脚本。
+-- 执行顺序：
+--   1. 本脚本建表、兼容视图 v_readings 并把异常检测触发器移到新表；
+--   2. 部署新版本后端（新读数写入 numeric_readings）；
+--   3. python scripts/migrate_numeric_readings.py --execute
+--      分批把 readings 中的数值读数复制到新表（保留原ID）并从 readings 删除。
+
+CREATE TABLE IF NOT EXISTS `numeric_readings` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT COMMENT '读数ID',
+  `sensor_id` int(11) NOT NULL COMMENT '传感器ID',
+  `timestamp` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '时间戳',
+  `value` float NOT NULL COMMENT '数值',
+  `quality` smallint NOT NULL DEFAULT 0 COMMENT '质量码: 0=good, 1=out_of_range',
+  -- 分区表的主键必须包含分区列 timestamp；分区表不支持外键，
+  -- 删除传感器时由ORM事件按 sensor_id 删除读数，数据库中直接删除留下的读数由分区维护线程清理
+  PRIMARY KEY (`id`, `timestamp`),
+  KEY `idx_sensor_timestamp` (`sensor_id`, `timestamp`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='数值读数表'
+-- 按月分区：后端分区管理线程从 p_future 拆分出 pYYYYMM 月分区
+PARTITION BY RANGE COLUMNS(`timestamp`) (
+  PARTITION `p_history` VALUES LESS THAN ('2025-06-01 00:00:00'),
+  PARTITION `p_future` VALUES LESS THAN (MAXVALUE)
+);
+
+-- 新读数的ID从 readings 当前最大ID之后开始，复制的历史读数保留原ID不冲突
+SET @next_id = (SELECT COALESCE(MAX(id), 0) + 1 FROM `readings`);
+SET @sql = CONCAT('ALTER TABLE `numeric_readings` AUTO_INCREMENT = ', @next_id);
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 兼容视图：按 readings 的列结构合并两张表，供报表和存储过程查询
+CREATE OR REPLACE VIEW v_readings AS
+SELECT
+    n.id,
+    n.sensor_id,
+    n.timestamp,
+    'numeric' AS data_type,
+    n.value AS numeric_value,
+    s.unit,
+    CASE n.quality WHEN 1 THEN 'out_of_range' ELSE 'good' END AS quality,
+    NULL AS file_path,
+    NULL AS file_size,
+    NULL AS file_format,
+    NULL AS storage_backend,
+    NULL AS bucket_name,
+    NULL AS object_key,
+    NULL AS object_url,
+    NULL AS object_etag,
+    NULL AS meta_info,
+    NULL AS created_at
+FROM numeric_readings n
+JOIN sensors s ON n.sensor_id = s.id
+UNION ALL
+SELECT
+    id, sensor_id, timestamp, data_type, numeric_value, unit, quality,
+    file_path, file_size, file_format, storage_backend, bucket_name,
+    object_key, object_url, object_etag, meta_info, created_at
+FROM readings;
+
+-- 异常检测触发器改为监听 numeric_readings
+DROP TRIGGER IF EXISTS tr_readings_anomaly_detection;
+DROP TRIGGER IF EXISTS tr_numeric_readings_anomaly_detection;
+DELIMITER $$
+CREATE TRIGGER tr_numeric_readings_anomaly_detection
+    AFTER INSERT ON numeric_readings
+    FOR EACH ROW
+BEGIN
+    -- 温度异常检测 (超出正常范围 0-50度)
+    IF EXISTS (SELECT 1 FROM sensors WHERE id = NEW.sensor_id AND type = 'temperature') THEN
+        IF NEW.value < 0 OR NEW.value > 50 THEN
+            INSERT INTO alarms (sensor_id, alarm_type, threshold_value, actual_value, message, severity, created_at)
+            VALUES (NEW.sensor_id, 'temperature_anomaly', 25.0, NEW.value,
+                    CONCAT('Temperature out of range: ', NEW.value, '°C'),
+                    'medium', NOW());
+        END IF;
+    END IF;
+
+    -- 检查湿度传感器 (超出0-100%)
+    IF EXISTS (SELECT 1 FROM sensors WHERE id = NEW.sensor_id AND type = 'humidity') THEN
+        IF NEW.value < 0 OR NEW.value > 100 THEN
+            INSERT INTO alarms (sensor_id, alarm_type, threshold_value, actual_value, message, severity, created_at)
+            VALUES (NEW.sensor_id, 'humidity_anomaly', 50.0, NEW.value,
+                    CONCAT('Humidity out of range: ', NEW.value, '%'),
+                    'medium', NOW());
+        END IF;
+    END IF;
+
+    -- 检查光照传感器 (负值)
+    IF EXISTS (SELECT 1 FROM sensors WHERE id = NEW.sensor_id AND type = 'light') THEN
+        IF NEW.value < 0 THEN
+            INSERT INTO alarms (sensor_id, alarm_type, threshold_value, actual_value, message, severity, created_at)
+            VALUES (NEW.sensor_id, 'light_anomaly', 0.0, NEW.value,
+                    CONCAT('Invalid light reading: ', NEW.value, ' lux'),
+                    'low', NOW());
+        END IF;
+    END IF;
+END$$
+DELIMITER ;
@@ -0,0 +1,23 @@
+-- AgriNex 迁移：读数Parquet归档索引表
+-- 
+-- 作用：归档任务（ARCHIVE_ENABLED 或 scripts/archive_readings.py）把已结束日期的
+-- 数值读数按 传感器/天 导出为 Parquet 文件，本表记录每个文件的位置、行数和
+-- 时间范围。预测和智能报告读取历史数据时，每个传感器最后归档日期之前的读数
+-- 从 Parquet 文件读取，之后的读数查询 numeric_readings 表。
+-- 
+-- 新部署使用 init_db.sql 时已包含该表，无需执行本脚本。
+
+CREATE TABLE IF NOT EXISTS `reading_archives` (
+  `sensor_id` int(11) NOT NULL COMMENT '传感器ID',
+  `day` date NOT NULL COMMENT '归档日期（UTC）',
+  `bucket_name` varchar(100) NOT NULL COMMENT 'MinIO归档桶',
+  `object_key` varchar(500) NOT NULL COMMENT 'Parquet文件对象键（本地存储目录下的相对路径相同）',
+  `storage_backend` varchar(20) NOT NULL DEFAULT 'local' COMMENT '存储位置: local/dual',
+  `row_count` int(11) NOT NULL DEFAULT 0 COMMENT '读数数量',
+  `min_ts` datetime COMMENT '最早读数时间',
+  `max_ts` datetime COMMENT '最晚读数时间',
+  `file_size` bigint(20) COMMENT '文件大小(字节)',
+  `created_at` datetime DEFAULT CURRENT_TIMESTAMP COMMENT '归档时间',
+  PRIMARY KEY (`sensor_id`, `day`),
+  CONSTRAINT `fk_reading_archives_sensor` FOREIGN KEY (`sensor_id`) REFERENCES `sensors` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='读数Parquet归档索引表';
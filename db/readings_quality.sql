@@ -0,0 +1,11 @@
+-- AgriNex 迁移：读数质量码列
+-- 
+-- 作用：摄取时按设备模板 sensor_configs.validation_rules（min/max）校验数值，
+-- 超出范围的读数保留原值并标记 quality = 'out_of_range'，不参与告警检查，
+-- 查询和统计时可按质量码过滤。已有数据默认视为 good。
+-- 
+-- 新部署使用 init_db.sql 时已包含该列，无需执行本脚本。
+
+ALTER TABLE `readings`
+  ADD COLUMN `quality` varchar(16) NOT NULL DEFAULT 'good'
+    COMMENT '质量码: good/out_of_range（按设备模板范围校验）' AFTER `unit`;
@@ -0,0 +1,57 @@
+-- AgriNex 迁移：读数汇总表 (1m/1h/1d)
+-- 
+-- 作用：统计接口（传感器统计、读数统计、设备读数汇总、智能报告）不再扫描
+-- readings 原始行，而是按查询区间选择能覆盖的最粗粒度汇总表，区间两端逐级
+-- 细化，不足一分钟的部分才查询原始读数。批量写入器在写入读数的同一事务中
+-- 增量更新三张表（READING_ROLLUP_ENABLED）。
+-- 
+-- 新部署使用 init_db.sql 时已包含这些表，无需执行本脚本。
+-- 已有数据在建表后执行回填：python scripts/backfill_rollups.py
+
+CREATE TABLE IF NOT EXISTS `readings_rollup_1m` (
+  `sensor_id` int(11) NOT NULL COMMENT '传感器ID',
+  `bucket_start` datetime NOT NULL COMMENT '时间桶起点（UTC，按分钟对齐）',
+  `count` int(11) NOT NULL DEFAULT 0 COMMENT '读数数量',
+  `sum` double NOT NULL DEFAULT 0 COMMENT '读数之和',
+  `min` double COMMENT '最小值',
+  `max` double COMMENT '最大值',
+  `sum_sq` double NOT NULL DEFAULT 0 COMMENT '读数平方和（计算标准差）',
+  `first_ts` datetime COMMENT '桶内第一条读数时间',
+  `first_value` double COMMENT '桶内第一条读数',
+  `last_ts` datetime COMMENT '桶内最后一条读数时间',
+  `last_value` double COMMENT '桶内最后一条读数',
+  PRIMARY KEY (`sensor_id`, `bucket_start`),
+  CONSTRAINT `fk_readings_rollup_1m_sensor` FOREIGN KEY (`sensor_id`) REFERENCES `sensors` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='读数分钟汇总表';
+
+CREATE TABLE IF NOT EXISTS `readings_rollup_1h` (
+  `sensor_id` int(11) NOT NULL COMMENT '传感器ID',
+  `bucket_start` datetime NOT NULL COMMENT '时间桶起点（UTC，按小时对齐）',
+  `count` int(11) NOT NULL DEFAULT 0 COMMENT '读数数量',
+  `sum` double NOT NULL DEFAULT 0 COMMENT '读数之和',
+  `min` double COMMENT '最小值',
+  `max` double COMMENT '最大值',
+  `sum_sq` double NOT NULL DEFAULT 0 COMMENT '读数平方和（计算标准差）',
+  `first_ts` datetime COMMENT '桶内第一条读数时间',
+  `first_value` double COMMENT '桶内第一条读数',
+  `last_ts` datetime COMMENT '桶内最后一条读数时间',
+  `last_value` double COMMENT '桶内最后一条读数',
+  PRIMARY KEY (`sensor_id`, `bucket_start`),
+  CONSTRAINT `fk_readings_rollup_1h_sensor` FOREIGN KEY (`sensor_id`) REFERENCES `sensors` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='读数小时汇总表';
+
+CREATE TABLE IF NOT EXISTS `readings_rollup_1d` (
+  `sensor_id` int(11) NOT NULL COMMENT '传感器ID',
+  `bucket_start` datetime NOT NULL COMMENT '时间桶起点（UTC，按天对齐）',
+  `count` int(11) NOT NULL DEFAULT 0 COMMENT '读数数量',
+  `sum` double NOT NULL DEFAULT 0 COMMENT '读数之和',
+  `min` double COMMENT '最小值',
+  `max` double COMMENT '最大值',
+  `sum_sq` double NOT NULL DEFAULT 0 COMMENT '读数平方和（计算标准差）',
+  `first_ts` datetime COMMENT '桶内第一条读数时间',
+  `first_value` double COMMENT '桶内第一条读数',
+  `last_ts` datetime COMMENT '桶内最后一条读数时间',
+  `last_value` double COMMENT '桶内最后一条读数',
+  PRIMARY KEY (`sensor_id`, `bucket_start`),
+  CONSTRAINT `fk_readings_rollup_1d_sensor` FOREIGN KEY (`sensor_id`) REFERENCES `sensors` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='读数天汇总表';
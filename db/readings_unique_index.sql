@@ -0,0 +1,22 @@
+-- AgriNex 可选迁移：数值读数表 (sensor_id, timestamp) 唯一索引
+-- 
+-- 作用：作为摄取去重窗口（INGEST_DEDUP_*）之外的数据库级兜底，
+-- 拒绝同一传感器同一时间戳的重复读数（例如集群模式下重投消息被
+-- 其他实例接收、或进程重启后去重窗口丢失）。批量写入器遇到唯一约束
+-- 冲突时会逐行重试并跳过重复行。
+-- 
+-- 注意：DATETIME 精度为秒。仅当设备上报自带时间戳且同一传感器采样
+-- 频率不超过 1Hz 时启用，否则同一秒内的合法读数会被当作重复丢弃。
+-- 启用前先清理已存在的重复数据，否则创建索引会失败。
+
+-- 1. 删除重复读数（保留ID最小的一条）
+DELETE r1 FROM `numeric_readings` r1
+JOIN `numeric_readings` r2
+  ON r1.sensor_id = r2.sensor_id
+ AND r1.timestamp = r2.timestamp
+ AND r1.id > r2.id;
+
+-- 2. 用唯一索引替换原有的普通索引（查询仍可使用同一前缀）
+ALTER TABLE `numeric_readings`
+  ADD UNIQUE KEY `uk_sensor_timestamp` (`sensor_id`, `timestamp`),
+  DROP KEY `idx_sensor_timestamp`;
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Payload encoding benchmark for AgriNex Sensor Client.
+
+Compares bytes on the wire and backend decode time of the JSON path against
+MessagePack / CBOR, with and without zlib, for both topics published by
+MQTTAdapter.send_sensor_data (numeric values and the detailed payload).
+"""
+
+import argparse
+import importlib.util
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add sensor-client root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.sensor_data import SensorData, SensorReading, encode_payload, PAYLOAD_ENCODINGS
+
+# Load the backend decoder directly so both sides of the wire are measured
+BACKEND_CODEC = Path(__file__).parent.parent.parent / "backend" / "utils" / "payload_codec.py"
+_spec = importlib.util.spec_from_file_location("payload_codec", BACKEND_CODEC)
+payload_codec = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(payload_codec)
+
+
+def build_sample() -> SensorData:
+    """Build a reading set similar to a greenhouse node."""
+    now = datetime.now()
+    values = {
+        'temperature': (23.47, '°C'),
+        'humidity': (61.2, '%'),
+        'light': (18234.0, 'lux'),
+        'ph': (6.52, 'pH'),
+        'moisture': (38.9, '%'),
+        'pressure': (1012.6, 'hPa'),
+        'wind_speed': (2.31, 'm/s'),
+    }
+    readings = [
+        SensorReading(sensor_type=name, value=value, unit=unit, timestamp=now)
+        for name, (value, unit) in values.items()
+    ]
+    return SensorData(client_id='greenhouse_node_001', readings=readings, timestamp=now)
+
+
+def time_decode(data: bytes, content_type: str, iterations: int) -> float:
+    """Average backend decode time in microseconds."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        payload_codec.decode_payload(data, content_type)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def run(iterations: int):
+    sample = build_sample()
+    payloads = {
+        'numeric': sample.get_numeric_values(),
+        'data': sample.to_mqtt_payload(),
+    }
+
+    for topic, payload in payloads.items():
+        print(f"=== sensors/<client_id>/{topic} ===")
+        print(f"{'content type':<16}{'bytes':>8}{'vs json':>10}{'decode µs':>12}{'vs json':>10}")
+
+        baseline_size = baseline_time = None
+        for encoding in PAYLOAD_ENCODINGS:
+            for compress in (False, True):
+                content_type, data = encode_payload(payload, encoding, compress)
+                if not content_type.startswith(encoding):
+                    print(f"{encoding:<16}  skipped (library not installed)")
+                    break
+
+                assert payload_codec.decode_payload(data, content_type) == payload
+                decode_us = time_decode(data, content_type, iterations)
+                if baseline_size is None:
+                    baseline_size, baseline_time = len(data), decode_us
+
+                print(f"{content_type:<16}{len(data):>8}{len(data) / baseline_size:>9.0%}"
+                      f"{decode_us:>12.2f}{decode_us / baseline_time:>9.0%}")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--iterations', type=int, default=20000,
+                        help='decode iterations per content type')
+    args = parser.parse_args()
+    run(args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -230,11 +230,8 @@ class CameraAdapter:
                 
                 writer.release()
                 
-                # Read video file and encode to base64
-                with open(temp_path, 'rb') as f:
-                    video_bytes = f.read()
-                
-                video_base64 = base64.b64encode(video_bytes).decode('utf-8')
+                # Hand the file over for chunked upload instead of base64-encoding it in memory
+                video_size = os.path.getsize(temp_path)
                 
                 # Create data structure
                 timestamp = datetime.now()
@@ -249,8 +246,8 @@ class CameraAdapter:
                         'fps': self.capture_fps,
                         'duration_seconds': final_duration,
                         'frame_count': frame_count,
-                        'size_bytes': len(video_bytes),
-                        'video_base64': video_base64
+                        'size_bytes': video_size,
+                        'file_path': temp_path
                     },
                     'metadata': {
                         'capture_device': f"camera_{self.camera_index}",
@@ -260,19 +257,20 @@ class CameraAdapter:
                 }
                 
                 self.total_captures += 1
-                self.logger.info(f"Captured video: {final_duration}s, {frame_count} frames, {len(video_bytes)} bytes")
+                self.logger.info(f"Captured video: {final_duration}s, {frame_count} frames, {video_size} bytes")
                 
-                # Notify callbacks
+                # Notify callbacks (the consumer removes the file after upload)
                 self._notify_data(video_data)
                 
                 return video_data
                 
-            finally:
+            except Exception:
                 # Clean up temporary file
                 try:
                     os.unlink(temp_path)
                 except:
                     pass
+                raise
             
         except Exception as e:
             self.total_errors += 1
@@ -382,11 +380,8 @@ class CameraAdapter:
             
             writer.release()
             
-            # Read video file
-            with open(temp_path, 'rb') as f:
-                video_bytes = f.read()
-            
-            video_base64 = base64.b64encode(video_bytes).decode('utf-8')
+            # Hand the file over for chunked upload
+            video_size = os.path.getsize(temp_path)
             
             timestamp = datetime.now()
             return {
@@ -400,8 +395,8 @@ class CameraAdapter:
                     'fps': self.capture_fps,
                     'duration_seconds': duration,
                     'frame_count': frame_count,
-                    'size_bytes': len(video_bytes),
-                    'video_base64': video_base64,
+                    'size_bytes': video_size,
+                    'file_path': temp_path,
                     'simulated': True
                 },
                 'metadata': {
@@ -411,12 +406,13 @@ class CameraAdapter:
                 }
             }
             
-        finally:
+        except Exception:
             # Clean up
             try:
                 os.unlink(temp_path)
             except:
                 pass
+            raise
     
     async def start_continuous_capture(self, interval: float = 30.0, capture_type: str = "image"):
         """Start continuous capture at specified interval."""
@@ -291,7 +291,10 @@ class CameraAdapter:
                 0x69, 0x73, 0x6F, 0x6D, 0x00, 0x00, 0x02, 0x00,
             ] + [128] * min(2000, frame_count * 10))  # Fake video data
             
-            video_base64 = base64.b64encode(fake_mp4).decode('utf-8')
+            # Write to a temporary file so it goes through chunked upload like a real recording
+            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_file:
+                temp_file.write(fake_mp4)
+                temp_path = temp_file.name
             
             timestamp = datetime.now()
             video_data = {
@@ -306,7 +309,7 @@ class CameraAdapter:
                     'duration_seconds': duration,
                     'frame_count': frame_count,
                     'size_bytes': len(fake_mp4),
-                    'video_base64': video_base64,
+                    'file_path': temp_path,
                     'simulated': True
                 },
                 'metadata': {
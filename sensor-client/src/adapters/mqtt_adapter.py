@@ -3,8 +3,12 @@ MQTT adapter for AgriNex sensor client.
 """
 
 import asyncio
+import hashlib
+import itertools
 import json
 import logging
+import os
+import secrets
 from datetime import datetime
 from typing import Optional, Callable, Dict, Any
 import paho.mqtt.client as mqtt
@@ -36,8 +40,16 @@ class MQTTAdapter:
         # Statistics
         self.messages_sent = 0
         self.messages_failed = 0
+        self.bytes_sent = 0
         self.last_message_time: Optional[datetime] = None
         
+        # Message ids: random per-process prefix + sequence, so redeliveries can be deduplicated
+        self._message_prefix = secrets.token_hex(4)
+        self._message_seq = itertools.count(1)
+        
+        # Pending chunked media uploads: upload_id -> (event loop, future for next status)
+        self._media_waiters: Dict[str, tuple] = {}
+        
     def add_connection_callback(self, callback: Callable[[bool], None]) -> None:
         """Add callback for connection state changes."""
         self.connection_callbacks.append(callback)
@@ -57,6 +69,9 @@ class MQTTAdapter:
             client.subscribe(control_topic, qos=self.mqtt_config.qos)
             self.logger.info(f"Subscribed to control topic: {control_topic}")
             
+            # Subscribe to chunked media upload status replies
+            client.subscribe(f"sensors/{self.client_id}/media/+/status", qos=self.mqtt_config.qos)
+            
             # Notify callbacks
             for callback in self.connection_callbacks:
                 try:
@@ -96,6 +111,10 @@ class MQTTAdapter:
             payload = json.loads(msg.payload.decode())
             self.logger.debug(f"Received message on topic {topic}: {payload}")
             
+            if topic.endswith('/status') and '/media/' in topic:
+                self._resolve_media_status(payload)
+                return
+            
             # Notify callbacks
             for callback in self.message_callbacks:
                 try:
@@ -165,32 +184,43 @@ class MQTTAdapter:
             # Send to numeric topic (for compatibility)
             numeric_topic = self.config.get_mqtt_topic('numeric')
             numeric_payload = sensor_data.get_numeric_values()
+            if not sensor_data.message_id:
+                sensor_data.message_id = f"{self._message_prefix}-{next(self._message_seq)}"
+            content_type, message = sensor_data.encode_numeric(
+                self.mqtt_config.payload_encoding,
+                self.mqtt_config.payload_compression
+            )
             
             result = self.client.publish(
-                numeric_topic,
-                json.dumps(numeric_payload),
+                self._encoded_topic(numeric_topic, content_type),
+                message,
                 qos=self.mqtt_config.qos,
                 retain=self.mqtt_config.retain
             )
             
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
                 self.messages_sent += 1
+                self.bytes_sent += len(message)
                 self.last_message_time = datetime.now()
-                self.logger.debug(f"Sent numeric data to {numeric_topic}: {numeric_payload}")
+                self.logger.debug(f"Sent numeric data to {numeric_topic} ({content_type}, {len(message)} bytes): {numeric_payload}")
                 
                 # Also send detailed data if configured
                 if self.config.sensor.include_metadata:
                     data_topic = self.config.get_mqtt_topic('sensor_data')
-                    data_payload = sensor_data.to_mqtt_payload()
+                    content_type, data_message = sensor_data.encode_mqtt_payload(
+                        self.mqtt_config.payload_encoding,
+                        self.mqtt_config.payload_compression
+                    )
                     
                     result2 = self.client.publish(
-                        data_topic,
-                        json.dumps(data_payload),
+                        self._encoded_topic(data_topic, content_type),
+                        data_message,
                         qos=self.mqtt_config.qos,
                         retain=self.mqtt_config.retain
                     )
                     
                     if result2.rc == mqtt.MQTT_ERR_SUCCESS:
+                        self.bytes_sent += len(data_message)
                         self.logger.debug(f"Sent detailed data to {data_topic}")
                 
                 return True
@@ -204,6 +234,130 @@ class MQTTAdapter:
             self.logger.error(f"Error sending sensor data: {e}")
             return False
     
+    @staticmethod
+    def _encoded_topic(topic: str, content_type: str) -> str:
+        """Append the content type to the topic for non-JSON payloads."""
+        if content_type == 'json':
+            return topic
+        return f"{topic}/{content_type}"
+    
+    async def send_media_file(self, file_path: str, data_type: str, file_format: str,
+                              sensor_type: Optional[str] = None,
+                              metadata: Optional[Dict[str, Any]] = None,
+                              timeout: float = 300.0) -> bool:
+        """Upload an image/video file in raw chunks with resume support.
+        
+        Protocol (topics under sensors/<client_id>/media/<upload_id>/):
+        init (JSON manifest) -> chunk/<n> (raw bytes) -> commit; the backend
+        replies on .../status with the chunks it is still missing. After a
+        disconnect the upload is resumed by re-sending init and only the
+        missing chunks. The file is read chunk by chunk, never as a whole.
+        """
+        chunk_size = self.mqtt_config.media_chunk_size
+        size = os.path.getsize(file_path)
+        sha256 = self._file_sha256(file_path)
+        # Stable id: retries of the same file resume the same upload
+        upload_id = f"{data_type}-{sha256[:24]}"
+        base_topic = f"sensors/{self.client_id}/media/{upload_id}"
+        manifest = {
+            'data_type': data_type,
+            'sensor_type': sensor_type or data_type,
+            'format': file_format,
+            'size': size,
+            'chunk_size': chunk_size,
+            'sha256': sha256,
+            'timestamp': datetime.now().isoformat(),
+            'metadata': metadata or {}
+        }
+        
+        deadline = asyncio.get_running_loop().time() + timeout
+        missing: Optional[list] = None
+        try:
+            while asyncio.get_running_loop().time() < deadline:
+                if not self.connected:
+                    await asyncio.sleep(1)
+                    continue
+                
+                if missing is None:
+                    status = await self._media_request(upload_id, f"{base_topic}/init", json.dumps(manifest))
+                else:
+                    status = await self._media_request(upload_id, f"{base_topic}/commit", b'{}')
+                if status is None:
+                    # No reply (e.g. disconnected): start over with init to resume
+                    missing = None
+                    continue
+                
+                state = status.get('state')
+                if state == 'committed':
+                    self.bytes_sent += size
+                    self.logger.info(f"Uploaded {data_type} {file_path} ({size} bytes) as {upload_id}")
+                    return True
+                if state == 'failed':
+                    self.logger.error(f"Media upload {upload_id} rejected: {status.get('error')}")
+                    return False
+                if state == 'unknown':
+                    missing = None
+                    continue
+                
+                missing = status.get('missing', [])
+                if not missing and status.get('received_chunks', 0) < status.get('total_chunks', 0):
+                    missing = None
+                    continue
+                self._send_media_chunks(file_path, base_topic, chunk_size, missing)
+            
+            self.logger.error(f"Timeout uploading media {file_path}")
+            return False
+            
+        except Exception as e:
+            self.messages_failed += 1
+            self.logger.error(f"Error uploading media {file_path}: {e}")
+            return False
+        finally:
+            self._media_waiters.pop(upload_id, None)
+    
+    def _send_media_chunks(self, file_path: str, base_topic: str, chunk_size: int, indexes: list) -> None:
+        """Publish the given chunks, reading each one from disk."""
+        with open(file_path, 'rb') as f:
+            for index in indexes:
+                f.seek(index * chunk_size)
+                self.client.publish(
+                    f"{base_topic}/chunk/{index}",
+                    f.read(chunk_size),
+                    qos=self.mqtt_config.qos
+                )
+    
+    async def _media_request(self, upload_id: str, topic: str, payload, reply_timeout: float = 30.0):
+        """Publish an init/commit message and wait for the backend status reply."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._media_waiters[upload_id] = (loop, future)
+        self.client.publish(topic, payload, qos=self.mqtt_config.qos)
+        try:
+            return await asyncio.wait_for(future, reply_timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"No status reply for media upload {upload_id}")
+            return None
+    
+    def _resolve_media_status(self, status: Dict[str, Any]) -> None:
+        """Deliver a media upload status (called from the paho network thread)."""
+        waiter = self._media_waiters.get(status.get('upload_id'))
+        if not waiter:
+            return
+        loop, future = waiter
+        
+        def _set_result():
+            if not future.done():
+                future.set_result(status)
+        loop.call_soon_threadsafe(_set_result)
+    
+    @staticmethod
+    def _file_sha256(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
     async def send_status(self, status: Dict[str, Any]) -> bool:
         """Send status information."""
         if not self.connected:
@@ -262,6 +416,8 @@ class MQTTAdapter:
             'connected': self.connected,
             'messages_sent': self.messages_sent,
             'messages_failed': self.messages_failed,
+            'bytes_sent': self.bytes_sent,
+            'payload_encoding': self.mqtt_config.payload_encoding,
             'last_message_time': self.last_message_time.isoformat() if self.last_message_time else None,
             'broker_host': self.mqtt_config.host,
             'broker_port': self.mqtt_config.port
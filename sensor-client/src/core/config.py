@@ -19,6 +19,9 @@ class MQTTConfig:
     keepalive: int = 60
     qos: int = 1
     retain: bool = False
+    payload_encoding: str = "json"  # json, msgpack, cbor
+    payload_compression: bool = False  # zlib-compress payloads
+    media_chunk_size: int = 64 * 1024  # chunk size for media uploads (bytes)
     
     
 @dataclass
@@ -133,6 +136,8 @@ class Config:
         config.mqtt.port = int(os.getenv('MQTT_PORT', str(config.mqtt.port)))
         config.mqtt.username = os.getenv('MQTT_USERNAME')
         config.mqtt.password = os.getenv('MQTT_PASSWORD')
+        config.mqtt.payload_encoding = os.getenv('MQTT_PAYLOAD_ENCODING', config.mqtt.payload_encoding)
+        config.mqtt.payload_compression = os.getenv('MQTT_PAYLOAD_COMPRESSION', 'false').lower() == 'true'
         
         # Serial config
         config.serial.baudrate = int(os.getenv('SERIAL_BAUDRATE', str(config.serial.baudrate)))
@@ -4,8 +4,46 @@ Core sensor data models and types.
 
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import json
+import zlib
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import cbor2
+    CBOR_AVAILABLE = True
+except ImportError:
+    CBOR_AVAILABLE = False
+
+
+# Payload encodings understood by the AgriNex backend. The content type is
+# announced as a topic suffix, e.g. sensors/<client_id>/numeric/msgpack-zlib.
+PAYLOAD_ENCODINGS = ('json', 'msgpack', 'cbor')
+
+
+def encode_payload(payload: Dict[str, Any], encoding: str = 'json',
+                   compress: bool = False) -> Tuple[str, bytes]:
+    """Encode a payload, returning (content_type, bytes).
+
+    Falls back to JSON when the requested binary library is not installed,
+    so the returned content type always describes the bytes.
+    """
+    if encoding == 'msgpack' and MSGPACK_AVAILABLE:
+        data = msgpack.packb(payload, use_bin_type=True)
+    elif encoding == 'cbor' and CBOR_AVAILABLE:
+        data = cbor2.dumps(payload)
+    else:
+        encoding = 'json'
+        data = json.dumps(payload).encode('utf-8')
+
+    if compress:
+        return f"{encoding}-zlib", zlib.compress(data)
+    return encoding, data
 
 
 @dataclass
@@ -42,6 +80,7 @@ class SensorData:
     location: Optional[str] = None
     device_info: Optional[Dict[str, Any]] = None
     timestamp: Optional[datetime] = None
+    message_id: Optional[str] = None  # lets the backend drop QoS1 redeliveries
 
     def __post_init__(self):
         if self.timestamp is None:
@@ -69,6 +108,8 @@ class SensorData:
             'timestamp': self.timestamp.isoformat() if self.timestamp else datetime.now().isoformat(),
             'data': {}
         }
+        if self.message_id:
+            payload['msg_id'] = self.message_id
         
         # Group readings by sensor type
         for reading in self.readings:
@@ -84,3 +125,14 @@ class SensorData:
     def get_numeric_values(self) -> Dict[str, float]:
         """Get numeric values only for simple transmission."""
         return {reading.sensor_type: reading.value for reading in self.readings}
+
+    def encode_numeric(self, encoding: str = 'json', compress: bool = False) -> Tuple[str, bytes]:
+        """Encode numeric values, returning (content_type, bytes)."""
+        payload: Dict[str, Any] = self.get_numeric_values()
+        if self.message_id:
+            payload['msg_id'] = self.message_id
+        return encode_payload(payload, encoding, compress)
+
+    def encode_mqtt_payload(self, encoding: str = 'json', compress: bool = False) -> Tuple[str, bytes]:
+        """Encode the detailed MQTT payload, returning (content_type, bytes)."""
+        return encode_payload(self.to_mqtt_payload(), encoding, compress)
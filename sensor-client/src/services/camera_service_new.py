@@ -5,6 +5,7 @@ Camera sensor service for capturing and transmitting images/videos.
 
 import asyncio
 import logging
+import os
 from datetime import datetime
 from typing import Dict, Any, Optional
 from ..core.config import Config
@@ -195,16 +196,37 @@ class CameraSensorService:
             # Send via MQTT
             success = await self.mqtt_adapter.send_sensor_data(sensor_data)
             
+            # Stream recorded files in chunks rather than embedding them in a message
+            file_path = camera_data.get('data', {}).get('file_path')
+            if success and file_path:
+                success = await self.mqtt_adapter.send_media_file(
+                    file_path,
+                    data_type=data_type,
+                    file_format=camera_data['data'].get('format', 'mp4'),
+                    metadata={
+                        'duration_seconds': camera_data['data'].get('duration_seconds'),
+                        'frame_count': camera_data['data'].get('frame_count'),
+                        'simulated': camera_data['data'].get('simulated', False)
+                    }
+                )
+
             if success:
                 self.total_transmissions += 1
                 self.logger.debug(f"Sent {data_type} data successfully")
             else:
                 self.error_count += 1
                 self.logger.error(f"Failed to send {data_type} data")
-            
+
         except Exception as e:
             self.error_count += 1
             self.logger.error(f"Error sending camera data: {e}")
+        finally:
+            file_path = camera_data.get('data', {}).get('file_path')
+            if file_path:
+                try:
+                    os.unlink(file_path)
+                except OSError:
+                    pass
     
     async def _automatic_capture_loop(self):
         """Automatic capture loop."""
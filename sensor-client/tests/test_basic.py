@@ -88,6 +88,24 @@ class TestSensorData:
         assert numeric["temperature"] == 22.5
         assert numeric["humidity"] == 65.0
 
+    def test_binary_encoding(self):
+        """Test binary payload encoding round-trips the numeric values."""
+        import zlib
+        msgpack = pytest.importorskip("msgpack")
+
+        sensor_data = SensorData(
+            client_id="test_client",
+            readings=[SensorReading("temperature", 22.5, "°C", datetime.now())]
+        )
+
+        content_type, data = sensor_data.encode_numeric("msgpack", compress=True)
+        assert content_type == "msgpack-zlib"
+        assert msgpack.unpackb(zlib.decompress(data)) == {"temperature": 22.5}
+
+        content_type, data = sensor_data.encode_numeric()
+        assert content_type == "json"
+        assert data == b'{"temperature": 22.5}'
+
 
 class TestSerialAdapter:
     """Test serial adapter functionality."""